@@ -1,14 +1,23 @@
 from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from typing import Optional
 from typing import List
 import logging
 import os
+import time
 
 from models import Activity, ActivityCreate, ActivityUpdate, ActivityResponse, StudentActivityView, SubmissionResponse, OptimizedSubmissionView
 from activities_service import ActivitiesService
 from lti_service import LTIGradeService
 from grade_service import GradeService
 from evaluation_service import EvaluationService
+from storage_service import FileStorageService
+from storage_usage_service import QuotaExceededError
+from fast_json import FastJSONResponse
+from zip_stream import ZipEntry, iter_zip
+import metrics
+import tracing
 
 router = APIRouter()
 
@@ -195,7 +204,15 @@ async def get_student_activity_view(activity_id: str, request: Request):
 
 # ==================== Entregas de una Actividad ====================
 
+_QUOTA_LEVELS = {'moodle': 'instancia de Moodle', 'course': 'curso', 'activity': 'actividad'}
+
+
+def _megabytes(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f}"
+
+
 @router.post("/{activity_id}/submissions", response_model=SubmissionResponse)
+@tracing.traced('submission.create')
 async def create_submission(
     activity_id: str,
     request: Request,
@@ -209,6 +226,8 @@ async def create_submission(
         file: Archivo a enviar
         student_note: Nota opcional del estudiante para el profesor(es)
     """
+    start = time.perf_counter()
+    outcome = 'error'
     try:
         lti_data = get_lti_session_data(request)
         
@@ -226,6 +245,7 @@ async def create_submission(
         file_content = await file.read()
         if len(file_content) > max_size:
             raise HTTPException(status_code=400, detail="El archivo es demasiado grande (máximo 50MB)")
+        metrics.UPLOAD_SIZE.observe(len(file_content))
         
         moodle_id = lti_data.get('tool_consumer_instance_guid', '')
         if not moodle_id:
@@ -251,6 +271,7 @@ async def create_submission(
         
         logging.info(f"Documento entregado: {submission.student_submission.id} por estudiante {lti_data.get('user_id')}")
         
+        outcome = 'success'
         return SubmissionResponse(
             success=True,
             message="Documento enviado exitosamente",
@@ -258,10 +279,21 @@ async def create_submission(
         )
         
     except HTTPException:
+        outcome = 'rejected'
         raise
+    except QuotaExceededError as e:
+        outcome = 'rejected'
+        logging.warning(f"Entrega rechazada por cuota de almacenamiento: {str(e)}")
+        raise HTTPException(
+            status_code=413,
+            detail=f"Se ha superado la cuota de almacenamiento ({_QUOTA_LEVELS[e.level]}: "
+                   f"{_megabytes(e.used)} de {_megabytes(e.limit)} MB usados)"
+        )
     except Exception as e:
         logging.error(f"Error enviando documento: {str(e)}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
+    finally:
+        metrics.UPLOAD_DURATION.observe(time.perf_counter() - start, outcome)
 
 @router.get("/{activity_id}/submissions")
 async def get_activity_submissions(activity_id: str, request: Request):
@@ -278,7 +310,8 @@ async def get_activity_submissions(activity_id: str, request: Request):
         
         submissions_data = ActivitiesService.get_submissions_by_activity(activity_id, moodle_id)
         
-        return submissions_data
+        # Plain dicts (see get_submissions_by_activity): rendered without jsonable_encoder
+        return FastJSONResponse(submissions_data)
         
     except HTTPException:
         raise
@@ -286,6 +319,75 @@ async def get_activity_submissions(activity_id: str, request: Request):
         logging.error(f"Error obteniendo entregas: {str(e)}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
+@router.get("/{activity_id}/submissions/download")
+async def download_activity_submissions(
+    activity_id: str,
+    request: Request,
+    ungraded: bool = False,
+    group_code: Optional[str] = None
+):
+    """Descarga todas las entregas de una actividad en un ZIP generado al vuelo (para profesores)
+    
+    Los ficheros llevan el mismo nombre que en /api/downloads (código de grupo
+    o nombre del estudiante). El ZIP se envía mientras se genera, sin fichero
+    temporal ni cargarlo en memoria.
+    
+    Query params:
+        ungraded: Solo entregas sin nota final del profesor
+        group_code: Solo la entrega de ese grupo
+    """
+    try:
+        lti_data = get_lti_session_data(request)
+        
+        if not check_teacher_role(lti_data):
+            raise HTTPException(status_code=403, detail="Solo profesores pueden descargar entregas")
+        
+        moodle_id = lti_data.get('tool_consumer_instance_guid', '')
+        if not moodle_id:
+            raise HTTPException(status_code=400, detail="No se encontró tool_consumer_instance_guid en los datos LTI")
+        
+        activity = ActivitiesService.get_activity_by_id(activity_id, moodle_id)
+        if not activity:
+            raise HTTPException(status_code=404, detail="Actividad no encontrada")
+        
+        selection = await run_in_threadpool(
+            ActivitiesService.get_submission_files_for_download, activity_id, moodle_id, ungraded, group_code
+        )
+        if not selection['files']:
+            raise HTTPException(status_code=404, detail="No hay entregas que descargar")
+        
+        backend = FileStorageService.backend()
+        entries = []
+        for item in selection['files']:
+            # Files compressed at rest are decoded on the fly
+            compressed = FileStorageService.stored_encoding(item['key']) is not None
+            local_path = None if compressed else backend.local_path(item['key'])
+            entries.append(ZipEntry(
+                name=item['name'],
+                path=local_path,
+                chunks=None if local_path else FileStorageService.iter_key(item['key']),
+                modified=item['uploaded_at']
+            ))
+        if selection['missing']:
+            logging.warning(f"Descarga de actividad {activity_id}: {len(selection['missing'])} ficheros no encontrados")
+            entries.append(ZipEntry(
+                name='_archivos_no_encontrados.txt',
+                chunks=['\n'.join(selection['missing']).encode('utf-8') + b'\n']
+            ))
+        
+        archive_name = FileStorageService.sanitize_filename(f"{activity.title or activity_id}_entregas.zip")
+        return StreamingResponse(
+            iter_zip(entries),
+            media_type='application/zip',
+            headers={'Content-Disposition': f'attachment; filename="{archive_name}"'}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error descargando entregas: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
 # ==================== Evaluaciรณn Automรกtica ====================
 
 def is_debug_mode() -> bool:
@@ -298,18 +400,24 @@ def run_background_evaluation(
     activity_moodle_id: str,
     file_submission_ids: List[str],
     evaluator_id: str,
-    debug_mode: bool
+    debug_mode: bool,
+    trace_parent: Optional[str] = None
 ):
-    """Background task to process evaluations"""
+    """Background task to process evaluations
+    
+    trace_parent is the traceparent of the request that queued the job, so
+    the evaluation spans belong to the same trace.
+    """
     logging.info(f"Starting background evaluation for {len(file_submission_ids)} submissions")
     try:
-        result = EvaluationService.process_evaluation_batch(
-            activity_id=activity_id,
-            activity_moodle_id=activity_moodle_id,
-            file_submission_ids=file_submission_ids,
-            evaluator_id=evaluator_id,
-            is_debug_mode=debug_mode
-        )
+        with tracing.span('evaluation.background', parent=trace_parent, submissions=len(file_submission_ids)):
+            result = EvaluationService.process_evaluation_batch(
+                activity_id=activity_id,
+                activity_moodle_id=activity_moodle_id,
+                file_submission_ids=file_submission_ids,
+                evaluator_id=evaluator_id,
+                is_debug_mode=debug_mode
+            )
         logging.info(f"Background evaluation completed: {result['grades_created']} created, {result['grades_updated']} updated, {len(result.get('errors', []))} errors")
     except Exception as e:
         logging.error(f"Background evaluation failed: {e}")
@@ -408,7 +516,8 @@ async def evaluate_activity(activity_id: str, request: Request, background_tasks
                 activity_moodle_id=moodle_id,
                 file_submission_ids=start_result['queued_ids'],
                 evaluator_id=activity.evaluator_id,
-                debug_mode=is_debug_mode()
+                debug_mode=is_debug_mode(),
+                trace_parent=tracing.current_traceparent()
             )
         
         response = {
@@ -1,8 +1,11 @@
+import os
 import uuid
 import secrets
 import string
 from datetime import datetime, timezone
 from typing import List, Optional, Dict, Any
+from sqlalchemy import func, literal_column, select, update
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from models import (
@@ -11,12 +14,14 @@ from models import (
     StudentActivityView, Grade
 )
 from db_models import (
-    ActivityDB, FileSubmissionDB, StudentSubmissionDB, UserDB
+    ActivityDB, FileSubmissionDB, StudentSubmissionDB, UserDB, GradeDB
 )
 from database import get_db_session
 from grade_service import GradeService
 from storage_service import FileStorageService
+from storage_usage_service import UsageScope
 from config import DEFAULT_ACTIVITY_LANGUAGE
+import tracing
 
 # Group prefix mapping for i18n (language -> prefix)
 GROUP_PREFIX_MAP = {
@@ -26,6 +31,116 @@ GROUP_PREFIX_MAP = {
     'eu': 'TALDEA'
 }
 
+# Random group codes drawn before giving up (36^8 codes: a second draw is already rare)
+GROUP_CODE_ATTEMPTS = 5
+
+# Columns of the teacher's submission listing (get_submissions_by_activity), one row per student
+_SUBMISSION_LISTING_COLUMNS = (
+    StudentSubmissionDB.id.label('student_submission_id'),
+    StudentSubmissionDB.student_id,
+    StudentSubmissionDB.student_moodle_id,
+    StudentSubmissionDB.activity_id.label('student_activity_id'),
+    StudentSubmissionDB.activity_moodle_id.label('student_activity_moodle_id'),
+    StudentSubmissionDB.lis_result_sourcedid,
+    StudentSubmissionDB.joined_at,
+    StudentSubmissionDB.sent_to_moodle,
+    StudentSubmissionDB.sent_to_moodle_at,
+    FileSubmissionDB.id.label('file_submission_id'),
+    FileSubmissionDB.activity_id,
+    FileSubmissionDB.activity_moodle_id,
+    FileSubmissionDB.file_name,
+    FileSubmissionDB.file_path,
+    FileSubmissionDB.content_hash,
+    FileSubmissionDB.file_size,
+    FileSubmissionDB.file_type,
+    FileSubmissionDB.uploaded_at,
+    FileSubmissionDB.uploaded_by,
+    FileSubmissionDB.uploaded_by_moodle_id,
+    FileSubmissionDB.group_code,
+    FileSubmissionDB.group_display_name,
+    FileSubmissionDB.max_group_members,
+    FileSubmissionDB.student_note,
+    FileSubmissionDB.evaluation_status,
+    FileSubmissionDB.evaluation_started_at,
+    FileSubmissionDB.evaluation_error,
+    UserDB.id.label('user_id'),
+    UserDB.full_name,
+    UserDB.email,
+    GradeDB.id.label('grade_id'),
+    GradeDB.ai_score,
+    GradeDB.ai_comment,
+    GradeDB.ai_evaluated_at,
+    GradeDB.score,
+    GradeDB.comment,
+    GradeDB.created_at.label('grade_created_at'),
+    GradeDB.updated_at.label('grade_updated_at'),
+)
+
+
+def _iso_z(value: Optional[datetime]) -> Optional[str]:
+    """Same format as the field serializers of models.py"""
+    return value.isoformat() + 'Z' if value else None
+
+
+def _activity_dict(activity: ActivityDB) -> Dict[str, Any]:
+    """JSON form of models.Activity"""
+    return {
+        'id': activity.id,
+        'title': activity.title,
+        'description': activity.description,
+        'activity_type': activity.activity_type,
+        'max_group_size': activity.max_group_size,
+        'creator_id': activity.creator_id,
+        'creator_moodle_id': activity.creator_moodle_id,
+        'created_at': _iso_z(activity.created_at),
+        'course_id': activity.course_id,
+        'course_moodle_id': activity.course_moodle_id,
+        'deadline': _iso_z(activity.deadline),
+        'evaluator_id': activity.evaluator_id,
+        'language': activity.language
+    }
+
+
+def _file_submission_dict(row) -> Dict[str, Any]:
+    """JSON form of models.FileSubmission from a _SUBMISSION_LISTING_COLUMNS row"""
+    return {
+        'id': row.file_submission_id,
+        'activity_id': row.activity_id,
+        'activity_moodle_id': row.activity_moodle_id,
+        'file_name': row.file_name,
+        'file_path': row.file_path,
+        'content_hash': row.content_hash,
+        'file_size': row.file_size,
+        'file_type': row.file_type,
+        'uploaded_at': _iso_z(row.uploaded_at),
+        'uploaded_by': row.uploaded_by,
+        'uploaded_by_moodle_id': row.uploaded_by_moodle_id,
+        'group_code': row.group_code,
+        'group_display_name': row.group_display_name,
+        'max_group_members': row.max_group_members,
+        'student_note': row.student_note,
+        'evaluation_status': row.evaluation_status,
+        'evaluation_started_at': _iso_z(row.evaluation_started_at),
+        'evaluation_error': row.evaluation_error
+    }
+
+
+def _grade_dict(row) -> Optional[Dict[str, Any]]:
+    """JSON form of models.Grade from a _SUBMISSION_LISTING_COLUMNS row (None without grade)"""
+    if row.grade_id is None:
+        return None
+    return {
+        'id': row.grade_id,
+        'file_submission_id': row.file_submission_id,
+        'ai_score': row.ai_score,
+        'ai_comment': row.ai_comment,
+        'ai_evaluated_at': _iso_z(row.ai_evaluated_at),
+        'score': row.score,
+        'comment': row.comment,
+        'created_at': _iso_z(row.grade_created_at),
+        'updated_at': _iso_z(row.grade_updated_at)
+    }
+
 class ActivitiesService:
     """
     Optimized activities service that uses the new storage structure.
@@ -129,9 +244,14 @@ class ActivitiesService:
         Format: {PREFIX}_{number} where PREFIX is i18n-ized
         Examples: GROUP_1, GRUPO_1, GRUP_1, TALDEA_1
         """
-        # Increment the group counter
-        activity.group_counter = (activity.group_counter or 0) + 1
-        group_number = activity.group_counter
+        # Increment the group counter in the database: concurrent leaders get consecutive numbers
+        group_number = db.execute(
+            update(ActivityDB)
+            .where(ActivityDB.id == activity.id, ActivityDB.course_moodle_id == activity.course_moodle_id)
+            .values(group_counter=func.coalesce(ActivityDB.group_counter, 0) + 1)
+            .returning(ActivityDB.group_counter)
+            .execution_options(synchronize_session=False)
+        ).scalar_one()
         
         # Get the prefix based on activity language
         prefix = GROUP_PREFIX_MAP.get(activity.language, GROUP_PREFIX_MAP['en'])
@@ -139,6 +259,7 @@ class ActivitiesService:
         return f"{prefix}_{group_number}"
     
     @staticmethod
+    @tracing.traced('submission.store')
     def create_submission(activity_id: str, student_id: str, student_name: str, 
                          student_email: Optional[str], file_name: str, file_content: bytes, 
                          file_size: int, file_type: str, course_id: str, course_moodle_id: str,
@@ -189,18 +310,19 @@ class ActivitiesService:
                 ).first()
                 
                 if file_submission and file_submission.uploaded_by == student_id:
-                    # Student owns the file - update it and replace file on disk
-                    relative_path = FileStorageService.save_submission_file(
-                        moodle_id=course_moodle_id,
-                        course_id=course_id,
-                        activity_id=activity_id,
-                        submission_id=file_submission.id,
+                    # Student owns the file - update it (unchanged content is not stored again)
+                    relative_path, content_hash = FileStorageService.save_submission_file(
+                        db,
                         file_name=file_name,
                         file_bytes=file_content,
-                        previous_file_path=file_submission.file_path
+                        previous_file_path=file_submission.file_path,
+                        media_type=file_type,
+                        usage=UsageScope(course_moodle_id, activity.course_id, activity_id),
+                        previous_size=file_submission.file_size or 0
                     )
                     file_submission.file_name = file_name
                     file_submission.file_path = relative_path
+                    file_submission.content_hash = content_hash
                     file_submission.file_size = file_size
                     file_submission.file_type = file_type
                     file_submission.uploaded_at = datetime.now(timezone.utc)
@@ -235,37 +357,38 @@ class ActivitiesService:
             is_group_leader = False
             
             if activity.activity_type == ActivityType.GROUP:
-                group_code = ActivitiesService._generate_group_code(db)
                 group_display_name = ActivitiesService._generate_group_display_name(db, activity)
                 max_group_members = activity.max_group_size
                 is_group_leader = True
             
             # Persist file and create file submission (one per group/individual)
-            relative_path = FileStorageService.save_submission_file(
-                moodle_id=course_moodle_id,
-                course_id=course_id,
-                activity_id=activity_id,
-                submission_id=file_submission_id,
+            relative_path, content_hash = FileStorageService.save_submission_file(
+                db,
                 file_name=file_name,
-                file_bytes=file_content
+                file_bytes=file_content,
+                media_type=file_type,
+                usage=UsageScope(course_moodle_id, activity.course_id, activity_id)
             )
 
-            db_file_submission = FileSubmissionDB(
+            file_submission_values = dict(
                 id=file_submission_id,
                 activity_id=activity_id,
                 activity_moodle_id=course_moodle_id,
                 file_name=file_name,
                 file_path=relative_path,
+                content_hash=content_hash,
                 file_size=file_size,
                 file_type=file_type,
                 uploaded_at=datetime.now(timezone.utc),
                 uploaded_by=student_id,
                 uploaded_by_moodle_id=course_moodle_id,
-                group_code=group_code,
                 group_display_name=group_display_name,
                 max_group_members=max_group_members,
+                member_count=1,
                 student_note=student_note.strip() if student_note else None
             )
+            group_code = ActivitiesService._insert_file_submission(db, file_submission_values, is_group_leader)
+            db_file_submission = db.get(FileSubmissionDB, file_submission_id)
             
             # Create student submission (one per student)
             db_student_submission = StudentSubmissionDB(
@@ -279,7 +402,6 @@ class ActivitiesService:
                 joined_at=datetime.now(timezone.utc)
             )
             
-            db.add(db_file_submission)
             db.add(db_student_submission)
             db.commit()
             db.refresh(db_file_submission)
@@ -337,14 +459,6 @@ class ActivitiesService:
             if not file_submission:
                 raise ValueError("Invalid group code")
             
-            # Check if group has reached maximum capacity
-            current_members = db.query(StudentSubmissionDB).filter(
-                StudentSubmissionDB.file_submission_id == file_submission.id
-            ).count()
-            
-            if current_members >= file_submission.max_group_members:
-                raise ValueError("Group code has reached maximum number of uses")
-            
             # Check if student already has a submission for this activity
             existing_student_submission = db.query(StudentSubmissionDB).filter(
                 StudentSubmissionDB.activity_id == activity_id,
@@ -360,6 +474,27 @@ class ActivitiesService:
                 else:
                     raise ValueError("You have already submitted to this activity")
             
+            # Take a place in the group: the capacity check and the increment are one
+            # statement, so concurrent joins cannot oversubscribe it (rows from before
+            # member_count existed are counted once here)
+            member_count = func.coalesce(
+                FileSubmissionDB.member_count,
+                select(func.count(StudentSubmissionDB.id))
+                .where(StudentSubmissionDB.file_submission_id == FileSubmissionDB.id)
+                .scalar_subquery()
+            )
+            joined = db.execute(
+                update(FileSubmissionDB)
+                .where(
+                    FileSubmissionDB.id == file_submission.id,
+                    member_count < func.coalesce(FileSubmissionDB.max_group_members, 1)
+                )
+                .values(member_count=member_count + 1)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not joined:
+                raise ValueError("Group code has reached maximum number of uses")
+            
             # Create new student submission for this group
             student_submission_id = str(uuid.uuid4())
             db_student_submission = StudentSubmissionDB(
@@ -374,8 +509,14 @@ class ActivitiesService:
             )
             
             db.add(db_student_submission)
-            db.commit()
+            try:
+                db.commit()
+            except IntegrityError:
+                # The same student joined concurrently (one submission per student and activity)
+                db.rollback()
+                raise ValueError("You have already submitted to this activity")
             db.refresh(db_student_submission)
+            db.refresh(file_submission)
             
             # Note: No need to create evaluation here as it already exists for the file_submission
             
@@ -432,9 +573,11 @@ class ActivitiesService:
             # Calculate group code uses if it's a group submission
             group_code_uses = None
             if file_submission.group_code:
-                group_uses_count = db.query(StudentSubmissionDB).filter(
-                    StudentSubmissionDB.file_submission_id == file_submission.id
-                ).count()
+                group_uses_count = file_submission.member_count
+                if group_uses_count is None:
+                    group_uses_count = db.query(StudentSubmissionDB).filter(
+                        StudentSubmissionDB.file_submission_id == file_submission.id
+                    ).count()
                 group_code_uses = group_uses_count - 1 if is_group_leader else 0
             
             grade = GradeService.get_grade_by_file_submission(file_submission.id)
@@ -448,6 +591,13 @@ class ActivitiesService:
     def get_submissions_by_activity(activity_id: str, activity_moodle_id: str) -> Dict[str, Any]:
         """Get all submissions for a specific activity organized by type (individual/group)
         
+        Lean path for the teacher's listing: one joined query over
+        student_submissions / file_submissions / users / grades, rows turned
+        into plain dicts with the same keys and formats as
+        OptimizedSubmissionView (datetimes already as ISO strings), so the
+        result can be rendered by FastJSONResponse without Pydantic models or
+        jsonable_encoder.
+        
         Args:
             activity_id: Activity ID from LTI
             activity_moodle_id: Moodle instance ID
@@ -462,136 +612,93 @@ class ActivitiesService:
             if not activity:
                 raise ValueError("Activity not found")
             
-            # Get all student submissions for this activity (using composite key)
-            student_submissions = db.query(StudentSubmissionDB).filter(
-                StudentSubmissionDB.activity_id == activity_id,
-                StudentSubmissionDB.activity_moodle_id == activity_moodle_id
+            rows = db.execute(
+                select(*_SUBMISSION_LISTING_COLUMNS)
+                .select_from(StudentSubmissionDB)
+                .join(FileSubmissionDB, FileSubmissionDB.id == StudentSubmissionDB.file_submission_id)
+                .outerjoin(UserDB, (UserDB.id == StudentSubmissionDB.student_id)
+                           & (UserDB.moodle_id == StudentSubmissionDB.student_moodle_id))
+                .outerjoin(GradeDB, GradeDB.file_submission_id == FileSubmissionDB.id)
+                .where(StudentSubmissionDB.activity_id == activity_id,
+                       StudentSubmissionDB.activity_moodle_id == activity_moodle_id)
+                # Insertion order on ties, as before (the group leader first)
+                .order_by(StudentSubmissionDB.joined_at, literal_column('student_submissions.rowid'))
             ).all()
-            
-            submissions_list = []
+        finally:
+            db.close()
+        
+        activity_dict = _activity_dict(activity)
+        
+        if activity.activity_type == ActivityType.GROUP:
             groups_dict = {}
-            
-            for student_submission in student_submissions:
-                # Get associated file submission
-                file_submission = db.query(FileSubmissionDB).filter(
-                    FileSubmissionDB.id == student_submission.file_submission_id
-                ).first()
-                
-                if not file_submission:
+            seen = set()
+            for row in rows:
+                if row.student_submission_id in seen:  # a second grade row of the same submission
                     continue
-                
-                # Get user data (using composite key)
-                user = db.query(UserDB).filter(
-                    UserDB.id == student_submission.student_id,
-                    UserDB.moodle_id == student_submission.student_moodle_id
-                ).first()
-                student_name = user.full_name if user else ""
-                student_email = user.email if user else ""
-                
-                # Determine if this student is the group leader
-                is_group_leader = (file_submission.uploaded_by == student_submission.student_id and file_submission.group_code is not None)
-                
-                # Calculate group code uses for this submission
-                group_code_uses = None
-                if file_submission.group_code and is_group_leader:
-                    group_uses_count = len([ss for ss in student_submissions if ss.file_submission_id == file_submission.id])
-                    group_code_uses = group_uses_count - 1
-                
-                # Get grade for this file submission
-                grade = GradeService.get_grade_by_file_submission(file_submission.id)
-                
-                submission_view = ActivitiesService._create_submission_view(
-                    file_submission, student_submission, student_name, student_email, is_group_leader, group_code_uses, grade
-                )
-                
-                submissions_list.append(submission_view)
-                
-                # If it's a group submission, organize by group
-                if file_submission.group_code:
-                    if file_submission.group_code not in groups_dict:
-                        # Convert Grade Pydantic model to dict for proper JSON serialization
-                        grade_dict = None
-                        if grade:
-                            grade_dict = {
-                                'id': grade.id,
-                                'file_submission_id': grade.file_submission_id,
-                                'ai_score': grade.ai_score,
-                                'ai_comment': grade.ai_comment,
-                                'ai_evaluated_at': grade.ai_evaluated_at.isoformat() + 'Z' if grade.ai_evaluated_at else None,
-                                'score': grade.score,
-                                'comment': grade.comment,
-                                'created_at': grade.created_at.isoformat() + 'Z' if grade.created_at else None,
-                                'updated_at': grade.updated_at.isoformat() + 'Z' if grade.updated_at else None
-                            }
-                        groups_dict[file_submission.group_code] = {
-                            'group_code': file_submission.group_code,
-                            'file_submission': submission_view.file_submission,
-                            'members': [],
-                            'group_leader': None,
-                            'grade': grade_dict  # Add grade at group level (as dict)
-                        }
-                    
-                    member_info = {
-                        'student_id': student_submission.student_id,
-                        'student_name': student_name,
-                        'student_email': student_email,
-                        'joined_at': student_submission.joined_at,
-                        'is_group_leader': is_group_leader
+                seen.add(row.student_submission_id)
+                if not row.group_code:
+                    continue
+                group = groups_dict.get(row.group_code)
+                if group is None:
+                    group = groups_dict[row.group_code] = {
+                        'group_code': row.group_code,
+                        'file_submission': _file_submission_dict(row),
+                        'members': [],
+                        'group_leader': None,
+                        'grade': _grade_dict(row)
                     }
-                    
-                    groups_dict[file_submission.group_code]['members'].append(member_info)
-                    
-                    if is_group_leader:
-                        groups_dict[file_submission.group_code]['group_leader'] = member_info
-            
-            # Organize final result
-            if activity.activity_type == ActivityType.GROUP:
-                groups = list(groups_dict.values())
-                return {
-                    'activity': Activity(
-                        id=activity.id,
-                        title=activity.title,
-                        description=activity.description,
-                        activity_type=activity.activity_type,
-                        max_group_size=activity.max_group_size,
-                        creator_id=activity.creator_id,
-                        creator_moodle_id=activity.creator_moodle_id,
-                        created_at=activity.created_at,
-                        course_id=activity.course_id,
-                        course_moodle_id=activity.course_moodle_id,
-                        deadline=activity.deadline,
-                        evaluator_id=activity.evaluator_id,
-                        language=activity.language
-                    ),
-                    'activity_type': 'group',
-                    'total_submissions': len(groups),
-                    'groups': groups
+                is_group_leader = row.uploaded_by == row.student_id
+                member_info = {
+                    'student_id': row.student_id,
+                    'student_name': row.full_name if row.user_id is not None else "",
+                    'student_email': row.email if row.user_id is not None else "",
+                    'joined_at': row.joined_at.isoformat() if row.joined_at else None,
+                    'is_group_leader': is_group_leader
                 }
-            else:
-                # Individual submissions
-                individual_submissions = [s for s in submissions_list if not s.file_submission.group_code]
-                return {
-                    'activity': Activity(
-                        id=activity.id,
-                        title=activity.title,
-                        description=activity.description,
-                        activity_type=activity.activity_type,
-                        max_group_size=activity.max_group_size,
-                        creator_id=activity.creator_id,
-                        creator_moodle_id=activity.creator_moodle_id,
-                        created_at=activity.created_at,
-                        course_id=activity.course_id,
-                        course_moodle_id=activity.course_moodle_id,
-                        deadline=activity.deadline,
-                        evaluator_id=activity.evaluator_id,
-                        language=activity.language
-                    ),
-                    'activity_type': 'individual',
-                    'total_submissions': len(individual_submissions),
-                    'submissions': individual_submissions
-                }
-        finally:
-            db.close()
+                group['members'].append(member_info)
+                if is_group_leader:
+                    group['group_leader'] = member_info
+            groups = list(groups_dict.values())
+            return {
+                'activity': activity_dict,
+                'activity_type': 'group',
+                'total_submissions': len(groups),
+                'groups': groups
+            }
+        
+        # Individual submissions
+        individual_submissions = []
+        seen = set()
+        for row in rows:
+            if row.student_submission_id in seen or row.group_code:
+                continue
+            seen.add(row.student_submission_id)
+            individual_submissions.append({
+                'file_submission': _file_submission_dict(row),
+                'student_submission': {
+                    'id': row.student_submission_id,
+                    'file_submission_id': row.file_submission_id,
+                    'student_id': row.student_id,
+                    'student_moodle_id': row.student_moodle_id,
+                    'activity_id': row.student_activity_id,
+                    'activity_moodle_id': row.student_activity_moodle_id,
+                    'lis_result_sourcedid': row.lis_result_sourcedid,
+                    'joined_at': _iso_z(row.joined_at),
+                    'sent_to_moodle': row.sent_to_moodle,
+                    'sent_to_moodle_at': _iso_z(row.sent_to_moodle_at)
+                },
+                'student_name': row.full_name if row.user_id is not None else "",
+                'student_email': row.email if row.user_id is not None else "",
+                'is_group_leader': False,
+                'group_code_uses': None,
+                'grade': _grade_dict(row)
+            })
+        return {
+            'activity': activity_dict,
+            'activity_type': 'individual',
+            'total_submissions': len(individual_submissions),
+            'submissions': individual_submissions
+        }
     
     @staticmethod
     def get_group_members(activity_id: str, activity_moodle_id: str, group_code: str) -> List[OptimizedSubmissionView]:
@@ -677,15 +784,31 @@ class ActivitiesService:
 
     
     @staticmethod
-    def _generate_group_code(db: Session) -> str:
-        """Generate a unique 8-character group code"""
-        while True:
-            # Generate a random 8-character code with uppercase letters and numbers
-            code = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(8))
-            # Ensure it's unique by checking if any file submission already uses this code
-            existing = db.query(FileSubmissionDB).filter(FileSubmissionDB.group_code == code).first()
-            if not existing:
-                return code
+    def _generate_group_code() -> str:
+        """Generate a random 8-character group code (uniqueness is enforced on insert)"""
+        return ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(8))
+    
+    @staticmethod
+    def _insert_file_submission(db: Session, values: Dict[str, Any], with_group_code: bool) -> Optional[str]:
+        """Insert a file submission, drawing group codes until one is free
+        
+        The unique index on group_code decides: a taken code inserts nothing
+        (ON CONFLICT DO NOTHING) and another one is drawn, without a lookup
+        per candidate or an IntegrityError aborting the transaction.
+        
+        Returns:
+            The group code of the new row (None without group code)
+        """
+        for _ in range(GROUP_CODE_ATTEMPTS if with_group_code else 1):
+            group_code = ActivitiesService._generate_group_code() if with_group_code else None
+            inserted = db.execute(
+                insert(FileSubmissionDB)
+                .values(**values, group_code=group_code)
+                .on_conflict_do_nothing(index_elements=[FileSubmissionDB.group_code])
+            ).rowcount
+            if inserted:
+                return group_code
+        raise RuntimeError(f"No free group code after {GROUP_CODE_ATTEMPTS} attempts")
     
     # Unchanged methods from original service
     @staticmethod
@@ -809,6 +932,7 @@ class ActivitiesService:
             activity_moodle_id=file_submission.activity_moodle_id,
             file_name=file_submission.file_name,
             file_path=file_submission.file_path,
+            content_hash=file_submission.content_hash,
             file_size=file_submission.file_size,
             file_type=file_submission.file_type,
             uploaded_at=file_submission.uploaded_at,
@@ -915,4 +1039,86 @@ class ActivitiesService:
                 language=db_activity.language
             )
         finally:
-            db.close()
\ No newline at end of file
+            db.close()
+    
+    @staticmethod
+    def get_submission_files_for_download(
+        activity_id: str,
+        activity_moodle_id: str,
+        ungraded_only: bool = False,
+        group_code: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Files of an activity with the names download_file would give them
+        
+        Names are made unique within the archive ("Name_2.pdf"). Files
+        missing from storage (or outside the uploads root) are reported separately.
+        
+        Args:
+            activity_id: Activity ID from LTI
+            activity_moodle_id: Moodle instance ID
+            ungraded_only: Only submissions without a final (teacher) score
+            group_code: Only the submission of this group
+            
+        Returns:
+            dict: {"files": [{"name", "key", "uploaded_at"}], "missing": [names]} (key: storage backend key)
+        """
+        db = get_db_session()
+        try:
+            query = db.query(
+                FileSubmissionDB.id, FileSubmissionDB.file_name, FileSubmissionDB.file_path,
+                FileSubmissionDB.group_code, FileSubmissionDB.uploaded_by, FileSubmissionDB.uploaded_at
+            ).outerjoin(
+                GradeDB, GradeDB.file_submission_id == FileSubmissionDB.id
+            ).filter(
+                FileSubmissionDB.activity_id == activity_id,
+                FileSubmissionDB.activity_moodle_id == activity_moodle_id
+            )
+            if group_code:
+                query = query.filter(FileSubmissionDB.group_code == group_code)
+            if ungraded_only:
+                query = query.filter(GradeDB.score.is_(None))
+            file_rows = query.order_by(FileSubmissionDB.uploaded_at.asc(), FileSubmissionDB.id.asc()).all()
+            
+            # First member (by join time) of every submission, in one query
+            first_members = {}
+            member_rows = db.query(
+                StudentSubmissionDB.file_submission_id, StudentSubmissionDB.student_id, UserDB.full_name
+            ).outerjoin(
+                UserDB,
+                (UserDB.id == StudentSubmissionDB.student_id) & (UserDB.moodle_id == StudentSubmissionDB.student_moodle_id)
+            ).filter(
+                StudentSubmissionDB.activity_id == activity_id,
+                StudentSubmissionDB.activity_moodle_id == activity_moodle_id
+            ).order_by(StudentSubmissionDB.joined_at.asc())
+            for file_submission_id, student_id, full_name in member_rows:
+                first_members.setdefault(file_submission_id, (student_id, full_name))
+        finally:
+            db.close()
+        
+        backend = FileStorageService.backend()
+        files = []
+        missing = []
+        used_names = set()
+        for row in file_rows:
+            student_id, full_name = first_members.get(row.id, (None, None))
+            name = FileStorageService.download_filename(
+                file_name=row.file_name,
+                stored_path=row.file_path,
+                group_code=row.group_code,
+                student_name=full_name,
+                student_id=student_id,
+                uploaded_by=row.uploaded_by
+            )
+            stem, extension = os.path.splitext(name)
+            copy = 2
+            while name.lower() in used_names:
+                name = f"{stem}_{copy}{extension}"
+                copy += 1
+            used_names.add(name.lower())
+            
+            key = FileStorageService.storage_key(row.file_path)
+            if key is not None and backend.exists(key):
+                files.append({"name": name, "key": key, "uploaded_at": row.uploaded_at})
+            else:
+                missing.append(name)
+        return {"files": files, "missing": missing}
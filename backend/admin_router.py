@@ -4,10 +4,18 @@ Provides authentication and data endpoints for the admin dashboard.
 """
 
 from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 import os
 import hashlib
 from datetime import datetime, timedelta
-from admin_service import AdminService
+from admin_service import AdminService, ADMIN_PAGE_SIZE
+from stats_service import StatsService
+from profiling_service import ProfilingService, ProfilerBusyError, approximate_size
+import query_log
+import storage_reconciler
+from storage_usage_service import StorageUsageService
+from fast_json import FastJSONResponse
 
 router = APIRouter()
 
@@ -164,7 +172,7 @@ async def check_admin_session(request: Request):
 @router.get("/api/admin/statistics")
 async def get_statistics(request: Request):
     """
-    Get system statistics.
+    Get system statistics (counts cached for STATS_CACHE_TTL seconds).
     Requires valid admin session.
     
     Returns:
@@ -175,7 +183,7 @@ async def get_statistics(request: Request):
         raise HTTPException(status_code=401, detail="No autorizado")
     
     try:
-        stats = AdminService.get_statistics()
+        stats = await run_in_threadpool(AdminService.get_statistics)
         return {
             "success": True,
             "data": stats
@@ -184,172 +192,331 @@ async def get_statistics(request: Request):
         raise HTTPException(status_code=500, detail=f"Error obteniendo estadísticas: {str(e)}")
 
 
-@router.get("/api/admin/moodle-instances")
-async def get_moodle_instances(request: Request):
+@router.get("/api/admin/statistics/series")
+async def get_statistics_series(request: Request, hours: int = 24):
     """
-    Get all Moodle instances.
+    Launches, uploads and evaluations per hour (UTC) over the last hours.
     Requires valid admin session.
     
+    Query params:
+        hours: Window length (1..STATS_SERIES_MAX_HOURS, default 24)
+    
     Returns:
-        - 200: List of Moodle instances
+        - 200: Zero-filled hourly buckets, oldest first, and totals
+        - 400: Invalid window
         - 401: Unauthorized
     """
     if not verify_admin_session(request):
         raise HTTPException(status_code=401, detail="No autorizado")
     
     try:
-        moodles = AdminService.get_all_moodle_instances()
-        return {
-            "success": True,
-            "data": moodles,
-            "count": len(moodles)
-        }
+        data = await run_in_threadpool(StatsService.get_hourly_series, hours)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo instancias: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error obteniendo series: {str(e)}")
+    
+    return {
+        "success": True,
+        "data": data,
+        "count": len(data["series"])
+    }
+
+
+# Query params of admin listings that are not column filters
+LISTING_PARAMS = ("limit", "cursor", "format")
+
+
+async def _admin_listing(request: Request, name: str, error_message: str):
+    """
+    Paginated JSON page or NDJSON stream of an admin listing
+    
+    Query params:
+        limit: Page size (default ADMIN_PAGE_SIZE, max ADMIN_PAGE_MAX)
+        cursor: next_cursor of the previous page (has_more is false on the last one)
+        format: 'json' (default) or 'ndjson' (whole filtered listing, streamed)
+        <column>=<value>: Column filters allowed by ADMIN_LISTINGS
+    """
+    if not verify_admin_session(request):
+        raise HTTPException(status_code=401, detail="No autorizado")
+    
+    params = request.query_params
+    filters = {key: value for key, value in params.items() if key not in LISTING_PARAMS}
+    output = params.get("format", "json")
+    
+    try:
+        if output == "ndjson":
+            return StreamingResponse(
+                AdminService.iter_ndjson(name, filters),
+                media_type="application/x-ndjson",
+                headers={"Content-Disposition": f'attachment; filename="{name}.ndjson"'}
+            )
+        if output != "json":
+            raise ValueError("format debe ser 'json' o 'ndjson'")
+        try:
+            limit = int(params.get("limit", ADMIN_PAGE_SIZE))
+        except ValueError:
+            raise ValueError("limit debe ser un entero")
+        page = await run_in_threadpool(AdminService.list_page, name, filters, limit, params.get("cursor"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"{error_message}: {str(e)}")
+    
+    # Rows are already plain values (see admin_service._serialize): no jsonable_encoder pass
+    return FastJSONResponse({
+        "success": True,
+        "data": page["items"],
+        "count": len(page["items"]),
+        "next_cursor": page["next_cursor"],
+        "has_more": page["next_cursor"] is not None
+    })
+
+
+@router.get("/api/admin/moodle-instances")
+async def get_moodle_instances(request: Request):
+    """
+    Get Moodle instances (paginated, filterable, or streamed as NDJSON; see _admin_listing).
+    Requires valid admin session.
+    
+    Returns:
+        - 200: List of Moodle instances
+        - 400: Invalid filter, limit or cursor
+        - 401: Unauthorized
+    """
+    return await _admin_listing(request, "moodle-instances", "Error obteniendo instancias")
 
 
 @router.get("/api/admin/courses")
 async def get_courses(request: Request):
     """
-    Get all courses.
+    Get courses (paginated, filterable, or streamed as NDJSON; see _admin_listing).
     Requires valid admin session.
     
     Returns:
         - 200: List of courses
+        - 400: Invalid filter, limit or cursor
         - 401: Unauthorized
     """
-    if not verify_admin_session(request):
-        raise HTTPException(status_code=401, detail="No autorizado")
-    
-    try:
-        courses = AdminService.get_all_courses()
-        return {
-            "success": True,
-            "data": courses,
-            "count": len(courses)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo cursos: {str(e)}")
+    return await _admin_listing(request, "courses", "Error obteniendo cursos")
 
 
 @router.get("/api/admin/activities")
 async def get_activities(request: Request):
     """
-    Get all activities.
+    Get activities (paginated, filterable, or streamed as NDJSON; see _admin_listing).
     Requires valid admin session.
     
     Returns:
         - 200: List of activities
+        - 400: Invalid filter, limit or cursor
         - 401: Unauthorized
     """
-    if not verify_admin_session(request):
-        raise HTTPException(status_code=401, detail="No autorizado")
-    
-    try:
-        activities = AdminService.get_all_activities()
-        return {
-            "success": True,
-            "data": activities,
-            "count": len(activities)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo actividades: {str(e)}")
+    return await _admin_listing(request, "activities", "Error obteniendo actividades")
 
 
 @router.get("/api/admin/users")
 async def get_users(request: Request):
     """
-    Get all users.
+    Get users (paginated, filterable, or streamed as NDJSON; see _admin_listing).
     Requires valid admin session.
     
     Returns:
         - 200: List of users
+        - 400: Invalid filter, limit or cursor
+        - 401: Unauthorized
+    """
+    return await _admin_listing(request, "users", "Error obteniendo usuarios")
+
+
+@router.get("/api/admin/submissions")
+async def get_submissions(request: Request):
+    """
+    Get student submissions (paginated, filterable, or streamed as NDJSON; see _admin_listing).
+    Requires valid admin session.
+    
+    Returns:
+        - 200: List of submissions
+        - 400: Invalid filter, limit or cursor
+        - 401: Unauthorized
+    """
+    return await _admin_listing(request, "submissions", "Error obteniendo entregas")
+
+
+@router.get("/api/admin/files")
+async def get_files(request: Request):
+    """
+    Get file submissions (paginated, filterable, or streamed as NDJSON; see _admin_listing).
+    Requires valid admin session.
+    
+    Returns:
+        - 200: List of files
+        - 400: Invalid filter, limit or cursor
+        - 401: Unauthorized
+    """
+    return await _admin_listing(request, "files", "Error obteniendo ficheros")
+
+
+@router.get("/api/admin/grades")
+async def get_grades(request: Request):
+    """
+    Get grades (paginated, filterable, or streamed as NDJSON; see _admin_listing).
+    Requires valid admin session.
+    
+    Returns:
+        - 200: List of grades
+        - 400: Invalid filter, limit or cursor
+        - 401: Unauthorized
+    """
+    return await _admin_listing(request, "grades", "Error obteniendo calificaciones")
+
+
+@router.get("/api/admin/storage/reconcile")
+async def storage_reconcile_status(request: Request):
+    """
+    Last storage reconciliation report and the reconciler settings.
+    Requires valid admin session.
+    
+    Returns:
+        - 200: Report of the last pass (null if none ran yet), interval, action and grace period
         - 401: Unauthorized
     """
     if not verify_admin_session(request):
         raise HTTPException(status_code=401, detail="No autorizado")
     
-    try:
-        users = AdminService.get_all_users()
-        return {
-            "success": True,
-            "data": users,
-            "count": len(users)
+    return {
+        "success": True,
+        "data": {
+            "last_report": storage_reconciler.last_report(),
+            "interval_seconds": storage_reconciler.STORAGE_RECONCILE_INTERVAL,
+            "background_action": storage_reconciler.STORAGE_RECONCILE_ACTION,
+            "grace_seconds": storage_reconciler.STORAGE_ORPHAN_GRACE,
+            "max_keys": storage_reconciler.STORAGE_RECONCILE_MAX_KEYS
         }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo usuarios: {str(e)}")
+    }
 
 
-@router.get("/api/admin/submissions")
-async def get_submissions(request: Request):
+@router.post("/api/admin/storage/reconcile")
+async def storage_reconcile_run(request: Request, action: str = "report", max_keys: int = None,
+                                restart: bool = False):
     """
-    Get all student submissions.
+    Run one storage reconciliation pass now: orphaned files, unreferenced
+    blobs and rows whose file is missing.
     Requires valid admin session.
     
+    Query params:
+        action: 'report' (dry run, default), 'quarantine' or 'delete'
+        max_keys: Keys (and rows of each table) to examine; the next pass resumes after them
+        restart: Ignore the saved cursors and start from the beginning
+    
     Returns:
-        - 200: List of submissions
+        - 200: Reconciliation report
+        - 400: Invalid action
         - 401: Unauthorized
+        - 409: Another pass is running
     """
     if not verify_admin_session(request):
         raise HTTPException(status_code=401, detail="No autorizado")
     
     try:
-        submissions = AdminService.get_all_submissions()
-        return {
-            "success": True,
-            "data": submissions,
-            "count": len(submissions)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo entregas: {str(e)}")
+        report = await run_in_threadpool(
+            storage_reconciler.reconcile, action, max_keys=max_keys, restart=restart
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except storage_reconciler.ReconcilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return {"success": True, "data": report}
 
 
-@router.get("/api/admin/files")
-async def get_files(request: Request):
+@router.get("/api/admin/storage/usage")
+async def storage_usage(request: Request, level: str = None, moodle_id: str = None, course_id: str = None,
+                        limit: int = 100):
     """
-    Get all file submissions.
+    Storage used (uploaded bytes and files) and quota of each Moodle instance,
+    course and activity, largest first.
     Requires valid admin session.
     
+    Query params:
+        level: 'moodle', 'course' or 'activity' (default: all)
+        moodle_id, course_id: Only rows of this Moodle instance / course
+        limit: Maximum rows (up to 1000)
+    
     Returns:
-        - 200: List of files
+        - 200: List of counters
+        - 400: Invalid level
         - 401: Unauthorized
     """
     if not verify_admin_session(request):
         raise HTTPException(status_code=401, detail="No autorizado")
     
     try:
-        files = AdminService.get_all_files()
-        return {
-            "success": True,
-            "data": files,
-            "count": len(files)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo ficheros: {str(e)}")
+        usage = await run_in_threadpool(
+            StorageUsageService.get_usage, level, moodle_id=moodle_id, course_id=course_id, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {"success": True, "data": usage}
 
 
-@router.get("/api/admin/grades")
-async def get_grades(request: Request):
+@router.put("/api/admin/storage/quota")
+async def storage_set_quota(request: Request):
     """
-    Get all grades.
+    Set the storage quota of a Moodle instance, course or activity.
     Requires valid admin session.
     
+    Body:
+        moodle_id: Moodle instance
+        course_id, activity_id: Optional, to set the quota of a course / activity
+        quota_bytes: Quota in bytes (0 = unlimited, null = back to the configured default)
+    
     Returns:
-        - 200: List of grades
+        - 200: Updated counter
+        - 400: Invalid body
         - 401: Unauthorized
     """
     if not verify_admin_session(request):
         raise HTTPException(status_code=401, detail="No autorizado")
     
     try:
-        grades = AdminService.get_all_grades()
-        return {
-            "success": True,
-            "data": grades,
-            "count": len(grades)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo calificaciones: {str(e)}")
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cuerpo JSON no válido")
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Cuerpo JSON no válido")
+    quota_bytes = body.get("quota_bytes")
+    if quota_bytes is not None and (isinstance(quota_bytes, bool) or not isinstance(quota_bytes, int)):
+        raise HTTPException(status_code=400, detail="quota_bytes debe ser un entero o null")
+    
+    try:
+        usage = await run_in_threadpool(
+            StorageUsageService.set_quota, body.get("moodle_id"), body.get("course_id"),
+            body.get("activity_id"), quota_bytes
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {"success": True, "data": usage}
+
+
+@router.post("/api/admin/storage/usage/recompute")
+async def storage_usage_recompute(request: Request):
+    """
+    Rebuild the storage counters from the submissions in the database
+    (quotas are kept).
+    Requires valid admin session.
+    
+    Returns:
+        - 200: Counters rebuilt, files and bytes in total
+        - 401: Unauthorized
+    """
+    if not verify_admin_session(request):
+        raise HTTPException(status_code=401, detail="No autorizado")
+    
+    summary = await run_in_threadpool(StorageUsageService.recompute)
+    return {"success": True, "data": summary}
 
 
 @router.get("/api/admin/debug/lamb")
@@ -452,3 +619,161 @@ async def debug_verify_lamb_model(request: Request):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+@router.get("/api/admin/debug/profile")
+async def debug_profile(request: Request, seconds: float = 10, mode: str = "wall", interval_ms: float = None):
+    """
+    Capture a sampling profile of the running process.
+    Requires valid admin session.
+    
+    Query params:
+        seconds: Capture duration (max PROFILER_MAX_SECONDS)
+        mode: 'wall' (all threads, including waiting) or 'cpu' (threads on CPU)
+        interval_ms: Sampling interval in milliseconds
+    
+    Returns:
+        - 200: Collapsed stacks (text/plain), one "frame;frame;... count" per line,
+               ready for flamegraph.pl or speedscope
+        - 400: Invalid parameters
+        - 401: Unauthorized
+        - 409: Another profile is being captured
+    """
+    if not verify_admin_session(request):
+        raise HTTPException(status_code=401, detail="No autorizado")
+    
+    try:
+        # Sampling runs in a worker thread so the event loop keeps serving (and is profiled)
+        profile = await run_in_threadpool(ProfilingService.capture_profile, seconds, mode, interval_ms)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    file_name = f"profile-{profile['mode']}-{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.collapsed"
+    return PlainTextResponse(
+        profile['collapsed'],
+        headers={
+            "Content-Disposition": f'attachment; filename="{file_name}"',
+            "X-Profile-Samples": str(profile['samples']),
+            "X-Profile-Seconds": str(profile['seconds']),
+            "X-Profile-Interval-Ms": str(profile['interval_ms'])
+        }
+    )
+
+
+@router.post("/api/admin/debug/memory/start")
+async def debug_memory_start(request: Request, nframes: int = 10):
+    """
+    Start tracemalloc and take the baseline snapshot for memory diffs.
+    Requires valid admin session.
+    
+    Returns:
+        - 200: Traced memory and in-process store sizes at the baseline
+        - 401: Unauthorized
+    """
+    if not verify_admin_session(request):
+        raise HTTPException(status_code=401, detail="No autorizado")
+    
+    return {
+        "success": True,
+        "data": await run_in_threadpool(ProfilingService.start_memory_tracing, nframes)
+    }
+
+
+@router.get("/api/admin/debug/memory/diff")
+async def debug_memory_diff(request: Request, limit: int = 25, key_type: str = "lineno",
+                            filename: str = None, rebase: bool = False):
+    """
+    Compare a tracemalloc snapshot against the baseline.
+    Requires valid admin session.
+    
+    Query params:
+        limit: Number of entries (largest growth first)
+        key_type: 'lineno', 'filename' or 'traceback'
+        filename: Only allocations from files containing this text (e.g. evaluation_service)
+        rebase: Use this snapshot as the new baseline
+    
+    Returns:
+        - 200: Top allocation growth and in-process store sizes
+        - 400: Tracing not started or invalid parameters
+        - 401: Unauthorized
+    """
+    if not verify_admin_session(request):
+        raise HTTPException(status_code=401, detail="No autorizado")
+    
+    try:
+        diff = await run_in_threadpool(ProfilingService.memory_diff, limit, key_type, filename, rebase)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "success": True,
+        "data": diff,
+        "count": len(diff['top'])
+    }
+
+
+@router.post("/api/admin/debug/memory/stop")
+async def debug_memory_stop(request: Request):
+    """
+    Stop tracemalloc (it slows down every allocation while active).
+    Requires valid admin session.
+    """
+    if not verify_admin_session(request):
+        raise HTTPException(status_code=401, detail="No autorizado")
+    
+    return {
+        "success": True,
+        "data": ProfilingService.stop_memory_tracing()
+    }
+
+
+
+@router.get("/api/admin/debug/queries")
+async def debug_queries(request: Request, limit: int = 20, order: str = "total"):
+    """
+    Slow-query log: worst offending statements, recent slow queries and
+    requests issuing the most queries (likely N+1 patterns).
+    Requires valid admin session.
+    
+    Query params:
+        limit: Entries per list
+        order: Offender ordering: 'total' (accumulated time), 'max' or 'count'
+    
+    Returns:
+        - 200: Offenders, slow queries (route, parameter shape, stack) and heavy requests
+        - 400: Invalid parameters
+        - 401: Unauthorized
+    """
+    if not verify_admin_session(request):
+        raise HTTPException(status_code=401, detail="No autorizado")
+    
+    try:
+        data = query_log.snapshot(limit, order)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "success": True,
+        "data": data,
+        "count": len(data['offenders'])
+    }
+
+
+@router.delete("/api/admin/debug/queries")
+async def debug_queries_reset(request: Request):
+    """
+    Clear the slow-query log (e.g. after a deploy or an index change).
+    Requires valid admin session.
+    """
+    if not verify_admin_session(request):
+        raise HTTPException(status_code=401, detail="No autorizado")
+    
+    query_log.reset()
+    return {"success": True}
+
+ProfilingService.register_memory_probe(
+    "admin_sessions",
+    lambda: {"entries": len(admin_sessions), "approx_bytes": approximate_size(admin_sessions)}
+)
@@ -1,15 +1,115 @@
 """
 Service for admin-related operations.
 Provides data retrieval for all system entities: Moodle instances, courses, activities, users, submissions, and files.
+Listings are paginated by keyset (primary key order) and can be exported as NDJSON streams.
 """
 
+import base64
+import json
 import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import Boolean, Float, Integer, inspect, select, tuple_
+
+import fast_json
 from database import get_db_session
+from stats_service import StatsService
 from db_models import (
     MoodleDB, UserDB, CourseDB, ActivityDB, 
     StudentSubmissionDB, FileSubmissionDB, GradeDB
 )
 
+# Page size of admin listings when no limit is given, and maximum allowed
+ADMIN_PAGE_SIZE = int(os.getenv('ADMIN_PAGE_SIZE', '100'))
+ADMIN_PAGE_MAX = int(os.getenv('ADMIN_PAGE_MAX', '1000'))
+# NDJSON export: rows per fetch (yield_per) and per keyset window (one query each)
+ADMIN_STREAM_BATCH = int(os.getenv('ADMIN_STREAM_BATCH', '500'))
+ADMIN_STREAM_WINDOW = int(os.getenv('ADMIN_STREAM_WINDOW', '10000'))
+
+# Admin listings: model, returned columns and filterable columns
+# ('eq' = exact match, 'contains' = case-insensitive substring)
+ADMIN_LISTINGS = {
+    'moodle-instances': {
+        'model': MoodleDB,
+        'columns': ('id', 'name', 'lis_outcome_service_url', 'created_at'),
+        'filters': {'id': 'eq', 'name': 'contains'},
+    },
+    'courses': {
+        'model': CourseDB,
+        'columns': ('id', 'moodle_id', 'title', 'created_at'),
+        'filters': {'id': 'eq', 'moodle_id': 'eq', 'title': 'contains'},
+    },
+    'activities': {
+        'model': ActivityDB,
+        'columns': ('id', 'course_moodle_id', 'title', 'description', 'activity_type', 'max_group_size',
+                    'creator_id', 'creator_moodle_id', 'created_at', 'course_id', 'deadline', 'evaluator_id'),
+        'filters': {'id': 'eq', 'course_moodle_id': 'eq', 'course_id': 'eq', 'activity_type': 'eq',
+                    'creator_id': 'eq', 'evaluator_id': 'eq', 'title': 'contains'},
+    },
+    'users': {
+        'model': UserDB,
+        'columns': ('id', 'moodle_id', 'full_name', 'email', 'role', 'created_at'),
+        'filters': {'id': 'eq', 'moodle_id': 'eq', 'role': 'eq', 'full_name': 'contains', 'email': 'contains'},
+    },
+    'submissions': {
+        'model': StudentSubmissionDB,
+        'columns': ('id', 'file_submission_id', 'student_id', 'student_moodle_id', 'activity_id',
+                    'activity_moodle_id', 'joined_at', 'sent_to_moodle', 'sent_to_moodle_at'),
+        'filters': {'file_submission_id': 'eq', 'student_id': 'eq', 'student_moodle_id': 'eq',
+                    'activity_id': 'eq', 'activity_moodle_id': 'eq', 'sent_to_moodle': 'eq'},
+    },
+    'files': {
+        'model': FileSubmissionDB,
+        'columns': ('id', 'activity_id', 'activity_moodle_id', 'file_name', 'file_path', 'content_hash', 'file_size', 'file_type',
+                    'uploaded_at', 'uploaded_by', 'uploaded_by_moodle_id', 'group_code', 'max_group_members'),
+        'filters': {'activity_id': 'eq', 'activity_moodle_id': 'eq', 'uploaded_by': 'eq',
+                    'uploaded_by_moodle_id': 'eq', 'file_type': 'eq', 'group_code': 'eq', 'content_hash': 'eq',
+                    'file_name': 'contains'},
+    },
+    'grades': {
+        'model': GradeDB,
+        'columns': ('id', 'file_submission_id', 'score', 'comment', 'created_at'),
+        'filters': {'file_submission_id': 'eq'},
+    },
+}
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Opaque cursor for a keyset position (primary key values of the last row)"""
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[List[Any]]:
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Cursor no válido")
+    if not isinstance(values, list) or not values:
+        raise ValueError("Cursor no válido")
+    return values
+
+
+def _parse_filter_value(column, column_name: str, raw_value: str) -> Any:
+    if isinstance(column.type, Boolean):
+        if raw_value.lower() not in ('true', 'false', '1', '0'):
+            raise ValueError(f"Valor no válido para {column_name}: {raw_value}")
+        return raw_value.lower() in ('true', '1')
+    try:
+        if isinstance(column.type, Integer):
+            return int(raw_value)
+        if isinstance(column.type, Float):
+            return float(raw_value)
+    except ValueError:
+        raise ValueError(f"Valor no válido para {column_name}: {raw_value}")
+    return raw_value
+
+
+def _serialize(row) -> Dict[str, Any]:
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+
 
 class AdminService:
     """Service for admin operations"""
@@ -32,176 +132,114 @@ class AdminService:
         return username == admin_username and password == admin_password
     
     @staticmethod
-    def get_all_moodle_instances():
-        """Get all Moodle instances from database"""
-        db = get_db_session()
-        try:
-            moodles = db.query(MoodleDB).all()
-            return [
-                {
-                    "id": m.id,
-                    "name": m.name,
-                    "lis_outcome_service_url": m.lis_outcome_service_url,
-                    "created_at": m.created_at.isoformat() if m.created_at else None
-                }
-                for m in moodles
-            ]
-        finally:
-            db.close()
-    
-    @staticmethod
-    def get_all_courses():
-        """Get all courses from database"""
-        db = get_db_session()
-        try:
-            courses = db.query(CourseDB).all()
-            return [
-                {
-                    "id": c.id,
-                    "moodle_id": c.moodle_id,
-                    "title": c.title,
-                    "created_at": c.created_at.isoformat() if c.created_at else None
-                }
-                for c in courses
-            ]
-        finally:
-            db.close()
+    def get_listing(name: str) -> Dict[str, Any]:
+        """Listing definition by name (raises ValueError if unknown)"""
+        if name not in ADMIN_LISTINGS:
+            raise ValueError(f"Listado desconocido: {name}")
+        return ADMIN_LISTINGS[name]
     
     @staticmethod
-    def get_all_activities():
-        """Get all activities from database"""
-        db = get_db_session()
-        try:
-            activities = db.query(ActivityDB).all()
-            return [
-                {
-                    "id": a.id,
-                    "course_moodle_id": a.course_moodle_id,
-                    "title": a.title,
-                    "description": a.description,
-                    "activity_type": a.activity_type,
-                    "max_group_size": a.max_group_size,
-                    "creator_id": a.creator_id,
-                    "creator_moodle_id": a.creator_moodle_id,
-                    "created_at": a.created_at.isoformat() if a.created_at else None,
-                    "course_id": a.course_id,
-                    "deadline": a.deadline.isoformat() if a.deadline else None,
-                    "evaluator_id": a.evaluator_id
-                }
-                for a in activities
-            ]
-        finally:
-            db.close()
-    
-    @staticmethod
-    def get_all_users():
-        """Get all users from database"""
-        db = get_db_session()
-        try:
-            users = db.query(UserDB).all()
-            return [
-                {
-                    "id": u.id,
-                    "moodle_id": u.moodle_id,
-                    "full_name": u.full_name,
-                    "email": u.email,
-                    "role": u.role,
-                    "created_at": u.created_at.isoformat() if u.created_at else None
-                }
-                for u in users
-            ]
-        finally:
-            db.close()
+    def _build_query(name: str, filters: Dict[str, str], after: Optional[List[Any]] = None):
+        """SELECT of the listing columns, filtered, in primary key order, after a keyset position"""
+        listing = AdminService.get_listing(name)
+        model = listing['model']
+        key_columns = list(inspect(model).primary_key)
+        query = select(*(getattr(model, column) for column in listing['columns']))
+        
+        for column_name, raw_value in filters.items():
+            mode = listing['filters'].get(column_name)
+            if mode is None:
+                allowed = ', '.join(sorted(listing['filters']))
+                raise ValueError(f"Filtro no permitido: {column_name} (permitidos: {allowed})")
+            column = getattr(model, column_name)
+            if mode == 'contains':
+                escaped = raw_value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                query = query.where(column.ilike(f'%{escaped}%', escape='\\'))
+            else:
+                query = query.where(column == _parse_filter_value(column, column_name, raw_value))
+        
+        if after is not None:
+            if len(after) != len(key_columns):
+                raise ValueError("Cursor no válido")
+            if len(after) == 1:
+                query = query.where(key_columns[0] > after[0])
+            else:
+                query = query.where(tuple_(*key_columns) > tuple_(*after))
+        return query.order_by(*key_columns), [column.key for column in key_columns]
     
     @staticmethod
-    def get_all_submissions():
-        """Get all student submissions from database"""
+    def list_page(name: str, filters: Dict[str, str] = None, limit: int = ADMIN_PAGE_SIZE,
+                  cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        One page of an admin listing using keyset pagination
+        
+        Rows come in primary key order; `next_cursor` (None on the last page)
+        resumes right after the last returned row, so every page costs an
+        index seek regardless of how deep it is.
+        
+        Args:
+            name: Listing name (key of ADMIN_LISTINGS)
+            filters: Column filters {column: value}
+            limit: Page size (1..ADMIN_PAGE_MAX)
+            cursor: Cursor returned by the previous page
+            
+        Returns:
+            dict: {"items": [...], "next_cursor": str or None}
+            
+        Raises:
+            ValueError: Unknown listing, invalid filter, limit or cursor
+        """
+        if not 1 <= limit <= ADMIN_PAGE_MAX:
+            raise ValueError(f"limit debe estar entre 1 y {ADMIN_PAGE_MAX}")
+        query, key_names = AdminService._build_query(name, filters or {}, decode_cursor(cursor))
         db = get_db_session()
         try:
-            submissions = db.query(StudentSubmissionDB).all()
-            return [
-                {
-                    "id": s.id,
-                    "file_submission_id": s.file_submission_id,
-                    "student_id": s.student_id,
-                    "student_moodle_id": s.student_moodle_id,
-                    "activity_id": s.activity_id,
-                    "activity_moodle_id": s.activity_moodle_id,
-                    "joined_at": s.joined_at.isoformat() if s.joined_at else None,
-                    "sent_to_moodle": s.sent_to_moodle,
-                    "sent_to_moodle_at": s.sent_to_moodle_at.isoformat() if s.sent_to_moodle_at else None
-                }
-                for s in submissions
-            ]
+            rows = db.execute(query.limit(limit + 1)).mappings().all()
         finally:
             db.close()
+        
+        has_more = len(rows) > limit
+        items = [_serialize(row) for row in rows[:limit]]
+        next_cursor = encode_cursor([rows[limit - 1][key] for key in key_names]) if has_more else None
+        return {"items": items, "next_cursor": next_cursor}
     
     @staticmethod
-    def get_all_files():
-        """Get all file submissions from database"""
-        db = get_db_session()
-        try:
-            files = db.query(FileSubmissionDB).all()
-            return [
-                {
-                    "id": f.id,
-                    "activity_id": f.activity_id,
-                    "activity_moodle_id": f.activity_moodle_id,
-                    "file_name": f.file_name,
-                    "file_path": f.file_path,
-                    "file_size": f.file_size,
-                    "file_type": f.file_type,
-                    "uploaded_at": f.uploaded_at.isoformat() if f.uploaded_at else None,
-                    "uploaded_by": f.uploaded_by,
-                    "uploaded_by_moodle_id": f.uploaded_by_moodle_id,
-                    "group_code": f.group_code,
-                    "max_group_members": f.max_group_members
-                }
-                for f in files
-            ]
-        finally:
-            db.close()
+    def iter_ndjson(name: str, filters: Dict[str, str] = None) -> Iterator[bytes]:
+        """
+        Stream a whole (filtered) listing as NDJSON chunks
+        
+        Rows are fetched with yield_per in keyset windows of
+        ADMIN_STREAM_WINDOW rows; the session is closed between windows so
+        no read transaction stays open for the whole export.
+        
+        Raises:
+            ValueError: Unknown listing or invalid filter (before the first chunk)
+        """
+        filters = filters or {}
+        AdminService._build_query(name, filters)  # Validate before streaming starts
+        return AdminService._ndjson_windows(name, filters)
     
     @staticmethod
-    def get_all_grades():
-        """Get all grades from database"""
-        db = get_db_session()
-        try:
-            grades = db.query(GradeDB).all()
-            return [
-                {
-                    "id": g.id,
-                    "file_submission_id": g.file_submission_id,
-                    "score": g.score,
-                    "comment": g.comment,
-                    "created_at": g.created_at.isoformat() if g.created_at else None
-                }
-                for g in grades
-            ]
-        finally:
-            db.close()
+    def _ndjson_windows(name: str, filters: Dict[str, str]) -> Iterator[bytes]:
+        after = None
+        while True:
+            query, key_names = AdminService._build_query(name, filters, after)
+            db = get_db_session()
+            try:
+                result = db.execute(query.limit(ADMIN_STREAM_WINDOW).execution_options(yield_per=ADMIN_STREAM_BATCH))
+                rows = 0
+                last = None
+                for batch in result.mappings().partitions():
+                    rows += len(batch)
+                    last = batch[-1]
+                    yield b''.join(fast_json.dumps(_serialize(row)) + b'\n' for row in batch)
+            finally:
+                db.close()
+            if rows < ADMIN_STREAM_WINDOW:
+                return
+            after = [last[key] for key in key_names]
     
     @staticmethod
     def get_statistics():
-        """Get overall system statistics"""
-        db = get_db_session()
-        try:
-            moodle_count = db.query(MoodleDB).count()
-            course_count = db.query(CourseDB).count()
-            activity_count = db.query(ActivityDB).count()
-            user_count = db.query(UserDB).count()
-            submission_count = db.query(StudentSubmissionDB).count()
-            file_count = db.query(FileSubmissionDB).count()
-            grade_count = db.query(GradeDB).count()
-            
-            return {
-                "moodle_instances": moodle_count,
-                "courses": course_count,
-                "activities": activity_count,
-                "users": user_count,
-                "submissions": submission_count,
-                "files": file_count,
-                "grades": grade_count
-            }
-        finally:
-            db.close()
+        """Get overall system statistics (cached aggregate, see StatsService)"""
+        return StatsService.get_statistics()
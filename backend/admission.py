@@ -0,0 +1,295 @@
+"""
+Admission Control - Concurrency limits and backpressure for heavy routes
+
+Handles:
+- Per-pool concurrency limit with a bounded wait queue: submission uploads
+  (up to 50MB each) and exports (ZIP of an activity, grade CSV/XLSX)
+- Fast 503 with Retry-After when the queue is full, when a request has waited
+  ADMISSION_MAX_WAIT seconds, or when a session already has its share queued
+- Per-session fairness: a session (LTI session, else client address) runs at
+  most ADMISSION_SESSION_LIMIT requests of a pool at once, and waiting
+  sessions are served round-robin, so one client retrying in a loop cannot
+  starve a class uploading before a deadline
+- Metrics: queue wait time, rejections by reason, active and queued requests
+
+Admission happens in an ASGI middleware, before the route reads the request
+body: a queued upload has not been received yet (the client is held by TCP
+flow control), so waiting costs neither memory nor disk. Limits are per
+process; with several workers the effective limit is multiplied by them.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, QueryParams
+from starlette.requests import cookie_parser
+from starlette.routing import compile_path
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+import metrics
+from fast_json import FastJSONResponse
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+# Requests of each pool processed at once (0 = unlimited) and requests waiting for a slot
+ADMISSION_UPLOAD_CONCURRENCY = int(os.getenv('ADMISSION_UPLOAD_CONCURRENCY', '8'))
+ADMISSION_UPLOAD_QUEUE = int(os.getenv('ADMISSION_UPLOAD_QUEUE', '64'))
+ADMISSION_EXPORT_CONCURRENCY = int(os.getenv('ADMISSION_EXPORT_CONCURRENCY', '4'))
+ADMISSION_EXPORT_QUEUE = int(os.getenv('ADMISSION_EXPORT_QUEUE', '16'))
+# Seconds a request may wait for a slot before being rejected
+ADMISSION_MAX_WAIT = float(os.getenv('ADMISSION_MAX_WAIT', '10'))
+# Requests of one session running (and, separately, waiting) at once in each pool
+ADMISSION_SESSION_LIMIT = int(os.getenv('ADMISSION_SESSION_LIMIT', '1'))
+# Upper bound of the Retry-After estimate, in seconds
+ADMISSION_RETRY_AFTER_MAX = int(os.getenv('ADMISSION_RETRY_AFTER_MAX', '60'))
+
+# (method, route template) of the routes in each pool
+HEAVY_ROUTES = {
+    'upload': [
+        ('POST', '/api/activities/{activity_id}/submissions'),
+    ],
+    'export': [
+        ('GET', '/api/activities/{activity_id}/submissions/download'),
+        ('GET', '/api/grades/activity/{activity_id}/export'),
+        ('GET', '/api/grades/course/export'),
+    ],
+}
+
+_REJECTION_MESSAGES = {
+    'upload': "Hay demasiadas entregas en curso. Vuelve a intentarlo en {seconds} s",
+    'export': "Hay demasiadas exportaciones en curso. Vuelve a intentarlo en {seconds} s",
+}
+
+
+class AdmissionRejected(Exception):
+    """The pool cannot take the request; retry_after is the suggested wait in seconds"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionPool:
+    """Concurrency limit with a fair, bounded wait queue (event loop only, not thread-safe)
+
+    Waiters are kept in one FIFO per session; a freed slot goes to the first
+    session (in arrival order) below its session limit, which then moves to
+    the end of the rotation.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue_size: int,
+                 session_limit: int = 1, max_wait: float = 10.0):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.session_limit = max(1, session_limit)
+        self.max_wait = max_wait
+        self.active = 0
+        self.queued = 0
+        self._active_by_session: Dict[str, int] = {}
+        self._waiting: 'OrderedDict[str, Deque[asyncio.Future]]' = OrderedDict()
+        # Moving average of the time a slot is held, for Retry-After
+        self._service_seconds = 1.0
+
+    def _can_run(self, session: str) -> bool:
+        return self._active_by_session.get(session, 0) < self.session_limit
+
+    def _grant(self, session: str) -> None:
+        self.active += 1
+        self._active_by_session[session] = self._active_by_session.get(session, 0) + 1
+
+    def _update_gauges(self) -> None:
+        metrics.ADMISSION_ACTIVE.set(self.active, self.name)
+        metrics.ADMISSION_QUEUED.set(self.queued, self.name)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free: queued work spread over the slots"""
+        estimate = self._service_seconds * (self.queued + 1) / max(1, self.concurrency)
+        return max(1, min(ADMISSION_RETRY_AFTER_MAX, math.ceil(estimate)))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        metrics.ADMISSION_REJECTIONS.inc(self.name, reason)
+        return AdmissionRejected(reason, self.retry_after())
+
+    async def acquire(self, session: str) -> float:
+        """Wait for a slot; returns the seconds waited or raises AdmissionRejected"""
+        # Slots only stay free while every waiter is at its session limit,
+        # so a newcomer below its own limit does not jump anyone
+        if self.active < self.concurrency and self._can_run(session):
+            self._grant(session)
+            self._update_gauges()
+            metrics.ADMISSION_WAIT.observe(0, self.name, 'admitted')
+            return 0.0
+
+        waiters = self._waiting.get(session)
+        if waiters is not None and len(waiters) >= self.session_limit:
+            raise self._reject('session_limit')
+        if self.queued >= self.queue_size:
+            raise self._reject('queue_full')
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(session, deque()).append(future)
+        self.queued += 1
+        self._update_gauges()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait({future}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            # The client went away while waiting
+            if future.done():
+                self.release(session, 0.0)  # granted, but nobody will use it
+            else:
+                future.cancel()
+                self._remove_waiter(session, future)
+            raise
+        waited = time.perf_counter() - started
+
+        if not future.done():
+            future.cancel()
+            self._remove_waiter(session, future)
+            metrics.ADMISSION_WAIT.observe(waited, self.name, 'timeout')
+            raise self._reject('timeout')
+        metrics.ADMISSION_WAIT.observe(waited, self.name, 'admitted')
+        return waited
+
+    def _remove_waiter(self, session: str, future: asyncio.Future) -> None:
+        waiters = self._waiting.get(session)
+        if waiters is None or future not in waiters:
+            return
+        waiters.remove(future)
+        if not waiters:
+            del self._waiting[session]
+        self.queued -= 1
+        self._update_gauges()
+
+    def release(self, session: str, held_seconds: float) -> None:
+        self.active -= 1
+        remaining = self._active_by_session.get(session, 1) - 1
+        if remaining:
+            self._active_by_session[session] = remaining
+        else:
+            self._active_by_session.pop(session, None)
+        if held_seconds > 0:
+            self._service_seconds = 0.8 * self._service_seconds + 0.2 * held_seconds
+        self._dispatch()
+        self._update_gauges()
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiting sessions in round-robin order"""
+        while self.active < self.concurrency:
+            session = next((name for name in self._waiting if self._can_run(name)), None)
+            if session is None:
+                return
+            waiters = self._waiting[session]
+            future = waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                self._waiting.move_to_end(session)
+            else:
+                del self._waiting[session]
+            self._grant(session)
+            future.set_result(None)
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            'concurrency': self.concurrency,
+            'queue_size': self.queue_size,
+            'active': self.active,
+            'queued': self.queued,
+            'waiting_sessions': len(self._waiting),
+        }
+
+
+def build_pools() -> Dict[str, AdmissionPool]:
+    """Pools from the ADMISSION_* settings (pools with concurrency 0 are not limited)"""
+    limits = {
+        'upload': (ADMISSION_UPLOAD_CONCURRENCY, ADMISSION_UPLOAD_QUEUE),
+        'export': (ADMISSION_EXPORT_CONCURRENCY, ADMISSION_EXPORT_QUEUE),
+    }
+    return {
+        name: AdmissionPool(name, concurrency, queue_size, ADMISSION_SESSION_LIMIT, ADMISSION_MAX_WAIT)
+        for name, (concurrency, queue_size) in limits.items() if concurrency > 0
+    }
+
+
+def session_key(scope: Scope) -> str:
+    """LTI session of the request (same lookup order as get_lti_session_data), else the client address"""
+    headers = Headers(scope=scope)
+    session_id = cookie_parser(headers.get('cookie', '')).get('lti_session') \
+        or headers.get('x-lti-session') \
+        or QueryParams(scope.get('query_string', b'')).get('lti_session')
+    if session_id:
+        return f'lti:{session_id}'
+    client = scope.get('client')
+    return f'client:{client[0]}' if client else 'client:unknown'
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware applying the pools to HEAVY_ROUTES
+
+    The slot is held until the route returns (including streaming the
+    response body), so a ZIP download counts for as long as it is sent.
+    """
+
+    def __init__(self, app: ASGIApp, pools: Optional[Dict[str, AdmissionPool]] = None):
+        self.app = app
+        self.pools = build_pools() if pools is None else pools
+        self._routes: List[Tuple[str, re.Pattern, str, str]] = [
+            (method, compile_path(template)[0], template, pool)
+            for pool, routes in HEAVY_ROUTES.items() if pool in self.pools
+            for method, template in routes
+        ]
+
+    def _match(self, scope: Scope) -> Optional[Tuple[str, str]]:
+        method = scope['method']
+        path = scope['path']
+        for route_method, regex, template, pool in self._routes:
+            if route_method == method and regex.match(path):
+                return pool, template
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        match = self._match(scope) if scope['type'] == 'http' and ADMISSION_ENABLED else None
+        if match is None:
+            await self.app(scope, receive, send)
+            return
+
+        pool_name, template = match
+        pool = self.pools[pool_name]
+        session = session_key(scope)
+        try:
+            await pool.acquire(session)
+        except AdmissionRejected as e:
+            logger.warning("Petición rechazada por admisión (%s, %s): %s, cola %d/%d",
+                           pool_name, template, e.reason, pool.queued, pool.queue_size)
+            _label_route(scope, template)
+            response = FastJSONResponse(
+                {'detail': _REJECTION_MESSAGES[pool_name].format(seconds=e.retry_after)},
+                status_code=503,
+                headers={'Retry-After': str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pool.release(session, time.perf_counter() - started)
+
+
+def _label_route(scope: Scope, template: str) -> None:
+    """Set the matched route on rejected requests, so request metrics keep the route label"""
+    app = scope.get('app')
+    for route in getattr(getattr(app, 'router', None), 'routes', ()):
+        if getattr(route, 'path', None) == template:
+            scope['route'] = route
+            return
@@ -0,0 +1,276 @@
+"""
+Benchmark de endpoints sobre un dataset a escala.
+
+Mide latencia (p50/p95/p99/máx) y rendimiento (peticiones/s) de los
+endpoints más usados: listado de entregas del profesor, vista del
+estudiante, estado de evaluación, listados de administración y
+sincronización de notas (contra un servidor de outcomes Moodle falso).
+
+Por defecto arranca la aplicación en el mismo proceso (TestClient) sobre la
+base de datos indicada; con --url mide un servidor ya arrancado con esa
+misma base de datos. Sin --db genera un dataset temporal pequeño.
+
+Uso (desde backend/):
+    python benchmarks/seed_dataset.py --db /tmp/lamba-bench.db --submissions 100000
+    python benchmarks/bench_endpoints.py --db /tmp/lamba-bench.db --requests 200 --concurrency 4
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from fake_servers import FakeOutcomeServer  # noqa: E402
+
+# (method, path, role); {activity} is replaced by a sampled activity id
+SCENARIOS = {
+    'teacher_submissions': ('GET', '/api/activities/{activity}/submissions', 'teacher'),
+    'student_view': ('GET', '/api/activities/{activity}/view', 'student'),
+    'evaluation_status': ('GET', '/api/activities/{activity}/evaluation-status', 'teacher'),
+    'admin_statistics': ('GET', '/api/admin/statistics', 'admin'),
+    'admin_activities': ('GET', '/api/admin/activities', 'admin'),
+    'admin_submissions': ('GET', '/api/admin/submissions', 'admin'),
+    'admin_grades': ('GET', '/api/admin/grades', 'admin'),
+    'grade_sync': ('POST', '/api/activities/{activity}/grades/sync', 'teacher'),
+}
+
+# Grade sync sends one outcome request per graded student: fewer iterations
+SLOW_SCENARIOS = {'grade_sync': 10}
+
+ADMIN_USERNAME = 'bench-admin'
+ADMIN_PASSWORD = 'bench-password'
+
+class InProcessTarget:
+    """The FastAPI app served in this process through TestClient"""
+
+    def __init__(self):
+        from fastapi.testclient import TestClient
+        import main
+
+        self._context = TestClient(main.app)
+        self.client = self._context.__enter__()
+
+    def launch(self, payload: Dict[str, str]) -> str:
+        response = self.client.post('/lti', data=payload, follow_redirects=False)
+        session_id = response.cookies.get('lti_session')
+        # Sessions travel in X-LTI-Session; the shared cookie jar would override them
+        self.client.cookies.clear()
+        return session_id
+
+    def login(self, username: str, password: str) -> None:
+        self.client.post('/api/admin/login', json={'username': username, 'password': password}).raise_for_status()
+
+    def request(self, method: str, path: str, headers: Dict[str, str]) -> int:
+        return self.client.request(method, path, headers=headers).status_code
+
+    def close(self) -> None:
+        self._context.__exit__(None, None, None)
+
+
+class HTTPTarget:
+    """A running LAMBA server (one requests.Session per worker thread)"""
+
+    def __init__(self, base_url: str):
+        import requests
+
+        self._requests = requests
+        self.base_url = base_url.rstrip('/')
+        self.admin_cookie: Optional[str] = None
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+            if self.admin_cookie:
+                session.cookies.set('admin_session', self.admin_cookie)
+        return session
+
+    def launch(self, payload: Dict[str, str]) -> str:
+        response = self._requests.post(f'{self.base_url}/lti', data=payload, allow_redirects=False, timeout=30)
+        return response.cookies.get('lti_session')
+
+    def login(self, username: str, password: str) -> None:
+        response = self._requests.post(f'{self.base_url}/api/admin/login',
+                                       json={'username': username, 'password': password}, timeout=30)
+        response.raise_for_status()
+        self.admin_cookie = response.cookies.get('admin_session')
+
+    def request(self, method: str, path: str, headers: Dict[str, str]) -> int:
+        return self._session().request(method, f'{self.base_url}{path}', headers=headers, timeout=300).status_code
+
+    def close(self) -> None:
+        pass
+
+
+def lti_payload(activity: Dict[str, Any], user_id: str, roles: str, outcome_url: str) -> Dict[str, str]:
+    """LTI 1.1 launch for a user of a seeded activity"""
+    return {
+        'lti_message_type': 'basic-lti-launch-request',
+        'lti_version': 'LTI-1p0',
+        'resource_link_id': activity['id'],
+        'resource_link_title': activity['id'],
+        'context_id': activity['course_id'],
+        'context_title': activity['course_id'],
+        'user_id': user_id,
+        'lis_person_name_full': user_id,
+        'lis_person_contact_email_primary': f'{user_id}@bench.example',
+        'lis_result_sourcedid': f"{activity['id']}:{user_id}",
+        'lis_outcome_service_url': outcome_url,
+        'roles': roles,
+        'tool_consumer_instance_guid': activity['moodle_id'],
+        'tool_consumer_instance_name': activity['moodle_id'],
+        'oauth_consumer_key': os.environ.get('OAUTH_CONSUMER_KEY', 'bench-key'),
+    }
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(call: Callable[[int], int], requests: int, concurrency: int, warmup: int = 0) -> Dict[str, Any]:
+    """Issue `requests` calls with `concurrency` workers and summarize the latencies"""
+    for index in range(warmup):
+        call(index)
+
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(index: int) -> None:
+        nonlocal errors
+        start = time.perf_counter()
+        status = call(index)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        'throughput_rps': round(requests / wall, 1) if wall else 0.0,
+    }
+
+
+def run_benchmarks(target, manifest: Dict[str, Any], scenarios: List[str], requests: int, concurrency: int,
+                   activities: int = 10, warmup: int = 5, outcome_url: str = '', seed: int = 42) -> Dict[str, Dict[str, Any]]:
+    """Open LTI/admin sessions on sampled activities and run every scenario"""
+    rng = random.Random(seed)
+    sampled = rng.sample(manifest['activities'], min(activities, len(manifest['activities'])))
+    sessions = []
+    for activity in sampled:
+        teacher = target.launch(lti_payload(activity, activity['teacher_id'], 'Instructor', outcome_url))
+        student = target.launch(lti_payload(activity, activity['student_ids'][0], 'Learner', outcome_url))
+        sessions.append({'activity': activity['id'], 'teacher': teacher, 'student': student})
+    if any(SCENARIOS[name][2] == 'admin' for name in scenarios):
+        target.login(os.environ.get('ADMIN_USERNAME', ADMIN_USERNAME), os.environ.get('ADMIN_PASSWORD', ADMIN_PASSWORD))
+
+    results = {}
+    for name in scenarios:
+        method, template, role = SCENARIOS[name]
+
+        def call(index: int, method=method, template=template, role=role) -> int:
+            session = sessions[index % len(sessions)]
+            headers = {'X-LTI-Session': session[role]} if role != 'admin' else {}
+            return target.request(method, template.format(activity=session['activity']), headers)
+
+        count = min(requests, SLOW_SCENARIOS.get(name, requests))
+        results[name] = run_scenario(call, count, concurrency, warmup=min(warmup, count))
+    return results
+
+
+def print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    print(f"{'escenario':<22}{'n':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'máx ms':>10}{'req/s':>9}")
+    for name, result in results.items():
+        print(f"{name:<22}{result['requests']:>6}{result['errors']:>5}{result['p50_ms']:>10.1f}"
+              f"{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['max_ms']:>10.1f}{result['throughput_rps']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', help='Dataset created by seed_dataset.py (default: small temporary dataset)')
+    parser.add_argument('--manifest', help='Manifest path (default: <db>.manifest.json)')
+    parser.add_argument('--url', help='Benchmark a running server instead of the in-process app')
+    parser.add_argument('--submissions', type=int, default=2000, help='Size of the temporary dataset')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--activities', type=int, default=10, help='Activities sampled for the sessions')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated scenario names')
+    parser.add_argument('--outcome-latency-ms', type=float, default=0, help='Latency of the fake Moodle outcome service')
+    parser.add_argument('--json', help='Write the results to this JSON file')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    for key, value in (('LOG_LEVEL', 'WARNING'), ('ADMIN_USERNAME', ADMIN_USERNAME), ('ADMIN_PASSWORD', ADMIN_PASSWORD),
+                       ('OAUTH_CONSUMER_KEY', 'bench-key'), ('LTI_SECRET', 'bench-secret')):
+        os.environ.setdefault(key, value)
+
+    temp_dir = None
+    if args.db:
+        os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(args.db)}'
+        with open(args.manifest or f'{args.db}.manifest.json', encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+    else:
+        import seed_dataset
+
+        temp_dir = tempfile.TemporaryDirectory(prefix='lamba-bench-')
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(temp_dir.name, 'bench.db')}"
+        from storage_service import FileStorageService
+        FileStorageService.BASE_DIR = temp_dir.name
+        FileStorageService.UPLOADS_ROOT = os.path.join(temp_dir.name, 'uploads')
+        manifest = seed_dataset.seed(seed_dataset.SeedConfig(submissions=args.submissions, courses=10))
+        print(f"Dataset temporal: {manifest['counts']} ({manifest['seconds']}s)")
+
+    outcome_url = urlparse(manifest['config']['outcome_url'])
+    target = HTTPTarget(args.url) if args.url else InProcessTarget()
+    try:
+        with FakeOutcomeServer(args.outcome_latency_ms, outcome_url.hostname, outcome_url.port or 80) as outcome:
+            results = run_benchmarks(target, manifest, scenarios, args.requests, args.concurrency,
+                                     activities=args.activities, outcome_url=outcome.url)
+    finally:
+        target.close()
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    print_table(results)
+    print(f"Peticiones recibidas por el servidor de outcomes: {outcome.requests}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as output:
+            json.dump({'counts': manifest['counts'], 'concurrency': args.concurrency, 'results': results}, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Micro-benchmark del parser de respuestas LAMB.
+
+Compara el algoritmo anterior (patrones compilados en cada llamada y
+escaneo del texto completo) con LAMBResponseParser sobre el corpus de
+tests/fixtures/lamb_responses.jsonl, sobre respuestas largas sintéticas y,
+con --store, sobre respuestas reales grabadas con LAMB_RECORD_PATH (informa
+también de las notas en las que ambos algoritmos discrepan).
+
+Uso (desde backend/):
+    python benchmarks/bench_lamb_parser.py [--iterations 2000] [--store /tmp/lamb.jsonl.gz]
+"""
+
+import argparse
+import json
+import logging
+import re
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import lamb_recorder  # noqa: E402
+from lamb_response_parser import LAMBResponseParser  # noqa: E402
+
+CORPUS_PATH = PROJECT_ROOT / "tests" / "fixtures" / "lamb_responses.jsonl"
+
+LEGACY_PATTERNS = [
+    r'(?:NOTA\s+FINAL|FINAL\s+SCORE)\s*:\s*(\d+\.?\d*)',
+    r'(?:#*\s*\**\s*)(?:Nota|Puntuación|Calificación)\s*(?:\**)\s*:\s*(\d+\.?\d*)',
+    r'(?:#*\s*\**\s*)(?:Score|Grade|Mark)\s*(?:\**)\s*:\s*(\d+\.?\d*)',
+    r'(\d+\.?\d*)\s*/\s*10\s*(?:puntos?|points?)?\s*$',
+]
+
+
+def legacy_find_score(content):
+    """Algoritmo anterior: cada patrón recorre el texto completo"""
+    for pattern in LEGACY_PATTERNS:
+        match = re.search(pattern, content, re.IGNORECASE | re.MULTILINE)
+        if match:
+            score = float(match.group(1))
+            if 0 <= score <= 10:
+                return score
+    return None
+
+
+def load_texts():
+    """Textos libres del corpus más respuestas largas sintéticas"""
+    texts = []
+    for line in CORPUS_PATH.read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        content = LAMBResponseParser.extract_content(json.loads(line)["response"].get("response", {}))
+        if content:
+            texts.append(("corpus", content))
+
+    paragraph = "El alumno presenta una argumentación correcta aunque mejorable en la sección de conclusiones. "
+    for size in (10_000, 100_000, 500_000):
+        body = "\n".join(paragraph * 4 for _ in range(size // (len(paragraph) * 4) + 1))
+        texts.append((f"synthetic_{size // 1000}k", body + "\nNOTA FINAL: 7.5"))
+        # Caso peor para el algoritmo anterior: sin nota, todos los patrones fallan
+        texts.append((f"synthetic_{size // 1000}k_no_score", body))
+    return texts
+
+
+def load_recorded(path):
+    """Contenido de las respuestas /chat/completions correctas de un almacén grabado"""
+    texts = []
+    for entry in lamb_recorder.iter_records(path):
+        if entry["method"] != "POST" or entry["status"] != 200:
+            continue
+        try:
+            content = LAMBResponseParser.extract_content(json.loads(entry["body"]))
+        except ValueError:
+            continue
+        if content:
+            texts.append(("recorded", content))
+    return texts
+
+
+def bench(func, text, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(text)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--store", help="Almacén grabado con LAMB_RECORD_PATH")
+    args = parser.parse_args()
+
+    # Los avisos de "nota no encontrada" distorsionarían las medidas
+    logging.disable(logging.WARNING)
+
+    print(f"{'caso':<28}{'chars':>10}{'anterior µs':>14}{'nuevo µs':>12}{'mejora':>9}")
+    groups = {}
+    mismatches = 0
+    texts = load_texts() + (load_recorded(args.store) if args.store else [])
+    for name, text in texts:
+        iterations = args.iterations if len(text) < 50_000 else max(args.iterations // 50, 5)
+        legacy = bench(legacy_find_score, text, iterations)
+        new = bench(LAMBResponseParser.find_score, text, iterations)
+        if name == "recorded" and legacy_find_score(text) != LAMBResponseParser.find_score(text):
+            mismatches += 1
+        if name in ("corpus", "recorded"):
+            total = groups.setdefault(name, [0, 0.0, 0.0])
+            total[0] += len(text)
+            total[1] += legacy
+            total[2] += new
+            continue
+        print(f"{name:<28}{len(text):>10}{legacy:>14.1f}{new:>12.1f}{legacy / new:>8.1f}x")
+
+    for name in ("corpus", "recorded"):
+        if name in groups:
+            chars, legacy, new = groups[name]
+            print(f"{name + ' (total)':<28}{chars:>10}{legacy:>14.1f}{new:>12.1f}{legacy / new:>8.1f}x")
+    if args.store:
+        recorded = sum(1 for name, _ in texts if name == "recorded")
+        print(f"\nRespuestas grabadas: {recorded}; notas distintas entre algoritmos: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
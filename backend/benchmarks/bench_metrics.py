@@ -0,0 +1,77 @@
+"""
+Micro-benchmark del coste de instrumentación de metrics.py.
+
+Mide el coste por llamada de Counter.inc, Histogram.observe y de una
+petición completa a través de MetricsMiddleware frente a la misma
+aplicación ASGI sin middleware.
+
+Uso (desde backend/):
+    python benchmarks/bench_metrics.py [--iterations 200000]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from metrics import Counter, Histogram, MetricsMiddleware  # noqa: E402
+
+
+class _Route:
+    path = "/api/activities/{activity_id}"
+
+
+async def _app(scope, receive, send):
+    scope["route"] = _Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def _noop_send(message):
+    pass
+
+
+async def _noop_receive():
+    return {"type": "http.request"}
+
+
+async def _run_requests(app, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await app({"type": "http", "method": "GET", "path": "/api/activities/1"}, _noop_receive, _noop_send)
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def bench(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200_000)
+    args = parser.parse_args()
+
+    counter = Counter("bench_total", "Bench", ("code",))
+    histogram = Histogram("bench_seconds", "Bench", ("route",))
+
+    print(f"{'operación':<32}{'ns/llamada':>12}")
+    print(f"{'Counter.inc':<32}{bench(lambda: counter.inc('200'), args.iterations):>12.0f}")
+    print(f"{'Histogram.observe':<32}{bench(lambda: histogram.observe(0.042, '/a'), args.iterations):>12.0f}")
+
+    bare = asyncio.run(_run_requests(_app, args.iterations))
+    wrapped = asyncio.run(_run_requests(MetricsMiddleware(_app), args.iterations))
+    print(f"{'petición sin middleware':<32}{bare:>12.0f}")
+    print(f"{'petición con MetricsMiddleware':<32}{wrapped:>12.0f}")
+    print(f"{'sobrecoste por petición':<32}{wrapped - bare:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
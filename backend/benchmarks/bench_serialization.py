@@ -0,0 +1,237 @@
+"""
+Benchmark de la serialización del listado de entregas del profesor.
+
+Compara, para una actividad individual y una de grupo del dataset:
+- ruta anterior: una consulta por entrega (fichero, usuario y nota), modelos
+  Pydantic por fila, jsonable_encoder y JSONResponse de Starlette
+- ruta ligera: una consulta con joins, diccionarios construidos desde las
+  filas y fast_json.dumps (orjson si está instalado)
+
+Informa de milisegundos por petición (mediana), tamaño de la respuesta y
+tamaño y coste de comprimirla con gzip (nivel de response_compression) y
+brotli si está instalado.
+
+Uso (desde backend/):
+    python benchmarks/bench_serialization.py [--submissions 2000] [--iterations 20]
+    python benchmarks/bench_serialization.py --db /tmp/lamba-bench.db
+"""
+
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def legacy_submissions_by_activity(activity_id: str, activity_moodle_id: str) -> Dict[str, Any]:
+    """ActivitiesService.get_submissions_by_activity before the lean path (N+1 queries, Pydantic views)"""
+    from activities_service import ActivitiesService
+    from database import get_db_session
+    from db_models import ActivityDB, FileSubmissionDB, StudentSubmissionDB, UserDB
+    from grade_service import GradeService
+    from models import Activity, ActivityType
+
+    db = get_db_session()
+    try:
+        activity = db.query(ActivityDB).filter(
+            ActivityDB.id == activity_id,
+            ActivityDB.course_moodle_id == activity_moodle_id
+        ).first()
+        if not activity:
+            raise ValueError("Activity not found")
+
+        student_submissions = db.query(StudentSubmissionDB).filter(
+            StudentSubmissionDB.activity_id == activity_id,
+            StudentSubmissionDB.activity_moodle_id == activity_moodle_id
+        ).all()
+
+        submissions_list = []
+        groups_dict = {}
+        for student_submission in student_submissions:
+            file_submission = db.query(FileSubmissionDB).filter(
+                FileSubmissionDB.id == student_submission.file_submission_id
+            ).first()
+            if not file_submission:
+                continue
+            user = db.query(UserDB).filter(
+                UserDB.id == student_submission.student_id,
+                UserDB.moodle_id == student_submission.student_moodle_id
+            ).first()
+            student_name = user.full_name if user else ""
+            student_email = user.email if user else ""
+            is_group_leader = (file_submission.uploaded_by == student_submission.student_id
+                               and file_submission.group_code is not None)
+            group_code_uses = None
+            if file_submission.group_code and is_group_leader:
+                group_code_uses = len([ss for ss in student_submissions
+                                       if ss.file_submission_id == file_submission.id]) - 1
+            grade = GradeService.get_grade_by_file_submission(file_submission.id)
+            submission_view = ActivitiesService._create_submission_view(
+                file_submission, student_submission, student_name, student_email, is_group_leader,
+                group_code_uses, grade
+            )
+            submissions_list.append(submission_view)
+
+            if file_submission.group_code:
+                if file_submission.group_code not in groups_dict:
+                    grade_dict = None
+                    if grade:
+                        grade_dict = {
+                            'id': grade.id,
+                            'file_submission_id': grade.file_submission_id,
+                            'ai_score': grade.ai_score,
+                            'ai_comment': grade.ai_comment,
+                            'ai_evaluated_at': grade.ai_evaluated_at.isoformat() + 'Z' if grade.ai_evaluated_at else None,
+                            'score': grade.score,
+                            'comment': grade.comment,
+                            'created_at': grade.created_at.isoformat() + 'Z' if grade.created_at else None,
+                            'updated_at': grade.updated_at.isoformat() + 'Z' if grade.updated_at else None
+                        }
+                    groups_dict[file_submission.group_code] = {
+                        'group_code': file_submission.group_code,
+                        'file_submission': submission_view.file_submission,
+                        'members': [],
+                        'group_leader': None,
+                        'grade': grade_dict
+                    }
+                member_info = {
+                    'student_id': student_submission.student_id,
+                    'student_name': student_name,
+                    'student_email': student_email,
+                    'joined_at': student_submission.joined_at,
+                    'is_group_leader': is_group_leader
+                }
+                groups_dict[file_submission.group_code]['members'].append(member_info)
+                if is_group_leader:
+                    groups_dict[file_submission.group_code]['group_leader'] = member_info
+
+        activity_model = Activity(
+            id=activity.id, title=activity.title, description=activity.description,
+            activity_type=activity.activity_type, max_group_size=activity.max_group_size,
+            creator_id=activity.creator_id, creator_moodle_id=activity.creator_moodle_id,
+            created_at=activity.created_at, course_id=activity.course_id,
+            course_moodle_id=activity.course_moodle_id, deadline=activity.deadline,
+            evaluator_id=activity.evaluator_id, language=activity.language
+        )
+        if activity.activity_type == ActivityType.GROUP:
+            groups = list(groups_dict.values())
+            return {'activity': activity_model, 'activity_type': 'group',
+                    'total_submissions': len(groups), 'groups': groups}
+        individual_submissions = [s for s in submissions_list if not s.file_submission.group_code]
+        return {'activity': activity_model, 'activity_type': 'individual',
+                'total_submissions': len(individual_submissions), 'submissions': individual_submissions}
+    finally:
+        db.close()
+
+
+def legacy_body(activity_id: str, moodle_id: str) -> bytes:
+    """Response body of the listing as the endpoint rendered it before (jsonable_encoder + JSONResponse)"""
+    from fastapi.encoders import jsonable_encoder
+    from starlette.responses import JSONResponse
+
+    return JSONResponse(jsonable_encoder(legacy_submissions_by_activity(activity_id, moodle_id))).body
+
+
+def lean_body(activity_id: str, moodle_id: str) -> bytes:
+    """Response body of the listing rendered by FastJSONResponse"""
+    from activities_service import ActivitiesService
+    from fast_json import FastJSONResponse
+
+    return FastJSONResponse(ActivitiesService.get_submissions_by_activity(activity_id, moodle_id)).body
+
+
+def median_ms(func: Callable[[], Any], iterations: int) -> float:
+    func()  # warm-up (statement cache, imports)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def compressed(body: bytes, iterations: int) -> Dict[str, Tuple[int, float]]:
+    """encoding -> (compressed bytes, median ms)"""
+    import response_compression
+
+    results = {}
+    level = response_compression.RESPONSE_COMPRESSION_GZIP_LEVEL
+    results['gzip'] = (len(gzip.compress(body, compresslevel=level)),
+                       median_ms(lambda: gzip.compress(body, compresslevel=level), iterations))
+    if response_compression.BROTLI_AVAILABLE:
+        import brotli
+        quality = response_compression.RESPONSE_COMPRESSION_BROTLI_QUALITY
+        results['br'] = (len(brotli.compress(body, quality=quality)),
+                         median_ms(lambda: brotli.compress(body, quality=quality), iterations))
+    return results
+
+
+def pick_activities(manifest: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """First activity of each type in the manifest"""
+    picked = {}
+    for activity in manifest['activities']:
+        picked.setdefault(activity['type'], activity)
+    return picked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', help='Dataset created by seed_dataset.py (default: temporary dataset)')
+    parser.add_argument('--manifest', help='Manifest path (default: <db>.manifest.json)')
+    parser.add_argument('--submissions', type=int, default=2000, help='Submissions per activity of the temporary dataset')
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    temp_dir: Optional[tempfile.TemporaryDirectory] = None
+    if args.db:
+        os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(args.db)}'
+        with open(args.manifest or f'{args.db}.manifest.json', encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+    else:
+        import seed_dataset
+
+        temp_dir = tempfile.TemporaryDirectory(prefix='lamba-bench-')
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(temp_dir.name, 'bench.db')}"
+        # One course: every activity has --submissions students
+        manifest = seed_dataset.seed(seed_dataset.SeedConfig(
+            submissions=args.submissions * 4, moodles=1, courses=1, activities_per_course=4,
+            group_ratio=0.5, graded_ratio=0.9, files='none'
+        ))
+        print(f"Dataset temporal: {manifest['counts']} ({manifest['seconds']}s)")
+
+    import fast_json
+
+    print(f"orjson: {'sí' if fast_json.ORJSON_AVAILABLE else 'no'}\n")
+    print(f"{'actividad':<12}{'ruta':<9}{'ms':>9}{'KB':>9}{'gzip KB':>9}{'gzip ms':>9}{'br KB':>8}{'br ms':>8}")
+    try:
+        for activity_type, activity in sorted(pick_activities(manifest).items()):
+            bodies = {}
+            for name, render in (('anterior', legacy_body), ('ligera', lean_body)):
+                body = render(activity['id'], activity['moodle_id'])
+                bodies[name] = body
+                elapsed = median_ms(lambda: render(activity['id'], activity['moodle_id']), args.iterations)
+                sizes = compressed(body, args.iterations)
+                gzip_size, gzip_ms = sizes['gzip']
+                brotli_columns = (f"{sizes['br'][0] / 1024:>8.1f}{sizes['br'][1]:>8.2f}" if 'br' in sizes
+                                  else f"{'-':>8}{'-':>8}")
+                print(f"{activity_type:<12}{name:<9}{elapsed:>9.2f}{len(body) / 1024:>9.1f}"
+                      f"{gzip_size / 1024:>9.1f}{gzip_ms:>9.2f}{brotli_columns}")
+            if json.loads(bodies['anterior']) != json.loads(bodies['ligera']):
+                print("  aviso: las dos rutas devuelven documentos distintos")
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
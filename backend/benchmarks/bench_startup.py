@@ -0,0 +1,149 @@
+"""
+Perfil de arranque del backend.
+
+Importa la aplicación (main) en un proceso nuevo con `python -X importtime`
+y resume el resultado:
+- tiempo total de importación (mediana de --runs procesos)
+- módulos de la aplicación ordenados por tiempo acumulado
+- paquetes de terceros ordenados por tiempo propio (suma de sus módulos)
+- dependencias pesadas que deberían cargarse bajo demanda (pypdf, docx) y
+  que aparecen importadas al arrancar
+
+Con --ready arranca además el lifespan de la aplicación (TestClient) y mide
+el tiempo hasta que /readyz responde 200, con las fases que informa el
+propio backend (imports, init_db, warm-up...).
+
+Uso (desde backend/):
+    python benchmarks/bench_startup.py [--runs 5] [--top 15] [--ready]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# Imported on first use (see document_extractor); at startup they only cost time
+LAZY_MODULES = ('pypdf', 'docx')
+
+_READY_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    while client.get('/readyz').status_code != 200:
+        time.sleep(0.005)
+    body = client.get('/readyz').json()
+ready = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'ready_ms': (ready - started) * 1000,
+                  'startup_ms': body['startup_ms'], 'checks': body['checks']}))
+"""
+
+
+class ImportRecord(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(output: str) -> List[ImportRecord]:
+    """Records of `python -X importtime` (stderr lines 'import time: self | cumulative | name')"""
+    records = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header line
+        name = fields[2].rstrip()
+        stripped = name.lstrip(' ')
+        records.append(ImportRecord(stripped, int(fields[0]), int(fields[1]), (len(name) - len(stripped)) // 2))
+    return records
+
+
+def app_modules() -> set:
+    return {path.stem for path in PROJECT_ROOT.glob('*.py')}
+
+
+def _environment(temp_dir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(temp_dir, 'startup.db')}")
+    env.setdefault('LOG_LEVEL', 'WARNING')
+    return env
+
+
+def profile_imports(temp_dir: str) -> List[ImportRecord]:
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=PROJECT_ROOT,
+                            env=_environment(temp_dir), capture_output=True, text=True, check=True)
+    return parse_importtime(result.stderr)
+
+
+def measure_ready(temp_dir: str) -> Dict[str, object]:
+    result = subprocess.run([sys.executable, '-c', _READY_SCRIPT], cwd=PROJECT_ROOT, env=_environment(temp_dir),
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(records: List[ImportRecord], top: int) -> Dict[str, object]:
+    own = app_modules()
+    main_record = next(record for record in records if record.module == 'main')
+    packages: Dict[str, int] = defaultdict(int)
+    for record in records:
+        package = record.module.split('.')[0]
+        if package not in own:
+            packages[package] += record.self_us
+    return {
+        'total_ms': main_record.cumulative_us / 1000,
+        'app': sorted((record for record in records if record.module in own),
+                      key=lambda record: record.cumulative_us, reverse=True)[:top],
+        'packages': sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top],
+        'eager_lazy_modules': sorted({record.module.split('.')[0] for record in records
+                                      if record.module.split('.')[0] in LAZY_MODULES}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='Procesos medidos (se informa la mediana)')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--ready', action='store_true', help='Mide también el tiempo hasta /readyz 200')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='lamba-startup-') as temp_dir:
+        runs = [profile_imports(temp_dir) for _ in range(args.runs)]
+        summaries = [summarize(records, args.top) for records in runs]
+        summary = sorted(summaries, key=lambda item: item['total_ms'])[len(summaries) // 2]
+        print(f"import main: {statistics.median(item['total_ms'] for item in summaries):.1f} ms "
+              f"(mediana de {args.runs}; mín {min(item['total_ms'] for item in summaries):.1f} ms)\n")
+
+        print(f"{'módulo de la aplicación':<32}{'acumulado ms':>14}{'propio ms':>11}")
+        for record in summary['app']:
+            print(f"{record.module:<32}{record.cumulative_us / 1000:>14.1f}{record.self_us / 1000:>11.1f}")
+
+        print(f"\n{'paquete':<32}{'propio ms':>14}")
+        for package, self_us in summary['packages']:
+            print(f"{package:<32}{self_us / 1000:>14.1f}")
+
+        if summary['eager_lazy_modules']:
+            print(f"\naviso: importados al arrancar: {', '.join(summary['eager_lazy_modules'])}")
+
+        if args.ready:
+            ready = measure_ready(temp_dir)
+            print(f"\nhasta /readyz 200: {ready['ready_ms']:.1f} ms (import {ready['import_ms']:.1f} ms)")
+            for phase, elapsed in ready['startup_ms'].items():
+                print(f"  {phase:<28}{elapsed:>10.1f} ms")
+            print(f"  warm-up: {json.dumps(ready['checks'])}")
+
+
+if __name__ == '__main__':
+    main()
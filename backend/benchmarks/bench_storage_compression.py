@@ -0,0 +1,146 @@
+"""
+Benchmark de la compresión en reposo de las entregas (storage_service).
+
+Para cada tipo de fichero del corpus aplica la política por tipo MIME de
+FileStorageService (STORAGE_COMPRESSION_TYPES, tamaño mínimo y ahorro
+mínimo) y mide la razón de compresión, el rendimiento de compresión al
+guardar y el de descompresión al vuelo (gunzip_chunks, como en las
+descargas y la extracción de texto). Con --levels compara además varios
+niveles de gzip sobre los tipos comprimibles.
+
+Sin --dir usa un corpus sintético representativo: código Python y Markdown
+del propio repositorio, JSON, texto, PDF sin comprimir, DOCX y bytes
+aleatorios (imágenes ya comprimidas). Con --dir mide ficheros reales (p. ej.
+una copia de uploads/), con el tipo MIME deducido del nombre.
+
+Uso (desde backend/):
+    python benchmarks/bench_storage_compression.py [--dir uploads/] [--levels 1,6,9]
+"""
+
+import argparse
+import gzip
+import mimetypes
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import storage_service  # noqa: E402
+from seed_dataset import _essay, build_docx, build_pdf  # noqa: E402
+from storage_service import FileStorageService, gunzip_chunks  # noqa: E402
+
+_MB = 1024 * 1024
+_CHUNK = 1024 * 1024
+
+
+def synthetic_corpus(rng: random.Random) -> List[Tuple[str, str, bytes]]:
+    """(name, MIME type, content) of typical uploads"""
+    code = b''.join(path.read_bytes() for path in sorted(PROJECT_ROOT.glob('*.py'))[:12])
+    docs = (PROJECT_ROOT / 'API_DOCUMENTATION.md').read_bytes()
+    essay = '\n\n'.join(_essay(rng, 40))
+    records = [{'id': index, 'alumno': f'estudiante{index}', 'nota': round(rng.uniform(0, 10), 2),
+                'comentario': ' '.join(_essay(rng, 1))[:160]} for index in range(2000)]
+    lines = [essay[start:start + 90] for start in range(0, len(essay), 90)]
+    return [
+        ('practica.py', 'text/x-python', code),
+        ('memoria.md', 'text/markdown', docs),
+        ('datos.json', 'application/json', repr(records).replace("'", '"').encode('utf-8')),
+        ('ensayo.txt', 'text/plain', essay.encode('utf-8')),
+        ('informe.pdf', 'application/pdf', build_pdf(lines)),
+        ('informe.docx', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+         build_docx(_essay(rng, 20))),
+        ('captura.png', 'image/png', rng.randbytes(512 * 1024)),
+    ]
+
+
+def directory_corpus(directory: str) -> List[Tuple[str, str, bytes]]:
+    corpus = []
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            corpus.append((name, mimetypes.guess_type(name)[0] or 'application/octet-stream',
+                           Path(path).read_bytes()))
+    return corpus
+
+
+def throughput(func: Callable[[], object], size: int, min_seconds: float = 0.2) -> float:
+    """MB/s of `func` over `size` bytes (repeated for at least min_seconds)"""
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return size * runs / elapsed / _MB
+
+
+def _speed(value: float) -> str:
+    return f"{value:>11.1f}" if value == value else f"{'-':>11}"
+
+
+def decode(data: bytes) -> None:
+    for _ in gunzip_chunks(data[offset:offset + _CHUNK] for offset in range(0, len(data), _CHUNK)):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dir', help='Directorio con ficheros reales (por defecto, corpus sintético)')
+    parser.add_argument('--levels', default='1,6,9', help='Niveles de gzip a comparar (vacío = no comparar)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    storage_service.STORAGE_COMPRESSION = 'gzip'
+    corpus = directory_corpus(args.dir) if args.dir else synthetic_corpus(random.Random(args.seed))
+
+    totals: Dict[str, List[float]] = defaultdict(lambda: [0, 0, 0])
+    print(f"{'fichero':<24}{'tipo MIME':<34}{'KB':>9}{'KB guard.':>11}{'razón':>8}"
+          f"{'comp MB/s':>11}{'desc MB/s':>11}")
+    for name, media_type, content in corpus:
+        stored, encoding = FileStorageService._encode(content, media_type)
+        level = FileStorageService.compression_level(media_type)
+        compress_speed = decode_speed = float('nan')
+        if level is not None:
+            compress_speed = throughput(lambda: gzip.compress(content, compresslevel=level, mtime=0), len(content))
+        if encoding:
+            decode_speed = throughput(lambda: decode(stored), len(content))
+        group = totals[media_type.split('/')[0] if media_type.startswith('text/') else media_type]
+        group[0] += 1
+        group[1] += len(content)
+        group[2] += len(stored)
+        print(f"{name[:23]:<24}{media_type[:33]:<34}{len(content) / 1024:>9.1f}{len(stored) / 1024:>11.1f}"
+              f"{len(content) / len(stored):>8.2f}{_speed(compress_speed)}{_speed(decode_speed)}")
+
+    original = sum(group[1] for group in totals.values())
+    stored_total = sum(group[2] for group in totals.values())
+    print(f"\n{'tipo':<40}{'ficheros':>9}{'razón':>8}")
+    for group_name, (files, size, stored) in sorted(totals.items()):
+        print(f"{group_name[:39]:<40}{files:>9}{size / stored:>8.2f}")
+    print(f"{'total':<40}{len(corpus):>9}{original / stored_total:>8.2f}"
+          f"   ({original / _MB:.2f} MB -> {stored_total / _MB:.2f} MB)")
+
+    levels = [int(level) for level in args.levels.split(',') if level.strip()]
+    compressible = [(name, media_type, content) for name, media_type, content in corpus
+                    if FileStorageService.compression_level(media_type) is not None]
+    if levels and compressible:
+        size = sum(len(content) for _, _, content in compressible)
+        print(f"\n{'nivel gzip':<12}{'razón':>8}{'comp MB/s':>11}{'desc MB/s':>11}   (tipos comprimibles)")
+        for level in levels:
+            compressed = [gzip.compress(content, compresslevel=level, mtime=0) for _, _, content in compressible]
+            compress_speed = throughput(
+                lambda: [gzip.compress(content, compresslevel=level, mtime=0) for _, _, content in compressible], size
+            )
+            decode_speed = throughput(lambda: [decode(data) for data in compressed], size)
+            print(f"{level:<12}{size / sum(map(len, compressed)):>8.2f}{compress_speed:>11.1f}{decode_speed:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
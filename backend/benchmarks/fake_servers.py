@@ -0,0 +1,405 @@
+"""
+Servidores locales que sustituyen a Moodle y LAMB en benchmarks y pruebas de carga.
+
+- FakeOutcomeServer: servicio de outcomes LTI 1.1 de Moodle (replaceResult)
+- FakeLAMBServer: API LAMB (/v1/models y /chat/completions) con latencia
+  log-normal y tasas de error, timeout y respuesta no JSON configurables
+- ReplayLAMBServer: API LAMB que responde con tráfico grabado por
+  lamb_recorder (LAMB_RECORD_PATH), con la latencia original o escalada
+- FakeS3Server: almacén de objetos compatible con S3 (estilo MinIO) para
+  STORAGE_BACKEND=s3, con listados, subida multiparte y URLs prefirmadas
+
+Todos escuchan en un hilo del proceso actual, son deterministas para una
+semilla dada y cuentan las peticiones recibidas por resultado.
+"""
+
+import hashlib
+import hmac
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import lamb_recorder  # noqa: E402
+import storage_backends  # noqa: E402
+
+_OUTCOME_SUCCESS = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<imsx_POXEnvelopeResponse xmlns="http://www.imsglobal.org/services/ltiv1p1/xsd/imsoms_v1p0">'
+    '<imsx_POXHeader><imsx_POXResponseHeaderInfo><imsx_statusInfo>'
+    '<imsx_codeMajor>success</imsx_codeMajor></imsx_statusInfo>'
+    '</imsx_POXResponseHeaderInfo></imsx_POXHeader><imsx_POXBody><replaceResultResponse/></imsx_POXBody>'
+    '</imsx_POXEnvelopeResponse>'
+).encode('utf-8')
+
+
+class _LocalServer:
+    """ThreadingHTTPServer running in a daemon thread (context manager)"""
+
+    path = '/'
+
+    def __init__(self, handler, host: str = '127.0.0.1', port: int = 0):
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f'http://{host}:{self.httpd.server_address[1]}'
+        self.url = f'{self.base_url}{self.path}'
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes, content_type: str = 'application/json') -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+
+class FakeOutcomeServer(_LocalServer):
+    """Moodle LTI 1.1 outcome service answering success to every replaceResult
+
+    Seeded Moodle instances keep their outcome URL (LTI launches do not
+    overwrite it), so the server must listen on the URL used by seed_dataset.
+    """
+
+    path = '/outcome'
+
+    def __init__(self, latency_ms: float = 0, host: str = '127.0.0.1', port: int = 0):
+        latency = latency_ms / 1000
+        self.requests = 0
+        server = self
+
+        class Handler(_QuietHandler):
+            def do_POST(self):
+                self._read_body()
+                if latency:
+                    time.sleep(latency)
+                server.requests += 1
+                self._reply(200, _OUTCOME_SUCCESS, 'application/xml')
+
+        super().__init__(Handler, host, port)
+
+
+@dataclass
+class LAMBProfile:
+    """Latency and failure distribution of the fake LAMB server"""
+    median_ms: float = 1500  # Median /chat/completions latency (log-normal)
+    sigma: float = 0.5  # Log-normal shape; 0 = constant latency
+    error_rate: float = 0.0  # HTTP 500 responses
+    timeout_rate: float = 0.0  # Requests held for timeout_ms (beyond LAMB_TIMEOUT)
+    invalid_rate: float = 0.0  # 200 responses whose body is not JSON
+    timeout_ms: float = 35_000
+    seed: int = 42
+
+    def latency(self, rng: random.Random) -> float:
+        """Seconds for one completion"""
+        if self.sigma <= 0:
+            return self.median_ms / 1000
+        return rng.lognormvariate(math.log(self.median_ms / 1000), self.sigma)
+
+
+class FakeLAMBServer(_LocalServer):
+    """LAMB API stand-in: /v1/models lists any evaluator, /chat/completions grades
+
+    Completions return a chat.completions body ending in "NOTA FINAL: X.X".
+    `outcomes` counts the result of every completion ('ok', 'error',
+    'timeout', 'invalid').
+    """
+
+    def __init__(self, profile: LAMBProfile = None, host: str = '127.0.0.1', port: int = 0):
+        profile = profile or LAMBProfile()
+        self.profile = profile
+        self.outcomes = Counter()
+        rng = random.Random(profile.seed)
+        rng_lock = threading.Lock()
+        server = self
+
+        def draw():
+            with rng_lock:
+                return rng.random(), profile.latency(rng), round(rng.uniform(3, 10), 1)
+
+        class Handler(_QuietHandler):
+            def do_GET(self):
+                if self.path.rstrip('/').endswith('/v1/models'):
+                    body = {'object': 'list', 'data': [
+                        {'id': f'lamb_assistant.{index}', 'object': 'model'} for index in range(1, 51)
+                    ] + [{'id': 'lamb_assistant.bench-evaluator', 'object': 'model'}]}
+                    self._reply(200, json.dumps(body).encode('utf-8'))
+                else:
+                    self._reply(404, b'{"detail": "Not Found"}')
+
+            def do_POST(self):
+                request = json.loads(self._read_body() or b'{}')
+                roll, latency, score = draw()
+                if roll < profile.timeout_rate:
+                    outcome = 'timeout'
+                    latency = profile.timeout_ms / 1000
+                elif roll < profile.timeout_rate + profile.error_rate:
+                    outcome = 'error'
+                elif roll < profile.timeout_rate + profile.error_rate + profile.invalid_rate:
+                    outcome = 'invalid'
+                else:
+                    outcome = 'ok'
+                time.sleep(latency)
+                server.outcomes[outcome] += 1
+
+                try:
+                    if outcome == 'error':
+                        self._reply(500, b'{"detail": "Internal Server Error"}')
+                    elif outcome == 'invalid':
+                        self._reply(200, b'<html>upstream error</html>', 'text/html')
+                    else:
+                        prompt = request.get('prompt', '')
+                        content = (f"## Evaluación\n\nTexto de {len(prompt)} caracteres revisado.\n\n"
+                                   f"**Puntos fuertes**\n- Estructura clara\n\nNOTA FINAL: {score}")
+                        body = {
+                            'id': f'chatcmpl-{int(time.time() * 1000)}',
+                            'object': 'chat.completion',
+                            'model': request.get('model'),
+                            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                                         'finish_reason': 'stop'}],
+                            'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': 60}
+                        }
+                        self._reply(200, json.dumps(body).encode('utf-8'))
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Client gave up (timeout)
+
+        super().__init__(Handler, host, port)
+
+
+class ReplayLAMBServer(_LocalServer):
+    """LAMB API stand-in answering with recorded responses (see lamb_recorder)
+
+    Requests are matched like in replay mode: same method, path and JSON
+    body first, then the next recording of the same path when
+    on_miss='sequential'. Unmatched requests get 404. `outcomes` counts
+    'hit', 'fallback' and 'miss'.
+    """
+
+    def __init__(self, store: lamb_recorder.ReplayStore, host: str = '127.0.0.1', port: int = 0):
+        self.store = store
+        self.outcomes = Counter()
+        server = self
+
+        class Handler(_QuietHandler):
+            def _replay(self, payload):
+                entry, outcome = store.match(self.command, self.path.split('?', 1)[0], payload)
+                server.outcomes[outcome] += 1
+                if entry is None:
+                    self._reply(404, b'{"detail": "No recorded response"}')
+                    return
+                time.sleep(store.delay(entry))
+                try:
+                    self._reply(entry['status'], entry['body'].encode('utf-8'),
+                                entry.get('content_type') or 'application/json')
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Client gave up (timeout)
+
+            def do_GET(self):
+                self._replay(None)
+
+            def do_POST(self):
+                body = self._read_body()
+                try:
+                    payload = json.loads(body) if body else None
+                except ValueError:
+                    payload = body.decode('utf-8', 'replace')
+                self._replay(payload)
+
+        super().__init__(Handler, host, port)
+
+
+class FakeS3Server(_LocalServer):
+    """S3-compatible object store stand-in (MinIO-style path URLs: /<bucket>/<key>)
+
+    Supports object PUT, GET (with Range), HEAD and DELETE, ListObjectsV2
+    (paginated), multipart upload (initiate, upload part, complete, abort)
+    and presigned GET URLs. Every
+    request must carry a valid Signature V4, in the Authorization header or
+    in the query string; anything else gets 403. `objects` maps
+    (bucket, key) to the stored bytes and `operations` counts requests by kind.
+    """
+
+    def __init__(self, access_key: str = 'lamba', secret_key: str = 'lamba-secret-key',
+                 region: str = 'us-east-1', host: str = '127.0.0.1', port: int = 0):
+        self.access_key = access_key
+        self.region = region
+        self.objects = {}
+        self.modified = {}
+        self.uploads = {}
+        self.operations = Counter()
+        server = self
+
+        def verify(handler, path, query, body) -> bool:
+            if 'X-Amz-Signature' in query:
+                query = dict(query)
+                given = query.pop('X-Amz-Signature')
+                amz_date = query.get('X-Amz-Date', '')
+                issued = datetime.strptime(amz_date, '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+                if time.time() > issued.timestamp() + int(query.get('X-Amz-Expires', '0')):
+                    return False
+                signed_names = query.get('X-Amz-SignedHeaders', 'host').split(';')
+                credential = query.get('X-Amz-Credential', '')
+                payload_hash = 'UNSIGNED-PAYLOAD'
+            else:
+                match = re.match(r'AWS4-HMAC-SHA256 Credential=([^,]+), SignedHeaders=([^,]+), Signature=(\w+)',
+                                 handler.headers.get('Authorization', ''))
+                if not match:
+                    return False
+                credential, signed_names, given = match.group(1), match.group(2).split(';'), match.group(3)
+                amz_date = handler.headers.get('x-amz-date', '')
+                payload_hash = handler.headers.get('x-amz-content-sha256', '')
+                if payload_hash != 'UNSIGNED-PAYLOAD' and payload_hash != hashlib.sha256(body).hexdigest():
+                    return False
+            if credential.split('/')[0] != access_key:
+                return False
+            _, expected = storage_backends.sigv4_signature(
+                method=handler.command, path=path, query=query,
+                headers={name: handler.headers.get(name, '') for name in signed_names},
+                payload_hash=payload_hash, secret_key=secret_key, region=region, amz_date=amz_date
+            )
+            return hmac.compare_digest(expected, given)
+
+        class Handler(_QuietHandler):
+            def _send(self, status: int, body: bytes = b'', headers: dict = None, content_length: int = None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body) if content_length is None else content_length))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def _handle(self):
+                url = urlsplit(self.path)
+                query = dict(parse_qsl(url.query, keep_blank_values=True))
+                body = self._read_body()
+                if not verify(self, url.path, query, body):
+                    server.operations['denied'] += 1
+                    self._send(403, b'<Error><Code>SignatureDoesNotMatch</Code></Error>')
+                    return
+                bucket, _, key = unquote(url.path).lstrip('/').partition('/')
+                name = (bucket, key)
+                if self.command == 'GET' and not key and query.get('list-type') == '2':
+                    self._send_listing(bucket, query)
+                elif self.command == 'POST' and 'uploads' in query:
+                    upload_id = uuid.uuid4().hex
+                    server.uploads[upload_id] = {}
+                    server.operations['initiate'] += 1
+                    self._send(200, f'<InitiateMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{key}</Key>'
+                                    f'<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>'.encode())
+                elif 'uploadId' in query:
+                    parts = server.uploads.get(query['uploadId'])
+                    if parts is None:
+                        self._send(404, b'<Error><Code>NoSuchUpload</Code></Error>')
+                    elif self.command == 'PUT':
+                        parts[int(query['partNumber'])] = body
+                        server.operations['upload_part'] += 1
+                        self._send(200, headers={'ETag': f'"{hashlib.md5(body).hexdigest()}"'})
+                    elif self.command == 'POST':
+                        numbers = [int(number) for number in re.findall(r'<PartNumber>(\d+)</PartNumber>', body.decode())]
+                        server.objects[name] = b''.join(parts[number] for number in numbers)
+                        server.modified[name] = time.time()
+                        del server.uploads[query['uploadId']]
+                        server.operations['complete'] += 1
+                        self._send(200, b'<CompleteMultipartUploadResult/>')
+                    else:
+                        del server.uploads[query['uploadId']]
+                        server.operations['abort'] += 1
+                        self._send(204)
+                elif self.command == 'PUT':
+                    server.objects[name] = body
+                    server.modified[name] = time.time()
+                    server.operations['put'] += 1
+                    self._send(200, headers={'ETag': f'"{hashlib.md5(body).hexdigest()}"'})
+                elif self.command == 'DELETE':
+                    server.objects.pop(name, None)
+                    server.operations['delete'] += 1
+                    self._send(204)
+                elif name not in server.objects:
+                    server.operations['missing'] += 1
+                    self._send(404, b'' if self.command == 'HEAD' else b'<Error><Code>NoSuchKey</Code></Error>')
+                else:
+                    self._send_object(name, query)
+
+            def _send_listing(self, bucket, query):
+                server.operations['list'] += 1
+                prefix = query.get('prefix', '')
+                after = query.get('continuation-token') or query.get('start-after') or ''
+                keys = sorted(key for owner, key in server.objects if owner == bucket
+                              and key.startswith(prefix) and key > after)
+                page = keys[:int(query.get('max-keys', '1000'))]
+                contents = ''.join(
+                    f'<Contents><Key>{escape(key)}</Key><Size>{len(server.objects[(bucket, key)])}</Size>'
+                    f'<LastModified>{datetime.fromtimestamp(server.modified[(bucket, key)], timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")}'
+                    f'</LastModified></Contents>'
+                    for key in page
+                )
+                truncated = len(page) < len(keys)
+                token = f'<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>' if truncated else ''
+                self._send(200, (
+                    '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+                    f'<Name>{bucket}</Name><KeyCount>{len(page)}</KeyCount>'
+                    f'<IsTruncated>{"true" if truncated else "false"}</IsTruncated>{token}{contents}</ListBucketResult>'
+                ).encode('utf-8'))
+
+            def _send_object(self, name, query):
+                data = server.objects[name]
+                headers = {'Last-Modified': formatdate(server.modified[name], usegmt=True),
+                           'ETag': f'"{hashlib.md5(data).hexdigest()}"', 'Accept-Ranges': 'bytes',
+                           'Content-Type': query.get('response-content-type', 'application/octet-stream')}
+                if 'response-content-disposition' in query:
+                    headers['Content-Disposition'] = query['response-content-disposition']
+                if 'response-content-encoding' in query:
+                    headers['Content-Encoding'] = query['response-content-encoding']
+                if self.command == 'HEAD':
+                    server.operations['head'] += 1
+                    self._send(200, headers=headers, content_length=len(data))
+                    return
+                server.operations['get'] += 1
+                status = 200
+                match = re.match(r'bytes=(\d*)-(\d*)$', self.headers.get('Range', ''))
+                if match:
+                    start = int(match.group(1)) if match.group(1) else len(data) - int(match.group(2))
+                    end = int(match.group(2)) if match.group(1) and match.group(2) else len(data) - 1
+                    headers['Content-Range'] = f'bytes {start}-{end}/{len(data)}'
+                    data, status = data[start:end + 1], 206
+                try:
+                    self._send(status, data, headers)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            do_GET = do_PUT = do_POST = do_DELETE = do_HEAD = _handle
+
+        super().__init__(Handler, host, port)
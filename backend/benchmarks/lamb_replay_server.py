@@ -0,0 +1,66 @@
+"""
+Servidor LAMB de reproducción a partir de tráfico grabado.
+
+Sirve /v1/models y /chat/completions con las respuestas grabadas por
+lamb_recorder (LAMBA arrancado con LAMB_RECORD_PATH), con la latencia
+original o escalada. Permite medir rendimiento y cambios del parser sin
+acceso a LAMB: basta con arrancar LAMBA con LAMB_API_URL apuntando aquí.
+
+Uso (desde backend/):
+    LAMB_RECORD_PATH=/tmp/lamb.jsonl.gz python main.py      # grabar
+    python benchmarks/lamb_replay_server.py /tmp/lamb.jsonl.gz --port 9098 --latency-scale 0.5
+    LAMB_API_URL=http://127.0.0.1:9098 python main.py        # reproducir
+"""
+
+import argparse
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+for _path in (PROJECT_ROOT, Path(__file__).resolve().parent):
+    if str(_path) not in sys.path:
+        sys.path.insert(0, str(_path))
+
+import lamb_recorder  # noqa: E402
+from bench_endpoints import percentile  # noqa: E402
+from fake_servers import ReplayLAMBServer  # noqa: E402
+
+
+def describe(store: lamb_recorder.ReplayStore) -> None:
+    """Requests, statuses and latency of a recorded store"""
+    by_path = {}
+    for entry in store.records:
+        by_path.setdefault((entry['method'], entry['path']), []).append(entry)
+    print(f"{'petición':<36}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}  estados")
+    for (method, path), entries in sorted(by_path.items()):
+        latencies = sorted(entry['elapsed_ms'] for entry in entries)
+        statuses = Counter(entry['status'] for entry in entries)
+        print(f"{method + ' ' + path:<36}{len(entries):>6}{percentile(latencies, 0.5):>10.1f}"
+              f"{percentile(latencies, 0.95):>10.1f}  {dict(statuses)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('store', help='Store recorded with LAMB_RECORD_PATH')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9098)
+    parser.add_argument('--latency-scale', type=float, default=1.0, help='0 = no delay, 0.5 = twice as fast')
+    parser.add_argument('--on-miss', choices=('sequential', 'error'), default='sequential')
+    args = parser.parse_args()
+
+    store = lamb_recorder.ReplayStore.load(args.store, args.latency_scale, args.on_miss)
+    describe(store)
+    with ReplayLAMBServer(store, args.host, args.port) as server:
+        print(f"Reproduciendo {len(store.records)} respuestas en {server.base_url} (Ctrl+C para terminar)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+    print(f"Peticiones: {dict(server.outcomes)}")
+
+
+if __name__ == '__main__':
+    main()
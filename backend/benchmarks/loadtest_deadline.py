@@ -0,0 +1,582 @@
+"""
+Prueba de carga "última hora antes de la entrega".
+
+Reproduce los 10 minutos previos a una fecha límite contra un servidor
+uvicorn real (subproceso) con servidores locales falsos de outcomes Moodle
+y de LAMB:
+
+1. Preparación: cada profesor lanza LTI y crea su actividad (individual o de grupo)
+2. Avalancha: los estudiantes lanzan LTI y suben ficheros de 10-50MB; en las
+   actividades de grupo el líder sube y el resto se une con el código.
+   Mientras tanto los profesores consultan el listado de entregas
+3. Evaluación: cada profesor evalúa todas las entregas contra el LAMB falso
+   (latencia y errores configurables, o tráfico grabado con --lamb-replay)
+   y sondea el estado hasta terminar
+4. Envío de notas: acepta las notas de IA y las sincroniza con el Moodle falso
+
+El informe incluye rendimiento y latencias de cola por operación, tiempo de
+base de datos por petición (cabecera Server-Timing), memoria RSS del
+servidor y contención de SQLite (errores "database is locked" y tiempos de
+escritura desde /metrics).
+
+Uso (desde backend/):
+    python benchmarks/loadtest_deadline.py --students 300 --activities 6 --concurrency 50 \\
+        --min-mb 10 --max-mb 50 --lamb-median-ms 2000 --lamb-error-rate 0.05 --json informe.json
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+for _path in (PROJECT_ROOT, Path(__file__).resolve().parent):
+    if str(_path) not in sys.path:
+        sys.path.insert(0, str(_path))
+
+import lamb_recorder  # noqa: E402
+from bench_endpoints import percentile  # noqa: E402
+from fake_servers import FakeLAMBServer, FakeOutcomeServer, LAMBProfile, ReplayLAMBServer  # noqa: E402
+from seed_dataset import build_pdf  # noqa: E402
+
+EVALUATOR_ID = 'bench-evaluator'
+LTI_KEY = 'loadtest-key'
+LTI_SECRET = 'loadtest-secret'
+METRICS_TOKEN = 'loadtest-metrics'
+METRICS_HEADERS = {'Authorization': f'Bearer {METRICS_TOKEN}'}
+
+_SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+)')
+_METRIC_LINE = re.compile(r'^([a-zA-Z_:][\w:]*)(?:\{(.*)\})?\s+(\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+# Run the app with uploads below the scenario directory instead of backend/uploads
+_SERVER_BOOTSTRAP = """
+import os, sys
+sys.path.insert(0, os.getcwd())
+import storage_service
+storage_service.FileStorageService.BASE_DIR = os.environ['LOADTEST_BASE_DIR']
+storage_service.FileStorageService.UPLOADS_ROOT = os.path.join(os.environ['LOADTEST_BASE_DIR'], 'uploads')
+import uvicorn
+uvicorn.run('main:app', host='127.0.0.1', port=int(sys.argv[1]), log_level='warning')
+"""
+
+
+class Recorder:
+    """Thread-safe latency / error / DB-time samples per operation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.db_ms: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.first: Dict[str, float] = {}
+        self.last: Dict[str, float] = {}
+
+    def record(self, operation: str, started: float, response: Optional[requests.Response]) -> None:
+        finished = time.perf_counter()
+        status = str(response.status_code) if response is not None else 'exception'
+        db_match = _SERVER_TIMING_DB.search(response.headers.get('server-timing', '')) if response is not None else None
+        with self._lock:
+            self.samples[operation].append(finished - started)
+            self.statuses[operation][status] += 1
+            if response is None or response.status_code >= 400:
+                self.errors[operation] += 1
+            if db_match:
+                self.db_ms[operation].append(float(db_match.group(1)))
+            self.first[operation] = min(self.first.get(operation, started), started)
+            self.last[operation] = max(self.last.get(operation, finished), finished)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        for operation, latencies in self.samples.items():
+            latencies = sorted(latencies)
+            db_ms = sorted(self.db_ms.get(operation, []))
+            window = self.last[operation] - self.first[operation]
+            result[operation] = {
+                'requests': len(latencies),
+                'errors': self.errors.get(operation, 0),
+                'statuses': dict(self.statuses[operation]),
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+                'max_ms': round(latencies[-1] * 1000, 1),
+                'throughput_rps': round(len(latencies) / window, 2) if window > 0 else 0.0,
+                'db_p95_ms': round(percentile(db_ms, 0.95), 1) if db_ms else None,
+            }
+        return result
+
+
+class MemorySampler:
+    """Samples the RSS of a process from /proc (Linux) in a background thread"""
+
+    def __init__(self, pid: int, interval: float = 0.25):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[int] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def rss_bytes(self) -> Optional[int]:
+        try:
+            with open(f'/proc/{self.pid}/status', encoding='ascii') as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            return None
+        return None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            rss = self.rss_bytes()
+            if rss is not None:
+                self.samples.append(rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> 'MemorySampler':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def summary(self) -> Dict[str, Any]:
+        if not self.samples:
+            return {'available': False}
+        mb = 1024 * 1024
+        return {
+            'available': True,
+            'start_mb': round(self.samples[0] / mb, 1),
+            'peak_mb': round(max(self.samples) / mb, 1),
+            'end_mb': round(self.samples[-1] / mb, 1),
+        }
+
+
+def parse_metrics(text: str) -> Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float]:
+    """Parse the Prometheus text format into {(name, labels): value}"""
+    values = {}
+    for line in text.splitlines():
+        match = _METRIC_LINE.match(line)
+        if not match or line.startswith('#'):
+            continue
+        name, labels, value = match.groups()
+        values[(name, tuple(_LABEL.findall(labels or '')))] = float(value.replace('+Inf', 'inf'))
+    return values
+
+
+def histogram_quantile(metrics: Dict, name: str, quantile: float, **labels: str) -> Optional[float]:
+    """Estimate a quantile from cumulative histogram buckets (linear interpolation)"""
+    buckets = []
+    for (metric, metric_labels), value in metrics.items():
+        label_dict = dict(metric_labels)
+        if metric == f'{name}_bucket' and all(label_dict.get(key) == val for key, val in labels.items()):
+            buckets.append((float(label_dict['le'].replace('+Inf', 'inf')), value))
+    buckets.sort()
+    if not buckets or buckets[-1][1] == 0:
+        return None
+    rank = quantile * buckets[-1][1]
+    previous_bound, previous_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if math.isinf(bound):
+                return previous_bound
+            if count == previous_count:
+                return bound
+            return previous_bound + (bound - previous_bound) * (rank - previous_count) / (count - previous_count)
+        previous_bound, previous_count = bound, count
+    return previous_bound
+
+
+def sqlite_contention(metrics: Dict) -> Dict[str, Any]:
+    """Lock errors and write statement timings from the server metrics"""
+    locked = sum(value for (name, labels), value in metrics.items()
+                 if name == 'lamba_db_errors_total' and dict(labels).get('kind') == 'locked')
+    report = {'locked_errors': int(locked)}
+    for operation in ('insert', 'update', 'select'):
+        count = metrics.get(('lamba_db_query_duration_seconds_count', (('operation', operation),)), 0)
+        total = metrics.get(('lamba_db_query_duration_seconds_sum', (('operation', operation),)), 0)
+        p95 = histogram_quantile(metrics, 'lamba_db_query_duration_seconds', 0.95, operation=operation)
+        report[operation] = {
+            'statements': int(count),
+            'mean_ms': round(total / count * 1000, 2) if count else None,
+            'p95_ms': round(p95 * 1000, 2) if p95 is not None else None,
+        }
+    return report
+
+
+def build_upload_bodies(min_mb: float, max_mb: float, variants: int, rng: random.Random) -> List[bytes]:
+    """Valid PDFs spread over the size range (padding is incompressible)"""
+    block = os.urandom(1024 * 1024)
+    bodies = []
+    for index in range(variants):
+        size_mb = min_mb + (max_mb - min_mb) * (index / max(1, variants - 1))
+        padding_size = int(size_mb * 1024 * 1024)
+        padding = (block * (padding_size // len(block) + 1))[:padding_size]
+        lines = [f'Entrega de prueba de carga {index}', 'Texto breve para la evaluacion automatica.'] * 10
+        bodies.append(build_pdf(lines, padding))
+    rng.shuffle(bodies)
+    return bodies
+
+
+def lti_payload(user_id: str, roles: str, activity_id: str, course_id: str, moodle_id: str, outcome_url: str) -> Dict[str, str]:
+    return {
+        'lti_message_type': 'basic-lti-launch-request',
+        'lti_version': 'LTI-1p0',
+        'resource_link_id': activity_id,
+        'resource_link_title': activity_id,
+        'context_id': course_id,
+        'context_title': f'Curso {course_id}',
+        'user_id': user_id,
+        'lis_person_name_full': user_id,
+        'lis_person_contact_email_primary': f'{user_id}@loadtest.example',
+        'lis_result_sourcedid': f'{activity_id}:{user_id}',
+        'lis_outcome_service_url': outcome_url,
+        'roles': roles,
+        'tool_consumer_instance_guid': moodle_id,
+        'tool_consumer_instance_name': moodle_id,
+        'oauth_consumer_key': LTI_KEY,
+    }
+
+
+class DeadlineRush:
+    """Drives one scenario against a running server"""
+
+    def __init__(self, base_url: str, args, outcome_url: str, recorder: Recorder):
+        self.base_url = base_url
+        self.args = args
+        self.outcome_url = outcome_url
+        self.recorder = recorder
+        self.rng = random.Random(args.seed)
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def call(self, operation: str, method: str, path: str, **kwargs) -> Optional[requests.Response]:
+        session = self._session()
+        started = time.perf_counter()
+        response = None
+        try:
+            response = session.request(method, f'{self.base_url}{path}', timeout=self.args.request_timeout, **kwargs)
+            return response
+        except requests.RequestException:
+            return None
+        finally:
+            # Sessions travel in X-LTI-Session; a stale cookie would take precedence
+            session.cookies.clear()
+            self.recorder.record(operation, started, response)
+
+    def launch(self, user_id: str, roles: str, activity: Dict[str, Any]) -> Optional[str]:
+        response = self.call('lti_launch', 'POST', '/lti', allow_redirects=False, data=lti_payload(
+            user_id, roles, activity['id'], activity['course_id'], activity['moodle_id'], self.outcome_url))
+        return response.cookies.get('lti_session') if response is not None else None
+
+    def setup(self) -> List[Dict[str, Any]]:
+        """Teachers launch and create the activities"""
+        activities = []
+        for index in range(self.args.activities):
+            activity = {
+                'id': f'loadtest-act-{index}',
+                'course_id': f'loadtest-course-{index % max(1, self.args.activities // 2)}',
+                'moodle_id': 'loadtest-moodle',
+                'type': 'group' if index < round(self.args.activities * self.args.group_ratio) else 'individual',
+                'teacher_id': f'loadtest-teacher-{index}',
+                'file_ids': [],
+                'groups': {},
+            }
+            activity['teacher_session'] = self.launch(activity['teacher_id'], 'Instructor', activity)
+            response = self.call('create_activity', 'POST', '/api/activities',
+                                 headers={'X-LTI-Session': activity['teacher_session']},
+                                 json={'title': f"Entrega {activity['id']}", 'description': 'Prueba de carga',
+                                       'activity_type': activity['type'], 'evaluator_id': EVALUATOR_ID,
+                                       'max_group_size': self.args.group_size if activity['type'] == 'group' else None,
+                                       'language': 'es'})
+            if response is None or response.status_code != 200:
+                raise RuntimeError(f"Could not create activity {activity['id']}: "
+                                   f"{response.status_code if response is not None else 'no response'}")
+            activities.append(activity)
+        return activities
+
+    def _student_task(self, activity: Dict[str, Any], student_id: str, group: Optional[Dict[str, Any]],
+                      body: bytes, start_at: float, started: float) -> None:
+        delay = started + start_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        session_id = self.launch(student_id, 'Learner', activity)
+        if not session_id:
+            return
+        headers = {'X-LTI-Session': session_id}
+        if group is None or group['leader'] == student_id:
+            response = self.call('upload', 'POST', f"/api/activities/{activity['id']}/submissions", headers=headers,
+                                 files={'file': (f'{student_id}.pdf', body, 'application/pdf')},
+                                 data={'student_note': 'Entrega de la prueba de carga'})
+            file_submission = None
+            if response is not None and response.status_code == 200:
+                file_submission = response.json()['submission']['file_submission']
+                activity['file_ids'].append(file_submission['id'])
+            if group is not None:
+                group['code'] = file_submission['group_code'] if file_submission else None
+                group['ready'].set()
+        else:
+            if not group['ready'].wait(self.args.request_timeout) or not group['code']:
+                return
+            self.call('group_join', 'POST', '/api/submissions/join', headers=headers,
+                      json={'activity_id': activity['id'], 'group_code': group['code']})
+
+    def _poll_listings(self, activities: List[Dict[str, Any]], stop: threading.Event) -> None:
+        while not stop.is_set():
+            for activity in activities:
+                if stop.is_set():
+                    break
+                self.call('teacher_listing', 'GET', f"/api/activities/{activity['id']}/submissions",
+                          headers={'X-LTI-Session': activity['teacher_session']})
+            stop.wait(self.args.poll_interval)
+
+    def rush(self, activities: List[Dict[str, Any]]) -> float:
+        """Launch + upload/join for every student while teachers poll their listings"""
+        bodies = build_upload_bodies(self.args.min_mb, self.args.max_mb, self.args.size_variants, self.rng)
+        leaders, members = [], []
+        per_activity = max(1, self.args.students // len(activities))
+        for activity in activities:
+            students = [f"{activity['id']}-student-{index}" for index in range(per_activity)]
+            if activity['type'] == 'group':
+                for start in range(0, len(students), self.args.group_size):
+                    group_students = students[start:start + self.args.group_size]
+                    group = {'leader': group_students[0], 'code': None, 'ready': threading.Event()}
+                    leaders.append((activity, group_students[0], group))
+                    members.extend((activity, student_id, group) for student_id in group_students[1:])
+            else:
+                leaders.extend((activity, student_id, None) for student_id in students)
+        # Uploaders are scheduled before joiners so joiners never hold every worker while waiting
+        self.rng.shuffle(leaders)
+        self.rng.shuffle(members)
+        tasks = leaders + members
+
+        stop = threading.Event()
+        pollers = [threading.Thread(target=self._poll_listings, args=(activities, stop), daemon=True)
+                   for _ in range(self.args.teacher_pollers)]
+        started = time.perf_counter()
+        for poller in pollers:
+            poller.start()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as executor:
+            futures = [
+                executor.submit(self._student_task, activity, student_id, group, bodies[index % len(bodies)],
+                                self.rng.uniform(0, self.args.ramp_seconds), started)
+                for index, (activity, student_id, group) in enumerate(tasks)
+            ]
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for poller in pollers:
+            poller.join()
+        return elapsed
+
+    def evaluate(self, activities: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Queue every submission for evaluation and poll until none is pending"""
+        started = time.perf_counter()
+        queued = 0
+        for activity in activities:
+            if not activity['file_ids']:
+                continue
+            response = self.call('evaluate', 'POST', f"/api/activities/{activity['id']}/evaluate",
+                                 headers={'X-LTI-Session': activity['teacher_session']},
+                                 json={'file_submission_ids': activity['file_ids']})
+            if response is not None and response.status_code == 200:
+                queued += response.json().get('queued', 0)
+
+        final = {}
+        deadline = time.perf_counter() + self.args.evaluation_timeout
+        pending = [activity for activity in activities if activity['file_ids']]
+        while pending and time.perf_counter() < deadline:
+            time.sleep(self.args.poll_interval)
+            still_pending = []
+            for activity in pending:
+                response = self.call('evaluation_status', 'GET', f"/api/activities/{activity['id']}/evaluation-status",
+                                     headers={'X-LTI-Session': activity['teacher_session']})
+                status = response.json() if response is not None and response.status_code == 200 else {}
+                if status.get('overall_status', 'in_progress') == 'in_progress':
+                    still_pending.append(activity)
+                else:
+                    final[activity['id']] = status['counts']
+            pending = still_pending
+
+        elapsed = time.perf_counter() - started
+        totals = defaultdict(int)
+        for counts in final.values():
+            for key in ('completed', 'error'):
+                totals[key] += counts.get(key, 0)
+        return {
+            'queued': queued,
+            'seconds': round(elapsed, 2),
+            'finished_activities': len(final),
+            'unfinished_activities': len(pending),
+            'statuses': dict(totals),
+            'evaluations_per_second': round(totals.get('completed', 0) / elapsed, 2) if elapsed else 0.0,
+        }
+
+    def passback(self, activities: List[Dict[str, Any]]) -> None:
+        for activity in activities:
+            headers = {'X-LTI-Session': activity['teacher_session']}
+            self.call('accept_ai_grades', 'POST', f"/api/grades/activity/{activity['id']}/accept-ai-grades", headers=headers)
+            self.call('grade_sync', 'POST', f"/api/activities/{activity['id']}/grades/sync", headers=headers)
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def start_server(base_dir: str, env: Dict[str, str], startup_timeout: float = 30) -> Tuple[subprocess.Popen, str]:
+    """Start uvicorn in a subprocess and wait until it answers"""
+    port = _free_port()
+    process = subprocess.Popen([sys.executable, '-c', _SERVER_BOOTSTRAP, str(port)], cwd=str(PROJECT_ROOT),
+                               env={**os.environ, **env, 'LOADTEST_BASE_DIR': base_dir})
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.perf_counter() + startup_timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited with code {process.returncode}')
+        try:
+            requests.get(f'{base_url}/metrics', headers=METRICS_HEADERS, timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('Server did not start in time')
+
+
+def run(args) -> Dict[str, Any]:
+    """Run the whole scenario and return the report"""
+    profile = LAMBProfile(median_ms=args.lamb_median_ms, sigma=args.lamb_sigma, error_rate=args.lamb_error_rate,
+                          timeout_rate=args.lamb_timeout_rate, invalid_rate=args.lamb_invalid_rate,
+                          timeout_ms=(args.lamb_timeout + 1) * 1000, seed=args.seed)
+    if args.lamb_replay:
+        store = lamb_recorder.ReplayStore.load(args.lamb_replay, args.lamb_latency_scale)
+        lamb_server = ReplayLAMBServer(store)
+    else:
+        lamb_server = FakeLAMBServer(profile)
+    recorder = Recorder()
+    with tempfile.TemporaryDirectory(prefix='lamba-loadtest-') as base_dir, \
+            FakeOutcomeServer(args.outcome_latency_ms) as outcome, lamb_server as lamb:
+        env = {
+            'DATABASE_URL': f"sqlite:///{os.path.join(base_dir, 'loadtest.db')}",
+            'LAMB_API_URL': lamb.base_url,
+            'LAMB_TIMEOUT': str(args.lamb_timeout),
+            'OAUTH_CONSUMER_KEY': LTI_KEY,
+            'LTI_SECRET': LTI_SECRET,
+            'METRICS_TOKEN': METRICS_TOKEN,
+            'LOG_LEVEL': 'WARNING',
+            'TRACE_EXPORTER': '',
+        }
+        if args.lamb_record:
+            env['LAMB_RECORD_PATH'] = os.path.abspath(args.lamb_record)
+        process, base_url = start_server(base_dir, env)
+        try:
+            rush = DeadlineRush(base_url, args, outcome.url, recorder)
+            with MemorySampler(process.pid) as memory:
+                activities = rush.setup()
+                rush_seconds = rush.rush(activities)
+                evaluation = rush.evaluate(activities)
+                rush.passback(activities)
+            server_metrics = parse_metrics(requests.get(f'{base_url}/metrics', headers=METRICS_HEADERS, timeout=30).text)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+        return {
+            'scenario': {key: value for key, value in vars(args).items() if key != 'json'},
+            'rush_seconds': round(rush_seconds, 2),
+            'uploaded_files': sum(len(activity['file_ids']) for activity in activities),
+            'operations': recorder.summary(),
+            'evaluation': evaluation,
+            'lamb': dict(lamb.outcomes),
+            'moodle_outcome_requests': outcome.requests,
+            'memory': memory.summary(),
+            'sqlite': sqlite_contention(server_metrics),
+        }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"Avalancha: {report['rush_seconds']}s, {report['uploaded_files']} ficheros subidos\n")
+    print(f"{'operación':<20}{'n':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'máx ms':>10}"
+          f"{'req/s':>9}{'db p95':>9}")
+    for name, result in report['operations'].items():
+        db_p95 = f"{result['db_p95_ms']:.1f}" if result['db_p95_ms'] is not None else '-'
+        print(f"{name:<20}{result['requests']:>6}{result['errors']:>5}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+              f"{result['p99_ms']:>10.1f}{result['max_ms']:>10.1f}{result['throughput_rps']:>9.2f}{db_p95:>9}")
+    evaluation = report['evaluation']
+    print(f"\nEvaluación: {evaluation['queued']} en cola, {evaluation['statuses']} en {evaluation['seconds']}s "
+          f"({evaluation['evaluations_per_second']} eval/s); LAMB: {report['lamb']}")
+    print(f"Outcomes Moodle recibidos: {report['moodle_outcome_requests']}")
+    memory = report['memory']
+    if memory.get('available'):
+        print(f"Memoria RSS servidor: inicio {memory['start_mb']}MB, pico {memory['peak_mb']}MB, fin {memory['end_mb']}MB")
+    sqlite = report['sqlite']
+    print(f"SQLite: {sqlite['locked_errors']} errores 'database is locked'; " + ', '.join(
+        f"{operation} media {sqlite[operation]['mean_ms']}ms p95 {sqlite[operation]['p95_ms']}ms"
+        for operation in ('insert', 'update', 'select')))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--activities', type=int, default=4)
+    parser.add_argument('--group-ratio', type=float, default=0.5, help='Fraction of group activities')
+    parser.add_argument('--group-size', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=40, help='Students acting at the same time')
+    parser.add_argument('--ramp-seconds', type=float, default=0, help='Spread student arrivals over this window')
+    parser.add_argument('--min-mb', type=float, default=10)
+    parser.add_argument('--max-mb', type=float, default=50)
+    parser.add_argument('--size-variants', type=int, default=4, help='Distinct upload bodies kept in memory')
+    parser.add_argument('--teacher-pollers', type=int, default=2)
+    parser.add_argument('--poll-interval', type=float, default=2)
+    parser.add_argument('--lamb-median-ms', type=float, default=1500)
+    parser.add_argument('--lamb-sigma', type=float, default=0.5)
+    parser.add_argument('--lamb-error-rate', type=float, default=0.02)
+    parser.add_argument('--lamb-timeout-rate', type=float, default=0.0)
+    parser.add_argument('--lamb-invalid-rate', type=float, default=0.0)
+    parser.add_argument('--lamb-timeout', type=int, default=30, help='LAMB_TIMEOUT given to the server')
+    parser.add_argument('--lamb-record', help='Record the LAMB traffic of the server to this store')
+    parser.add_argument('--lamb-replay', help='Answer LAMB requests from this recorded store instead of the fake LAMB')
+    parser.add_argument('--lamb-latency-scale', type=float, default=1.0,
+                        help='Scale of the recorded latencies with --lamb-replay (0 = no delay)')
+    parser.add_argument('--outcome-latency-ms', type=float, default=50)
+    parser.add_argument('--request-timeout', type=float, default=300)
+    parser.add_argument('--evaluation-timeout', type=float, default=1800)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='Write the report to this JSON file')
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+"""
+Generador de datos sintéticos a escala para benchmarks y pruebas de carga.
+
+Crea instancias Moodle, cursos, actividades (individuales y de grupo),
+profesores, estudiantes, entregas con ficheros PDF/DOCX reales y notas
+(IA y del profesor) mediante inserciones masivas, y escribe un manifiesto
+JSON con los identificadores necesarios para lanzar sesiones LTI.
+
+Cada estudiante de un curso entrega en todas las actividades del curso, así
+que el número de estudiantes por curso se deriva de --submissions. Los
+ficheros se generan una vez por plantilla y se enlazan (hardlink) en la
+carpeta de cada actividad, con la misma estructura que las subidas reales.
+
+Uso (desde backend/):
+    python benchmarks/seed_dataset.py --db /tmp/lamba-bench.db --submissions 100000
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import random
+import shutil
+import string
+import sys
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+_WORDS = (
+    "análisis datos modelo sistema proceso resultado evaluación estudiante aprendizaje método "
+    "energía agua ciudad historia economía lenguaje red algoritmo estructura función variable "
+    "hipótesis experimento conclusión referencia contexto problema solución diseño prueba impacto"
+).split()
+
+_BATCH_SIZE = 5000
+
+
+@dataclass
+class SeedConfig:
+    """Scale of the generated dataset"""
+    submissions: int = 10_000  # Student submissions (one per student and activity)
+    moodles: int = 2
+    courses: int = 20
+    activities_per_course: int = 5
+    group_ratio: float = 0.3  # Fraction of group activities
+    group_size: int = 3
+    graded_ratio: float = 0.6  # Submissions with an AI grade
+    teacher_graded_ratio: float = 0.5  # Of the AI graded, fraction with a final teacher grade
+    sent_ratio: float = 0.3  # Of the teacher graded, fraction already sent to Moodle
+    files: str = 'link'  # 'link' (hardlink templates), 'copy' or 'none'
+    outcome_url: str = 'http://127.0.0.1:8999/outcome'
+    seed: int = 42
+
+
+def build_pdf(lines: Iterable[str], padding: bytes = b'') -> bytes:
+    """Minimal single-page PDF with extractable Helvetica text
+
+    `padding` is stored in an unreferenced stream object, so large uploads
+    stay valid PDFs whose text extracts quickly.
+    """
+    def escape(text: str) -> str:
+        return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+    shown = ' '.join(f"({escape(line)}) '" for line in lines)
+    content = f"BT /F1 11 Tf 50 800 Td 14 TL {shown} ET".encode('latin-1', 'replace')
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+        b"/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Length " + str(len(content)).encode() + b" >>\nstream\n" + content + b"\nendstream",
+    ]
+    if padding:
+        objects.append(b"<< /Length " + str(len(padding)).encode() + b" >>\nstream\n" + padding + b"\nendstream")
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        output.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref = output.tell()
+    output.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        output.write(f"{offset:010d} 00000 n \n".encode())
+    output.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return output.getvalue()
+
+
+def build_docx(paragraphs: Iterable[str]) -> bytes:
+    """DOCX document built with python-docx"""
+    import docx
+
+    document = docx.Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    output = io.BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+
+def _essay(rng: random.Random, paragraphs: int) -> List[str]:
+    return [
+        ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(60, 120))).capitalize() + '.'
+        for _ in range(paragraphs)
+    ]
+
+
+def write_templates(directory: str, rng: random.Random, variants: int = 4) -> List[Dict[str, Any]]:
+    """Write PDF and DOCX templates; returns their name, path, size and MIME type"""
+    os.makedirs(directory, exist_ok=True)
+    templates = []
+    for index in range(variants):
+        paragraphs = _essay(rng, 3 + index * 2)
+        # The PDF writer does not wrap lines: one line per ~90 characters
+        lines = [text[start:start + 90] for text in paragraphs for start in range(0, len(text), 90)]
+        for extension, content, mime_type in (
+            ('pdf', build_pdf(lines[:55]), 'application/pdf'),
+            ('docx', build_docx(paragraphs), 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
+        ):
+            name = f"entrega_{index}.{extension}"
+            path = os.path.join(directory, name)
+            with open(path, 'wb') as template_file:
+                template_file.write(content)
+            templates.append({'name': name, 'path': path, 'size': len(content), 'type': mime_type})
+    return templates
+
+
+def _place_file(template: Dict[str, Any], destination: str, mode: str) -> None:
+    if mode == 'link':
+        try:
+            os.link(template['path'], destination)
+            return
+        except OSError:
+            pass  # Different filesystem or no hardlink support: copy instead
+    shutil.copyfile(template['path'], destination)
+
+
+def _insert(conn, table, rows: List[Dict[str, Any]]) -> None:
+    from sqlalchemy import insert
+
+    for start in range(0, len(rows), _BATCH_SIZE):
+        conn.execute(insert(table), rows[start:start + _BATCH_SIZE])
+
+
+def seed(config: SeedConfig) -> Dict[str, Any]:
+    """Generate the dataset into the database configured by DATABASE_URL
+
+    Returns:
+        Manifest with the counts, the Moodle instances and, per activity,
+        its course, teacher and students (for LTI launches)
+    """
+    from database import engine, init_db
+    from db_models import (MoodleDB, UserDB, CourseDB, ActivityDB, FileSubmissionDB,
+                           StudentSubmissionDB, GradeDB)
+    from storage_service import FileStorageService
+
+    started = time.perf_counter()
+    rng = random.Random(config.seed)
+    now = datetime.utcnow()
+    init_db()
+
+    def new_id() -> str:
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    templates = []
+    if config.files != 'none':
+        templates = write_templates(os.path.join(FileStorageService.ensure_uploads_root(), '.bench_templates'), rng)
+
+    total_activities = config.courses * config.activities_per_course
+    students_per_course = max(1, math.ceil(config.submissions / max(1, total_activities)))
+
+    rows = {table: [] for table in ('moodles', 'users', 'courses', 'activities', 'files', 'students', 'grades')}
+    manifest_activities = []
+
+    for moodle_index in range(config.moodles):
+        rows['moodles'].append({
+            'id': f'bench-moodle-{moodle_index}',
+            'name': f'Moodle Bench {moodle_index}',
+            'lis_outcome_service_url': config.outcome_url,
+            'created_at': now
+        })
+
+    for course_index in range(config.courses):
+        moodle_id = f'bench-moodle-{course_index % config.moodles}'
+        course_id = f'bench-course-{course_index}'
+        teacher_id = f'bench-teacher-{course_index}'
+        rows['courses'].append({'id': course_id, 'moodle_id': moodle_id, 'title': f'Curso {course_index}',
+                                'created_at': now})
+        rows['users'].append({'id': teacher_id, 'moodle_id': moodle_id, 'full_name': f'Profesor {course_index}',
+                              'email': f'{teacher_id}@bench.example', 'role': 'teacher', 'created_at': now})
+        student_ids = [f'bench-student-{course_index}-{index}' for index in range(students_per_course)]
+        rows['users'].extend(
+            {'id': student_id, 'moodle_id': moodle_id, 'full_name': f'Estudiante {course_index}-{index}',
+             'email': f'{student_id}@bench.example', 'role': 'student', 'created_at': now}
+            for index, student_id in enumerate(student_ids)
+        )
+
+        for activity_index in range(config.activities_per_course):
+            activity_id = f'bench-act-{course_index}-{activity_index}'
+            is_group = rng.random() < config.group_ratio
+            members = [student_ids[start:start + config.group_size]
+                       for start in range(0, len(student_ids), config.group_size)] if is_group \
+                else [[student_id] for student_id in student_ids]
+            rows['activities'].append({
+                'id': activity_id, 'course_moodle_id': moodle_id, 'title': f'Actividad {course_index}-{activity_index}',
+                'description': 'Actividad generada para benchmarks', 'activity_type': 'group' if is_group else 'individual',
+                'max_group_size': config.group_size if is_group else None, 'creator_id': teacher_id,
+                'creator_moodle_id': moodle_id, 'created_at': now, 'course_id': course_id,
+                'deadline': now + timedelta(days=7), 'evaluator_id': 'bench-evaluator', 'language': 'es',
+                'group_counter': len(members) if is_group else 0
+            })
+            activity_dir = None
+            if templates:
+                activity_dir = FileStorageService.ensure_activity_directory(moodle_id, course_id, activity_id)
+
+            for group_index, group in enumerate(members, start=1):
+                file_id = new_id()
+                template = rng.choice(templates) if templates else None
+                file_name = template['name'] if template else 'entrega.pdf'
+                file_path = os.path.join('uploads', moodle_id, course_id, activity_id, f'{file_id}_{file_name}')
+                if template:
+                    destination = os.path.join(activity_dir, f'{file_id}_{file_name}')
+                    _place_file(template, destination, config.files)
+                    file_path = FileStorageService._to_relative_path(destination)
+                graded = rng.random() < config.graded_ratio
+                rows['files'].append({
+                    'id': file_id, 'activity_id': activity_id, 'activity_moodle_id': moodle_id,
+                    'file_name': file_name, 'file_path': file_path,
+                    'file_size': template['size'] if template else 0,
+                    'file_type': template['type'] if template else 'application/pdf',
+                    'uploaded_at': now - timedelta(minutes=rng.randint(0, 10_000)),
+                    'uploaded_by': group[0], 'uploaded_by_moodle_id': moodle_id,
+                    'group_code': ''.join(rng.choice(string.ascii_uppercase + string.digits) for _ in range(8)) if is_group else None,
+                    'group_display_name': f'GRUPO_{group_index}' if is_group else None,
+                    'max_group_members': config.group_size if is_group else 1,
+                    'member_count': len(group),
+                    'student_note': None,
+                    'evaluation_status': 'completed' if graded else rng.choice((None, None, None, 'pending', 'error')),
+                    'evaluation_started_at': now if graded else None,
+                    'evaluation_error': None
+                })
+                teacher_graded = graded and rng.random() < config.teacher_graded_ratio
+                sent = teacher_graded and rng.random() < config.sent_ratio
+                for student_id in group:
+                    rows['students'].append({
+                        'id': new_id(), 'file_submission_id': file_id, 'student_id': student_id,
+                        'student_moodle_id': moodle_id, 'activity_id': activity_id, 'activity_moodle_id': moodle_id,
+                        'lis_result_sourcedid': f'{activity_id}:{student_id}', 'joined_at': now,
+                        'sent_to_moodle': sent, 'sent_to_moodle_at': now if sent else None
+                    })
+                if graded:
+                    ai_score = round(rng.uniform(2, 10), 1)
+                    rows['grades'].append({
+                        'id': new_id(), 'file_submission_id': file_id, 'ai_score': ai_score,
+                        'ai_comment': ' '.join(rng.choice(_WORDS) for _ in range(40)), 'ai_evaluated_at': now,
+                        'score': ai_score if teacher_graded else None,
+                        'comment': 'Revisado por el profesor' if teacher_graded else None,
+                        'created_at': now, 'updated_at': now
+                    })
+
+            manifest_activities.append({
+                'id': activity_id, 'moodle_id': moodle_id, 'course_id': course_id,
+                'type': 'group' if is_group else 'individual', 'teacher_id': teacher_id,
+                'student_ids': [group[0] for group in members[:5]]
+            })
+
+    with engine.begin() as conn:
+        for table, key in ((MoodleDB.__table__, 'moodles'), (UserDB.__table__, 'users'),
+                           (CourseDB.__table__, 'courses'), (ActivityDB.__table__, 'activities'),
+                           (FileSubmissionDB.__table__, 'files'), (StudentSubmissionDB.__table__, 'students'),
+                           (GradeDB.__table__, 'grades')):
+            _insert(conn, table, rows[key])
+
+    return {
+        'config': asdict(config),
+        'seconds': round(time.perf_counter() - started, 2),
+        'counts': {key: len(value) for key, value in rows.items()},
+        'moodles': [row['id'] for row in rows['moodles']],
+        'activities': manifest_activities
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default='lamba-bench.db', help='SQLite file (overrides DATABASE_URL)')
+    parser.add_argument('--manifest', help='Manifest path (default: <db>.manifest.json)')
+    parser.add_argument('--base-dir', help='Directory containing uploads/ (default: the backend directory)')
+    defaults = SeedConfig()
+    for field, value in asdict(defaults).items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(args.db)}'
+    config = SeedConfig(**{field: getattr(args, field) for field in asdict(defaults)})
+    if args.base_dir:
+        from storage_service import FileStorageService
+        FileStorageService.BASE_DIR = os.path.abspath(args.base_dir)
+        FileStorageService.UPLOADS_ROOT = os.path.join(FileStorageService.BASE_DIR, 'uploads')
+    manifest = seed(config)
+    manifest['database_url'] = os.environ['DATABASE_URL']
+
+    manifest_path = args.manifest or f'{args.db}.manifest.json'
+    with open(manifest_path, 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    print(f"{manifest['counts']} en {manifest['seconds']}s -> {manifest_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,84 @@
+import hashlib
+import logging
 import os
-from sqlalchemy import create_engine, MetaData
+import time
+from datetime import datetime
+from sqlalchemy import create_engine, event, inspect, MetaData, text
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.engine import make_url
 from sqlalchemy.pool import StaticPool
 
+import metrics
+import query_log
+import tracing
+
+logger = logging.getLogger(__name__)
+
 # Database configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./lamba.db")
 
-# Create engine with connection pooling for SQLite
+# Connections kept open, and extra ones opened under load (each session holds one until it closes)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "30"))
+# Milliseconds a write waits for SQLite's write lock before failing with "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Synchronize the schema on startup even when schema_state says it is up to date
+DB_SCHEMA_RESYNC = os.getenv("DB_SCHEMA_RESYNC", "false").lower() in ("true", "1", "yes")
+
+_url = make_url(DATABASE_URL)
+_is_sqlite = _url.get_backend_name() == "sqlite"
+_in_memory = _is_sqlite and _url.database in (None, "", ":memory:")
+
+# One connection per session, so concurrent requests get separate transactions
+# (an in-memory database only exists on its single shared connection)
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False},  # Only needed for SQLite
-    poolclass=StaticPool,  # For SQLite
-    echo=True  # Set to False in production
+    connect_args={"check_same_thread": False} if _is_sqlite else {},
+    **({"poolclass": StaticPool} if _in_memory else {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW}),
+    # SQL echo is very verbose; enable only for debugging
+    echo=os.getenv("DB_ECHO", "false").lower() in ("true", "1", "yes")
 )
 
+if _is_sqlite:
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        """WAL: readers never block the writer nor wait for it; writers queue on the lock for the busy timeout"""
+        cursor = dbapi_connection.cursor()
+        if not _in_memory:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+    # Child span only within sampled traces (includes SQLite lock waits)
+    context._query_span = None
+    if tracing.current_span().sampled:
+        context._query_span = tracing.span(
+            f"db.{metrics.db_operation(statement)}", tracing.KIND_CLIENT, **{'db.statement': statement[:500]}
+        )
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Record query count and duration per statement type, and per request"""
+    elapsed = time.perf_counter() - context._query_start
+    metrics.DB_QUERY_DURATION.observe(elapsed, metrics.db_operation(statement))
+    query_log.record_query(statement, parameters, elapsed, executemany)
+    if context._query_span is not None:
+        context._query_span.end()
+
+@event.listens_for(engine, "handle_error")
+def _handle_error(exception_context):
+    """Count errors, separating SQLite lock contention from the rest"""
+    kind = 'locked' if 'database is locked' in str(exception_context.original_exception) else 'other'
+    metrics.DB_ERRORS.inc(metrics.db_operation(exception_context.statement or ''), kind)
+    query_span = getattr(exception_context.execution_context, '_query_span', None)
+    if query_span is not None:
+        query_span.set_error(f"{type(exception_context.original_exception).__name__}: {exception_context.original_exception}")
+        query_span.end()
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -28,9 +93,82 @@ def get_db():
     finally:
         db.close()
 
+def schema_fingerprint() -> str:
+    """Hash of the tables, columns and indexes declared by the models"""
+    parts = []
+    for table in Base.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(f"{column.name} {column.type.compile(dialect=engine.dialect)} {column.nullable}"
+                     for column in table.columns)
+        parts.extend(sorted(f"{index.name} {','.join(column.name for column in index.columns)} {index.unique}"
+                            for index in table.indexes))
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+def _schema_state():
+    """Stored schema fingerprint, and the declared tables and indexes missing from the database
+
+    On SQLite one query on sqlite_master also finds objects dropped by hand;
+    other databases only compare the fingerprint.
+    """
+    with engine.connect() as connection:
+        if _is_sqlite:
+            present = set(connection.execute(
+                text("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')")).scalars())
+            declared = [name for table in Base.metadata.sorted_tables
+                        for name in (table.name, *(index.name for index in table.indexes))]
+            missing = [name for name in declared if name not in present]
+            has_state = 'schema_state' in present
+        else:
+            missing = []
+            has_state = inspect(connection).has_table('schema_state')
+        if not has_state:
+            return None, missing
+        return connection.execute(text('SELECT fingerprint FROM schema_state WHERE id = 1')).scalar(), missing
+
 def init_db():
-    """Initialize database tables"""
+    """Initialize database tables
+    
+    create_all only creates missing tables, so nullable columns and
+    indexes added to existing tables are created here too. That is one
+    statement per table and index: when the schema was already synchronized
+    with the same models (schema_state) and none of its tables or indexes
+    is missing, startup skips it with two queries. DB_SCHEMA_RESYNC=true
+    forces the synchronization.
+    """
+    fingerprint = schema_fingerprint()
+    stored, missing = _schema_state()
+    if stored == fingerprint and not DB_SCHEMA_RESYNC:
+        if not missing:
+            return
+        logger.warning("Faltan objetos del esquema (%s): se sincroniza de nuevo", ', '.join(missing))
     Base.metadata.create_all(bind=engine)
+    existing_tables = inspect(engine)
+    unrepairable = []
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            present = {column['name'] for column in existing_tables.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                if not column.nullable:
+                    # Existing rows would need a value: left to a manual migration
+                    unrepairable.append(f'{table.name}.{column.name}')
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    if unrepairable:
+        logger.error("Columnas NOT NULL ausentes en la base de datos, hay que añadirlas a mano: %s",
+                     ', '.join(unrepairable))
+    with engine.begin() as connection:
+        connection.execute(text('DELETE FROM schema_state'))
+        if unrepairable:
+            # Not recorded as synchronized, so every startup reports it until it is migrated
+            return
+        connection.execute(text('INSERT INTO schema_state (id, fingerprint, updated_at) VALUES (1, :fingerprint, :now)'),
+                           {'fingerprint': fingerprint, 'now': datetime.utcnow()})
 
 def get_db_session():
     """Get a database session for direct use"""
@@ -80,17 +80,19 @@ class FileSubmissionDB(Base):
     
     # File information (unique per group/individual submission)
     file_name = Column(String, nullable=False)
-    file_path = Column(String, nullable=False)
+    file_path = Column(String, nullable=False, index=True)  # Indexed: downloads look the submission up by path
+    content_hash = Column(String, nullable=True)  # SHA-256 (hex) of the stored bytes, used as strong ETag
     file_size = Column(Integer, nullable=False)
     file_type = Column(String, nullable=False)  # MIME type
-    uploaded_at = Column(DateTime, default=datetime.utcnow)
+    uploaded_at = Column(DateTime, default=datetime.utcnow, index=True)
     uploaded_by = Column(String, nullable=False)  # User ID who uploaded the file
     uploaded_by_moodle_id = Column(String, nullable=False)  # Uploader's Moodle instance ID
     
     # Group information
-    group_code = Column(String, nullable=True)  # Unique code for group submissions (for joining)
+    group_code = Column(String, nullable=True, unique=True, index=True)  # Unique code for group submissions (for joining)
     group_display_name = Column(String, nullable=True)  # Human-readable group name (e.g., GRUPO_1, GROUP_1)
     max_group_members = Column(Integer, default=1)  # Max members allowed for this submission
+    member_count = Column(Integer, nullable=True, default=1)  # Students sharing this submission (joins check and bump it atomically)
     
     # Student note to professor(s)
     student_note = Column(Text, nullable=True)  # Note from student to professor when submitting
@@ -147,7 +149,7 @@ class GradeDB(Base):
     # AI proposed grade (from automatic evaluation)
     ai_score = Column(Float, nullable=True)  # AI proposed score (0-10)
     ai_comment = Column(Text, nullable=True)  # AI feedback/comment
-    ai_evaluated_at = Column(DateTime, nullable=True)  # When AI evaluation was done
+    ai_evaluated_at = Column(DateTime, nullable=True, index=True)  # When AI evaluation was done
     
     # Final grade (from professor, sent to LMS)
     score = Column(Float, nullable=True)  # Professor's final score (0-10)
@@ -157,4 +159,44 @@ class GradeDB(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    file_submission = relationship("FileSubmissionDB", back_populates="grade")
\ No newline at end of file
+    file_submission = relationship("FileSubmissionDB", back_populates="grade")
+
+class UsageHourlyDB(Base):
+    __tablename__ = "usage_hourly"
+    
+    # Events without their own timestamped rows (e.g. LTI launches), counted per UTC hour
+    hour = Column(DateTime, primary_key=True)  # Start of the hour (UTC)
+    event = Column(String, primary_key=True)  # "launch"
+    count = Column(Integer, nullable=False, default=0)
+
+class StoredBlobDB(Base):
+    __tablename__ = "stored_blobs"
+    
+    # Content-addressed submission files (uploads/blobs/[gz/]ab/cd/<sha256><ext>), stored once
+    path = Column(String, primary_key=True)  # Relative path, as in file_submissions.file_path
+    content_hash = Column(String, nullable=False, index=True)  # SHA-256 (hex) of the content
+    size = Column(Integer, nullable=False)
+    stored_size = Column(Integer, nullable=True)  # Bytes held by the backend (smaller when compressed at rest)
+    ref_count = Column(Integer, nullable=False, default=0)  # file_submissions pointing at this blob
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class StorageUsageDB(Base):
+    __tablename__ = "storage_usage"
+    
+    # Incremental storage counters per Moodle, course and activity ('' for the aggregate levels:
+    # ('m', '', '') is a whole Moodle instance, ('m', 'c', '') a course, ('m', 'c', 'a') an activity)
+    moodle_id = Column(String, primary_key=True)
+    course_id = Column(String, primary_key=True, default='')
+    activity_id = Column(String, primary_key=True, default='')
+    used_bytes = Column(Integer, nullable=False, default=0)  # Sum of file_submissions.file_size (uploaded bytes)
+    file_count = Column(Integer, nullable=False, default=0)  # Number of file_submissions
+    quota_bytes = Column(Integer, nullable=True)  # Quota override (0 = unlimited, NULL = STORAGE_QUOTA_* default)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SchemaStateDB(Base):
+    __tablename__ = "schema_state"
+    
+    # Fingerprint of the models the schema was last synchronized with (see database.init_db)
+    id = Column(Integer, primary_key=True)  # Single row: 1
+    fingerprint = Column(String, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
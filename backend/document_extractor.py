@@ -1,95 +1,127 @@
 """
 Document text extraction service
 Extracts text from various document formats (PDF, DOCX, TXT, etc.)
+
+pypdf and python-docx are imported on the first extraction of their format,
+not at startup (together ~70ms of the app's import time, and only evaluations
+use them); here we only check that they are installed.
 """
+import importlib.util
 import os
 import logging
-from typing import Optional
+import time
+from typing import BinaryIO, Optional, Union
+
+import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
 
 # PDF extraction
-try:
-    from pypdf import PdfReader
-    PDF_AVAILABLE = True
-except ImportError:
-    PDF_AVAILABLE = False
-    logging.warning("pypdf not available. PDF extraction will not work.")
+PDF_AVAILABLE = importlib.util.find_spec('pypdf') is not None
+if not PDF_AVAILABLE:
+    logger.warning("pypdf not available. PDF extraction will not work.")
 
 # DOCX extraction
-try:
-    import docx
-    DOCX_AVAILABLE = True
-except ImportError:
-    DOCX_AVAILABLE = False
-    logging.warning("python-docx not available. DOCX extraction will not work.")
+DOCX_AVAILABLE = importlib.util.find_spec('docx') is not None
+if not DOCX_AVAILABLE:
+    logger.warning("python-docx not available. DOCX extraction will not work.")
 
 
 class DocumentExtractor:
     """Extract text from various document formats"""
     
+    # Formats whose readers need random access (PDF xref table, DOCX zip directory)
+    SEEKABLE_EXTENSIONS = ('.pdf', '.docx', '.doc')
+    
+    @staticmethod
+    def requires_seek(file_path: str) -> bool:
+        """Whether extracting this file needs a seekable stream"""
+        return os.path.splitext(file_path)[1].lower() in DocumentExtractor.SEEKABLE_EXTENSIONS
+    
     @staticmethod
-    def extract_text_from_file(file_path: str) -> Optional[str]:
+    @tracing.traced('document.extract')
+    def extract_text_from_file(file_path: str, stream: Optional[BinaryIO] = None) -> Optional[str]:
         """
         Extract text from a file based on its extension
         
         Args:
-            file_path: Path to the file
+            file_path: Path to the file (only its extension is used when `stream` is given)
+            stream: Binary file object with the content, e.g. a decompressing
+                stream over a stored file (seekable for PDF/DOCX)
             
         Returns:
             Extracted text or None if extraction failed
         """
-        if not os.path.exists(file_path):
-            logging.error(f"File not found: {file_path}")
+        if stream is None and not os.path.exists(file_path):
+            logger.error("File not found: %s", file_path)
             return None
         
         # Get file extension
         _, ext = os.path.splitext(file_path)
         ext = ext.lower()
         
+        start = time.perf_counter()
+        text_format = ext.lstrip('.')
+        outcome = 'error'
+        source = stream if stream is not None else file_path
         try:
             if ext == '.pdf':
-                return DocumentExtractor._extract_from_pdf(file_path)
+                text = DocumentExtractor._extract_from_pdf(source)
             elif ext in ['.docx', '.doc']:
-                return DocumentExtractor._extract_from_docx(file_path)
+                text = DocumentExtractor._extract_from_docx(source)
             elif ext in ['.txt', '.md', '.py', '.java', '.cpp', '.c', '.js', '.html', '.css', '.json', '.xml']:
-                return DocumentExtractor._extract_from_text(file_path)
+                text = DocumentExtractor._extract_from_text(source)
             else:
-                logging.warning(f"Unsupported file format: {ext}")
+                logger.warning("Unsupported file format: %s", ext)
+                text_format = 'unsupported'
+                outcome = 'unsupported'
                 return None
+            outcome = 'success' if text else 'empty'
+            return text
         except Exception as e:
-            logging.error(f"Error extracting text from {file_path}: {str(e)}")
+            logger.error("Error extracting text from %s: %s", file_path, e)
             return None
+        finally:
+            metrics.EXTRACTION_DURATION.observe(time.perf_counter() - start, text_format, outcome)
+            extract_span = tracing.current_span()
+            extract_span.set_attribute('document.format', text_format)
+            extract_span.set_attribute('document.outcome', outcome)
     
     @staticmethod
-    def _extract_from_pdf(file_path: str) -> Optional[str]:
-        """Extract text from PDF file"""
+    def _extract_from_pdf(source: Union[str, BinaryIO]) -> Optional[str]:
+        """Extract text from PDF file (path or seekable binary stream)"""
         if not PDF_AVAILABLE:
-            logging.error("pypdf not available. Cannot extract from PDF.")
+            logger.error("pypdf not available. Cannot extract from PDF.")
             return None
         
         try:
+            from pypdf import PdfReader  # lazy: see module docstring
+            
             text_parts = []
-            with open(file_path, 'rb') as file:
-                pdf_reader = PdfReader(file)
-                for page in pdf_reader.pages:
-                    text = page.extract_text()
-                    if text:
-                        text_parts.append(text)
+            pdf_reader = PdfReader(source)
+            for page in pdf_reader.pages:
+                text = page.extract_text()
+                if text:
+                    text_parts.append(text)
             
             full_text = '\n'.join(text_parts)
             return full_text.strip() if full_text else None
         except Exception as e:
-            logging.error(f"Error extracting PDF text: {str(e)}")
+            logger.error("Error extracting PDF text: %s", e)
             return None
     
     @staticmethod
-    def _extract_from_docx(file_path: str) -> Optional[str]:
-        """Extract text from DOCX file"""
+    def _extract_from_docx(source: Union[str, BinaryIO]) -> Optional[str]:
+        """Extract text from DOCX file (path or seekable binary stream)"""
         if not DOCX_AVAILABLE:
-            logging.error("python-docx not available. Cannot extract from DOCX.")
+            logger.error("python-docx not available. Cannot extract from DOCX.")
             return None
         
         try:
-            doc = docx.Document(file_path)
+            import docx  # lazy: see module docstring
+            
+            doc = docx.Document(source)
             text_parts = []
             
             # Extract from paragraphs
@@ -107,25 +139,32 @@ class DocumentExtractor:
             full_text = '\n'.join(text_parts)
             return full_text.strip() if full_text else None
         except Exception as e:
-            logging.error(f"Error extracting DOCX text: {str(e)}")
+            logger.error("Error extracting DOCX text: %s", e)
             return None
     
     @staticmethod
-    def _extract_from_text(file_path: str) -> Optional[str]:
-        """Extract text from plain text file"""
+    def _extract_from_text(source: Union[str, BinaryIO]) -> Optional[str]:
+        """Extract text from plain text file (path or binary stream)"""
         try:
+            if not isinstance(source, str):
+                data = source.read()
+                try:
+                    text = data.decode('utf-8')
+                except UnicodeDecodeError:
+                    text = data.decode('latin-1')
+                return text.strip() if text else None
             # Try UTF-8 first
             try:
-                with open(file_path, 'r', encoding='utf-8') as file:
+                with open(source, 'r', encoding='utf-8') as file:
                     text = file.read()
                 return text.strip() if text else None
             except UnicodeDecodeError:
                 # Fallback to latin-1 if UTF-8 fails
-                with open(file_path, 'r', encoding='latin-1') as file:
+                with open(source, 'r', encoding='latin-1') as file:
                     text = file.read()
                 return text.strip() if text else None
         except Exception as e:
-            logging.error(f"Error extracting text file: {str(e)}")
+            logger.error("Error extracting text file: %s", e)
             return None
     
     @staticmethod
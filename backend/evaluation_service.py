@@ -9,14 +9,23 @@ Handles:
 """
 
 import logging
+import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import func
 from database import get_db_session
 from db_models import FileSubmissionDB, GradeDB, ActivityDB
 from grade_service import GradeService
 from document_extractor import DocumentExtractor
 from lamb_api_service import LAMBAPIService
+from logging_config import log_lamb_payload
+from prompt_builder import PromptBuilder
+from storage_service import FileStorageService
+import tracing
+
+logger = logging.getLogger(__name__)
 
 # Evaluation status constants
 STATUS_PENDING = 'pending'
@@ -27,6 +36,9 @@ STATUS_ERROR = 'error'
 # Timeout for stuck evaluations (5 minutes)
 EVALUATION_TIMEOUT_MINUTES = 5
 
+# Maximum number of chunks of a long document evaluated concurrently
+LAMB_CHUNK_CONCURRENCY = int(os.getenv('LAMB_CHUNK_CONCURRENCY', '4'))
+
 
 class EvaluationService:
     """Service for managing background evaluations"""
@@ -192,7 +204,7 @@ class EvaluationService:
             }
         except Exception as e:
             db.rollback()
-            logging.error(f"Error starting evaluation: {e}")
+            logger.error("Error starting evaluation: %s", e)
             return {
                 'success': False,
                 'message': str(e),
@@ -202,6 +214,7 @@ class EvaluationService:
             db.close()
     
     @staticmethod
+    @tracing.traced('evaluation.batch')
     def process_evaluation_batch(
         activity_id: str,
         activity_moodle_id: str,
@@ -232,7 +245,7 @@ class EvaluationService:
         }
         
         try:
-            for file_sub_id in file_submission_ids:
+            for file_sub_id in tracing.spans_over('evaluation.submission', file_submission_ids, 'file_submission_id'):
                 try:
                     # Mark as processing
                     file_sub = db.query(FileSubmissionDB).filter(
@@ -252,7 +265,12 @@ class EvaluationService:
                     
                     # Extract text from file
                     try:
-                        extracted_text = DocumentExtractor.extract_text_from_file(file_sub.file_path)
+                        # Read through a (decompressing) stream; PDF/DOCX readers get a seekable spool
+                        seekable = DocumentExtractor.requires_seek(file_sub.file_path)
+                        with FileStorageService.open_file(file_sub.file_path, seekable=seekable) as stream:
+                            extracted_text = DocumentExtractor.extract_text_from_file(file_sub.file_path, stream)
+                        if extracted_text is None:
+                            raise ValueError("no text could be extracted from the file")
                     except Exception as e:
                         file_sub.evaluation_status = STATUS_ERROR
                         file_sub.evaluation_error = f"Error extracting text: {str(e)}"
@@ -263,22 +281,24 @@ class EvaluationService:
                         })
                         continue
                     
-                    # Call LAMB API
+                    # Call LAMB API (chunked map-reduce when over the token budget)
                     try:
-                        logging.info(f"=== CALLING LAMB API ===")
-                        logging.info(f"Evaluator ID: {evaluator_id}")
-                        logging.info(f"Text length: {len(extracted_text)} chars")
-                        logging.info(f"Text preview: {extracted_text[:200]}...")
+                        logger.info(
+                            "Calling LAMB evaluator %s for submission %s (%s chars)",
+                            evaluator_id, file_sub_id, len(extracted_text),
+                            extra={'sample': 'lamb_call'}
+                        )
+                        logger.debug("Text preview: %s...", extracted_text[:200])
                         
-                        lamb_response = LAMBAPIService.evaluate_text(
+                        lamb_response, parsed = EvaluationService._evaluate_text(
                             text=extracted_text,
-                            evaluator_id=evaluator_id
+                            evaluator_id=evaluator_id,
+                            include_validation=is_debug_mode
                         )
                         
-                        logging.info(f"=== LAMB API RESPONSE ===")
-                        logging.info(f"Response: {lamb_response}")
+                        log_lamb_payload('response', lamb_response, file_submission_id=file_sub_id, evaluator_id=evaluator_id)
                     except Exception as e:
-                        logging.error(f"LAMB API Exception: {type(e).__name__}: {str(e)}")
+                        logger.error("LAMB API Exception: %s: %s", type(e).__name__, e)
                         file_sub.evaluation_status = STATUS_ERROR
                         file_sub.evaluation_error = f"LAMB API error: {str(e)}"
                         db.commit()
@@ -288,10 +308,12 @@ class EvaluationService:
                         })
                         continue
                     
-                    # Parse response
-                    logging.info(f"=== PARSING RESPONSE ===")
-                    parsed = LAMBAPIService.parse_evaluation_response(lamb_response)
-                    logging.info(f"Parsed result: {parsed}")
+                    logger.info(
+                        "LAMB result for submission %s: success=%s score=%s",
+                        file_sub_id, parsed.get('success'), parsed.get('score'),
+                        extra={'sample': 'lamb_result'}
+                    )
+                    log_lamb_payload('parsed', parsed, file_submission_id=file_sub_id, evaluator_id=evaluator_id)
                     
                     if is_debug_mode:
                         results['debug_info'].append({
@@ -319,8 +341,8 @@ class EvaluationService:
                     
                     # Log if no score was extracted (but don't treat as error)
                     if ai_score is None:
-                        logging.warning(f"No score found in LAMB response for submission {file_sub_id}")
-                        logging.warning(f"AI comment received: {ai_comment[:200] if ai_comment else 'None'}...")
+                        logger.warning("No score found in LAMB response for submission %s", file_sub_id)
+                        logger.warning("AI comment received: %s...", ai_comment[:200] if ai_comment else 'None')
                     
                     # Create or update grade with AI proposed values
                     existing_grade = db.query(GradeDB).filter(
@@ -355,7 +377,7 @@ class EvaluationService:
                     
                 except Exception as e:
                     db.rollback()
-                    logging.error(f"Error processing submission {file_sub_id}: {e}")
+                    logger.error("Error processing submission %s: %s", file_sub_id, e)
                     
                     # Try to mark as error
                     try:
@@ -377,7 +399,7 @@ class EvaluationService:
             return results
             
         except Exception as e:
-            logging.error(f"Error in batch evaluation: {e}")
+            logger.error("Error in batch evaluation: %s", e)
             return {
                 'grades_created': results['grades_created'],
                 'grades_updated': results['grades_updated'],
@@ -387,6 +409,113 @@ class EvaluationService:
         finally:
             db.close()
     
+    @staticmethod
+    def _evaluate_text(text: str, evaluator_id: str, include_validation: bool = False) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Evaluate extracted text with LAMB, respecting the evaluator token budget
+        
+        Documents within budget are sent as a single prompt. Documents over
+        budget are split into chunks that are evaluated concurrently (map) and
+        then combined into a single score and comment (reduce).
+        
+        Args:
+            text: Extracted document text
+            evaluator_id: LAMB evaluator ID
+            include_validation: Whether to attach the response format validation
+            
+        Returns:
+            Tuple of (raw LAMB response, parsed result)
+        """
+        plan = PromptBuilder.build_prompts(text, evaluator_id)
+        
+        if not plan['chunked']:
+            lamb_response = LAMBAPIService.evaluate_text(text=plan['prompts'][0], evaluator_id=evaluator_id)
+            return lamb_response, LAMBAPIService.parse_evaluation_response(lamb_response, include_validation)
+        
+        prompts = plan['prompts']
+        logger.info(
+            "Document exceeds token budget (%s > %s), evaluating in %s chunks",
+            plan['total_tokens'], plan['token_budget'], len(prompts)
+        )
+        
+        def evaluate_chunk(prompt: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+            chunk_response = LAMBAPIService.evaluate_text(text=prompt, evaluator_id=evaluator_id)
+            return chunk_response, LAMBAPIService.parse_evaluation_response(chunk_response, include_validation)
+        
+        max_workers = max(1, min(LAMB_CHUNK_CONCURRENCY, len(prompts)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            chunk_results = list(executor.map(tracing.bind_context(evaluate_chunk), prompts))
+        
+        lamb_response = {
+            'success': all(response.get('success') for response, _ in chunk_results),
+            'chunked': True,
+            'responses': [response for response, _ in chunk_results]
+        }
+        parsed = EvaluationService._combine_chunk_results(
+            [chunk_parsed for _, chunk_parsed in chunk_results],
+            plan['token_estimates']
+        )
+        return lamb_response, parsed
+    
+    @staticmethod
+    def _combine_chunk_results(chunk_results: List[Dict[str, Any]], weights: List[int]) -> Dict[str, Any]:
+        """Combine the partial evaluations of a chunked document
+        
+        The score of each part is the one parsed from its response (re-extracted
+        from the raw response when the parser found none) and the final
+        score is the average weighted by the size of each part. Parts without a
+        recognizable score do not contribute to the average.
+        
+        Args:
+            chunk_results: Parsed result of each chunk, in document order
+            weights: Estimated token count of each chunk
+            
+        Returns:
+            Parsed result with the same shape as parse_evaluation_response
+        """
+        total = len(chunk_results)
+        failed = [index for index, result in enumerate(chunk_results, start=1) if not result.get('success')]
+        if failed:
+            errors = '; '.join(
+                f"part {index}/{total}: {chunk_results[index - 1].get('error', 'Unknown error')}"
+                for index in failed
+            )
+            return {
+                'success': False,
+                'error': f"Chunked evaluation failed ({errors})",
+                'score': None,
+                'comment': None,
+                'chunks': total
+            }
+        
+        weighted_sum = 0.0
+        weight_total = 0
+        sections = []
+        
+        for index, (result, weight) in enumerate(zip(chunk_results, weights), start=1):
+            feedback = result.get('comment') or ''
+            # Structured (JSON) responses carry the score apart from the feedback
+            partial_score = result.get('score')
+            if partial_score is None:
+                partial_score = LAMBAPIService._extract_score_and_feedback(
+                    result.get('raw_response') or feedback
+                )['score']
+            if partial_score is not None:
+                weighted_sum += partial_score * weight
+                weight_total += weight
+            sections.append(f"### [{index}/{total}]\n{feedback.strip()}")
+        
+        score = round(weighted_sum / weight_total, 2) if weight_total else None
+        comment = '\n\n'.join(sections)
+        
+        return {
+            'success': True,
+            'score': score,
+            'comment': comment,
+            'raw_response': comment,
+            'chunks': total,
+            'json_validation': chunk_results[0].get('json_validation', {})
+        }
+    
     @staticmethod
     def reset_stuck_evaluations(activity_id: str, activity_moodle_id: str) -> int:
         """Reset evaluations that have been stuck in processing for too long
@@ -419,7 +548,7 @@ class EvaluationService:
             return count
         except Exception as e:
             db.rollback()
-            logging.error(f"Error resetting stuck evaluations: {e}")
+            logger.error("Error resetting stuck evaluations: %s", e)
             return 0
         finally:
             db.close()
@@ -448,7 +577,24 @@ class EvaluationService:
             return count
         except Exception as e:
             db.rollback()
-            logging.error(f"Error clearing evaluation status: {e}")
+            logger.error("Error clearing evaluation status: %s", e)
             return 0
         finally:
             db.close()
+    
+    @staticmethod
+    def get_queue_depth() -> Dict[str, int]:
+        """Count file submissions per evaluation status across all activities
+        
+        Returns:
+            Dictionary status -> count ('none' for never evaluated)
+        """
+        db = get_db_session()
+        try:
+            rows = db.query(
+                FileSubmissionDB.evaluation_status,
+                func.count(FileSubmissionDB.id)
+            ).group_by(FileSubmissionDB.evaluation_status).all()
+            return {status or 'none': count for status, count in rows}
+        finally:
+            db.close()
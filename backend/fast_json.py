@@ -0,0 +1,42 @@
+"""
+Fast JSON - orjson serialization with a standard-library fallback
+
+Handles:
+- dumps(): compact UTF-8 JSON bytes, through orjson when installed (several
+  times faster on large documents) and json otherwise, with the same output
+  for the types the API returns (str, numbers, bool, None, lists, dicts)
+- FastJSONResponse: the app's default response class
+
+Endpoints returning large lists build plain dicts (datetimes already as
+strings) and return FastJSONResponse directly: FastAPI then skips
+jsonable_encoder, which walks every value of the document once more.
+"""
+
+import json
+import logging
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    logger.info("orjson not available. JSON responses use the json module.")
+
+
+def dumps(content: Any) -> bytes:
+    """Compact JSON (non-ASCII characters as UTF-8, like Starlette's JSONResponse)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by dumps()"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
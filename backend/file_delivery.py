@@ -0,0 +1,249 @@
+"""
+File Delivery - Download responses for stored submission files
+
+Handles:
+- Strong ETags (SHA-256 of the content) and Last-Modified validators
+- Conditional GET (If-None-Match / If-Modified-Since -> 304)
+- Single byte ranges (Range / If-Range -> 206, 416 when unsatisfiable)
+- Optional offload to a fronting proxy (X-Accel-Redirect for nginx,
+  X-Sendfile for Apache/lighttpd) so Python is not in the data path
+- Remote storage backends: redirect to a presigned URL, or stream the
+  object through the app
+- Files compressed at rest: sent as stored (Content-Encoding) to clients
+  that accept the encoding, decompressed on the fly otherwise and for ranges
+
+Stored files are immutable (a resubmission gets a new path), so the
+content hash identifies the bytes for good and clients only revalidate.
+"""
+
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+
+from storage_backends import ObjectStat, StorageBackend
+from storage_service import gunzip_chunks
+
+# Offload mode: '' (serve from Python), 'x-accel-redirect' or 'x-sendfile'
+FILE_OFFLOAD = os.getenv('FILE_OFFLOAD', '').strip().lower()
+# Internal nginx location mapped to the uploads root (X-Accel-Redirect only)
+FILE_OFFLOAD_PREFIX = os.getenv('FILE_OFFLOAD_PREFIX', '/protected-uploads').rstrip('/')
+# Remote backends: redirect downloads to a presigned URL valid this many seconds (0 = stream through the app)
+FILE_PRESIGNED_EXPIRES = int(os.getenv('FILE_PRESIGNED_EXPIRES', '300'))
+# Downloads are access-controlled: never stored by shared caches, always revalidated
+FILE_CACHE_CONTROL = 'private, no-cache'
+
+
+def etag_for(content_hash: str, encoding: Optional[str] = None) -> str:
+    """Strong ETag of a representation (the encoded one gets its own)"""
+    return f'"{content_hash}-{encoding}"' if encoding else f'"{content_hash}"'
+
+
+def weak_etag_for(stat: ObjectStat, encoding: Optional[str] = None) -> str:
+    """Weak ETag from size and modification time, for files without a known content hash"""
+    opaque = f'{stat.size}-{int(stat.modified)}'
+    return f'W/"{opaque}-{encoding}"' if encoding else f'W/"{opaque}"'
+
+
+def accepts_encoding(request: Request, encoding: str) -> bool:
+    """Whether Accept-Encoding allows `encoding` (q > 0), by name or through '*'"""
+    weights = {}
+    for item in request.headers.get('accept-encoding', '').split(','):
+        name, _, params = item.partition(';')
+        weight = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if name.strip():
+            weights[name.strip().lower()] = weight
+    return weights.get(encoding, weights.get('*', 0.0)) > 0
+
+
+def content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match comparison (weak: W/ prefixes are ignored)"""
+    if header.strip() == '*':
+        return True
+    opaque = etag.removeprefix('W/')
+    return any(candidate.strip().removeprefix('W/') == opaque for candidate in header.split(','))
+
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since
+
+
+def is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """RFC 9110: If-None-Match wins over If-Modified-Since when both are sent"""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get('if-modified-since')
+    return if_modified_since is not None and _not_modified_since(if_modified_since, mtime)
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) inclusive of a single `bytes=` range, or None to send the whole file
+
+    Multiple ranges and malformed headers are ignored (RFC 9110 allows it).
+
+    Raises:
+        ValueError: If the range is not satisfiable (-> 416)
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, dash, last = spec.strip().partition('-')
+    if not dash or not all(part == '' or part.isdigit() for part in (first, last)) or first == last == '':
+        return None
+    if first == '':
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Rango no satisfacible")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("Rango no satisfacible")
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def _if_range_allows(request: Request, etag: str, mtime: float) -> bool:
+    """A Range is honoured only if If-Range (when sent) still matches the file"""
+    if_range = request.headers.get('if-range')
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(('"', 'W/')):
+        return not etag.startswith('W/') and if_range == etag  # strong comparison
+    try:
+        return int(mtime) == int(parsedate_to_datetime(if_range).timestamp())
+    except (TypeError, ValueError):
+        return False
+
+
+def _offload_headers(key: str, local_path: Optional[str]) -> dict:
+    if local_path is None:
+        return {}
+    if FILE_OFFLOAD == 'x-accel-redirect':
+        return {'X-Accel-Redirect': quote(f'{FILE_OFFLOAD_PREFIX}/{key}')}
+    if FILE_OFFLOAD == 'x-sendfile':
+        return {'X-Sendfile': local_path}
+    return {}
+
+
+def file_response(
+    request: Request,
+    key: str,
+    *,
+    backend: StorageBackend,
+    stat: ObjectStat,
+    filename: str,
+    media_type: str,
+    content_hash: Optional[str]
+) -> Response:
+    """
+    Download response for a stored file with validators, ranges and optional offload
+
+    Blocking for remote backends (presigning is local, but streamed bodies
+    and ranges read from the store): call it from a worker thread.
+
+    Args:
+        request: Incoming request (conditional, Range and Accept-Encoding headers)
+        key: Backend key of the file
+        backend: Storage backend holding it
+        stat: Its size and modification time (from FileStorageService.stat:
+            decoded size and encoding at rest for compressed files)
+        filename: Download name (Content-Disposition)
+        media_type: Content-Type of the body
+        content_hash: SHA-256 of the file content (strong ETag); None for files
+            without a submission row, which get a weak ETag from size and mtime
+    """
+    stored_encoding = stat.encoding
+    # Stored bytes go out as they are when the client accepts their encoding;
+    # ranges always refer to the decoded representation
+    send_encoded = (
+        stored_encoding is not None
+        and not request.headers.get('range')
+        and accepts_encoding(request, stored_encoding)
+    )
+    sent_encoding = stored_encoding if send_encoded else None
+    etag = etag_for(content_hash, sent_encoding) if content_hash else weak_etag_for(stat, sent_encoding)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': formatdate(stat.modified, usegmt=True),
+        'Cache-Control': FILE_CACHE_CONTROL,
+        'Accept-Ranges': 'bytes',
+    }
+    if stored_encoding is not None:
+        headers['Vary'] = 'Accept-Encoding'
+
+    if is_not_modified(request, etag, stat.modified):
+        return Response(status_code=304, headers=headers)
+
+    headers['Content-Disposition'] = content_disposition(filename)
+    local_path = backend.local_path(key)
+    if send_encoded:
+        headers['Content-Encoding'] = stored_encoding
+        if local_path is not None:
+            return FileResponse(local_path, headers=headers, media_type=media_type)
+        if FILE_PRESIGNED_EXPIRES > 0:
+            url = backend.presigned_url(key, FILE_PRESIGNED_EXPIRES, content_disposition=headers['Content-Disposition'],
+                                        media_type=media_type, content_encoding=stored_encoding)
+            if url:
+                return RedirectResponse(url, status_code=307, headers={'Cache-Control': 'private, no-store'})
+        headers['Content-Length'] = str(stat.stored_size)
+        return StreamingResponse(backend.iter_bytes(key), headers=headers, media_type=media_type)
+
+    if stored_encoding is None:
+        offload = _offload_headers(key, local_path)
+        if offload:
+            # The proxy serves the bytes (and answers Range requests itself)
+            return Response(status_code=200, headers={**headers, **offload}, media_type=media_type)
+        if local_path is None and FILE_PRESIGNED_EXPIRES > 0:
+            url = backend.presigned_url(key, FILE_PRESIGNED_EXPIRES, content_disposition=headers['Content-Disposition'],
+                                        media_type=media_type)
+            if url:
+                # The object store serves the bytes (and ranges); the URL itself must not be cached
+                return RedirectResponse(url, status_code=307, headers={'Cache-Control': 'private, no-store'})
+
+    def read(start: int = 0, end: Optional[int] = None):
+        if stored_encoding is None:
+            return backend.iter_bytes(key, start, end)
+        return gunzip_chunks(backend.iter_bytes(key), start, end)
+
+    size = stat.size
+    range_header = request.headers.get('range')
+    if range_header and _if_range_allows(request, etag, stat.modified):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+        if byte_range is not None:
+            start, end = byte_range
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+            headers['Content-Length'] = str(end - start + 1)
+            return StreamingResponse(read(start, end), status_code=206, headers=headers, media_type=media_type)
+
+    if local_path is not None and stored_encoding is None:
+        return FileResponse(local_path, headers=headers, media_type=media_type)
+    headers['Content-Length'] = str(size)
+    return StreamingResponse(read(), headers=headers, media_type=media_type)
@@ -0,0 +1,167 @@
+"""
+Frontend Assets - Serving the SvelteKit build (frontend/build)
+
+Handles:
+- Precompressed variants: the <file>.br / <file>.gz written next to each
+  asset by adapter-static (precompress: true) are sent as they are to
+  clients whose Accept-Encoding allows them, so nothing is compressed per
+  request
+- Cache-Control: fingerprinted files under app/immutable/ never change
+  (immutable, one year); other static files are cached for
+  FRONTEND_ASSET_MAX_AGE seconds
+- index.html (every SPA route), config.js and favicon.png kept in memory
+  with a strong ETag and their compressed copies, reloaded only when the
+  file changes on disk; index.html and config.js are always revalidated,
+  so a deployment is picked up on the next load
+
+Inside a Moodle iframe every launch loads index.html, config.js and the
+entry chunks: after the first visit they are 304s or browser cache hits.
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+from dataclasses import dataclass
+from email.utils import formatdate
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from file_delivery import accepts_encoding, etag_for, is_not_modified
+
+logger = logging.getLogger(__name__)
+
+# Seconds browsers may reuse non-fingerprinted static files (images, favicon) without revalidating
+FRONTEND_ASSET_MAX_AGE = int(os.getenv('FRONTEND_ASSET_MAX_AGE', '3600'))
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+# Content-hashed file names (SvelteKit appDir 'app' -> /app/immutable/...)
+IMMUTABLE_DIRNAME = 'immutable'
+# Precompressed variants, preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# Worth compressing in memory when the build has no .gz next to the file
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+def static_cache_control() -> str:
+    return f'public, max-age={FRONTEND_ASSET_MAX_AGE}'
+
+
+def _preferred_variant(request: Request, available) -> Optional[str]:
+    """First encoding of ENCODINGS that the client accepts and `available` contains"""
+    for encoding, _ in ENCODINGS:
+        if encoding in available and accepts_encoding(request, encoding):
+            return encoding
+    return None
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles sending build-time .br/.gz variants and long-lived cache headers"""
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        variants = {}
+        for encoding, suffix in ENCODINGS:
+            try:
+                variant_stat = os.stat(f"{full_path}{suffix}")
+            except OSError:
+                continue
+            # A variant older than its source is stale (partial redeploy): ignore it
+            if variant_stat.st_mtime >= stat_result.st_mtime:
+                variants[encoding] = variant_stat
+        encoding = _preferred_variant(Request(scope), variants)
+
+        response = FileResponse(
+            f"{full_path}{dict(ENCODINGS)[encoding]}" if encoding else full_path,
+            status_code=status_code,
+            stat_result=variants[encoding] if encoding else stat_result,
+            media_type=mimetypes.guess_type(str(full_path))[0] or 'text/plain'
+        )
+        if encoding:
+            response.headers['content-encoding'] = encoding
+        if variants:
+            response.headers['vary'] = 'Accept-Encoding'
+        relative = os.path.relpath(full_path, str(self.directory)).replace(os.sep, '/')
+        response.headers['cache-control'] = (
+            IMMUTABLE_CACHE_CONTROL if relative.startswith(f'{IMMUTABLE_DIRNAME}/') else static_cache_control()
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+@dataclass(frozen=True)
+class _Loaded:
+    signature: Tuple[int, int]  # (mtime_ns, size) of the source file
+    mtime: float
+    content_hash: str
+    bodies: Dict[Optional[str], bytes]  # encoding (None = identity) -> bytes
+
+
+class MemoryAsset:
+    """A small build file served from memory (index.html, config.js, favicon.png)"""
+
+    def __init__(self, path: str, media_type: str, cache_control: str = REVALIDATE_CACHE_CONTROL):
+        self.path = path
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self._loaded: Optional[_Loaded] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Optional[_Loaded]:
+        """Current contents: one stat per request, the file is read again only when it changed"""
+        try:
+            stat_result = os.stat(self.path)
+        except OSError:
+            return None
+        signature = (stat_result.st_mtime_ns, stat_result.st_size)
+        loaded = self._loaded
+        if loaded is not None and loaded.signature == signature:
+            return loaded
+        with self._lock:
+            if self._loaded is not None and self._loaded.signature == signature:
+                return self._loaded
+            with open(self.path, 'rb') as source:
+                data = source.read()
+            bodies: Dict[Optional[str], bytes] = {None: data}
+            for encoding, suffix in ENCODINGS:
+                variant = f"{self.path}{suffix}"
+                if os.path.isfile(variant) and os.stat(variant).st_mtime_ns >= stat_result.st_mtime_ns:
+                    with open(variant, 'rb') as source:
+                        bodies[encoding] = source.read()
+            if 'gzip' not in bodies and self.media_type.startswith(COMPRESSIBLE_TYPES):
+                compressed = gzip.compress(data, compresslevel=9, mtime=0)
+                if len(compressed) < len(data):
+                    bodies['gzip'] = compressed
+            self._loaded = _Loaded(signature, stat_result.st_mtime, hashlib.sha256(data).hexdigest()[:32], bodies)
+            logger.debug(f"Recurso del frontend cargado en memoria: {self.path} ({len(data)} bytes)")
+            return self._loaded
+
+    def response(self, request: Request) -> Optional[Response]:
+        """200 or 304 with the best representation for the request (None if the file does not exist)"""
+        loaded = self._load()
+        if loaded is None:
+            return None
+        encoding = _preferred_variant(request, loaded.bodies)
+        etag = etag_for(loaded.content_hash, encoding)
+        headers = {
+            'ETag': etag,
+            'Last-Modified': formatdate(loaded.mtime, usegmt=True),
+            'Cache-Control': self.cache_control,
+        }
+        if len(loaded.bodies) > 1:
+            headers['Vary'] = 'Accept-Encoding'
+        if is_not_modified(request, etag, loaded.mtime):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return Response(loaded.bodies[encoding], media_type=self.media_type, headers=headers)
@@ -0,0 +1,240 @@
+"""
+Service for exporting grades and AI feedback of an activity or a whole course.
+Rows come from one joined query read with a server-side cursor (yield_per) and are
+written incrementally as CSV or XLSX, so large exports start downloading at once
+and use bounded memory.
+"""
+
+import csv
+import io
+import os
+import re
+import zipfile
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from xml.sax.saxutils import escape
+
+from sqlalchemy import and_, select
+
+from database import get_db_session
+from db_models import ActivityDB, FileSubmissionDB, GradeDB, StudentSubmissionDB, UserDB
+from storage_service import FileStorageService
+from zip_stream import ZipEntry, iter_zip
+
+# Rows fetched from the cursor per batch (one CSV/XLSX chunk per batch)
+GRADE_EXPORT_BATCH = int(os.getenv('GRADE_EXPORT_BATCH', '500'))
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# (header, selected column), one row per student
+EXPORT_COLUMNS = (
+    ('course_id', ActivityDB.course_id),
+    ('activity_id', ActivityDB.id),
+    ('activity_title', ActivityDB.title),
+    ('group_code', FileSubmissionDB.group_code),
+    ('group_name', FileSubmissionDB.group_display_name),
+    ('student_id', StudentSubmissionDB.student_id),
+    ('student_name', UserDB.full_name),
+    ('email', UserDB.email),
+    ('file_name', FileSubmissionDB.file_name),
+    ('uploaded_at', FileSubmissionDB.uploaded_at),
+    ('ai_score', GradeDB.ai_score),
+    ('ai_comment', GradeDB.ai_comment),
+    ('ai_evaluated_at', GradeDB.ai_evaluated_at),
+    ('score', GradeDB.score),
+    ('comment', GradeDB.comment),
+    ('sent_to_moodle', StudentSubmissionDB.sent_to_moodle),
+    ('sent_to_moodle_at', StudentSubmissionDB.sent_to_moodle_at),
+)
+EXPORT_HEADERS = [header for header, _ in EXPORT_COLUMNS]
+
+# Leading characters that make spreadsheet applications evaluate a CSV cell
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# Characters not allowed in XML 1.0
+_XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def _cell_text(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ', timespec='seconds')
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def iter_csv(batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """CSV (UTF-8 with BOM, so spreadsheet applications detect the encoding), one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADERS)
+    yield '\ufeff'.encode('utf-8') + buffer.getvalue().encode('utf-8')
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        for row in batch:
+            cells = [_cell_text(value) for value in row]
+            writer.writerow([
+                "'" + cell if isinstance(value, str) and cell.startswith(_FORMULA_PREFIXES) else cell
+                for value, cell in zip(row, cells)
+            ])
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _column_letter(index: int) -> str:
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_row(number: int, row: Iterable[Any]) -> str:
+    cells = []
+    for index, value in enumerate(row):
+        if value is None:
+            continue
+        ref = f'{_column_letter(index)}{number}'
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c r="{ref}"><v>{value!r}</v></c>')
+        else:
+            text = escape(_XML_INVALID.sub('', _cell_text(value)))
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+def _xlsx_sheet(batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    yield (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+        + _xlsx_row(1, EXPORT_HEADERS)
+    ).encode('utf-8')
+    number = 1
+    for batch in batches:
+        rows = []
+        for row in batch:
+            number += 1
+            rows.append(_xlsx_row(number, row))
+        yield ''.join(rows).encode('utf-8')
+    yield b'</sheetData></worksheet>'
+
+
+_XLSX_PARTS = (
+    ('[Content_Types].xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/xl/workbook.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+     '<Override PartName="/xl/worksheets/sheet1.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+     '</Types>'),
+    ('_rels/.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+     'Target="xl/workbook.xml"/></Relationships>'),
+    ('xl/workbook.xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+     '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+     'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+     '<sheets><sheet name="Notas" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    ('xl/_rels/workbook.xml.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+     'Target="worksheets/sheet1.xml"/></Relationships>'),
+)
+
+
+def iter_xlsx(batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """Minimal XLSX workbook (one sheet, inline strings) streamed through zip_stream"""
+    entries = [
+        ZipEntry(name, chunks=[content.encode('utf-8')], compress_type=zipfile.ZIP_DEFLATED, zip64=False)
+        for name, content in _XLSX_PARTS
+    ]
+    entries.append(ZipEntry(
+        'xl/worksheets/sheet1.xml', chunks=_xlsx_sheet(batches), compress_type=zipfile.ZIP_DEFLATED, zip64=False
+    ))
+    return iter_zip(entries)
+
+
+class GradeExportService:
+    """Service for grade exports"""
+
+    @staticmethod
+    def build_query(activity_moodle_id: str, activity_id: Optional[str] = None, course_id: Optional[str] = None):
+        """
+        One row per student submission with its file, user and (optional) grade
+
+        Args:
+            activity_moodle_id: Moodle instance ID
+            activity_id: Only this activity
+            course_id: Only activities of this course
+        """
+        query = select(*(column for _, column in EXPORT_COLUMNS)).select_from(StudentSubmissionDB).join(
+            FileSubmissionDB, FileSubmissionDB.id == StudentSubmissionDB.file_submission_id
+        ).join(
+            ActivityDB, and_(
+                ActivityDB.id == StudentSubmissionDB.activity_id,
+                ActivityDB.course_moodle_id == StudentSubmissionDB.activity_moodle_id
+            )
+        ).outerjoin(
+            UserDB, and_(
+                UserDB.id == StudentSubmissionDB.student_id,
+                UserDB.moodle_id == StudentSubmissionDB.student_moodle_id
+            )
+        ).outerjoin(
+            GradeDB, GradeDB.file_submission_id == FileSubmissionDB.id
+        ).where(StudentSubmissionDB.activity_moodle_id == activity_moodle_id)
+        if activity_id is not None:
+            query = query.where(StudentSubmissionDB.activity_id == activity_id)
+        if course_id is not None:
+            query = query.where(ActivityDB.course_id == course_id)
+        return query.order_by(
+            ActivityDB.title, ActivityDB.id, FileSubmissionDB.uploaded_at, FileSubmissionDB.id, UserDB.full_name
+        )
+
+    @staticmethod
+    def iter_batches(query) -> Iterator[List[tuple]]:
+        """Rows of `query` in batches of GRADE_EXPORT_BATCH (server-side cursor, session closed at the end)"""
+        db = get_db_session()
+        try:
+            result = db.execute(query.execution_options(yield_per=GRADE_EXPORT_BATCH))
+            for batch in result.partitions():
+                yield [tuple(row) for row in batch]
+        finally:
+            db.close()
+
+    @staticmethod
+    def export(fmt: str, activity_moodle_id: str, activity_id: Optional[str] = None,
+               course_id: Optional[str] = None) -> Iterator[bytes]:
+        """
+        Byte chunks of the export in `fmt` ('csv' or 'xlsx')
+
+        The query only runs when the first chunk is requested.
+
+        Raises:
+            ValueError: If the format is not supported
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Formato no soportado: {fmt} (permitidos: {', '.join(EXPORT_FORMATS)})")
+        batches = GradeExportService.iter_batches(
+            GradeExportService.build_query(activity_moodle_id, activity_id=activity_id, course_id=course_id)
+        )
+        return iter_csv(batches) if fmt == 'csv' else iter_xlsx(batches)
+
+    @staticmethod
+    def response_headers(fmt: str, base_name: str) -> Dict[str, str]:
+        """Media type and Content-Disposition of an export download"""
+        filename = FileStorageService.sanitize_filename(f"{base_name}_notas.{fmt}")
+        return {'Content-Type': EXPORT_FORMATS[fmt], 'Content-Disposition': f'attachment; filename="{filename}"'}
+
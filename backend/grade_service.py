@@ -9,6 +9,9 @@ from db_models import GradeDB, FileSubmissionDB, ActivityDB
 from database import get_db_session
 from document_extractor import DocumentExtractor
 from lamb_api_service import LAMBAPIService
+from storage_service import FileStorageService
+
+logger = logging.getLogger(__name__)
 
 def is_debug_mode() -> bool:
     """Check if debug mode is enabled via environment variable"""
@@ -163,7 +166,7 @@ class GradeService:
             if not verification["success"]:
                 raise ValueError(verification["error"])
             
-            logging.info(f"Using LAMB model {verification['model_id']} for evaluation")
+            logger.info("Using LAMB model %s for evaluation", verification['model_id'])
             
             # Get file submissions to evaluate
             query = db.query(FileSubmissionDB).filter(
@@ -177,14 +180,14 @@ class GradeService:
                 file_submissions = query.filter(
                     FileSubmissionDB.id.in_(file_submission_ids)
                 ).all()
-                logging.info(f"Evaluating {len(file_submissions)} specific submissions (including previously graded)")
+                logger.info("Evaluating %s specific submissions (including previously graded)", len(file_submissions))
             else:
                 # Otherwise, get all file submissions (including those with grades for re-evaluation)
                 file_submissions = query.all()
-                logging.info(f"Evaluating all {len(file_submissions)} submissions for activity")
+                logger.info("Evaluating all %s submissions for activity", len(file_submissions))
 
             if not file_submissions:
-                logging.info(f"No submissions found for activity {activity_id}")
+                logger.info("No submissions found for activity %s", activity_id)
                 return {
                     'grades': [], 
                     'debug_info': [] if debug_mode else None,
@@ -199,7 +202,7 @@ class GradeService:
             )
             re_evaluation_count = len(existing_grade_ids)
 
-            logging.info(f"Processing {len(file_submissions)} submissions with LAMB ({re_evaluation_count} re-evaluations)")
+            logger.info("Processing %s submissions with LAMB (%s re-evaluations)", len(file_submissions), re_evaluation_count)
             created_grades = []
             updated_grades = []
             debug_info_list = [] if debug_mode else None
@@ -236,7 +239,7 @@ class GradeService:
                             created_at=datetime.now(timezone.utc)
                         )
                         updated_grades.append(grade)
-                        logging.info(f"Grade UPDATED for submission {file_submission.id}: {grade_result['score']}/10")
+                        logger.info("Grade UPDATED for submission %s: %s/10", file_submission.id, grade_result['score'])
                     else:
                         # Create new grade
                         grade_id = str(uuid.uuid4())
@@ -257,11 +260,11 @@ class GradeService:
                             created_at=datetime.now(timezone.utc)
                         )
                         created_grades.append(grade)
-                        logging.info(f"Grade CREATED for submission {file_submission.id}: {grade_result['score']}/10")
+                        logger.info("Grade CREATED for submission %s: %s/10", file_submission.id, grade_result['score'])
                     
                 except Exception as e:
                     error_msg = f"Error evaluating submission {file_submission.id}: {str(e)}"
-                    logging.error(error_msg)
+                    logger.error(error_msg)
                     errors.append(error_msg)
                     continue
             
@@ -269,7 +272,7 @@ class GradeService:
             
             # Log summary
             if errors:
-                logging.warning(f"Completed with {len(errors)} errors: {'; '.join(errors)}")
+                logger.warning("Completed with %s errors: %s", len(errors), '; '.join(errors))
             
             return {
                 'grades': created_grades,
@@ -304,29 +307,30 @@ class GradeService:
                 'parsed_response': None
             }
         
-        # Get absolute path to file
-        # Assuming file_path is relative to uploads directory
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        file_abs_path = os.path.join(base_dir, file_submission.file_path)
-        
-        logging.info(f"Extracting text from: {file_abs_path}")
+        logger.info("Extracting text from: %s", file_submission.file_path, extra={'sample': 'extract_text'})
         
-        # Extract text from document
-        extracted_text = DocumentExtractor.extract_text_from_file(file_abs_path)
+        # Extract text from document (read through the storage backend, decoded if compressed at rest)
+        try:
+            seekable = DocumentExtractor.requires_seek(file_submission.file_path)
+            with FileStorageService.open_file(file_submission.file_path, seekable=seekable) as stream:
+                extracted_text = DocumentExtractor.extract_text_from_file(file_submission.file_path, stream)
+        except OSError as e:
+            logger.error("Error reading %s: %s", file_submission.file_path, e)
+            extracted_text = None
         
         if debug_info:
             # Truncate extracted text for debug to avoid huge responses
             debug_info['extracted_text'] = extracted_text[:2000] + '...' if extracted_text and len(extracted_text) > 2000 else extracted_text
         
         if not extracted_text or not extracted_text.strip():
-            logging.warning(f"Could not extract text from {file_submission.file_name}")
+            logger.warning("Could not extract text from %s", file_submission.file_name)
             return {
                 'score': 5.0,
                 'comment': "No se pudo extraer texto del documento para evaluar. Verifica el formato del archivo.",
                 'debug_info': debug_info
             }
         
-        logging.info(f"Extracted {len(extracted_text)} characters from document")
+        logger.debug("Extracted %s characters from document", len(extracted_text))
         
         # Send to LAMB for evaluation
         lamb_result = LAMBAPIService.evaluate_text(extracted_text, evaluator_id)
@@ -335,7 +339,7 @@ class GradeService:
             debug_info['lamb_raw_response'] = lamb_result.get('response') if lamb_result.get('success') else lamb_result.get('error')
         
         if not lamb_result['success']:
-            logging.error(f"LAMB evaluation failed: {lamb_result['error']}")
+            logger.error("LAMB evaluation failed: %s", lamb_result['error'])
             return {
                 'score': 5.0,
                 'comment': f"Error en la evaluación automática: {lamb_result['error']}",
@@ -343,7 +347,7 @@ class GradeService:
             }
         
         # Parse LAMB response
-        parsed = LAMBAPIService.parse_evaluation_response(lamb_result['response'])
+        parsed = LAMBAPIService.parse_evaluation_response(lamb_result['response'], include_validation=debug_info is not None)
         
         if debug_info:
             debug_info['parsed_response'] = parsed
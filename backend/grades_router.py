@@ -1,9 +1,12 @@
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from datetime import datetime, timezone
 import logging
 
 from models import GradeRequest, GradeUpdate, GradeResponse
 from grade_service import GradeService
+from grade_export_service import GradeExportService, EXPORT_FORMATS
+from activities_service import ActivitiesService
 from database import get_db
 from db_models import GradeDB, FileSubmissionDB
 
@@ -137,3 +140,54 @@ async def accept_all_ai_grades(activity_id: str, request: Request):
         logging.error(f"Error accepting AI grades: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
+
+
+def _grade_export_response(lti_data: dict, format: str, activity_id: str = None):
+    """Streamed CSV/XLSX export of one activity or of the course of the LTI session"""
+    if not check_teacher_role(lti_data):
+        raise HTTPException(status_code=403, detail="Solo profesores pueden exportar calificaciones")
+    
+    moodle_id = lti_data.get('tool_consumer_instance_guid')
+    if not moodle_id:
+        raise HTTPException(status_code=400, detail="No se encontró ID de Moodle en la sesión")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {format} (permitidos: {', '.join(EXPORT_FORMATS)})")
+    
+    if activity_id is not None:
+        activity = ActivitiesService.get_activity_by_id(activity_id, moodle_id)
+        if not activity:
+            raise HTTPException(status_code=404, detail="Actividad no encontrada")
+        chunks = GradeExportService.export(format, moodle_id, activity_id=activity_id)
+        base_name = activity.title or activity_id
+    else:
+        course_id = lti_data.get('context_id')
+        if not course_id:
+            raise HTTPException(status_code=400, detail="No se encontró el curso en la sesión")
+        chunks = GradeExportService.export(format, moodle_id, course_id=course_id)
+        base_name = lti_data.get('context_title') or course_id
+    
+    return StreamingResponse(chunks, headers=GradeExportService.response_headers(format, base_name))
+
+
+@router.get("/activity/{activity_id}/export")
+async def export_activity_grades(activity_id: str, request: Request, format: str = "csv"):
+    """Exporta notas y feedback de IA de una actividad (CSV o XLSX, en streaming)"""
+    try:
+        return _grade_export_response(get_lti_session_data(request), format, activity_id=activity_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error exportando calificaciones: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
+
+@router.get("/course/export")
+async def export_course_grades(request: Request, format: str = "csv"):
+    """Exporta notas y feedback de IA de todas las actividades del curso de la sesión LTI"""
+    try:
+        return _grade_export_response(get_lti_session_data(request), format)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error exportando calificaciones: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
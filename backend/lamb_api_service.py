@@ -3,12 +3,17 @@ LAMB API Service - Comunica con la API de evaluación LAMB
 """
 import os
 import logging
+import threading
+import time
 import requests
-import re
 from typing import Dict, Any, Optional
-from dotenv import load_dotenv
+import config  # Load environment variables via load_dotenv() (once, in config)
+import lamb_recorder
+import metrics
+import tracing
+from lamb_response_parser import LAMBResponseParser
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 class LAMBAPIService:
     """Servicio para interactuar con la API LAMB"""
@@ -16,18 +21,73 @@ class LAMBAPIService:
     LAMB_API_URL = os.getenv('LAMB_API_URL', 'http://lamb.lamb-project.org:9099')
     LAMB_BEARER_TOKEN = os.getenv('LAMB_BEARER_TOKEN', '0p3n-w3bu!-wasabi')
     LAMB_TIMEOUT = int(os.getenv('LAMB_TIMEOUT', '30'))
+    # Keep-alive connections kept per LAMB host (concurrent evaluations beyond it open extra ones)
+    LAMB_POOL_SIZE = int(os.getenv('LAMB_POOL_SIZE', '10'))
+    
+    _session: Optional[requests.Session] = None
+    _session_lock = threading.Lock()
+    
+    @staticmethod
+    def session() -> requests.Session:
+        """Shared HTTP session: connections (TCP + TLS) to LAMB are reused between requests"""
+        if LAMBAPIService._session is None:
+            with LAMBAPIService._session_lock:
+                if LAMBAPIService._session is None:
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=LAMBAPIService.LAMB_POOL_SIZE)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    LAMBAPIService._session = session
+        return LAMBAPIService._session
+    
+    @staticmethod
+    def _request(method: str, endpoint: str, url: str, **kwargs) -> requests.Response:
+        """Perform an HTTP request to LAMB recording latency and result metrics
+        
+        The result label is the HTTP status code, or 'timeout' /
+        'connection_error' / 'error' when no response was received.
+        In replay mode the response comes from the recorded store
+        (LAMB_REPLAY_PATH); in recording mode it is also stored there
+        (LAMB_RECORD_PATH). See lamb_recorder.
+        """
+        start = time.perf_counter()
+        code = 'error'
+        lamb_span = tracing.span(f'lamb.{endpoint}', tracing.KIND_CLIENT, **{'http.method': method, 'http.url': url})
+        with lamb_span:
+            if lamb_span.traceparent:
+                kwargs['headers'] = {**kwargs.get('headers', {}), 'traceparent': lamb_span.traceparent}
+            try:
+                if lamb_recorder.is_replaying():
+                    response = lamb_recorder.replay(method, url, kwargs.get('json'))
+                else:
+                    response = LAMBAPIService.session().request(method, url, **kwargs)
+                    if lamb_recorder.is_recording():
+                        lamb_recorder.record(method, url, kwargs.get('json'), response,
+                                             time.perf_counter() - start, endpoint=endpoint)
+                code = str(response.status_code)
+                return response
+            except requests.exceptions.Timeout:
+                code = 'timeout'
+                raise
+            except requests.exceptions.ConnectionError:
+                code = 'connection_error'
+                raise
+            finally:
+                metrics.LAMB_REQUEST_DURATION.observe(time.perf_counter() - start, endpoint)
+                metrics.LAMB_REQUESTS.inc(endpoint, code)
+                lamb_span.set_attribute('lamb.result', code)
     
     @staticmethod
     def verify_model_exists(evaluator_id: str) -> Dict[str, Any]:
         """Verifica que existe un modelo LAMB con el evaluator_id dado"""
         url = f"{LAMBAPIService.LAMB_API_URL}/v1/models"
-        logging.info(f"Verificando modelo LAMB en: {url}")
+        logger.info("Verificando modelo LAMB en: %s", url)
         
         try:
-            response = requests.get(url, timeout=10)
+            response = LAMBAPIService._request('GET', 'models', url, timeout=10)
             
-            logging.info(f"LAMB /v1/models response status: {response.status_code}")
-            logging.debug(f"LAMB /v1/models response headers: {dict(response.headers)}")
+            logger.info("LAMB /v1/models response status: %s", response.status_code)
+            logger.debug("LAMB /v1/models response headers: %s", dict(response.headers))
             
             if response.status_code != 200:
                 error_detail = ""
@@ -42,7 +102,7 @@ class LAMBAPIService:
             
             # Log raw response for debugging
             raw_text = response.text
-            logging.debug(f"LAMB /v1/models raw response (first 500 chars): {raw_text[:500] if raw_text else '(empty)'}")
+            logger.debug("LAMB /v1/models raw response (first 500 chars): %s", raw_text[:500] if raw_text else '(empty)')
             
             if not raw_text or not raw_text.strip():
                 return {
@@ -53,7 +113,7 @@ class LAMBAPIService:
             try:
                 data = response.json()
             except Exception as json_err:
-                logging.error(f"Error parseando JSON de LAMB: {json_err}. Respuesta raw: {raw_text[:500]}")
+                logger.error("Error parseando JSON de LAMB: %s. Respuesta raw: %s", json_err, raw_text[:500])
                 return {
                     "success": False,
                     "error": f"El servidor LAMB retornó una respuesta no válida (no es JSON). Respuesta: {raw_text[:200]}"
@@ -62,8 +122,8 @@ class LAMBAPIService:
             models = data.get("data", [])
             model_id = f"lamb_assistant.{evaluator_id}"
             
-            logging.info(f"Buscando modelo '{model_id}' entre {len(models)} modelos disponibles")
-            logging.debug(f"Modelos disponibles: {[m.get('id') for m in models]}")
+            logger.info("Buscando modelo '%s' entre %s modelos disponibles", model_id, len(models))
+            logger.debug("Modelos disponibles: %s", [m.get('id') for m in models])
             
             model_found = any(model.get("id") == model_id for model in models)
             
@@ -85,7 +145,7 @@ class LAMBAPIService:
         except requests.exceptions.ConnectionError as e:
             return {"success": False, "error": f"No se pudo conectar con el servidor LAMB ({url}): {str(e)}"}
         except Exception as e:
-            logging.exception(f"Error inesperado al verificar modelo LAMB")
+            logger.exception("Error inesperado al verificar modelo LAMB")
             return {"success": False, "error": f"Error al verificar el modelo LAMB: {type(e).__name__}: {str(e)}"}
     
     @staticmethod
@@ -102,14 +162,19 @@ class LAMBAPIService:
             }
             payload = {'model': model_id, 'prompt': text}
             
-            logging.info(f"Enviando solicitud de evaluación al modelo LAMB {model_id}")
-            logging.info(f"URL: {url}, Timeout: {effective_timeout}s, Text length: {len(text)} chars")
-            logging.debug(f"Headers: {headers}")
-            logging.debug(f"Payload model: {payload['model']}, prompt length: {len(payload['prompt'])}")
+            logger.info(
+                "Enviando solicitud de evaluación al modelo LAMB %s (URL: %s, Timeout: %ss, Text length: %s chars)",
+                model_id, url, effective_timeout, len(text),
+                extra={'sample': 'lamb_request'}
+            )
+            logger.debug("Headers: %s", headers)
+            logger.debug("Payload model: %s, prompt length: %s", payload['model'], len(payload['prompt']))
             
-            response = requests.post(url, headers=headers, json=payload, timeout=effective_timeout)
+            response = LAMBAPIService._request(
+                'POST', 'chat_completions', url, headers=headers, json=payload, timeout=effective_timeout
+            )
             
-            logging.info(f"LAMB /chat/completions response status: {response.status_code}")
+            logger.debug("LAMB /chat/completions response status: %s", response.status_code)
             
             if response.status_code != 200:
                 raw_text = response.text[:500] if response.text else "(empty)"
@@ -119,14 +184,14 @@ class LAMBAPIService:
                     error_msg += f": {error_detail}"
                 except:
                     error_msg += f": {raw_text}"
-                logging.error(error_msg)
+                logger.error(error_msg)
                 return {'success': False, 'error': error_msg}
             
             # Check for empty response
             raw_text = response.text
             if not raw_text or not raw_text.strip():
                 error_msg = f"LAMB API retornó una respuesta vacía (status 200). URL: {url}"
-                logging.error(error_msg)
+                logger.error(error_msg)
                 return {'success': False, 'error': error_msg}
             
             # Try to parse JSON
@@ -134,234 +199,50 @@ class LAMBAPIService:
                 response_json = response.json()
             except Exception as json_err:
                 error_msg = f"LAMB API retornó respuesta no válida (no es JSON): {raw_text[:300]}"
-                logging.error(error_msg)
+                logger.error(error_msg)
                 return {'success': False, 'error': error_msg}
             
-            logging.info("Respuesta de evaluación recibida de LAMB")
-            logging.debug(f"Response keys: {response_json.keys() if isinstance(response_json, dict) else type(response_json)}")
+            logger.info("Respuesta de evaluación recibida de LAMB", extra={'sample': 'lamb_response'})
+            logger.debug("Response keys: %s", response_json.keys() if isinstance(response_json, dict) else type(response_json))
             
             return {'success': True, 'response': response_json, 'model_id': model_id}
             
         except requests.exceptions.Timeout:
             error_msg = f"Timeout al conectar con LAMB API (> {effective_timeout}s). URL: {url}"
-            logging.error(error_msg)
+            logger.error(error_msg)
             return {'success': False, 'error': error_msg}
         except requests.exceptions.ConnectionError as e:
             error_msg = f"No se pudo conectar con LAMB API ({url}): {str(e)}"
-            logging.error(error_msg)
+            logger.error(error_msg)
             return {'success': False, 'error': error_msg}
         except Exception as e:
             error_msg = f"Error inesperado al llamar a LAMB API: {type(e).__name__}: {str(e)}"
-            logging.exception(error_msg)
+            logger.exception(error_msg)
             return {'success': False, 'error': error_msg}
     
     @staticmethod
     def validate_chat_completions_format(response: Dict[str, Any]) -> Dict[str, Any]:
         """Validates that the response follows the expected chat completions format.
         
-        Expected format (OpenAI-compatible):
-        {
-            "choices": [
-                {
-                    "message": {
-                        "content": "..."
-                    }
-                }
-            ]
-        }
-        
-        Returns validation results with details about any issues found.
+        See LAMBResponseParser.validate_chat_completions_format.
         """
-        validation = {
-            'is_valid': True,
-            'format_detected': None,
-            'issues': [],
-            'structure': {}
-        }
-        
-        if not isinstance(response, dict):
-            validation['is_valid'] = False
-            validation['issues'].append(f"Response is not a dict, got: {type(response).__name__}")
-            return validation
-        
-        validation['structure']['top_level_keys'] = list(response.keys())
-        
-        # Check for OpenAI chat completions format
-        if 'choices' in response:
-            validation['format_detected'] = 'openai_chat_completions'
-            choices = response.get('choices', [])
-            
-            if not isinstance(choices, list):
-                validation['is_valid'] = False
-                validation['issues'].append(f"'choices' is not a list, got: {type(choices).__name__}")
-            elif len(choices) == 0:
-                validation['is_valid'] = False
-                validation['issues'].append("'choices' array is empty")
-            else:
-                choice = choices[0]
-                validation['structure']['first_choice_keys'] = list(choice.keys()) if isinstance(choice, dict) else None
-                
-                if not isinstance(choice, dict):
-                    validation['is_valid'] = False
-                    validation['issues'].append(f"First choice is not a dict, got: {type(choice).__name__}")
-                elif 'message' in choice:
-                    message = choice.get('message', {})
-                    validation['structure']['message_keys'] = list(message.keys()) if isinstance(message, dict) else None
-                    
-                    if not isinstance(message, dict):
-                        validation['is_valid'] = False
-                        validation['issues'].append(f"'message' is not a dict, got: {type(message).__name__}")
-                    elif 'content' not in message:
-                        validation['is_valid'] = False
-                        validation['issues'].append("'message' does not contain 'content' key")
-                    elif not isinstance(message.get('content'), str):
-                        validation['issues'].append(f"'content' is not a string, got: {type(message.get('content')).__name__}")
-                elif 'text' in choice:
-                    validation['format_detected'] = 'openai_completions_legacy'
-                    if not isinstance(choice.get('text'), str):
-                        validation['issues'].append(f"'text' is not a string, got: {type(choice.get('text')).__name__}")
-                else:
-                    validation['is_valid'] = False
-                    validation['issues'].append("First choice has neither 'message' nor 'text' key")
-        
-        # Check for alternative formats
-        elif 'content' in response:
-            validation['format_detected'] = 'simple_content'
-            if not isinstance(response.get('content'), str):
-                validation['issues'].append(f"'content' is not a string, got: {type(response.get('content')).__name__}")
-        elif 'text' in response:
-            validation['format_detected'] = 'simple_text'
-            if not isinstance(response.get('text'), str):
-                validation['issues'].append(f"'text' is not a string, got: {type(response.get('text')).__name__}")
-        else:
-            validation['is_valid'] = False
-            validation['format_detected'] = 'unknown'
-            validation['issues'].append("Response doesn't match any known format (missing 'choices', 'content', or 'text')")
-        
-        return validation
+        return LAMBResponseParser.validate_chat_completions_format(response)
     
     @staticmethod
-    def parse_evaluation_response(response: Dict[str, Any]) -> Dict[str, Any]:
-        """Parsea la respuesta de LAMB API para extraer nota y feedback"""
-        try:
-            logging.info(f"=== PARSING LAMB RESPONSE ===")
-            logging.info(f"Response type: {type(response)}")
-            logging.info(f"Response keys: {response.keys() if isinstance(response, dict) else 'N/A'}")
-            logging.info(f"Full response: {response}")
-            
-            # Check if the LAMB API call itself failed
-            if isinstance(response, dict) and response.get('success') == False:
-                error_msg = response.get('error', 'Unknown LAMB API error')
-                logging.error(f"LAMB API returned error: {error_msg}")
-                return {
-                    'success': False,
-                    'error': error_msg,
-                    'score': None,
-                    'comment': None,
-                    'raw_response': response
-                }
-            
-            # First validate the response format
-            validation = LAMBAPIService.validate_chat_completions_format(response)
-            logging.info(f"Validation result: {validation}")
-            
-            content = None
-            
-            # Try to extract content from various response formats
-            if 'response' in response and isinstance(response['response'], dict):
-                # Handle wrapped response from evaluate_text
-                inner_response = response['response']
-                logging.info(f"Found inner 'response' key, extracting from it")
-                if 'choices' in inner_response and len(inner_response['choices']) > 0:
-                    choice = inner_response['choices'][0]
-                    content = choice.get('message', {}).get('content') or choice.get('text')
-                    logging.info(f"Extracted content from inner response choices: {content[:200] if content else 'None'}...")
-            
-            if not content and 'choices' in response and len(response['choices']) > 0:
-                choice = response['choices'][0]
-                content = choice.get('message', {}).get('content') or choice.get('text')
-                logging.info(f"Extracted content from choices: {content[:200] if content else 'None'}...")
-            elif not content and 'content' in response:
-                content = response['content']
-                logging.info(f"Extracted content from 'content' key: {content[:200] if content else 'None'}...")
-            elif not content and 'text' in response:
-                content = response['text']
-                logging.info(f"Extracted content from 'text' key: {content[:200] if content else 'None'}...")
-            
-            if content:
-                result = LAMBAPIService._extract_score_and_feedback(content)
-                result['success'] = True
-                result['json_validation'] = validation
-                logging.info(f"Successfully parsed response. Score: {result.get('score')}")
-                return result
-            
-            logging.warning(f"Could not extract content from response. Returning raw response.")
-            return {
-                'success': True,  # Not an error, just no structured content
-                'score': None, 
-                'comment': str(response), 
-                'raw_response': response,
-                'json_validation': validation
-            }
-                
-        except Exception as e:
-            logging.error(f"Error parseando respuesta LAMB: {str(e)}")
-            logging.exception("Full traceback:")
-            return {
-                'success': False,
-                'error': f"Error al procesar respuesta: {str(e)}",
-                'score': None, 
-                'comment': f"Error al procesar respuesta: {str(e)}", 
-                'raw_response': response,
-                'json_validation': {'is_valid': False, 'issues': [str(e)]}
-            }
+    def parse_evaluation_response(response: Dict[str, Any], include_validation: bool = False) -> Dict[str, Any]:
+        """Parsea la respuesta de LAMB API para extraer nota y feedback
+        
+        Args:
+            response: Respuesta de evaluate_text
+            include_validation: Adjunta la validación del formato (modo debug)
+        """
+        return LAMBResponseParser.parse(response, include_validation=include_validation)
     
     @staticmethod
     def _extract_score_and_feedback(content: str) -> Dict[str, Any]:
         """Extrae nota y feedback del contenido de texto
         
-        Busca múltiples formatos de nota/puntuación:
-        - "NOTA FINAL: X.X"
-        - "FINAL SCORE: X.X"
-        - "Nota: X.X" (with optional markdown like ## or **)
-        - "Score: X.X"
-        - "Puntuación: X.X"
-        - "Calificación: X.X"
-        - "Grade: X.X"
+        Acepta salida estructurada ({"score": .., "feedback": ..}) o texto libre
+        con los formatos de nota de LAMBResponseParser.extract_score_and_feedback.
         """
-        score = None
-        
-        # List of patterns to try, in order of specificity (most specific first)
-        patterns = [
-            # Most specific: "NOTA FINAL" or "FINAL SCORE"
-            r'(?:NOTA\s+FINAL|FINAL\s+SCORE)\s*:\s*(\d+\.?\d*)',
-            # Spanish variants with optional markdown (##, **, etc.)
-            r'(?:#*\s*\**\s*)(?:Nota|Puntuación|Calificación)\s*(?:\**)\s*:\s*(\d+\.?\d*)',
-            # English variants with optional markdown
-            r'(?:#*\s*\**\s*)(?:Score|Grade|Mark)\s*(?:\**)\s*:\s*(\d+\.?\d*)',
-            # Fallback: any "X.X/10" or "X.X / 10" pattern near end of text
-            r'(\d+\.?\d*)\s*/\s*10\s*(?:puntos?|points?)?\s*$',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, content, re.IGNORECASE | re.MULTILINE)
-            if match:
-                try:
-                    score = float(match.group(1))
-                    if 0 <= score <= 10:
-                        logging.info(f"Nota extraída con patrón '{pattern}': {score}")
-                        break
-                    else:
-                        logging.warning(f"Nota fuera de rango (0-10): {score}, continuando búsqueda...")
-                        score = None
-                except (ValueError, IndexError) as e:
-                    logging.error(f"Error al convertir nota a float: {str(e)}")
-                    score = None
-        
-        # Si no se encuentra nota en ningún formato, loguear una advertencia
-        if score is None:
-            logging.warning("No se encontró ningún formato de nota reconocido en la respuesta del agente LAMB")
-            logging.warning(f"Últimos 500 caracteres de la respuesta: {content[-500:]}")
-        
-        return {'score': score, 'comment': content, 'raw_response': content}
-
+        return LAMBResponseParser.extract_score_and_feedback(content)
@@ -0,0 +1,208 @@
+"""
+LAMB Recorder - Record/replay of LAMB API traffic
+
+Handles:
+- Recording mode: every LAMB request/response pair, with its latency, is
+  appended to a compact on-disk store (LAMB_RECORD_PATH)
+- Replay mode: LAMBAPIService is served from a store without network
+  (LAMB_REPLAY_PATH), deterministically and with original or scaled latency
+- Loading stores for the replay server and the offline benchmarks
+
+Store format: a ``.jsonl.gz`` file where every record is its own gzip
+member, so appending is crash-safe and the file reads as one gzip stream.
+Records hold the request payload (including the student text), the status,
+content type, body and latency, but never the Authorization header. New
+stores are created with 0600 permissions.
+
+Matching: requests are keyed by method, URL path (not host, so a recording
+replays against any LAMB URL) and canonical JSON payload. Repeated
+identical requests get the recorded responses in order, cycling. On a miss,
+LAMB_REPLAY_ON_MISS='sequential' serves the next recording of the same path
+(useful when replaying against different submissions) and 'error' fails
+like an unreachable server.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+LAMB_RECORD_PATH = os.getenv('LAMB_RECORD_PATH', '')
+LAMB_REPLAY_PATH = os.getenv('LAMB_REPLAY_PATH', '')
+# 1 = original latency, 0 = no delay, 0.5 = twice as fast
+LAMB_REPLAY_LATENCY_SCALE = float(os.getenv('LAMB_REPLAY_LATENCY_SCALE', '1'))
+# 'sequential' or 'error'
+LAMB_REPLAY_ON_MISS = os.getenv('LAMB_REPLAY_ON_MISS', 'sequential')
+
+STORE_VERSION = 1
+
+_write_lock = threading.Lock()
+_replay_lock = threading.Lock()
+_replay_store: Optional['ReplayStore'] = None
+
+
+def is_recording() -> bool:
+    return bool(LAMB_RECORD_PATH) and not LAMB_REPLAY_PATH
+
+
+def is_replaying() -> bool:
+    return bool(LAMB_REPLAY_PATH)
+
+
+def request_key(method: str, path: str, payload: Any = None) -> str:
+    """Stable identity of a request: method, URL path and canonical JSON payload"""
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':')) if payload is not None else ''
+    return hashlib.sha256(f'{method.upper()} {path}\n{canonical}'.encode('utf-8')).hexdigest()
+
+
+def append_record(path: str, record: Dict[str, Any]) -> None:
+    """Append one record as its own gzip member"""
+    data = gzip.compress((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'), compresslevel=6)
+    with _write_lock:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        with os.fdopen(fd, 'ab') as store:
+            store.write(data)
+
+
+def record(method: str, url: str, payload: Any, response: requests.Response, elapsed: float,
+           endpoint: str = '', path: Optional[str] = None) -> None:
+    """Store a request/response pair in LAMB_RECORD_PATH (or `path`)
+
+    A failing store (disk full, permissions) is only logged: the response
+    has already been received and the request must not fail because of it.
+    """
+    url_path = urlsplit(url).path
+    record_path = path or LAMB_RECORD_PATH
+    try:
+        append_record(record_path, {
+            'v': STORE_VERSION,
+            'key': request_key(method, url_path, payload),
+            'method': method.upper(),
+            'path': url_path,
+            'endpoint': endpoint,
+            'request': payload,
+            'status': response.status_code,
+            'content_type': response.headers.get('Content-Type', ''),
+            'body': response.text,
+            'elapsed_ms': round(elapsed * 1000, 3),
+            'recorded_at': datetime.now(timezone.utc).isoformat(),
+        })
+    except Exception as e:
+        logger.warning("No se pudo grabar la respuesta de LAMB en %s: %s: %s", record_path, type(e).__name__, e)
+
+
+def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Records of a store in recording order (a truncated last record is skipped)"""
+    with gzip.open(path, 'rt', encoding='utf-8') as store:
+        try:
+            for line in store:
+                if line.strip():
+                    yield json.loads(line)
+        except (EOFError, gzip.BadGzipFile, json.JSONDecodeError):
+            return
+
+
+class ReplayStore:
+    """Recorded responses indexed for deterministic lookup"""
+
+    def __init__(self, records: List[Dict[str, Any]], latency_scale: float = 1.0, on_miss: str = 'sequential'):
+        if on_miss not in ('sequential', 'error'):
+            raise ValueError("on_miss must be 'sequential' or 'error'")
+        self.records = records
+        self.latency_scale = latency_scale
+        self.on_miss = on_miss
+        self._by_key: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._by_path: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for entry in records:
+            self._by_key[entry['key']].append(entry)
+            self._by_path[(entry['method'], entry['path'])].append(entry)
+        self._cursors: Dict[Any, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path: str, latency_scale: float = 1.0, on_miss: str = 'sequential') -> 'ReplayStore':
+        return cls(list(iter_records(path)), latency_scale, on_miss)
+
+    def _next(self, cursor_key: Any, candidates: List[Dict[str, Any]]) -> Dict[str, Any]:
+        index = self._cursors[cursor_key]
+        self._cursors[cursor_key] = index + 1
+        return candidates[index % len(candidates)]
+
+    def match(self, method: str, path: str, payload: Any = None) -> Tuple[Optional[Dict[str, Any]], str]:
+        """Recorded response for a request and how it matched: 'hit', 'fallback' or 'miss'"""
+        key = request_key(method, path, payload)
+        with self._lock:
+            if key in self._by_key:
+                self.hits += 1
+                return self._next(key, self._by_key[key]), 'hit'
+            self.misses += 1
+            candidates = self._by_path.get((method.upper(), path))
+            if self.on_miss == 'sequential' and candidates:
+                return self._next((method.upper(), path), candidates), 'fallback'
+        return None, 'miss'
+
+    def lookup(self, method: str, path: str, payload: Any = None) -> Optional[Dict[str, Any]]:
+        """Recorded response for a request, or None"""
+        return self.match(method, path, payload)[0]
+
+    def delay(self, entry: Dict[str, Any]) -> float:
+        """Seconds to wait before answering with a recorded response"""
+        return entry.get('elapsed_ms', 0) / 1000 * self.latency_scale
+
+
+def build_response(entry: Dict[str, Any], url: str) -> requests.Response:
+    """requests.Response equivalent to a recorded one"""
+    response = requests.Response()
+    response.status_code = entry['status']
+    response._content = entry['body'].encode('utf-8')
+    response.encoding = 'utf-8'
+    response.headers = CaseInsensitiveDict({'Content-Type': entry.get('content_type', '')})
+    response.url = url
+    return response
+
+
+def _store() -> 'ReplayStore':
+    global _replay_store
+    with _replay_lock:
+        if _replay_store is None:
+            _replay_store = ReplayStore.load(LAMB_REPLAY_PATH, LAMB_REPLAY_LATENCY_SCALE, LAMB_REPLAY_ON_MISS)
+        return _replay_store
+
+
+def replay(method: str, url: str, payload: Any = None) -> requests.Response:
+    """Serve a request from LAMB_REPLAY_PATH, waiting the (scaled) recorded latency
+
+    Raises:
+        requests.exceptions.ConnectionError: If nothing was recorded for it
+    """
+    store = _store()
+    entry = store.lookup(method, urlsplit(url).path, payload)
+    if entry is None:
+        raise requests.exceptions.ConnectionError(f"No recorded LAMB response for {method.upper()} {urlsplit(url).path}")
+    delay = store.delay(entry)
+    if delay > 0:
+        time.sleep(delay)
+    return build_response(entry, url)
+
+
+def reset() -> None:
+    """Drop the loaded replay store (it is reloaded on next use)"""
+    global _replay_store
+    with _replay_lock:
+        _replay_store = None
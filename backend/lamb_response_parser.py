@@ -0,0 +1,315 @@
+"""
+LAMB Response Parser - Extracts score and feedback from LAMB evaluator responses
+
+Handles:
+- Structured output fast path ({"score": .., "feedback": ..})
+- Score markers in free-text feedback, scanning only the tail of the text
+- Optional validation of the chat completions format (for debugging)
+"""
+
+import json
+import logging
+import os
+import re
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Only the last characters of a response are scanned for score markers:
+# evaluators end their feedback with the grade
+SCORE_TAIL_CHARS = int(os.getenv('LAMB_SCORE_TAIL_CHARS', '2000'))
+# How far before the cut the tail may extend to start at a line boundary
+_TAIL_LINE_LOOKBACK = 200
+
+# Score patterns in order of specificity (most specific first)
+SCORE_PATTERNS = (
+    # Most specific: "NOTA FINAL" or "FINAL SCORE"
+    re.compile(r'(?:NOTA\s+FINAL|FINAL\s+SCORE)\s*\**\s*:\s*\**\s*(\d+\.?\d*)', re.IGNORECASE),
+    # Spanish variants with optional markdown (## Nota:, **Nota**:, **Nota:** ...)
+    re.compile(r'(?:Nota|Puntuación|Calificación)\s*\**\s*:\s*\**\s*(\d+\.?\d*)', re.IGNORECASE),
+    # English variants with optional markdown
+    re.compile(r'(?:Score|Grade|Mark)\s*\**\s*:\s*\**\s*(\d+\.?\d*)', re.IGNORECASE),
+    # Fallback: any "X.X/10" or "X.X / 10" pattern at the end of a line
+    re.compile(r'(\d+\.?\d*)\s*/\s*10\s*(?:puntos?|points?)?\s*$', re.IGNORECASE | re.MULTILINE),
+)
+
+# Markdown code fence around structured output (```json ... ```)
+_CODE_FENCE = re.compile(r'^```(?:json)?\s*(.*?)\s*```$', re.DOTALL | re.IGNORECASE)
+
+# Keys accepted as feedback in structured output
+_FEEDBACK_KEYS = ('feedback', 'comment', 'comments')
+
+
+class LAMBResponseParser:
+    """Parses LAMB evaluation responses into score and comment"""
+
+    @staticmethod
+    def parse(response: Dict[str, Any], include_validation: bool = False) -> Dict[str, Any]:
+        """Parse a LAMB API response (as returned by LAMBAPIService.evaluate_text)
+
+        Args:
+            response: Wrapped response from evaluate_text or a raw LAMB payload
+            include_validation: Whether to run the (slower) chat completions
+                format validation and attach it as 'json_validation'
+
+        Returns:
+            Dictionary with success, score, comment and raw_response
+        """
+        try:
+            # Check if the LAMB API call itself failed
+            if isinstance(response, dict) and response.get('success') is False:
+                error_msg = response.get('error', 'Unknown LAMB API error')
+                logger.error("LAMB API returned error: %s", error_msg)
+                return {
+                    'success': False,
+                    'error': error_msg,
+                    'score': None,
+                    'comment': None,
+                    'raw_response': response
+                }
+
+            payload = response
+            if isinstance(response, dict) and isinstance(response.get('response'), dict):
+                # Unwrap the response from evaluate_text
+                payload = response['response']
+
+            result = LAMBResponseParser._parse_structured_payload(payload)
+            if result is None:
+                content = LAMBResponseParser.extract_content(payload)
+                if content is None and payload is not response:
+                    content = LAMBResponseParser.extract_content(response)
+
+                if not content:
+                    logger.warning("Could not extract content from LAMB response. Returning raw response.")
+                    return {
+                        'success': True,  # Not an error, just no structured content
+                        'score': None,
+                        'comment': str(response),
+                        'raw_response': response,
+                        'json_validation': LAMBResponseParser.validate_chat_completions_format(payload)
+                    }
+
+                result = LAMBResponseParser.extract_score_and_feedback(content)
+
+            result['success'] = True
+            if include_validation:
+                result['json_validation'] = LAMBResponseParser.validate_chat_completions_format(payload)
+            logger.debug("Parsed LAMB response. Score: %s", result.get('score'))
+            return result
+
+        except Exception as e:
+            logger.exception("Error parseando respuesta LAMB: %s", e)
+            return {
+                'success': False,
+                'error': f"Error al procesar respuesta: {str(e)}",
+                'score': None,
+                'comment': f"Error al procesar respuesta: {str(e)}",
+                'raw_response': response,
+                'json_validation': {'is_valid': False, 'issues': [str(e)]}
+            }
+
+    @staticmethod
+    def extract_content(payload: Any) -> Optional[str]:
+        """Extract the text content from the known LAMB response formats"""
+        if not isinstance(payload, dict):
+            return None
+
+        choices = payload.get('choices')
+        if isinstance(choices, list) and choices and isinstance(choices[0], dict):
+            choice = choices[0]
+            message = choice.get('message')
+            content = message.get('content') if isinstance(message, dict) else None
+            return content or choice.get('text')
+
+        content = payload.get('content')
+        if isinstance(content, str):
+            return content
+
+        text = payload.get('text')
+        if isinstance(text, str):
+            return text
+
+        return None
+
+    @staticmethod
+    def extract_score_and_feedback(content: str) -> Dict[str, Any]:
+        """Extract score and feedback from the evaluator text
+
+        Structured output ({"score": .., "feedback": ..}) is decoded directly.
+        Otherwise the tail of the text is scanned for the score markers in
+        SCORE_PATTERNS, most specific first:
+        - "NOTA FINAL: X.X" / "FINAL SCORE: X.X"
+        - "Nota: X.X", "Puntuación: X.X", "Calificación: X.X" (optional markdown)
+        - "Score: X.X", "Grade: X.X", "Mark: X.X" (optional markdown)
+        - "X.X/10" at the end of a line
+        """
+        structured = LAMBResponseParser._parse_structured_text(content)
+        if structured is not None:
+            return structured
+
+        return {
+            'score': LAMBResponseParser.find_score(content),
+            'comment': content,
+            'raw_response': content
+        }
+
+    @staticmethod
+    def find_score(content: str) -> Optional[float]:
+        """Find the score in the tail of a free-text response"""
+        tail = LAMBResponseParser._tail(content)
+
+        for pattern in SCORE_PATTERNS:
+            match = pattern.search(tail)
+            if not match:
+                continue
+            try:
+                score = float(match.group(1))
+            except (ValueError, IndexError):
+                continue
+            if 0 <= score <= 10:
+                return score
+            logger.debug("Nota fuera de rango (0-10): %s, continuando búsqueda...", score)
+
+        logger.warning("No se encontró ningún formato de nota reconocido en la respuesta del agente LAMB")
+        return None
+
+    @staticmethod
+    def _tail(content: str) -> str:
+        """Return the last SCORE_TAIL_CHARS characters, starting at a nearby line boundary
+
+        The boundary is looked for at most _TAIL_LINE_LOOKBACK characters
+        before the cut; a long single-line reply is cut mid-line instead.
+        """
+        cut = len(content) - SCORE_TAIL_CHARS
+        if cut <= 0:
+            return content
+        newline = content.rfind('\n', max(0, cut - _TAIL_LINE_LOOKBACK), cut)
+        return content[newline + 1:] if newline >= 0 else content[cut:]
+
+    @staticmethod
+    def _parse_structured_payload(payload: Any) -> Optional[Dict[str, Any]]:
+        """Fast path for payloads that already are {"score": .., "feedback": ..}"""
+        if not isinstance(payload, dict) or 'score' not in payload:
+            return None
+        return LAMBResponseParser._structured_result(payload, json.dumps(payload, ensure_ascii=False))
+
+    @staticmethod
+    def _parse_structured_text(content: str) -> Optional[Dict[str, Any]]:
+        """Fast path for text content holding a JSON object with a score"""
+        if not content:
+            return None
+        stripped = content.strip()
+        if stripped.startswith('```'):
+            fence = _CODE_FENCE.match(stripped)
+            if not fence:
+                return None
+            stripped = fence.group(1)
+        if not (stripped.startswith('{') and stripped.endswith('}')):
+            return None
+        try:
+            data = json.loads(stripped)
+        except ValueError:
+            return None
+        if not isinstance(data, dict) or 'score' not in data:
+            return None
+        return LAMBResponseParser._structured_result(data, content)
+
+    @staticmethod
+    def _structured_result(data: Dict[str, Any], raw: str) -> Dict[str, Any]:
+        """Build the parse result from a decoded structured output object"""
+        try:
+            score = float(data['score'])
+            if not 0 <= score <= 10:
+                score = None
+        except (TypeError, ValueError):
+            score = None
+
+        feedback = next((data[key] for key in _FEEDBACK_KEYS if isinstance(data.get(key), str)), None)
+        return {'score': score, 'comment': feedback if feedback is not None else raw, 'raw_response': raw}
+
+    @staticmethod
+    def validate_chat_completions_format(response: Dict[str, Any]) -> Dict[str, Any]:
+        """Validates that the response follows the expected chat completions format.
+
+        Expected format (OpenAI-compatible):
+        {
+            "choices": [
+                {
+                    "message": {
+                        "content": "..."
+                    }
+                }
+            ]
+        }
+
+        Returns validation results with details about any issues found.
+        """
+        validation = {
+            'is_valid': True,
+            'format_detected': None,
+            'issues': [],
+            'structure': {}
+        }
+
+        if not isinstance(response, dict):
+            validation['is_valid'] = False
+            validation['issues'].append(f"Response is not a dict, got: {type(response).__name__}")
+            return validation
+
+        validation['structure']['top_level_keys'] = list(response.keys())
+
+        # Check for OpenAI chat completions format
+        if 'choices' in response:
+            validation['format_detected'] = 'openai_chat_completions'
+            choices = response.get('choices', [])
+
+            if not isinstance(choices, list):
+                validation['is_valid'] = False
+                validation['issues'].append(f"'choices' is not a list, got: {type(choices).__name__}")
+            elif len(choices) == 0:
+                validation['is_valid'] = False
+                validation['issues'].append("'choices' array is empty")
+            else:
+                choice = choices[0]
+                validation['structure']['first_choice_keys'] = list(choice.keys()) if isinstance(choice, dict) else None
+
+                if not isinstance(choice, dict):
+                    validation['is_valid'] = False
+                    validation['issues'].append(f"First choice is not a dict, got: {type(choice).__name__}")
+                elif 'message' in choice:
+                    message = choice.get('message', {})
+                    validation['structure']['message_keys'] = list(message.keys()) if isinstance(message, dict) else None
+
+                    if not isinstance(message, dict):
+                        validation['is_valid'] = False
+                        validation['issues'].append(f"'message' is not a dict, got: {type(message).__name__}")
+                    elif 'content' not in message:
+                        validation['is_valid'] = False
+                        validation['issues'].append("'message' does not contain 'content' key")
+                    elif not isinstance(message.get('content'), str):
+                        validation['issues'].append(f"'content' is not a string, got: {type(message.get('content')).__name__}")
+                elif 'text' in choice:
+                    validation['format_detected'] = 'openai_completions_legacy'
+                    if not isinstance(choice.get('text'), str):
+                        validation['issues'].append(f"'text' is not a string, got: {type(choice.get('text')).__name__}")
+                else:
+                    validation['is_valid'] = False
+                    validation['issues'].append("First choice has neither 'message' nor 'text' key")
+
+        # Check for alternative formats
+        elif 'score' in response:
+            validation['format_detected'] = 'structured_output'
+        elif 'content' in response:
+            validation['format_detected'] = 'simple_content'
+            if not isinstance(response.get('content'), str):
+                validation['issues'].append(f"'content' is not a string, got: {type(response.get('content')).__name__}")
+        elif 'text' in response:
+            validation['format_detected'] = 'simple_text'
+            if not isinstance(response.get('text'), str):
+                validation['issues'].append(f"'text' is not a string, got: {type(response.get('text')).__name__}")
+        else:
+            validation['is_valid'] = False
+            validation['format_detected'] = 'unknown'
+            validation['issues'].append("Response doesn't match any known format (missing 'choices', 'content', or 'text')")
+
+        return validation
@@ -0,0 +1,180 @@
+"""
+Logging configuration - Structured, low-overhead application logging
+
+Handles:
+- JSON (or plain text) log lines on stderr
+- Per-subsystem levels (e.g. "lamb_api_service=DEBUG,sqlalchemy.engine=WARNING")
+- Sampling of high-volume hot-path messages
+- A separate rotating, gzip-compressed sink for raw LAMB payloads
+"""
+
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+# "json" or "text"
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+
+# Root level and per-subsystem overrides, e.g. "evaluation_service=DEBUG,sqlalchemy.engine=INFO"
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+
+# Keep one out of every N records of each sampled message (1 = keep all)
+LOG_SAMPLE_EVERY = int(os.getenv('LOG_SAMPLE_EVERY', '20'))
+
+# Raw LAMB payload sink (disabled when LAMB_PAYLOAD_LOG is empty)
+LAMB_PAYLOAD_LOG = os.getenv('LAMB_PAYLOAD_LOG', '')
+LAMB_PAYLOAD_LOG_MAX_BYTES = int(os.getenv('LAMB_PAYLOAD_LOG_MAX_BYTES', str(20 * 1024 * 1024)))
+LAMB_PAYLOAD_LOG_BACKUPS = int(os.getenv('LAMB_PAYLOAD_LOG_BACKUPS', '10'))
+
+# Logger used for raw LAMB payloads; it never propagates to the application log
+PAYLOAD_LOGGER_NAME = 'lamba.payloads'
+
+# Attributes every LogRecord has; anything else came in through extra={...}
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+# Marker set on the handlers installed here so reconfiguration replaces them
+_HANDLER_MARKER = '_lamba_handler'
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line
+
+    The message is only interpolated here, i.e. once a record has passed the
+    level and sampling checks, so disabled or dropped records cost nothing.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps one out of every N records that carry a 'sample' key
+
+    Hot-path messages opt in with extra={'sample': 'some_key'}; each key is
+    counted separately. Warnings and errors are never dropped.
+    """
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(every, 1)
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, 'sample', None)
+        if key is None or self.every == 1 or record.levelno >= logging.WARNING:
+            return True
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % self.every:
+            return False
+        record.sampled_every = self.every
+        return True
+
+
+class CompressedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler that gzips the rotated files"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.namer = lambda name: name + '.gz'
+        self.rotator = self._gzip_rotator
+
+    @staticmethod
+    def _gzip_rotator(source: str, dest: str) -> None:
+        with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(source)
+
+
+def _parse_levels(raw: str) -> Dict[str, int]:
+    """Parse "logger=LEVEL" pairs from the LOG_LEVELS setting"""
+    levels = {}
+    for item in (raw or '').split(','):
+        name, _, level = item.strip().partition('=')
+        level_no = logging.getLevelName(level.strip().upper())
+        if name and isinstance(level_no, int):
+            levels[name.strip()] = level_no
+    return levels
+
+
+def _replace_handler(logger: logging.Logger, handler: Optional[logging.Handler]) -> None:
+    """Remove the handlers installed by a previous configure_logging call"""
+    for existing in list(logger.handlers):
+        if getattr(existing, _HANDLER_MARKER, False):
+            logger.removeHandler(existing)
+            existing.close()
+    if handler is not None:
+        setattr(handler, _HANDLER_MARKER, True)
+        logger.addHandler(handler)
+
+
+def configure_logging() -> None:
+    """Configure the application logging (safe to call more than once)"""
+    handler = logging.StreamHandler()
+    if LOG_FORMAT == 'text':
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    else:
+        handler.setFormatter(JsonFormatter())
+    handler.addFilter(SamplingFilter(LOG_SAMPLE_EVERY))
+
+    root = logging.getLogger()
+    root_level = logging.getLevelName(LOG_LEVEL)
+    root.setLevel(root_level if isinstance(root_level, int) else logging.INFO)
+    _replace_handler(root, handler)
+
+    # SQL statements are only logged when explicitly asked for
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    payload_logger = logging.getLogger(PAYLOAD_LOGGER_NAME)
+    payload_logger.propagate = False
+    if LAMB_PAYLOAD_LOG:
+        os.makedirs(os.path.dirname(os.path.abspath(LAMB_PAYLOAD_LOG)), exist_ok=True)
+        payload_handler = CompressedRotatingFileHandler(
+            LAMB_PAYLOAD_LOG,
+            maxBytes=LAMB_PAYLOAD_LOG_MAX_BYTES,
+            backupCount=LAMB_PAYLOAD_LOG_BACKUPS,
+            encoding='utf-8'
+        )
+        payload_handler.setFormatter(JsonFormatter())
+        payload_logger.setLevel(logging.INFO)
+        _replace_handler(payload_logger, payload_handler)
+    else:
+        # Disabled: isEnabledFor() is False, so payloads are never serialized
+        payload_logger.setLevel(logging.CRITICAL + 1)
+        _replace_handler(payload_logger, None)
+
+
+def log_lamb_payload(kind: str, payload: Any, **fields: Any) -> None:
+    """Write a raw LAMB payload to the payload sink (no-op when disabled)
+
+    Args:
+        kind: Payload kind, e.g. 'response' or 'parsed'
+        payload: Raw payload (any JSON-serializable value)
+        **fields: Extra identifying fields (submission id, evaluator...)
+    """
+    payload_logger = logging.getLogger(PAYLOAD_LOGGER_NAME)
+    if not payload_logger.isEnabledFor(logging.INFO):
+        return
+    payload_logger.info(kind, extra={'kind': kind, 'payload': payload, **fields})
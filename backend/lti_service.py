@@ -12,6 +12,10 @@ from xml.sax.saxutils import escape
 from typing import Dict, Any
 from database import get_db_session
 from db_models import StudentSubmissionDB, GradeDB, FileSubmissionDB, CourseDB, ActivityDB, MoodleDB
+import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
 
 
 class LTIGradeService:
@@ -58,9 +62,9 @@ class LTIGradeService:
         hashed = hmac.new(signing_key.encode("utf-8"), base_string.encode("utf-8"), hashlib.sha1)
         signature = base64.b64encode(hashed.digest()).decode("utf-8")
 
-        logging.debug(f"LTI Signature base string: {base_string}")
-        logging.debug(f"LTI Signature key: {signing_key}")
-        logging.debug(f"LTI Signature: {signature}")
+        logger.debug("LTI Signature base string: %s", base_string)
+        logger.debug("LTI Signature key: %s", signing_key)
+        logger.debug("LTI Signature: %s", signature)
 
         return signature
 
@@ -100,6 +104,7 @@ class LTIGradeService:
 </imsx_POXEnvelopeRequest>"""
 
     @staticmethod
+    @tracing.traced('lti.grade_passback', tracing.KIND_CLIENT)
     def send_grade_to_moodle(
         lis_result_sourcedid: str,
         lis_outcome_service_url: str,
@@ -110,7 +115,8 @@ class LTIGradeService:
     ) -> Dict[str, Any]:
         """Send a single grade to Moodle (LTI 1.1 Outcome Service)."""
         try:
-            logging.info(f"Sending grade to Moodle - Score: {score}/10, Comment: {comment}")
+            logger.info("Sending grade to Moodle - Score: %s/10", score, extra={'sample': 'grade_passback'})
+            logger.debug("Grade comment: %s", comment)
             xml_payload = LTIGradeService.create_outcome_xml(lis_result_sourcedid, score, comment)
 
             # Calculate oauth_body_hash
@@ -143,19 +149,23 @@ class LTIGradeService:
                 "Content-Length": str(len(xml_payload.encode("utf-8"))),
             }
 
-            response = requests.post(
-                lis_outcome_service_url, data=xml_payload.encode("utf-8"), headers=headers, timeout=30
-            )
+            start = time.perf_counter()
+            try:
+                response = requests.post(
+                    lis_outcome_service_url, data=xml_payload.encode("utf-8"), headers=headers, timeout=30
+                )
+            finally:
+                metrics.GRADE_PASSBACK_DURATION.observe(time.perf_counter() - start)
 
-            logging.info(f"Response code: {response.status_code}")
-            logging.debug(f"Response body: {response.text}")
+            logger.debug("Response code: %s", response.status_code)
+            logger.debug("Response body: %s", response.text)
 
             success = False
             error_message = None
             if response.status_code == 200:
                 if "imsx_codemajor>success" in response.text.lower():
                     success = True
-                    logging.info("✅ Grade sent successfully!")
+                    logger.info("✅ Grade sent successfully!")
                 else:
                     if "signature not valid" in response.text.lower():
                         error_message = "Error: OAuth signature invalid."
@@ -164,6 +174,7 @@ class LTIGradeService:
             else:
                 error_message = f"Error: HTTP {response.status_code}"
 
+            metrics.GRADE_PASSBACKS.inc('success' if success else 'failure')
             return {
                 "success": success,
                 "status_code": response.status_code,
@@ -172,11 +183,14 @@ class LTIGradeService:
             }
 
         except requests.exceptions.RequestException as e:
+            metrics.GRADE_PASSBACKS.inc('connection_error')
             return {"success": False, "status_code": None, "response_text": None, "error_message": f"Connection error: {e}"}
         except Exception as e:
+            metrics.GRADE_PASSBACKS.inc('error')
             return {"success": False, "status_code": None, "response_text": None, "error_message": f"Unexpected error: {e}"}
 
     @staticmethod
+    @tracing.traced('lti.grade_sync')
     def send_activity_grades_to_moodle(activity_id: str, activity_moodle_id: str) -> Dict[str, Any]:
         """Send all grades for an activity to Moodle.
         
@@ -266,7 +280,7 @@ class LTIGradeService:
             }
 
         except Exception as e:
-            logging.error(f"Error sending activity grades: {str(e)}")
+            logger.error("Error sending activity grades: %s", e)
             return {"success": False, "error": f"Internal error: {str(e)}", "sent_count": 0, "failed_count": 0, "results": []}
         finally:
             db.close()
@@ -1,13 +1,17 @@
+import time
+_IMPORTS_STARTED = time.perf_counter()  # Startup profile: time spent importing the app (see warmup)
+
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse, HTMLResponse, FileResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse, HTMLResponse, Response
 from contextlib import asynccontextmanager
 import os
 import logging
 import hashlib
 
 import config  # Load environment variables via load_dotenv()
+from logging_config import configure_logging
 from activities_router import router as activities_router
 from submissions_router import router as submissions_router
 from grades_router import router as grades_router
@@ -18,9 +22,24 @@ from moodle_service import MoodleService
 from database import init_db, get_db_session
 from db_models import FileSubmissionDB, StudentSubmissionDB, UserDB
 from storage_service import FileStorageService
+from storage_usage_service import StorageUsageService
+from file_delivery import file_response
+from fast_json import FastJSONResponse
+from response_compression import CompressionMiddleware
+from admission import AdmissionMiddleware
+from frontend_assets import MemoryAsset, PrecompressedStaticFiles, static_cache_control
+from stats_service import StatsService
+from evaluation_service import EvaluationService
+import metrics
+import query_log
+import tracing
+import storage_reconciler
+from profiling_service import ProfilingService, approximate_size
+import warmup
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (JSON lines, per-subsystem levels, LAMB payload sink)
+configure_logging()
+warmup.record_phase("imports", time.perf_counter() - _IMPORTS_STARTED)
 
 # Initialize database using lifespan
 @asynccontextmanager
@@ -28,17 +47,29 @@ async def lifespan(app: FastAPI):
     """Gestiona el ciclo de vida de la aplicación"""
     # Startup
     logging.info("Inicializando base de datos...")
+    started = time.perf_counter()
     init_db()
+    warmup.record_phase("init_db", time.perf_counter() - started)
     logging.info("Base de datos inicializada correctamente")
+    started = time.perf_counter()
+    StorageUsageService.backfill_if_empty()
+    warmup.record_phase("storage_usage_backfill", time.perf_counter() - started)
+    reconciler_task = storage_reconciler.start_background()
+    # Pool de la BD y conexiones a LAMB abiertos antes de /readyz (en segundo plano)
+    warmup_task = warmup.start_background()
     yield
-    # Shutdown (si se necesita algo en el futuro)
+    # Shutdown
+    for task in (reconciler_task, warmup_task):
+        if task is not None:
+            task.cancel()
 
 # Create FastAPI app
 app = FastAPI(
     title="LAMBA", 
     description="Learning Activities & Machine-Based Assessment", 
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # Include routers
@@ -47,6 +78,11 @@ app.include_router(submissions_router, prefix="/api/submissions", tags=["submiss
 app.include_router(grades_router, prefix="/api/grades", tags=["grades"])
 app.include_router(admin_router, tags=["admin"])
 
+# Concurrency limits with a bounded, per-session fair queue for uploads and
+# exports (503 + Retry-After when saturated), before the body is read;
+# innermost, so rejections still carry the CORS headers
+app.add_middleware(AdmissionMiddleware)
+
 # CORS middleware
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "*").split(",")
 app.add_middleware(
@@ -55,40 +91,57 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
+# Negotiated brotli/gzip for JSON/text responses (inside the metrics/tracing middlewares)
+app.add_middleware(CompressionMiddleware)
+
+# Per-request query accounting (Server-Timing), request latency / in-flight metrics
+# and request spans (outermost middlewares)
+app.add_middleware(query_log.QueryLogMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(tracing.TracingMiddleware)
+
 # Static files configuration
-FRONTEND_BUILD_DIR = "../frontend/build"
+FRONTEND_BUILD_DIR = os.getenv("FRONTEND_BUILD_DIR", "../frontend/build")
 frontend_build_path = os.path.abspath(os.path.join(os.path.dirname(__file__), FRONTEND_BUILD_DIR))
 frontend_index_html = os.path.join(frontend_build_path, 'index.html')
 
+# Small files of every page load, served from memory with ETags (see frontend_assets)
+frontend_index = MemoryAsset(frontend_index_html, "text/html; charset=utf-8")
+frontend_config_js = MemoryAsset(os.path.join(frontend_build_path, "config.js"), "text/javascript; charset=utf-8")
+frontend_favicon = MemoryAsset(os.path.join(frontend_build_path, "favicon.png"), "image/png",
+                               cache_control=static_cache_control())
+
 def setup_static_files():
     """Configura el servicio de archivos estáticos para el build de SvelteKit"""
     if not os.path.isdir(frontend_build_path):
         return
     
+    # Variantes .br/.gz precomprimidas y caché inmutable para /app/immutable/
     app_dir = os.path.join(frontend_build_path, "app")
     if os.path.isdir(app_dir):
-        app.mount("/app", StaticFiles(directory=app_dir), name="svelte_assets")
+        app.mount("/app", PrecompressedStaticFiles(directory=app_dir), name="svelte_assets")
     
     img_dir = os.path.join(frontend_build_path, "img")
     if os.path.isdir(img_dir):
-        app.mount("/img", StaticFiles(directory=img_dir), name="svelte_images")
+        app.mount("/img", PrecompressedStaticFiles(directory=img_dir), name="svelte_images")
 
 @app.get("/favicon.png", include_in_schema=False)
-async def get_favicon():
+async def get_favicon(request: Request):
     """Sirve el favicon"""
-    favicon_path = os.path.join(frontend_build_path, "favicon.png")
-    if os.path.isfile(favicon_path):
-        return FileResponse(favicon_path)
+    response = frontend_favicon.response(request)
+    if response is not None:
+        return response
     raise HTTPException(status_code=404, detail="Favicon no encontrado")
 
 @app.get("/config.js", include_in_schema=False)
-async def get_config_js():
+async def get_config_js(request: Request):
     """Sirve el archivo config.js para la app SvelteKit"""
-    config_path = os.path.join(frontend_build_path, "config.js")
-    if os.path.isfile(config_path):
-        return FileResponse(config_path)
+    response = frontend_config_js.response(request)
+    if response is not None:
+        return response
     raise HTTPException(status_code=404, detail="Archivo de configuración no encontrado")
 
 # Setup static files
@@ -97,8 +150,14 @@ setup_static_files()
 # Almacén temporal de datos LTI
 lti_data_store = {}
 
+ProfilingService.register_memory_probe(
+    "lti_data_store",
+    lambda: {"entries": len(lti_data_store), "approx_bytes": approximate_size(lti_data_store)}
+)
+
 # Rutas LTI
 @app.post("/lti")
+@tracing.traced('lti.launch')
 async def process_lti_launch(request: Request):
     """Procesa el lanzamiento LTI desde Moodle y almacena los datos"""
     try:
@@ -238,9 +297,16 @@ async def process_lti_launch(request: Request):
             max_age=3600
         )
         
+        try:
+            StatsService.record_launch()
+        except Exception as e:
+            logging.error(f"Error registrando lanzamiento en estadísticas: {str(e)}")
+        
+        metrics.LTI_LAUNCHES.inc('success')
         return response
         
     except Exception as e:
+        metrics.LTI_LAUNCHES.inc('error')
         logging.error(f"Error procesando lanzamiento LTI: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error procesando lanzamiento LTI: {str(e)}")
 
@@ -323,81 +389,186 @@ async def get_debug_mode(request: Request):
         logging.error(f"Error checking debug mode: {str(e)}")
         return {"debug_mode": False}
 
+def _evaluation_queue_collector():
+    """Profundidad de la cola de evaluación por estado (calculada en cada scrape)"""
+    depth = EvaluationService.get_queue_depth()
+    return [metrics.make_gauge(
+        'lamba_evaluation_queue_depth',
+        'File submissions by evaluation status',
+        ('status',),
+        (((status,), count) for status, count in depth.items())
+    )]
+
+metrics.REGISTRY.register_collector('evaluation_queue', _evaluation_queue_collector)
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics(request: Request):
+    """Expone las métricas de la aplicación en formato Prometheus"""
+    metrics_token = os.getenv("METRICS_TOKEN", "")
+    if metrics_token:
+        if request.headers.get("Authorization") != f"Bearer {metrics_token}":
+            raise HTTPException(status_code=401, detail="No autorizado")
+    elif os.getenv("METRICS_PUBLIC", "false").lower() != "true":
+        # Without a token the endpoint stays closed unless it is explicitly made public
+        raise HTTPException(status_code=401, detail="No autorizado: define METRICS_TOKEN o METRICS_PUBLIC=true")
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: el proceso responde (no consulta dependencias)"""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Readiness: 503 hasta terminar el warm-up, después mientras la base de datos responda"""
+    ready, body = await run_in_threadpool(warmup.readiness)
+    return FastJSONResponse(body, status_code=200 if ready else 503)
+
+def _teacher_lti_data(request: Request) -> dict:
+    """LTI data of a teacher/administrator session (401/403/404 otherwise)"""
+    session_id = get_session_id_from_request(request)
+    if not session_id:
+        raise HTTPException(status_code=401, detail="No se encontró sesión LTI activa")
+    
+    if session_id not in lti_data_store:
+        raise HTTPException(status_code=404, detail="Sesión expirada o no encontrada")
+    
+    lti_data = lti_data_store[session_id]
+    
+    if not lti_data or not lti_data.get('roles'):
+        raise HTTPException(status_code=403, detail="Sin permisos para descargar archivos")
+    
+    roles = lti_data['roles'].lower()
+    has_permission = any(role in roles for role in ['administrator', 'instructor', 'teacher', 'admin'])
+    
+    if not has_permission:
+        raise HTTPException(status_code=403, detail="Solo profesores y administradores pueden descargar archivos")
+    
+    return lti_data
+
+
+def _download_filename(db, file_submission: FileSubmissionDB, stored_name: str) -> str:
+    """Download name of a submission file (group code or student name)"""
+    student_submission = None
+    user = None
+    if not file_submission.group_code:
+        student_submission = db.query(StudentSubmissionDB).filter(
+            StudentSubmissionDB.file_submission_id == file_submission.id
+        ).order_by(StudentSubmissionDB.joined_at.asc()).first()
+        if student_submission:
+            user = db.query(UserDB).filter(
+                UserDB.id == student_submission.student_id,
+                UserDB.moodle_id == student_submission.student_moodle_id
+            ).first()
+    
+    return FileStorageService.download_filename(
+        file_name=file_submission.file_name,
+        stored_path=stored_name,
+        group_code=file_submission.group_code,
+        student_name=user.full_name if user else None,
+        student_id=student_submission.student_id if student_submission else None,
+        uploaded_by=file_submission.uploaded_by
+    )
+
+
+async def _submission_file_response(request: Request, db, file_submission: FileSubmissionDB | None,
+                                    file_path: str) -> Response:
+    """Download of a stored file; named and validated (ETag) by its submission when there is one"""
+    key = FileStorageService.storage_key(file_path)
+    if key is None:
+        raise HTTPException(status_code=403, detail="Acceso denegado al archivo")
+    
+    backend = FileStorageService.backend()
+    stat = await run_in_threadpool(FileStorageService.stat, file_path)
+    if stat is None:
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+    filename = os.path.basename(key)
+    # Files without a submission row (legacy, orphaned) get a weak
+    # size/mtime ETag instead of being hashed on every download
+    content_hash = None
+    if file_submission:
+        try:
+            content_hash = file_submission.content_hash
+            if not content_hash:
+                # Rows stored before content hashes existed: hash once and keep it
+                content_hash = await run_in_threadpool(FileStorageService.hash_file, file_path)
+                file_submission.content_hash = content_hash
+                db.commit()
+            filename = _download_filename(db, file_submission, filename)
+        except Exception as e:
+            logging.warning(f"Unable to customize download filename: {e}")
+    
+    return await run_in_threadpool(
+        file_response,
+        request,
+        key,
+        backend=backend,
+        stat=stat,
+        filename=filename,
+        media_type='application/octet-stream',
+        content_hash=content_hash
+    )
+
+
+@app.get("/api/downloads/submission/{file_submission_id}")
+async def download_submission_file(file_submission_id: str, request: Request):
+    """Descarga el archivo de una entrega por su id (solo profesores de la misma instancia de Moodle)
+    
+    Con la deduplicación varias entregas pueden compartir el mismo archivo
+    almacenado: el id identifica la entrega (nombre de descarga, ETag) sin
+    ambigüedad.
+    """
+    try:
+        lti_data = _teacher_lti_data(request)
+        db = get_db_session()
+        try:
+            file_submission = db.query(FileSubmissionDB).filter(
+                FileSubmissionDB.id == file_submission_id,
+                FileSubmissionDB.activity_moodle_id == lti_data.get('tool_consumer_instance_guid', '')
+            ).first()
+            if not file_submission:
+                raise HTTPException(status_code=404, detail="Entrega no encontrada")
+            return await _submission_file_response(request, db, file_submission, file_submission.file_path)
+        finally:
+            db.close()
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error descargando archivo: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error descargando archivo")
+
+
 @app.get("/api/downloads/{file_path:path}")
 async def download_file(file_path: str, request: Request):
-    """Descarga archivos subidos (solo para profesores/administradores)"""
+    """Descarga archivos subidos por ruta (solo para profesores/administradores)
+    
+    Ruta heredada: un archivo deduplicado puede pertenecer a varias entregas,
+    así que solo se consideran las de la instancia de Moodle de la sesión
+    (la de la actividad de la sesión primero). Usar /api/downloads/submission/{id}.
+    """
     try:
-        session_id = get_session_id_from_request(request)
-        if not session_id:
-            raise HTTPException(status_code=401, detail="No se encontró sesión LTI activa")
-        
-        if session_id not in lti_data_store:
-            raise HTTPException(status_code=404, detail="Sesión expirada o no encontrada")
-        
-        lti_data = lti_data_store[session_id]
-        
-        if not lti_data or not lti_data.get('roles'):
-            raise HTTPException(status_code=403, detail="Sin permisos para descargar archivos")
-        
-        roles = lti_data['roles'].lower()
-        has_permission = any(role in roles for role in ['administrator', 'instructor', 'teacher', 'admin'])
-        
-        if not has_permission:
-            raise HTTPException(status_code=403, detail="Solo profesores y administradores pueden descargar archivos")
+        lti_data = _teacher_lti_data(request)
         
         import urllib.parse
         decoded_path = urllib.parse.unquote(file_path)
         
-        full_path = FileStorageService.resolve_path(decoded_path)
-        
-        if not FileStorageService.is_within_uploads(full_path):
-            raise HTTPException(status_code=403, detail="Acceso denegado al archivo")
-        
-        if not os.path.isfile(full_path):
-            raise HTTPException(status_code=404, detail="Archivo no encontrado")
-        filename = os.path.basename(full_path)
-        db = None
+        db = get_db_session()
         try:
-            db = get_db_session()
-            file_submission = db.query(FileSubmissionDB).filter(
+            # Index-backed lookup (file_submissions.file_path)
+            rows = db.query(FileSubmissionDB).filter(
                 FileSubmissionDB.file_path == decoded_path
-            ).first()
-            
-            if file_submission:
-                extension = os.path.splitext(file_submission.file_name or "")[1]
-                if not extension:
-                    extension = os.path.splitext(filename)[1]
-                
-                if file_submission.group_code:
-                    base_name = file_submission.group_code
-                else:
-                    student_submission = db.query(StudentSubmissionDB).filter(
-                        StudentSubmissionDB.file_submission_id == file_submission.id
-                    ).order_by(StudentSubmissionDB.joined_at.asc()).first()
-                    
-                    base_name = None
-                    if student_submission:
-                        user = db.query(UserDB).filter(UserDB.id == student_submission.student_id).first()
-                        base_name = (user.full_name or "").strip()
-                        if not base_name:
-                            base_name = student_submission.student_id
-                    if not base_name:
-                        base_name = file_submission.uploaded_by or "submission"
-                
-                sanitized = FileStorageService.sanitize_filename(f"{base_name}{extension}")
-                if sanitized:
-                    filename = sanitized
-        except Exception as e:
-            logging.warning(f"Unable to customize download filename: {e}")
+            ).order_by(FileSubmissionDB.uploaded_at.asc()).all()
+            moodle_id = lti_data.get('tool_consumer_instance_guid', '')
+            own = [row for row in rows if row.activity_moodle_id == moodle_id]
+            if rows and not own:
+                # Stored for another Moodle instance only
+                raise HTTPException(status_code=404, detail="Archivo no encontrado")
+            activity_id = lti_data.get('resource_link_id')
+            file_submission = next((row for row in own if row.activity_id == activity_id), own[0] if own else None)
+            return await _submission_file_response(request, db, file_submission, decoded_path)
         finally:
-            if db:
-                db.close()
-        
-        return FileResponse(
-            path=full_path,
-            filename=filename,
-            media_type='application/octet-stream'
-        )
+            db.close()
         
     except HTTPException:
         raise
@@ -419,8 +590,9 @@ async def serve_spa(request: Request, full_path: str):
             else:
                 raise HTTPException(status_code=404, detail="Archivo no encontrado")
         
-        if os.path.isfile(frontend_index_html):
-            return FileResponse(frontend_index_html)
+        response = frontend_index.response(request)
+        if response is not None:
+            return response
         else:
             return HTMLResponse(
                 content="<h1>Frontend no construido</h1><p>Por favor ejecuta 'npm run build' en el directorio frontend/svelte-app</p>",
@@ -0,0 +1,330 @@
+"""
+Metrics - Prometheus-compatible in-process metrics
+
+Handles:
+- Counters, gauges and histograms with labels (text exposition format 0.0.4)
+- Scrape-time collectors for values read from the database
+- ASGI middleware with per-route request latency and in-flight requests
+
+Recording a value is a dict lookup plus an increment under a lock, so
+instrumenting hot paths is cheap. The text output is only built on scrape.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Seconds; suited to HTTP handlers and DB queries
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Seconds; LAMB evaluations and grade passback are remote calls that can take minutes
+REMOTE_CALL_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+# Bytes; uploads are capped at 50MB
+SIZE_BUCKETS = (10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000, 25_000_000, 50_000_000)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    """Base class: a named metric family with fixed label names"""
+
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Tuple[str, ...]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return labels if all(type(label) is str for label in labels) else tuple(map(str, labels))
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value"""
+
+    metric_type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in items]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    metric_type = 'gauge'
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            state[index] += 1
+            state[-1] += value
+
+    def time(self, *labels: str) -> '_Timer':
+        """Context manager observing the elapsed time of its block"""
+        return _Timer(self, labels)
+
+    def count(self, *labels: str) -> int:
+        state = self._values.get(self._key(labels))
+        return int(sum(state[:-1])) if state else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state[:-1]):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(state[-1])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> '_Timer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Registry:
+    """Holds the metric families and scrape-time collectors"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Callable[[], Iterable[_Metric]]] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, name: str, collector: Callable[[], Iterable[_Metric]]) -> None:
+        """Register (or replace) a function returning metrics computed on scrape"""
+        self._collectors[name] = collector
+
+    def render(self) -> str:
+        families = list(self._metrics.values())
+        for collector in list(self._collectors.values()):
+            try:
+                families.extend(collector())
+            except Exception:
+                # A failing collector must not break the whole scrape
+                continue
+        lines = []
+        for metric in families:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    'lamba_http_request_duration_seconds', 'HTTP request latency by route', ('method', 'route', 'status')))
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    'lamba_http_requests_in_flight', 'HTTP requests currently being served'))
+HTTP_REQUESTS_IN_FLIGHT.set(0)
+
+LTI_LAUNCHES = REGISTRY.register(Counter(
+    'lamba_lti_launches_total', 'LTI launches received (use rate() for launches per minute)', ('outcome',)))
+
+UPLOAD_SIZE = REGISTRY.register(Histogram(
+    'lamba_upload_size_bytes', 'Size of uploaded submission files', buckets=SIZE_BUCKETS))
+UPLOAD_DURATION = REGISTRY.register(Histogram(
+    'lamba_upload_duration_seconds', 'Time to receive and store a submission upload', ('outcome',)))
+STORED_BLOBS = REGISTRY.register(Counter(
+    'lamba_storage_blobs_total',
+    'Stored submission files by outcome (written, deduplicated = bytes already stored, unchanged = same file re-uploaded)',
+    ('outcome',)))
+STORED_BYTES = REGISTRY.register(Counter(
+    'lamba_storage_written_bytes_total',
+    'Bytes of newly stored submission files: original (as uploaded) and stored (after compression at rest)',
+    ('encoding', 'kind')))
+STORAGE_RECONCILED = REGISTRY.register(Counter(
+    'lamba_storage_reconciled_total',
+    'Storage reconciler findings (orphan, unreferenced_blob, dangling_submission, dangling_blob) by outcome',
+    ('kind', 'outcome')))
+STORAGE_QUOTA_REJECTIONS = REGISTRY.register(Counter(
+    'lamba_storage_quota_rejections_total',
+    'Uploads rejected because they would exceed a storage quota',
+    ('level',)))
+
+ADMISSION_WAIT = REGISTRY.register(Histogram(
+    'lamba_admission_wait_seconds',
+    'Time requests to heavy routes (uploads, exports) waited for an admission slot, by outcome (admitted, timeout)',
+    ('pool', 'outcome')))
+ADMISSION_REJECTIONS = REGISTRY.register(Counter(
+    'lamba_admission_rejections_total',
+    'Requests rejected with 503 by admission control (queue_full, timeout, session_limit)',
+    ('pool', 'reason')))
+ADMISSION_ACTIVE = REGISTRY.register(Gauge(
+    'lamba_admission_active', 'Requests holding an admission slot', ('pool',)))
+ADMISSION_QUEUED = REGISTRY.register(Gauge(
+    'lamba_admission_queued', 'Requests waiting for an admission slot', ('pool',)))
+
+EXTRACTION_DURATION = REGISTRY.register(Histogram(
+    'lamba_extraction_duration_seconds', 'Document text extraction time by format', ('format', 'outcome')))
+
+LAMB_REQUEST_DURATION = REGISTRY.register(Histogram(
+    'lamba_lamb_request_duration_seconds', 'LAMB API call latency', ('endpoint',), buckets=REMOTE_CALL_BUCKETS))
+LAMB_REQUESTS = REGISTRY.register(Counter(
+    'lamba_lamb_requests_total', 'LAMB API calls by result (HTTP status code or error kind)', ('endpoint', 'code')))
+
+GRADE_PASSBACK_DURATION = REGISTRY.register(Histogram(
+    'lamba_grade_passback_duration_seconds', 'LTI grade passback latency', buckets=REMOTE_CALL_BUCKETS))
+GRADE_PASSBACKS = REGISTRY.register(Counter(
+    'lamba_grade_passbacks_total', 'LTI grade passbacks by outcome', ('outcome',)))
+
+DB_QUERY_DURATION = REGISTRY.register(Histogram(
+    'lamba_db_query_duration_seconds', 'Database statement execution time', ('operation',)))
+DB_ERRORS = REGISTRY.register(Counter(
+    'lamba_db_errors_total', 'Database errors by kind (locked = SQLite busy timeout expired)', ('operation', 'kind')))
+
+_DB_OPERATIONS = frozenset(('select', 'insert', 'update', 'delete'))
+
+
+def db_operation(statement: str) -> str:
+    """Classify a SQL statement by its leading keyword (bounded label set)"""
+    keyword = statement.lstrip()[:6].lower()
+    return keyword if keyword in _DB_OPERATIONS else 'other'
+
+
+def render() -> str:
+    """Render all metrics in the Prometheus text format"""
+    return REGISTRY.render()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request latency and in-flight requests
+
+    The route label is the matched route template (e.g.
+    /api/activities/{activity_id}), never the raw path, so label cardinality
+    stays bounded. The request is measured until its response body has been
+    sent, so background tasks attached to the response are not counted.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        state = {'status': '500', 'done': False}
+
+        def finish() -> None:
+            if state['done']:
+                return
+            state['done'] = True
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = scope.get('route')
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                scope['method'],
+                getattr(route, 'path', None) or _unmatched_label(scope),
+                state['status']
+            )
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                state['status'] = str(message['status'])
+            await send(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                finish()
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish()
+
+
+def _unmatched_label(scope) -> str:
+    """Label for requests not served by an API route (static mounts, 404s)"""
+    root_path = scope.get('app_root_path') or scope.get('root_path') or ''
+    return f'{root_path}/*' if root_path else 'unmatched'
+
+
+def make_gauge(name: str, documentation: str, labelnames: Sequence[str],
+               values: Iterable[Tuple[Sequence[str], float]]) -> Gauge:
+    """Build a one-off gauge for scrape-time collectors"""
+    gauge = Gauge(name, documentation, labelnames)
+    for labels, value in values:
+        gauge.set(value, *labels)
+    return gauge
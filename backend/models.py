@@ -128,6 +128,7 @@ class FileSubmission(BaseModel):
     activity_moodle_id: str  # Moodle instance ID (part of activity composite key)
     file_name: str
     file_path: str
+    content_hash: Optional[str] = None  # SHA-256 of the content (also the download ETag)
     file_size: int
     file_type: str  # MIME type
     uploaded_at: Optional[datetime] = None
@@ -0,0 +1,256 @@
+"""
+Profiling Service - On-demand diagnostics of the running process
+
+Handles:
+- Sampling profiles (wall or CPU) of all threads as collapsed stacks,
+  ready for flamegraph.pl / speedscope
+- tracemalloc snapshot diffs against a baseline
+- Memory probes for in-process stores (e.g. the LTI session store)
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Callable, Dict, Optional
+
+# Upper bound for a single profile capture
+PROFILER_MAX_SECONDS = int(os.getenv('PROFILER_MAX_SECONDS', '60'))
+
+# Default sampling interval (5 ms = 200 Hz)
+PROFILER_DEFAULT_INTERVAL_MS = float(os.getenv('PROFILER_DEFAULT_INTERVAL_MS', '5'))
+
+# Deepest tracemalloc traceback (tracemalloc itself rejects more than 65535 frames)
+MEMORY_MAX_FRAMES = 100
+
+PROFILE_MODES = ('wall', 'cpu')
+
+# Leaf functions of threads that are blocked, not running (CPU mode fallback)
+_IDLE_LEAVES = frozenset(('wait', 'select', 'poll', 'epoll', 'acquire', 'sleep', 'accept', 'recv', 'recv_into', 'read', '_worker', 'get'))
+
+_profile_lock = threading.Lock()
+_memory_lock = threading.Lock()
+_memory_baseline: Optional[tracemalloc.Snapshot] = None
+_memory_probes: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+class ProfilerBusyError(RuntimeError):
+    """Raised when a profile is requested while another one is running"""
+
+
+class ProfilingService:
+    """Sampling profiler and tracemalloc helpers for the admin debug endpoints"""
+
+    @staticmethod
+    def capture_profile(seconds: float, mode: str = 'wall', interval_ms: Optional[float] = None) -> Dict[str, Any]:
+        """Sample the stacks of every thread for the given duration
+
+        Args:
+            seconds: Capture duration (capped at PROFILER_MAX_SECONDS)
+            mode: 'wall' counts every sampled stack; 'cpu' only stacks of
+                threads that consumed CPU since the previous sample
+            interval_ms: Sampling interval in milliseconds
+
+        Returns:
+            Dictionary with 'collapsed' (one "frame;frame;frame count" line
+            per stack), 'samples', 'seconds', 'mode' and 'interval_ms'
+
+        Raises:
+            ValueError: If the mode or duration is invalid
+            ProfilerBusyError: If another profile is being captured
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"mode must be one of {', '.join(PROFILE_MODES)}")
+        if seconds <= 0:
+            raise ValueError("seconds must be positive")
+        seconds = min(seconds, PROFILER_MAX_SECONDS)
+        interval = max(interval_ms or PROFILER_DEFAULT_INTERVAL_MS, 1) / 1000
+
+        if not _profile_lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already being captured")
+        try:
+            stacks = Counter()
+            samples = 0
+            own_ident = threading.get_ident()
+            cpu_times = ProfilingService._thread_cpu_times() if mode == 'cpu' else {}
+            deadline = time.monotonic() + seconds
+
+            while time.monotonic() < deadline:
+                frames = sys._current_frames()
+                threads = {thread.ident: thread for thread in threading.enumerate()}
+                if mode == 'cpu':
+                    previous, cpu_times = cpu_times, ProfilingService._thread_cpu_times()
+
+                for ident, frame in frames.items():
+                    if ident == own_ident:
+                        continue
+                    thread = threads.get(ident)
+                    native_id = thread.native_id if thread is not None else None
+                    if mode == 'cpu' and not ProfilingService._was_running(native_id, frame, previous, cpu_times):
+                        continue
+                    stacks[ProfilingService._collapse(thread.name if thread is not None else str(ident), frame)] += 1
+                del frames
+                samples += 1
+                time.sleep(interval)
+
+            collapsed = '\n'.join(f'{stack} {count}' for stack, count in stacks.most_common())
+            return {
+                'collapsed': collapsed + '\n' if collapsed else '',
+                'samples': samples,
+                'seconds': seconds,
+                'mode': mode,
+                'interval_ms': interval * 1000
+            }
+        finally:
+            _profile_lock.release()
+
+    @staticmethod
+    def _collapse(thread_name: str, frame) -> str:
+        """Render a frame chain root-first as "thread;module:function;..." """
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            parts.append(f'{module}:{code.co_name}')
+            frame = frame.f_back
+        parts.append(thread_name.replace(';', '_').replace(' ', '_'))
+        return ';'.join(reversed(parts))
+
+    @staticmethod
+    def _thread_cpu_times() -> Dict[int, int]:
+        """CPU ticks per native thread id (Linux /proc); empty elsewhere"""
+        times = {}
+        task_dir = '/proc/self/task'
+        try:
+            native_ids = os.listdir(task_dir)
+        except OSError:
+            return times
+        for native_id in native_ids:
+            try:
+                with open(f'{task_dir}/{native_id}/stat', 'rb') as stat_file:
+                    fields = stat_file.read().rsplit(b')', 1)[1].split()
+                # utime and stime are fields 14 and 15 of stat (11 and 12 after the command name)
+                times[int(native_id)] = int(fields[11]) + int(fields[12])
+            except (OSError, IndexError, ValueError):
+                continue
+        return times
+
+    @staticmethod
+    def _was_running(native_id: Optional[int], frame, previous: Dict[int, int], current: Dict[int, int]) -> bool:
+        """Whether a thread used CPU since the last sample"""
+        if native_id in current and native_id in previous:
+            return current[native_id] > previous[native_id]
+        # No per-thread CPU accounting: treat threads parked in blocking calls as idle
+        return frame.f_code.co_name not in _IDLE_LEAVES
+
+    @staticmethod
+    def register_memory_probe(name: str, probe: Callable[[], Dict[str, Any]]) -> None:
+        """Register (or replace) a function describing the size of an in-process store"""
+        _memory_probes[name] = probe
+
+    @staticmethod
+    def start_memory_tracing(nframes: int = 10) -> Dict[str, Any]:
+        """Start tracemalloc (if needed) and take the baseline snapshot"""
+        global _memory_baseline
+        with _memory_lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(max(1, min(nframes, MEMORY_MAX_FRAMES)))
+            _memory_baseline = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            return {
+                'tracing': True,
+                'nframes': tracemalloc.get_traceback_limit(),
+                'traced_bytes': current,
+                'peak_bytes': peak,
+                'probes': ProfilingService._run_probes()
+            }
+
+    @staticmethod
+    def memory_diff(limit: int = 25, key_type: str = 'lineno', filename: Optional[str] = None,
+                    rebase: bool = False) -> Dict[str, Any]:
+        """Compare a new snapshot against the baseline
+
+        Args:
+            limit: Number of entries returned (largest growth first)
+            key_type: 'lineno', 'filename' or 'traceback'
+            filename: Optional substring to only keep allocations from matching files
+            rebase: Make the new snapshot the baseline for the next diff
+
+        Raises:
+            ValueError: If tracing was not started or key_type is invalid
+        """
+        global _memory_baseline
+        if key_type not in ('lineno', 'filename', 'traceback'):
+            raise ValueError("key_type must be lineno, filename or traceback")
+        with _memory_lock:
+            if not tracemalloc.is_tracing() or _memory_baseline is None:
+                raise ValueError("Memory tracing is not started")
+            raw_snapshot = tracemalloc.take_snapshot()
+            filters = [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ]
+            if filename:
+                filters.append(tracemalloc.Filter(True, f'*{filename}*'))
+            snapshot = raw_snapshot.filter_traces(filters)
+            baseline = _memory_baseline.filter_traces(filters)
+            stats = snapshot.compare_to(baseline, key_type)
+            if rebase:
+                _memory_baseline = raw_snapshot
+            current, peak = tracemalloc.get_traced_memory()
+
+        return {
+            'traced_bytes': current,
+            'peak_bytes': peak,
+            'total_size_diff': sum(stat.size_diff for stat in stats),
+            'top': [ProfilingService._stat_to_dict(stat) for stat in stats[:max(1, limit)]],
+            'probes': ProfilingService._run_probes()
+        }
+
+    @staticmethod
+    def stop_memory_tracing() -> Dict[str, Any]:
+        """Stop tracemalloc and drop the baseline"""
+        global _memory_baseline
+        with _memory_lock:
+            was_tracing = tracemalloc.is_tracing()
+            tracemalloc.stop()
+            _memory_baseline = None
+        return {'tracing': False, 'was_tracing': was_tracing}
+
+    @staticmethod
+    def _stat_to_dict(stat: tracemalloc.StatisticDiff) -> Dict[str, Any]:
+        frames = [f'{frame.filename}:{frame.lineno}' for frame in stat.traceback]
+        return {
+            'location': frames[0] if frames else None,
+            'traceback': frames if len(frames) > 1 else None,
+            'size_bytes': stat.size,
+            'size_diff_bytes': stat.size_diff,
+            'count': stat.count,
+            'count_diff': stat.count_diff
+        }
+
+    @staticmethod
+    def _run_probes() -> Dict[str, Any]:
+        results = {}
+        for name, probe in list(_memory_probes.items()):
+            try:
+                results[name] = probe()
+            except Exception as e:
+                results[name] = {'error': str(e)}
+        return results
+
+
+def approximate_size(obj: Any, _seen: Optional[set] = None) -> int:
+    """Approximate deep size in bytes of dicts/lists/strings (for memory probes)"""
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approximate_size(key, seen) + approximate_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approximate_size(item, seen) for item in obj)
+    return size
@@ -0,0 +1,154 @@
+"""
+Prompt Builder - Token-budgeted prompt construction for LAMB evaluations
+
+Handles:
+- Estimating the token count of extracted submission text
+- Resolving the prompt token budget for each evaluator
+- Splitting documents that exceed the budget into evaluable chunks
+"""
+
+import math
+import os
+from typing import Dict, Any, List, Optional
+
+# LAMB does not expose the evaluator tokenizer, so we use the usual
+# characters-per-token approximation for Latin-script text
+CHARS_PER_TOKEN = float(os.getenv('LAMB_CHARS_PER_TOKEN', '4'))
+
+# Default maximum number of tokens sent to an evaluator in a single prompt
+DEFAULT_TOKEN_BUDGET = int(os.getenv('LAMB_PROMPT_TOKEN_BUDGET', '24000'))
+
+# Per-evaluator overrides, e.g. "evaluator_a:8000,evaluator_b:32000"
+EVALUATOR_TOKEN_BUDGETS = os.getenv('LAMB_EVALUATOR_TOKEN_BUDGETS', '')
+
+# Header prepended to every chunk so the evaluator knows it sees a fragment
+CHUNK_HEADER_TEMPLATE = "[Part {index}/{total} of a longer submission. Evaluate only this part.]\n\n"
+
+# Tokens reserved for the chunk header
+CHUNK_HEADER_TOKENS = 32
+
+
+class PromptBuilder:
+    """Builds LAMB prompts that respect the evaluator token budget"""
+
+    @staticmethod
+    def estimate_tokens(text: Optional[str]) -> int:
+        """Estimate the number of tokens of a text (O(1), no tokenizer needed)"""
+        if not text:
+            return 0
+        return int(math.ceil(len(text) / CHARS_PER_TOKEN))
+
+    @staticmethod
+    def _parse_budget_overrides(raw: str) -> Dict[str, int]:
+        """Parse "evaluator:budget" pairs from the LAMB_EVALUATOR_TOKEN_BUDGETS setting"""
+        overrides = {}
+        for item in (raw or '').split(','):
+            evaluator_id, _, budget = item.strip().rpartition(':')
+            if not evaluator_id:
+                continue
+            try:
+                overrides[evaluator_id.strip()] = int(budget)
+            except ValueError:
+                continue
+        return overrides
+
+    @staticmethod
+    def get_token_budget(evaluator_id: Optional[str]) -> int:
+        """Get the prompt token budget for an evaluator"""
+        overrides = PromptBuilder._parse_budget_overrides(EVALUATOR_TOKEN_BUDGETS)
+        budget = overrides.get(evaluator_id or '', DEFAULT_TOKEN_BUDGET)
+        # Never go below what the chunk header itself needs
+        return max(budget, CHUNK_HEADER_TOKENS * 4)
+
+    @staticmethod
+    def build_prompts(text: str, evaluator_id: Optional[str], token_budget: Optional[int] = None) -> Dict[str, Any]:
+        """Build the prompts needed to evaluate a document
+
+        Documents within budget are sent untouched as a single prompt. Larger
+        documents are split into chunks, each prefixed with a part header.
+
+        Args:
+            text: Extracted document text
+            evaluator_id: LAMB evaluator ID (used to look up the budget)
+            token_budget: Optional explicit budget (overrides configuration)
+
+        Returns:
+            Dictionary with 'prompts', per-prompt 'token_estimates',
+            'total_tokens', 'token_budget' and 'chunked'
+        """
+        budget = token_budget or PromptBuilder.get_token_budget(evaluator_id)
+        total_tokens = PromptBuilder.estimate_tokens(text)
+
+        if total_tokens <= budget:
+            return {
+                'prompts': [text],
+                'token_estimates': [total_tokens],
+                'total_tokens': total_tokens,
+                'token_budget': budget,
+                'chunked': False
+            }
+
+        max_chunk_chars = int((budget - CHUNK_HEADER_TOKENS) * CHARS_PER_TOKEN)
+        chunks = PromptBuilder.split_text(text, max_chunk_chars)
+        prompts = [
+            CHUNK_HEADER_TEMPLATE.format(index=index, total=len(chunks)) + chunk
+            for index, chunk in enumerate(chunks, start=1)
+        ]
+
+        return {
+            'prompts': prompts,
+            'token_estimates': [PromptBuilder.estimate_tokens(chunk) for chunk in chunks],
+            'total_tokens': total_tokens,
+            'token_budget': budget,
+            'chunked': True
+        }
+
+    @staticmethod
+    def split_text(text: str, max_chars: int) -> List[str]:
+        """Split text into chunks of at most max_chars characters
+
+        Chunks are packed greedily with whole paragraphs. Paragraphs that are
+        larger than a chunk are cut at the last whitespace before the limit.
+        """
+        if max_chars <= 0:
+            raise ValueError("max_chars must be positive")
+
+        chunks = []
+        current = []
+        current_len = 0
+
+        for paragraph in text.split('\n'):
+            pieces = PromptBuilder._split_long_paragraph(paragraph, max_chars)
+            for piece in pieces:
+                # +1 accounts for the newline that joins paragraphs back together
+                added_len = len(piece) + (1 if current else 0)
+                if current and current_len + added_len > max_chars:
+                    chunks.append('\n'.join(current))
+                    current = []
+                    current_len = 0
+                    added_len = len(piece)
+                current.append(piece)
+                current_len += added_len
+
+        if current:
+            chunks.append('\n'.join(current))
+
+        return [chunk for chunk in chunks if chunk.strip()]
+
+    @staticmethod
+    def _split_long_paragraph(paragraph: str, max_chars: int) -> List[str]:
+        """Cut a single paragraph into pieces that fit in a chunk"""
+        if len(paragraph) <= max_chars:
+            return [paragraph]
+
+        pieces = []
+        remaining = paragraph
+        while len(remaining) > max_chars:
+            cut = remaining.rfind(' ', 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            pieces.append(remaining[:cut])
+            remaining = remaining[cut:].lstrip(' ')
+        if remaining:
+            pieces.append(remaining)
+        return pieces
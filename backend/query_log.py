@@ -0,0 +1,261 @@
+"""
+Query Log - Per-request query accounting and slow-query ring buffer
+
+Handles:
+- Query count and accumulated DB time per HTTP request, exposed in a
+  Server-Timing response header (visible in the browser dev tools)
+- Ring buffer of statements slower than a threshold, with the route,
+  the shape of the parameters (never their values) and the app stack
+- Aggregated "worst offenders" by statement and the requests issuing the
+  most queries (N+1 patterns are made of fast queries)
+
+The engine hooks in database.py call record_query() for every statement;
+the common path is a context variable lookup and two additions.
+"""
+
+import os
+import re
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Statements at least this slow are kept in the ring buffer
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '100'))
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv('SLOW_QUERY_BUFFER_SIZE', '200'))
+# Requests issuing at least this many queries are reported as heavy (likely N+1)
+QUERY_HEAVY_REQUEST_THRESHOLD = int(os.getenv('QUERY_HEAVY_REQUEST_THRESHOLD', '50'))
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING', 'true').lower() in ('true', '1', 'yes')
+
+# Distinct statements tracked in the offenders table
+_MAX_OFFENDERS = 500
+# App frames kept per slow query
+_STACK_DEPTH = 8
+_STATEMENT_CHARS = 500
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_SKIPPED_FILES = frozenset((os.path.abspath(__file__), os.path.join(_APP_DIR, 'database.py')))
+_PLACEHOLDER_LIST = re.compile(r'\(\?(?:\s*,\s*\?)+\)')
+_WHITESPACE = re.compile(r'\s+')
+
+_lock = threading.Lock()
+_slow_queries: deque = deque(maxlen=SLOW_QUERY_BUFFER_SIZE)
+_heavy_requests: deque = deque(maxlen=SLOW_QUERY_BUFFER_SIZE)
+_offenders: Dict[str, Dict[str, Any]] = {}
+
+
+class RequestQueryStats:
+    """Queries issued while serving one HTTP request"""
+
+    __slots__ = ('scope', 'count', 'seconds', 'statements', 'response_sent')
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.scope = scope
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()
+        self.response_sent = False
+
+    @property
+    def route(self) -> Optional[str]:
+        """Method and matched route template, resolved lazily (routing happens after the middleware)"""
+        if self.scope is None:
+            return None
+        route = getattr(self.scope.get('route'), 'path', None) or self.scope.get('path')
+        label = f"{self.scope.get('method')} {route}"
+        return f"{label} (background)" if self.response_sent else label
+
+
+_current_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar('lamba_query_stats', default=None)
+
+
+def current_stats() -> Optional[RequestQueryStats]:
+    """Query accounting of the request being served (None outside requests)"""
+    return _current_stats.get()
+
+
+def normalize_statement(statement: str) -> str:
+    """Collapse whitespace and expanded IN lists so equivalent statements group together"""
+    statement = _WHITESPACE.sub(' ', statement).strip()
+    return _PLACEHOLDER_LIST.sub('(?, ...)', statement)[:_STATEMENT_CHARS]
+
+
+def param_shape(parameters: Any, executemany: bool = False) -> Any:
+    """Describe parameters by type (and length for text) without keeping values"""
+    if executemany and isinstance(parameters, (list, tuple)):
+        return {'rows': len(parameters), 'row': param_shape(parameters[0]) if parameters else None}
+    if isinstance(parameters, dict):
+        return {str(key): _value_shape(value) for key, value in list(parameters.items())[:20]}
+    if isinstance(parameters, (list, tuple)):
+        shape = [_value_shape(value) for value in parameters[:20]]
+        if len(parameters) > 20:
+            shape.append(f'... {len(parameters) - 20} more')
+        return shape
+    return _value_shape(parameters)
+
+
+def _value_shape(value: Any) -> str:
+    if isinstance(value, (str, bytes)):
+        return f'{type(value).__name__}[{len(value)}]'
+    return type(value).__name__
+
+
+def _app_stack() -> List[str]:
+    """Innermost application frames (library and hook frames skipped)"""
+    frames = []
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if filename in _SKIPPED_FILES or not filename.startswith(_APP_DIR) or 'site-packages' in filename:
+            continue
+        frames.append(f'{os.path.relpath(filename, _APP_DIR)}:{frame.lineno} {frame.name}')
+        if len(frames) == _STACK_DEPTH:
+            break
+    return frames
+
+
+def record_query(statement: str, parameters: Any, seconds: float, executemany: bool = False) -> None:
+    """Account a finished statement (called from the engine hooks)"""
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += seconds
+        stats.statements[statement] += 1
+
+    if seconds * 1000 < SLOW_QUERY_THRESHOLD_MS:
+        return
+
+    duration_ms = round(seconds * 1000, 3)
+    normalized = normalize_statement(statement)
+    route = stats.route if stats is not None else None
+    _slow_queries.append({
+        'timestamp': datetime.utcnow().isoformat(),
+        'duration_ms': duration_ms,
+        'statement': normalized,
+        'route': route,
+        'params_shape': param_shape(parameters, executemany),
+        'stack': _app_stack()
+    })
+    with _lock:
+        entry = _offenders.get(normalized)
+        if entry is None:
+            if len(_offenders) >= _MAX_OFFENDERS:
+                del _offenders[min(_offenders, key=lambda key: _offenders[key]['total_ms'])]
+            entry = _offenders[normalized] = {'statement': normalized, 'count': 0, 'total_ms': 0.0,
+                                              'max_ms': 0.0, 'routes': Counter()}
+        entry['count'] += 1
+        entry['total_ms'] += duration_ms
+        entry['max_ms'] = max(entry['max_ms'], duration_ms)
+        if route:
+            entry['routes'][route] += 1
+
+
+def _finish_request(stats: RequestQueryStats, started: float) -> None:
+    """Report the request as heavy when it issued too many queries"""
+    if stats.count < QUERY_HEAVY_REQUEST_THRESHOLD:
+        return
+    repeated = Counter()
+    for statement, count in stats.statements.items():
+        repeated[normalize_statement(statement)] += count
+    _heavy_requests.append({
+        'timestamp': datetime.utcnow().isoformat(),
+        'route': stats.route,
+        'queries': stats.count,
+        'db_ms': round(stats.seconds * 1000, 3),
+        'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+        'most_repeated': [{'statement': statement, 'count': count} for statement, count in repeated.most_common(3)]
+    })
+
+
+def server_timing(stats: RequestQueryStats, elapsed: float) -> str:
+    """Server-Timing header value: DB time/query count and total app time so far"""
+    return f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries", app;dur={elapsed * 1000:.1f}'
+
+
+def snapshot(limit: int = 20, order: str = 'total') -> Dict[str, Any]:
+    """Worst offenders, most recent slow queries and heaviest requests
+
+    Args:
+        limit: Entries per list
+        order: Offender ordering: 'total' (accumulated time), 'max' or 'count'
+
+    Raises:
+        ValueError: If the order is invalid
+    """
+    sort_keys = {'total': 'total_ms', 'max': 'max_ms', 'count': 'count'}
+    if order not in sort_keys:
+        raise ValueError("order must be total, max or count")
+    limit = max(1, limit)
+
+    with _lock:
+        offenders = [
+            {
+                'statement': entry['statement'],
+                'count': entry['count'],
+                'total_ms': round(entry['total_ms'], 3),
+                'max_ms': entry['max_ms'],
+                'avg_ms': round(entry['total_ms'] / entry['count'], 3),
+                'routes': dict(entry['routes'].most_common(5))
+            }
+            for entry in _offenders.values()
+        ]
+    offenders.sort(key=lambda entry: entry[sort_keys[order]], reverse=True)
+    heavy = sorted(_heavy_requests, key=lambda entry: entry['queries'], reverse=True)
+
+    return {
+        'threshold_ms': SLOW_QUERY_THRESHOLD_MS,
+        'heavy_request_threshold': QUERY_HEAVY_REQUEST_THRESHOLD,
+        'offenders': offenders[:limit],
+        'slow_queries': list(reversed(_slow_queries))[:limit],
+        'heavy_requests': heavy[:limit]
+    }
+
+
+def reset() -> None:
+    """Clear the slow-query buffer, offenders and heavy requests"""
+    with _lock:
+        _slow_queries.clear()
+        _heavy_requests.clear()
+        _offenders.clear()
+
+
+class QueryLogMiddleware:
+    """Pure ASGI middleware accounting the queries of each HTTP request
+
+    Adds a Server-Timing header with the DB time and query count accumulated
+    until the response starts. Queries issued by background tasks after the
+    response are still logged when slow, attributed to "<route> (background)".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        stats = RequestQueryStats(scope)
+        token = _current_stats.set(stats)
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start' and SERVER_TIMING_ENABLED:
+                headers = list(message.get('headers', ()))
+                headers.append((b'server-timing', server_timing(stats, time.perf_counter() - started).encode('latin-1')))
+                message = {**message, 'headers': headers}
+            await send(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body', False) \
+                    and not stats.response_sent:
+                _finish_request(stats, started)
+                stats.response_sent = True
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not stats.response_sent:
+                _finish_request(stats, started)
+                stats.response_sent = True
+            _current_stats.reset(token)
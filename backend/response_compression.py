@@ -0,0 +1,159 @@
+"""
+Response Compression - Negotiated brotli/gzip for API responses
+
+Handles:
+- Accept-Encoding negotiation (br preferred when the brotli package is
+  installed, then gzip); responses below RESPONSE_COMPRESSION_MIN_SIZE are
+  sent as they are
+- Only compressible media types (JSON, NDJSON, text); ZIP archives, images
+  and PDFs are left alone
+- Streaming responses (NDJSON exports, CSV) compressed chunk by chunk with a
+  sync flush, so the client still receives rows as they are produced
+- Vary: Accept-Encoding on every compressible response
+
+Responses that already carry Content-Encoding (precompressed frontend
+assets), Content-Range or an ETag (file downloads, whose validators belong to
+the stored bytes; see file_delivery) are never touched.
+
+Submission listings of a large activity are hundreds of kilobytes of
+repetitive JSON (AI comments, file metadata): gzip typically cuts them to a
+fifth, which matters on the links of a classroom behind a Moodle iframe.
+"""
+
+import logging
+import os
+import zlib
+from typing import Optional
+
+from fastapi import Request
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from file_delivery import accepts_encoding
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+    logger.info("brotli not available. Responses are compressed with gzip only.")
+
+RESPONSE_COMPRESSION_ENABLED = os.getenv('RESPONSE_COMPRESSION_ENABLED', 'true').lower() == 'true'
+# Smaller bodies are not worth the CPU (and may grow once compressed)
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv('RESPONSE_COMPRESSION_MIN_SIZE', '1024'))
+RESPONSE_COMPRESSION_GZIP_LEVEL = int(os.getenv('RESPONSE_COMPRESSION_GZIP_LEVEL', '6'))
+# 0-11; 4-5 is as fast as gzip -6 with smaller output, 11 is for build-time compression only
+RESPONSE_COMPRESSION_BROTLI_QUALITY = int(os.getenv('RESPONSE_COMPRESSION_BROTLI_QUALITY', '4'))
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'application/javascript', 'text/')
+UNCOMPRESSED_STATUS = (204, 206, 304)
+
+
+def negotiate_encoding(request: Request) -> Optional[str]:
+    """Encoding to use for this request (None = identity)"""
+    if BROTLI_AVAILABLE and accepts_encoding(request, 'br'):
+        return 'br'
+    if accepts_encoding(request, 'gzip'):
+        return 'gzip'
+    return None
+
+
+def _is_compressible(message: Message) -> bool:
+    if message['status'] in UNCOMPRESSED_STATUS:
+        return False
+    headers = Headers(raw=message.get('headers', []))
+    if 'content-encoding' in headers or 'content-range' in headers or 'etag' in headers:
+        return False
+    return headers.get('content-type', '').startswith(COMPRESSIBLE_TYPES)
+
+
+class _Compressor:
+    """Streaming compressor with the same interface for gzip and brotli"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=RESPONSE_COMPRESSION_BROTLI_QUALITY)
+        else:
+            # wbits=31: gzip container
+            self._zlib = zlib.compressobj(RESPONSE_COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        """Compressed bytes of `data`; flush=True emits everything buffered so far"""
+        if self.encoding == 'br':
+            output = self._brotli.process(data)
+            return output + self._brotli.flush() if flush else output
+        output = self._zlib.compress(data)
+        return output + self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else output
+
+    def finish(self, data: bytes = b'') -> bytes:
+        if self.encoding == 'br':
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware compressing API responses per Accept-Encoding"""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = None):
+        self.app = app
+        self.minimum_size = RESPONSE_COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or scope['method'] == 'HEAD' or not RESPONSE_COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Request(scope))
+        start_message: Optional[Message] = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start_message, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message['type'] == 'http.response.start':
+                if not _is_compressible(message):
+                    passthrough = True
+                    await send(message)
+                    return
+                # Held back until the first body chunk decides the headers
+                start_message = {**message, 'headers': list(message.get('headers', []))}
+                MutableHeaders(raw=start_message['headers']).add_vary_header('Accept-Encoding')
+                if encoding is None:
+                    passthrough = True
+                    await send(start_message)
+                return
+
+            if message['type'] != 'http.response.body':
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if compressor is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                headers = MutableHeaders(raw=start_message['headers'])
+                headers['Content-Encoding'] = encoding
+                if more_body:
+                    del headers['Content-Length']
+                    body = compressor.compress(body, flush=True)
+                else:
+                    body = compressor.finish(body)
+                    headers['Content-Length'] = str(len(body))
+                await send(start_message)
+            else:
+                body = compressor.compress(body, flush=True) if more_body else compressor.finish(body)
+            await send({**message, 'body': body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,170 @@
+"""
+Service for system statistics of the admin dashboard.
+Entity counts come from one aggregate query cached for STATS_CACHE_TTL seconds;
+hourly series of launches, uploads and evaluations are computed from indexed timestamps.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+
+from database import get_db_session
+from db_models import (
+    MoodleDB, UserDB, CourseDB, ActivityDB,
+    StudentSubmissionDB, FileSubmissionDB, GradeDB, UsageHourlyDB
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds a computed statistic is reused (0 = always recompute)
+STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', '30'))
+# Longest hourly series that can be requested (14 days)
+STATS_SERIES_MAX_HOURS = int(os.getenv('STATS_SERIES_MAX_HOURS', '336'))
+
+COUNTED_TABLES = (
+    ('moodle_instances', MoodleDB),
+    ('courses', CourseDB),
+    ('activities', ActivityDB),
+    ('users', UserDB),
+    ('submissions', StudentSubmissionDB),
+    ('files', FileSubmissionDB),
+    ('grades', GradeDB),
+)
+
+_HOUR_FORMAT = '%Y-%m-%d %H:00:00'
+
+_cache: Dict[Any, Tuple[float, Any]] = {}
+# One lock per key: a slow computation only holds up callers of the same key
+_key_locks: Dict[Any, threading.Lock] = {}
+_key_locks_lock = threading.Lock()
+
+
+def _fresh(key: Any) -> Optional[Tuple[float, Any]]:
+    entry = _cache.get(key)
+    if entry is not None and time.monotonic() - entry[0] < STATS_CACHE_TTL:
+        return entry
+    return None
+
+
+def _cached(key: Any, compute: Callable[[], Any]) -> Any:
+    """Value of `key` computed at most once per STATS_CACHE_TTL (concurrent callers of the key wait for it)"""
+    entry = _fresh(key)
+    if entry is not None:
+        return entry[1]
+    with _key_locks_lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        entry = _fresh(key)  # computed while we waited
+        if entry is not None:
+            return entry[1]
+        value = compute()
+        _cache[key] = (time.monotonic(), value)
+        return value
+
+
+def _hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class StatsService:
+    """Service for dashboard statistics"""
+
+    @staticmethod
+    def get_statistics() -> Dict[str, int]:
+        """Entity counts (one query with a scalar subquery per table, cached)"""
+        return _cached('statistics', StatsService._count_entities)
+
+    @staticmethod
+    def _count_entities() -> Dict[str, int]:
+        query = select(*(
+            select(func.count()).select_from(model).scalar_subquery().label(name)
+            for name, model in COUNTED_TABLES
+        ))
+        db = get_db_session()
+        try:
+            return dict(db.execute(query).mappings().one())
+        finally:
+            db.close()
+
+    @staticmethod
+    def get_hourly_series(hours: int = 24) -> Dict[str, Any]:
+        """
+        Launches, uploads and evaluations per UTC hour over the last `hours` hours
+
+        Uploads and evaluations are grouped from the indexed
+        file_submissions.uploaded_at and grades.ai_evaluated_at; launches come
+        from the usage_hourly counters. Every hour is present (zero-filled),
+        oldest first, the current (partial) hour last.
+
+        Raises:
+            ValueError: If hours is out of range
+        """
+        if not 1 <= hours <= STATS_SERIES_MAX_HOURS:
+            raise ValueError(f"hours debe estar entre 1 y {STATS_SERIES_MAX_HOURS}")
+        return _cached(('series', hours), lambda: StatsService._compute_series(hours))
+
+    @staticmethod
+    def _compute_series(hours: int) -> Dict[str, Any]:
+        since = _hour(datetime.utcnow()) - timedelta(hours=hours - 1)
+        buckets = {
+            (since + timedelta(hours=offset)).strftime(_HOUR_FORMAT): {'launches': 0, 'uploads': 0, 'evaluations': 0}
+            for offset in range(hours)
+        }
+
+        def grouped(column):
+            bucket = func.strftime(_HOUR_FORMAT, column)
+            return select(bucket, func.count()).where(column >= since).group_by(bucket)
+
+        db = get_db_session()
+        try:
+            for series, column in (('uploads', FileSubmissionDB.uploaded_at), ('evaluations', GradeDB.ai_evaluated_at)):
+                for hour, count in db.execute(grouped(column)):
+                    if hour in buckets:
+                        buckets[hour][series] = count
+            launches = select(UsageHourlyDB.hour, UsageHourlyDB.count).where(
+                UsageHourlyDB.event == 'launch', UsageHourlyDB.hour >= since
+            )
+            for hour, count in db.execute(launches):
+                key = hour.strftime(_HOUR_FORMAT)
+                if key in buckets:
+                    buckets[key]['launches'] = count
+        finally:
+            db.close()
+
+        series: List[Dict[str, Any]] = [
+            {'hour': datetime.strptime(hour, '%Y-%m-%d %H:%M:%S').isoformat(), **counts}
+            for hour, counts in buckets.items()
+        ]
+        return {
+            'hours': hours,
+            'since': since.isoformat(),
+            'series': series,
+            'totals': {name: sum(bucket[name] for bucket in series) for name in ('launches', 'uploads', 'evaluations')}
+        }
+
+    @staticmethod
+    def record_launch() -> None:
+        """Count an LTI launch in the current hour (a single upsert)"""
+        hour = _hour(datetime.utcnow())
+        statement = insert(UsageHourlyDB).values(hour=hour, event='launch', count=1)
+        statement = statement.on_conflict_do_update(
+            index_elements=[UsageHourlyDB.hour, UsageHourlyDB.event],
+            set_={'count': UsageHourlyDB.count + 1}
+        )
+        db = get_db_session()
+        try:
+            db.execute(statement)
+            db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def invalidate() -> None:
+        """Drop cached statistics (next call recomputes them)"""
+        _cache.clear()
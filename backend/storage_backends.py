@@ -0,0 +1,504 @@
+"""
+Storage Backends - Where stored submission files live
+
+Handles:
+- A small backend interface keyed by paths relative to the uploads root
+  (e.g. "blobs/ab/cd/<sha256>.pdf"): streaming put/get, byte ranges, stat,
+  delete and presigned download URLs
+- LocalStorageBackend: files under the uploads directory (default)
+- S3StorageBackend: any S3-compatible object store (AWS S3, MinIO, Ceph...)
+  over plain HTTP with AWS Signature V4, multipart upload for large files
+  and presigned GET URLs
+
+Selected with STORAGE_BACKEND=local|s3. The S3 driver only needs
+`requests`; benchmarks/fake_servers.FakeS3Server is a local stand-in for tests.
+"""
+
+import hashlib
+import hmac
+import io
+import logging
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional, Tuple, Union
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'local').strip().lower()
+
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL', '').rstrip('/')
+S3_BUCKET = os.getenv('S3_BUCKET', '')
+S3_ACCESS_KEY_ID = os.getenv('S3_ACCESS_KEY_ID', '')
+S3_SECRET_ACCESS_KEY = os.getenv('S3_SECRET_ACCESS_KEY', '')
+S3_REGION = os.getenv('S3_REGION', 'us-east-1')
+# Key prefix inside the bucket (e.g. "lamba/"), empty = bucket root
+S3_PREFIX = os.getenv('S3_PREFIX', '')
+# Virtual-hosted URLs (bucket.endpoint) instead of path-style (endpoint/bucket), needed by new AWS buckets
+S3_VIRTUAL_HOST = os.getenv('S3_VIRTUAL_HOST', 'false').lower() in ('true', '1', 'yes')
+# Files from this size are sent with multipart upload, in parts of S3_PART_SIZE (S3 minimum: 5 MiB)
+S3_MULTIPART_THRESHOLD = int(os.getenv('S3_MULTIPART_THRESHOLD', str(16 * 1024 * 1024)))
+S3_PART_SIZE = int(os.getenv('S3_PART_SIZE', str(8 * 1024 * 1024)))
+S3_TIMEOUT = float(os.getenv('S3_TIMEOUT', '30'))
+# Keys per ListObjectsV2 page (S3 maximum: 1000)
+S3_LIST_PAGE_SIZE = 1000
+
+CHUNK_SIZE = 64 * 1024
+
+_UNSIGNED_PAYLOAD = 'UNSIGNED-PAYLOAD'
+_EMPTY_PAYLOAD_HASH = hashlib.sha256(b'').hexdigest()
+
+Readable = Union[bytes, BinaryIO]
+
+
+@dataclass
+class ObjectStat:
+    size: int
+    modified: float  # POSIX timestamp
+    # Set by FileStorageService for files compressed at rest: `size` is then the
+    # decoded size and `stored_size` the bytes held by the backend
+    encoding: Optional[str] = None
+    stored_size: Optional[int] = None
+
+
+class ChunkReader(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            self._pending = next(self._chunks, None)
+            if self._pending is None:
+                self._pending = b""
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def close(self) -> None:
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
+        super().close()
+
+
+class StorageBackend:
+    """Interface of a storage backend (keys are '/'-separated relative paths)"""
+
+    name = ''
+
+    def put(self, key: str, data: Readable, size: Optional[int] = None) -> None:
+        """Store `data` (bytes or a binary file object) under `key`, replacing it atomically"""
+        raise NotImplementedError
+
+    def stat(self, key: str) -> Optional[ObjectStat]:
+        """Size and modification time, or None if the key does not exist"""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        return self.stat(key) is not None
+
+    def iter_bytes(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Content of `key` (bytes start..end inclusive) in chunks
+
+        Raises:
+            FileNotFoundError: If the key does not exist
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        """Remove `key` (no error if it does not exist)"""
+        raise NotImplementedError
+
+    def list_keys(self, prefix: str = '', start_after: Optional[str] = None) -> Iterator[Tuple[str, ObjectStat]]:
+        """(key, stat) of every object under `prefix`, in key order, after `start_after` if given"""
+        raise NotImplementedError
+
+    def move(self, key: str, target: str) -> None:
+        """Rename `key` to `target` (copy and delete unless the backend can rename)
+
+        Raises:
+            FileNotFoundError: If the key does not exist
+        """
+        stat = self.stat(key)
+        if stat is None:
+            raise FileNotFoundError(key)
+        self.put(target, io.BufferedReader(ChunkReader(self.iter_bytes(key))), stat.size)
+        self.delete(key)
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Filesystem path of `key` when the backend is local, else None"""
+        return None
+
+    def presigned_url(self, key: str, expires: int, *, content_disposition: Optional[str] = None,
+                      media_type: Optional[str] = None, content_encoding: Optional[str] = None) -> Optional[str]:
+        """Temporary direct download URL (with the given response headers), or None if the backend has none"""
+        return None
+
+
+class LocalStorageBackend(StorageBackend):
+    """Files under a local directory (the uploads root)"""
+
+    name = 'local'
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, *key.split('/')))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise ValueError(f"Clave fuera del almacenamiento: {key}")
+        return path
+
+    def put(self, key: str, data: Readable, size: Optional[int] = None) -> None:
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        source = io.BytesIO(data) if isinstance(data, (bytes, bytearray, memoryview)) else data
+        descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(descriptor, 'wb') as destination:
+                shutil.copyfileobj(source, destination, CHUNK_SIZE)
+            os.replace(temporary_path, path)
+        except BaseException:
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+            raise
+
+    def stat(self, key: str) -> Optional[ObjectStat]:
+        try:
+            path = self._path(key)
+            result = os.stat(path)
+        except (OSError, ValueError):
+            return None
+        if not os.path.isfile(path):
+            return None
+        return ObjectStat(size=result.st_size, modified=result.st_mtime)
+
+    def iter_bytes(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        remaining = None if end is None else end - start + 1
+        with open(self._path(key), 'rb') as source:
+            source.seek(start)
+            while remaining is None or remaining > 0:
+                chunk = source.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    return
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, key: str) -> None:
+        try:
+            path = self._path(key)
+        except ValueError:
+            return
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def list_keys(self, prefix: str = '', start_after: Optional[str] = None) -> Iterator[Tuple[str, ObjectStat]]:
+        yield from self._walk('', prefix, start_after)
+
+    def _walk(self, directory: str, prefix: str, start_after: Optional[str]) -> Iterator[Tuple[str, ObjectStat]]:
+        try:
+            entries = list(os.scandir(self._path(directory) if directory else self.root))
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        # Sorting directories as "name/" yields keys in plain lexicographic order (as S3 lists them)
+        entries.sort(key=lambda entry: entry.name + '/' if entry.is_dir(follow_symlinks=False) else entry.name)
+        for entry in entries:
+            key = f'{directory}{entry.name}'
+            if entry.is_dir(follow_symlinks=False):
+                key += '/'
+                # Skip subtrees entirely before the cursor or outside the prefix
+                if start_after and key <= start_after and not start_after.startswith(key):
+                    continue
+                if not (key.startswith(prefix) or prefix.startswith(key)):
+                    continue
+                yield from self._walk(key, prefix, start_after)
+            elif key.startswith(prefix) and (not start_after or key > start_after):
+                try:
+                    result = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                yield key, ObjectStat(size=result.st_size, modified=result.st_mtime)
+
+    def move(self, key: str, target: str) -> None:
+        target_path = self._path(target)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        os.replace(self._path(key), target_path)
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self._path(key)
+
+
+class S3Error(Exception):
+    """Unexpected answer from the object store"""
+
+
+def _uri_encode(value: str, safe: str = '-_.~') -> str:
+    return quote(value, safe=safe)
+
+
+def _canonical_query(params: Dict[str, str]) -> str:
+    return '&'.join(f'{_uri_encode(name)}={_uri_encode(str(value))}' for name, value in sorted(params.items()))
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
+
+
+def sigv4_signature(
+    *,
+    method: str,
+    path: str,
+    query: Dict[str, str],
+    headers: Dict[str, str],
+    payload_hash: str,
+    secret_key: str,
+    region: str,
+    amz_date: str
+) -> Tuple[str, str]:
+    """
+    AWS Signature Version 4 for S3
+
+    Args:
+        path: Canonical (already URI-encoded) request path
+        headers: Headers to sign (must include host)
+        amz_date: Request time as YYYYMMDDTHHMMSSZ
+
+    Returns:
+        (signed header names, hex signature)
+    """
+    canonical_headers = {name.lower(): ' '.join(str(value).split()) for name, value in headers.items()}
+    signed_headers = ';'.join(sorted(canonical_headers))
+    canonical_request = '\n'.join([
+        method,
+        path,
+        _canonical_query(query),
+        ''.join(f'{name}:{canonical_headers[name]}\n' for name in sorted(canonical_headers)),
+        signed_headers,
+        payload_hash,
+    ])
+    scope = f'{amz_date[:8]}/{region}/s3/aws4_request'
+    string_to_sign = '\n'.join([
+        'AWS4-HMAC-SHA256', amz_date, scope, hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()
+    ])
+    signing_key = _hmac(_hmac(_hmac(_hmac(f'AWS4{secret_key}'.encode('utf-8'), amz_date[:8]), region), 's3'),
+                        'aws4_request')
+    return signed_headers, hmac.new(signing_key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def _amz_date(now: Optional[datetime] = None) -> str:
+    return (now or datetime.now(timezone.utc)).strftime('%Y%m%dT%H%M%SZ')
+
+
+class S3StorageBackend(StorageBackend):
+    """S3-compatible object store (path-style or virtual-hosted URLs, Signature V4)"""
+
+    name = 's3'
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        region: str = 'us-east-1',
+        prefix: str = '',
+        virtual_host: bool = False,
+        multipart_threshold: int = S3_MULTIPART_THRESHOLD,
+        part_size: int = S3_PART_SIZE,
+        timeout: float = S3_TIMEOUT
+    ):
+        if not endpoint_url or not bucket:
+            raise ValueError("S3_ENDPOINT_URL y S3_BUCKET son obligatorios con STORAGE_BACKEND=s3")
+        endpoint = urlsplit(endpoint_url)
+        self.scheme = endpoint.scheme or 'https'
+        self.host = f'{bucket}.{endpoint.netloc}' if virtual_host else endpoint.netloc
+        self.base_path = '' if virtual_host else f'/{_uri_encode(bucket)}'
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.prefix = prefix
+        self.multipart_threshold = multipart_threshold
+        self.part_size = part_size
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _path(self, key: Optional[str]) -> str:
+        if key is None:
+            return self.base_path or '/'  # bucket-level requests (listing)
+        return f'{self.base_path}/{_uri_encode(self.prefix + key, safe="-_.~/")}'
+
+    def _request(self, method: str, key: Optional[str], *, query: Dict[str, str] = None, body: bytes = b'',
+                 headers: Dict[str, str] = None, stream: bool = False, ok=(200,)) -> requests.Response:
+        query = query or {}
+        path = self._path(key)
+        payload_hash = hashlib.sha256(body).hexdigest() if body else _EMPTY_PAYLOAD_HASH
+        amz_date = _amz_date()
+        signed = {'host': self.host, 'x-amz-content-sha256': payload_hash, 'x-amz-date': amz_date,
+                  **{name.lower(): value for name, value in (headers or {}).items()}}
+        signed_headers, signature = sigv4_signature(
+            method=method, path=path, query=query, headers=signed, payload_hash=payload_hash,
+            secret_key=self.secret_key, region=self.region, amz_date=amz_date
+        )
+        scope = f'{amz_date[:8]}/{self.region}/s3/aws4_request'
+        request_headers = {name: value for name, value in signed.items() if name != 'host'}
+        request_headers['Authorization'] = (
+            f'AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, '
+            f'SignedHeaders={signed_headers}, Signature={signature}'
+        )
+        url = f'{self.scheme}://{self.host}{path}'
+        if query:
+            url += '?' + _canonical_query(query)
+        response = self.session.request(method, url, data=body or None, headers=request_headers,
+                                        stream=stream, timeout=self.timeout)
+        if response.status_code not in ok:
+            detail = '' if stream or method == 'HEAD' else response.text[:300]
+            response.close()
+            raise S3Error(f"S3 {method} {key}: HTTP {response.status_code} {detail}".strip())
+        return response
+
+    def put(self, key: str, data: Readable, size: Optional[int] = None) -> None:
+        source = io.BytesIO(data) if isinstance(data, (bytes, bytearray, memoryview)) else data
+        if size is None and isinstance(data, (bytes, bytearray, memoryview)):
+            size = len(data)
+        if size is not None and size < self.multipart_threshold:
+            self._request('PUT', key, body=source.read())
+            return
+        self._put_multipart(key, source)
+
+    def _put_multipart(self, key: str, source: BinaryIO) -> None:
+        """Multipart upload: one part of part_size in memory at a time, aborted on failure"""
+        response = self._request('POST', key, query={'uploads': ''})
+        upload_id = next(
+            element.text for element in ElementTree.fromstring(response.content).iter()
+            if element.tag.endswith('UploadId')
+        )
+        parts = []
+        try:
+            while True:
+                chunk = source.read(self.part_size)
+                if not chunk and parts:
+                    break
+                number = len(parts) + 1
+                part = self._request('PUT', key, query={'partNumber': str(number), 'uploadId': upload_id}, body=chunk)
+                parts.append((number, part.headers.get('ETag', '')))
+                if len(chunk) < self.part_size:
+                    break
+            manifest = ''.join(
+                f'<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>' for number, etag in parts
+            )
+            self._request('POST', key, query={'uploadId': upload_id},
+                          body=f'<CompleteMultipartUpload>{manifest}</CompleteMultipartUpload>'.encode('utf-8'))
+        except BaseException:
+            try:
+                self._request('DELETE', key, query={'uploadId': upload_id}, ok=(200, 204, 404))
+            except Exception as e:
+                logger.warning("Could not abort multipart upload %s of %s: %s", upload_id, key, e)
+            raise
+        logger.debug("Multipart upload of %s completed in %d parts", key, len(parts))
+
+    def stat(self, key: str) -> Optional[ObjectStat]:
+        response = self._request('HEAD', key, ok=(200, 404))
+        if response.status_code == 404:
+            return None
+        modified = response.headers.get('Last-Modified')
+        return ObjectStat(
+            size=int(response.headers.get('Content-Length', 0)),
+            modified=parsedate_to_datetime(modified).timestamp() if modified else 0.0
+        )
+
+    def iter_bytes(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        headers = {}
+        if start or end is not None:
+            headers['range'] = f'bytes={start}-{"" if end is None else end}'
+        try:
+            response = self._request('GET', key, headers=headers, stream=True, ok=(200, 206))
+        except S3Error as e:
+            if ' 404' in str(e):
+                raise FileNotFoundError(key) from e
+            raise
+        with response:
+            yield from response.iter_content(CHUNK_SIZE)
+
+    def delete(self, key: str) -> None:
+        self._request('DELETE', key, ok=(200, 204, 404))
+
+    def list_keys(self, prefix: str = '', start_after: Optional[str] = None) -> Iterator[Tuple[str, ObjectStat]]:
+        """ListObjectsV2, page by page"""
+        token = None
+        while True:
+            query = {'list-type': '2', 'prefix': self.prefix + prefix, 'max-keys': str(S3_LIST_PAGE_SIZE)}
+            if token:
+                query['continuation-token'] = token
+            elif start_after:
+                query['start-after'] = self.prefix + start_after
+            root = ElementTree.fromstring(self._request('GET', None, query=query).content)
+            fields = {}
+            for element in root.iter():
+                name = element.tag.rsplit('}', 1)[-1]
+                if name == 'Contents':
+                    key, size, modified = (element.findtext(f'{{*}}{field}') for field in ('Key', 'Size', 'LastModified'))
+                    yield key[len(self.prefix):], ObjectStat(
+                        size=int(size or 0),
+                        modified=datetime.fromisoformat(modified.replace('Z', '+00:00')).timestamp() if modified else 0.0
+                    )
+                elif name in ('IsTruncated', 'NextContinuationToken'):
+                    fields[name] = element.text
+            if fields.get('IsTruncated') != 'true' or not fields.get('NextContinuationToken'):
+                return
+            token = fields['NextContinuationToken']
+
+    def presigned_url(self, key: str, expires: int, *, content_disposition: Optional[str] = None,
+                      media_type: Optional[str] = None, content_encoding: Optional[str] = None,
+                      now: Optional[datetime] = None) -> Optional[str]:
+        amz_date = _amz_date(now)
+        query = {
+            'X-Amz-Algorithm': 'AWS4-HMAC-SHA256',
+            'X-Amz-Credential': f'{self.access_key}/{amz_date[:8]}/{self.region}/s3/aws4_request',
+            'X-Amz-Date': amz_date,
+            'X-Amz-Expires': str(expires),
+            'X-Amz-SignedHeaders': 'host',
+        }
+        if content_disposition:
+            query['response-content-disposition'] = content_disposition
+        if media_type:
+            query['response-content-type'] = media_type
+        if content_encoding:
+            query['response-content-encoding'] = content_encoding
+        path = self._path(key)
+        _, signature = sigv4_signature(
+            method='GET', path=path, query=query, headers={'host': self.host}, payload_hash=_UNSIGNED_PAYLOAD,
+            secret_key=self.secret_key, region=self.region, amz_date=amz_date
+        )
+        return f'{self.scheme}://{self.host}{path}?{_canonical_query(query)}&X-Amz-Signature={signature}'
+
+
+def s3_backend_from_env() -> S3StorageBackend:
+    return S3StorageBackend(
+        S3_ENDPOINT_URL, S3_BUCKET, S3_ACCESS_KEY_ID, S3_SECRET_ACCESS_KEY,
+        region=S3_REGION, prefix=S3_PREFIX, virtual_host=S3_VIRTUAL_HOST
+    )
@@ -0,0 +1,312 @@
+"""
+Storage Reconciler - Orphaned files and dangling rows of the submission store
+
+Handles:
+- Incremental walk of the storage backend in key order (the legacy
+  uploads/<moodle>/<course>/<activity>/ tree and the blob store), resumed
+  from a cursor so each pass reads at most STORAGE_RECONCILE_MAX_KEYS keys
+- Batched diff against the database:
+  - orphans: files no file_submissions/stored_blobs row references (left by
+    failed transactions, crashed writes or deletes that did not happen)
+  - unreferenced blobs: stored_blobs rows with ref_count 0
+  - dangling rows: file_submissions / stored_blobs whose file is gone
+- Dry-run reports, quarantine (moved under uploads/.quarantine/<date>/) or
+  removal; the background loop (STORAGE_RECONCILE_INTERVAL) and the admin
+  API run the same pass
+
+Files younger than STORAGE_ORPHAN_GRACE are never touched: an upload
+writes its file before the transaction that references it commits.
+Dangling file_submissions are only reported, never deleted: they are
+student work and need a human decision.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select
+
+import metrics
+from database import get_db_session
+from db_models import FileSubmissionDB, StoredBlobDB
+from storage_backends import ObjectStat
+from storage_service import FileStorageService
+
+logger = logging.getLogger(__name__)
+
+# Seconds between background passes (0 = only on demand from the admin API)
+STORAGE_RECONCILE_INTERVAL = int(os.getenv('STORAGE_RECONCILE_INTERVAL', '0'))
+# Action of the background passes: report (dry run), quarantine or delete
+STORAGE_RECONCILE_ACTION = os.getenv('STORAGE_RECONCILE_ACTION', 'report').strip().lower()
+# Keys (and rows) looked up in the database per query
+STORAGE_RECONCILE_BATCH = int(os.getenv('STORAGE_RECONCILE_BATCH', '500'))
+# Keys (and rows of each table) examined per pass; the next pass resumes from there
+STORAGE_RECONCILE_MAX_KEYS = int(os.getenv('STORAGE_RECONCILE_MAX_KEYS', '10000'))
+# Files modified more recently than this (seconds) are left alone
+STORAGE_ORPHAN_GRACE = int(os.getenv('STORAGE_ORPHAN_GRACE', '3600'))
+
+ACTIONS = ('report', 'quarantine', 'delete')
+QUARANTINE_PREFIX = '.quarantine/'
+# Findings listed in a report (counters always cover everything)
+REPORT_ITEMS_LIMIT = 200
+
+
+class ReconcilerBusyError(RuntimeError):
+    """Raised when a pass is requested while another one is running"""
+
+
+@dataclass
+class ReconcileReport:
+    """Outcome of one reconciliation pass"""
+    action: str
+    started_at: str
+    finished_at: Optional[str] = None
+    duration_ms: float = 0.0
+    scanned_keys: int = 0
+    scanned_rows: int = 0
+    # The pass reached the end of the key space / tables (the next one starts over)
+    keys_complete: bool = False
+    rows_complete: bool = False
+    skipped_recent: int = 0
+    orphans: int = 0
+    orphan_bytes: int = 0
+    unreferenced_blobs: int = 0
+    unreferenced_bytes: int = 0
+    dangling_submissions: int = 0
+    dangling_blobs: int = 0
+    quarantined: int = 0
+    deleted: int = 0
+    reclaimed_bytes: int = 0
+    errors: int = 0
+    items: List[Dict[str, Any]] = field(default_factory=list)
+    items_truncated: bool = False
+
+    def add(self, kind: str, outcome: str, **details) -> None:
+        metrics.STORAGE_RECONCILED.inc(kind, outcome)
+        if len(self.items) < REPORT_ITEMS_LIMIT:
+            self.items.append({'kind': kind, 'outcome': outcome, **details})
+        else:
+            self.items_truncated = True
+
+
+_lock = threading.Lock()
+# Resume points: last key walked, last file_submissions id, last stored_blobs path
+_cursor: Dict[str, Optional[str]] = {'key': None, 'submission': None, 'blob': None}
+_last_report: Optional[Dict[str, Any]] = None
+
+
+def reconcile(action: str = 'report', *, max_keys: Optional[int] = None, restart: bool = False) -> Dict[str, Any]:
+    """
+    Run one incremental reconciliation pass (blocking)
+
+    Args:
+        action: 'report' (dry run), 'quarantine' or 'delete'
+        max_keys: Keys, and rows of each table, to examine (default STORAGE_RECONCILE_MAX_KEYS)
+        restart: Start from the beginning instead of the saved cursors
+
+    Raises:
+        ValueError: Unknown action
+        ReconcilerBusyError: Another pass is running
+    """
+    global _last_report
+    if action not in ACTIONS:
+        raise ValueError(f"Acción no válida: {action} (report, quarantine o delete)")
+    if not _lock.acquire(blocking=False):
+        raise ReconcilerBusyError("Ya hay una reconciliación en curso")
+    try:
+        if restart:
+            _cursor.update(key=None, submission=None, blob=None)
+        budget = max(1, max_keys or STORAGE_RECONCILE_MAX_KEYS)
+        start = time.perf_counter()
+        report = ReconcileReport(action=action, started_at=datetime.now(timezone.utc).isoformat())
+        _reconcile_keys(report, action, budget)
+        submissions_complete = _reconcile_submission_rows(report, budget)
+        report.rows_complete = _reconcile_blob_rows(report, action, budget) and submissions_complete
+        report.duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        report.finished_at = datetime.now(timezone.utc).isoformat()
+        _last_report = {**asdict(report), 'cursor': dict(_cursor)}
+        logger.info(
+            "Storage reconcile (%s): %d keys, %d rows, %d orphans, %d unreferenced blobs, "
+            "%d dangling submissions, %d dangling blobs, %d bytes reclaimed, %d errors",
+            action, report.scanned_keys, report.scanned_rows, report.orphans, report.unreferenced_blobs,
+            report.dangling_submissions, report.dangling_blobs, report.reclaimed_bytes, report.errors
+        )
+        return _last_report
+    finally:
+        _lock.release()
+
+
+def last_report() -> Optional[Dict[str, Any]]:
+    return _last_report
+
+
+def _reconcile_keys(report: ReconcileReport, action: str, budget: int) -> None:
+    """Walk the backend from the key cursor and diff each batch against the database"""
+    batch: List[Tuple[str, ObjectStat]] = []
+    last_key = None
+    for key, stat in FileStorageService.backend().list_keys(start_after=_cursor['key']):
+        last_key = key
+        if key.startswith(QUARANTINE_PREFIX):
+            continue
+        batch.append((key, stat))
+        if len(batch) >= STORAGE_RECONCILE_BATCH:
+            _diff_keys(report, action, batch)
+            batch = []
+        if report.scanned_keys + len(batch) >= budget:
+            break
+    else:
+        last_key = None
+        report.keys_complete = True
+    if batch:
+        _diff_keys(report, action, batch)
+    _cursor['key'] = last_key
+
+
+def _diff_keys(report: ReconcileReport, action: str, batch: List[Tuple[str, ObjectStat]]) -> None:
+    report.scanned_keys += len(batch)
+    paths = {key: FileStorageService.path_for_key(key) for key, _ in batch}
+    # Rows may hold the relative ("uploads/...") or the absolute form of a path
+    candidates = set(paths.values()) | {FileStorageService.resolve_path(path) for path in paths.values()}
+    now = time.time()
+    db = get_db_session()
+    try:
+        referenced = set(db.execute(
+            select(FileSubmissionDB.file_path).where(FileSubmissionDB.file_path.in_(candidates))
+        ).scalars())
+        ref_counts = dict(db.execute(
+            select(StoredBlobDB.path, StoredBlobDB.ref_count).where(StoredBlobDB.path.in_(paths.values()))
+        ).all())
+        for key, stat in batch:
+            path = paths[key]
+            if path in referenced or FileStorageService.resolve_path(path) in referenced or ref_counts.get(path):
+                continue
+            if now - stat.modified < STORAGE_ORPHAN_GRACE:
+                report.skipped_recent += 1
+                continue
+            if path in ref_counts:
+                report.unreferenced_blobs += 1
+                report.unreferenced_bytes += stat.size
+                kind = 'unreferenced_blob'
+            else:
+                report.orphans += 1
+                report.orphan_bytes += stat.size
+                kind = 'orphan'
+            outcome = 'reported' if action == 'report' else _dispose(db, key, path, stat, kind, action, report)
+            report.add(kind, outcome, key=key, size=stat.size)
+    finally:
+        db.close()
+
+
+def _dispose(db, key: str, path: str, stat: ObjectStat, kind: str, action: str, report: ReconcileReport) -> str:
+    """Quarantine or delete one file (and its zero-reference blob row); returns the outcome"""
+    backend = FileStorageService.backend()
+    try:
+        if kind == 'unreferenced_blob':
+            # Conditional delete: an upload reusing the blob meanwhile keeps it. The row lock is
+            # held until the file is gone, so a concurrent reuse waits and then writes it again.
+            if not db.execute(delete(StoredBlobDB).where(StoredBlobDB.path == path, StoredBlobDB.ref_count == 0)).rowcount:
+                db.rollback()
+                return 'kept'
+        if action == 'quarantine':
+            backend.move(key, f"{QUARANTINE_PREFIX}{datetime.now(timezone.utc):%Y-%m-%d}/{key}")
+        else:
+            backend.delete(key)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        report.errors += 1
+        logger.warning("Could not %s %s: %s", action, key, e)
+        return 'error'
+    report.reclaimed_bytes += stat.size
+    if action == 'quarantine':
+        report.quarantined += 1
+        return 'quarantined'
+    report.deleted += 1
+    return 'deleted'
+
+
+def _reconcile_submission_rows(report: ReconcileReport, budget: int) -> bool:
+    """file_submissions whose file is missing: reported only. True once the table is covered"""
+    backend = FileStorageService.backend()
+    scanned = 0
+    while scanned < budget:
+        db = get_db_session()
+        try:
+            query = select(FileSubmissionDB.id, FileSubmissionDB.file_path).order_by(FileSubmissionDB.id)
+            if _cursor['submission'] is not None:
+                query = query.where(FileSubmissionDB.id > _cursor['submission'])
+            rows = db.execute(query.limit(min(STORAGE_RECONCILE_BATCH, budget - scanned))).all()
+        finally:
+            db.close()
+        if not rows:
+            _cursor['submission'] = None
+            return True
+        for submission_id, file_path in rows:
+            key = FileStorageService.storage_key(file_path) if file_path else None
+            if key is None or not backend.exists(key):
+                report.dangling_submissions += 1
+                report.add('dangling_submission', 'reported', id=submission_id, file_path=file_path)
+        scanned += len(rows)
+        report.scanned_rows += len(rows)
+        _cursor['submission'] = rows[-1][0]
+    return False
+
+
+def _reconcile_blob_rows(report: ReconcileReport, action: str, budget: int) -> bool:
+    """stored_blobs whose file is missing: zero-reference rows are removed, the rest reported"""
+    backend = FileStorageService.backend()
+    scanned = 0
+    while scanned < budget:
+        db = get_db_session()
+        try:
+            query = select(StoredBlobDB.path, StoredBlobDB.ref_count).order_by(StoredBlobDB.path)
+            if _cursor['blob'] is not None:
+                query = query.where(StoredBlobDB.path > _cursor['blob'])
+            rows = db.execute(query.limit(min(STORAGE_RECONCILE_BATCH, budget - scanned))).all()
+            if not rows:
+                _cursor['blob'] = None
+                return True
+            for path, ref_count in rows:
+                key = FileStorageService.storage_key(path)
+                if key is not None and backend.exists(key):
+                    continue
+                report.dangling_blobs += 1
+                outcome = 'reported'
+                if action != 'report' and not ref_count:
+                    removed = db.execute(
+                        delete(StoredBlobDB).where(StoredBlobDB.path == path, StoredBlobDB.ref_count == 0)
+                    ).rowcount
+                    db.commit()
+                    outcome = 'deleted' if removed else 'kept'
+                report.add('dangling_blob', outcome, key=key or path, ref_count=ref_count)
+        finally:
+            db.close()
+        scanned += len(rows)
+        report.scanned_rows += len(rows)
+        _cursor['blob'] = rows[-1][0]
+    return False
+
+
+async def run_periodically() -> None:
+    """Background loop: one pass every STORAGE_RECONCILE_INTERVAL seconds"""
+    action = STORAGE_RECONCILE_ACTION if STORAGE_RECONCILE_ACTION in ACTIONS else 'report'
+    while True:
+        await asyncio.sleep(STORAGE_RECONCILE_INTERVAL)
+        try:
+            await asyncio.to_thread(reconcile, action)
+        except ReconcilerBusyError:
+            logger.info("Storage reconcile skipped: another pass is running")
+        except Exception:
+            logger.exception("Storage reconcile failed")
+
+
+def start_background() -> Optional[asyncio.Task]:
+    """Start the background loop if STORAGE_RECONCILE_INTERVAL is set (call from the app lifespan)"""
+    if STORAGE_RECONCILE_INTERVAL <= 0:
+        return None
+    return asyncio.create_task(run_periodically(), name='storage-reconciler')
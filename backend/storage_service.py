@@ -1,16 +1,225 @@
+import gzip
+import hashlib
+import io
+import logging
+import mimetypes
 import os
 import re
 import shutil
-from datetime import datetime, timezone
-from typing import Optional
+import tempfile
+import zlib
+from contextlib import ExitStack, contextmanager
+from fnmatch import fnmatch
+from functools import lru_cache
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+import metrics
+import storage_backends
+from db_models import StoredBlobDB
+from storage_backends import ChunkReader, LocalStorageBackend, ObjectStat, StorageBackend
+from storage_usage_service import StorageUsageService, UsageScope
+
+logger = logging.getLogger(__name__)
+
+# Session.info key of the files to delete once the session commits
+_PENDING_DELETES = "storage_pending_deletes"
+
+# Directory under the uploads root holding content-addressed submission files
+BLOBS_DIRNAME = "blobs"
+# Subdirectory of BLOBS_DIRNAME for blobs compressed at rest (not a hex shard name)
+COMPRESSED_DIRNAME = "gz"
+
+# Compression at rest: '' (disabled) or 'gzip'
+STORAGE_COMPRESSION = os.getenv("STORAGE_COMPRESSION", "").strip().lower()
+# Per-MIME policy: comma-separated type[:level] patterns ('*' wildcards); other types are stored as uploaded
+STORAGE_COMPRESSION_TYPES = os.getenv(
+    "STORAGE_COMPRESSION_TYPES",
+    "text/*,application/json,application/xml,application/javascript,application/x-ipynb+json,"
+    "application/rtf,application/msword,image/svg+xml,application/pdf:4"
+)
+STORAGE_COMPRESSION_LEVEL = int(os.getenv("STORAGE_COMPRESSION_LEVEL", "6"))
+# Smaller files are stored as uploaded
+STORAGE_COMPRESSION_MIN_SIZE = int(os.getenv("STORAGE_COMPRESSION_MIN_SIZE", "1024"))
+# The compressed copy is kept only if it saves at least this fraction (e.g. PDFs with compressed streams)
+STORAGE_COMPRESSION_MIN_SAVING = float(os.getenv("STORAGE_COMPRESSION_MIN_SAVING", "0.1"))
+# Decoded bytes produced per step when decompressing, and in memory before spooling to disk
+DECODE_CHUNK_SIZE = 1024 * 1024
+EXTRACT_SPOOL_BYTES = 16 * 1024 * 1024
+
+
+@lru_cache(maxsize=8)
+def _compression_policy(spec: str) -> List[Tuple[str, int]]:
+    policy = []
+    for item in spec.split(","):
+        pattern, _, level = item.strip().lower().partition(":")
+        if pattern:
+            policy.append((pattern, int(level) if level.strip() else STORAGE_COMPRESSION_LEVEL))
+    return policy
+
+
+def gunzip_chunks(chunks: Iterable[bytes], start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    """Decompress a gzip stream on the fly, yielding the decoded bytes start..end (inclusive)"""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decoded() -> Iterator[bytes]:
+        for chunk in chunks:
+            data = decompressor.decompress(chunk, DECODE_CHUNK_SIZE)
+            yield data
+            while decompressor.unconsumed_tail:
+                yield decompressor.decompress(decompressor.unconsumed_tail, DECODE_CHUNK_SIZE)
+        yield decompressor.flush()
+
+    position = 0
+    pieces = decoded()
+    try:
+        for data in pieces:
+            piece_start, position = position, position + len(data)
+            low = max(start - piece_start, 0)
+            high = len(data) if end is None else min(end + 1 - piece_start, len(data))
+            if low < high:
+                yield data[low:high] if (low, high) != (0, len(data)) else data
+            if end is not None and position > end:
+                return
+    finally:
+        pieces.close()
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
 
 
 class FileStorageService:
-    """Utility helpers to manage the uploads directory structure."""
+    """Utility helpers to manage the uploads directory structure.
+
+    Stored paths keep the form "uploads/..." (relative to BASE_DIR) whatever
+    the backend; the part after the uploads root is the backend key.
+    Blobs under blobs/gz/ are gzip-compressed at rest (STORAGE_COMPRESSION)
+    and decoded transparently by stat, iter_file, open_file and local_file.
+    """
 
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     UPLOADS_ROOT = os.path.join(BASE_DIR, "uploads")
 
+    _backend_override: Optional[StorageBackend] = None
+    _remote_backend: Optional[StorageBackend] = None
+
+    @classmethod
+    def backend(cls) -> StorageBackend:
+        """Configured storage backend (STORAGE_BACKEND); the local one follows UPLOADS_ROOT"""
+        if cls._backend_override is not None:
+            return cls._backend_override
+        if storage_backends.STORAGE_BACKEND == "s3":
+            if cls._remote_backend is None:
+                cls._remote_backend = storage_backends.s3_backend_from_env()
+            return cls._remote_backend
+        return LocalStorageBackend(cls.UPLOADS_ROOT)
+
+    @classmethod
+    def use_backend(cls, backend: Optional[StorageBackend]) -> None:
+        """Force a backend instance (None = back to the configured one)"""
+        cls._backend_override = backend
+
+    @classmethod
+    def storage_key(cls, path: str) -> Optional[str]:
+        """Backend key of a stored path, or None if it points outside the uploads root"""
+        abs_path = cls.resolve_path(path)
+        if not cls.is_within_uploads(abs_path) or abs_path == os.path.abspath(cls.UPLOADS_ROOT):
+            return None
+        return os.path.relpath(abs_path, cls.UPLOADS_ROOT).replace(os.sep, "/")
+
+    @classmethod
+    def stored_encoding(cls, key: str) -> Optional[str]:
+        """Encoding of a stored object at rest ('gzip' for compressed blobs, else None)"""
+        return "gzip" if key.startswith(f"{BLOBS_DIRNAME}/{COMPRESSED_DIRNAME}/") else None
+
+    @classmethod
+    def stat(cls, path: str) -> Optional[ObjectStat]:
+        """Size (decoded) and modification time of a stored file, None if missing or outside uploads"""
+        key = cls.storage_key(path)
+        if key is None:
+            return None
+        backend = cls.backend()
+        stat = backend.stat(key)
+        encoding = cls.stored_encoding(key)
+        if stat is None or encoding is None:
+            return stat
+        # gzip trailer: ISIZE = decoded size mod 2**32 (uploads are far below 4 GiB)
+        trailer = b"".join(backend.iter_bytes(key, max(stat.size - 4, 0), stat.size - 1))
+        return ObjectStat(
+            size=int.from_bytes(trailer, "little"), modified=stat.modified, encoding=encoding, stored_size=stat.size
+        )
+
+    @classmethod
+    def iter_file(cls, path: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Content of a stored file in chunks (decoded bytes start..end inclusive)"""
+        key = cls.storage_key(path)
+        if key is None:
+            raise FileNotFoundError(path)
+        return cls.iter_key(key, start, end)
+
+    @classmethod
+    def iter_key(cls, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Like iter_file, for a backend key"""
+        if cls.stored_encoding(key) is None:
+            return cls.backend().iter_bytes(key, start, end)
+        return gunzip_chunks(cls.backend().iter_bytes(key), start, end)
+
+    @classmethod
+    @contextmanager
+    def open_file(cls, path: str, *, seekable: bool = False) -> Iterator[BinaryIO]:
+        """
+        Binary file object with the decoded content of a stored file
+
+        Compressed and remote files are read through a decompressing stream;
+        with `seekable` (PDF/DOCX readers) they are first spooled to memory,
+        or to a temp file beyond EXTRACT_SPOOL_BYTES.
+        """
+        key = cls.storage_key(path)
+        if key is None:
+            raise FileNotFoundError(path)
+        backend = cls.backend()
+        local_path = backend.local_path(key)
+        encoding = cls.stored_encoding(key)
+        with ExitStack() as stack:
+            if local_path is not None:
+                stream = stack.enter_context(open(local_path, "rb"))
+            else:
+                stream = stack.enter_context(io.BufferedReader(ChunkReader(backend.iter_bytes(key))))
+            if encoding is not None:
+                stream = stack.enter_context(gzip.GzipFile(fileobj=stream, mode="rb"))
+            if seekable and (encoding is not None or local_path is None):
+                spool = stack.enter_context(tempfile.SpooledTemporaryFile(max_size=EXTRACT_SPOOL_BYTES))
+                shutil.copyfileobj(stream, spool, DECODE_CHUNK_SIZE)
+                spool.seek(0)
+                stream = spool
+            yield stream
+
+    @classmethod
+    @contextmanager
+    def local_file(cls, path: str) -> Iterator[str]:
+        """Local filesystem path of a stored file, decoded to a temp file (same extension) if remote or compressed"""
+        key = cls.storage_key(path)
+        if key is None:
+            raise FileNotFoundError(path)
+        local_path = cls.backend().local_path(key)
+        if local_path is not None and cls.stored_encoding(key) is None:
+            yield local_path
+            return
+        descriptor, temporary_path = tempfile.mkstemp(suffix=os.path.splitext(key)[1])
+        try:
+            with os.fdopen(descriptor, "wb") as temporary_file:
+                for chunk in cls.iter_key(key):
+                    temporary_file.write(chunk)
+            yield temporary_path
+        finally:
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+
     @classmethod
     def ensure_uploads_root(cls) -> str:
         os.makedirs(cls.UPLOADS_ROOT, exist_ok=True)
@@ -40,33 +249,182 @@ class FileStorageService:
     @classmethod
     def save_submission_file(
         cls,
+        db: Session,
         *,
-        moodle_id: str,
-        course_id: str,
-        activity_id: str,
-        submission_id: str,
         file_name: str,
         file_bytes: bytes,
-        previous_file_path: Optional[str] = None
-    ) -> str:
+        previous_file_path: Optional[str] = None,
+        media_type: Optional[str] = None,
+        usage: Optional[UsageScope] = None,
+        previous_size: int = 0
+    ) -> Tuple[str, str]:
         """
-        Persist a submission file inside uploads/<moodle_id>/<course_id>/<activity_id>.
-        Returns the relative path (from BASE_DIR) that should be stored in the DB.
+        Persist a submission file in the content-addressed blob store
+        (uploads/blobs/<ab>/<cd>/<sha256><ext>, or blobs/gz/... when compressed
+        at rest according to the per-MIME policy).
+
+        Identical bytes are stored once: the hash is computed before writing and
+        an existing blob (compressed or not) only gains a reference
+        (stored_blobs.ref_count, updated in `db` and committed by the caller).
+        Re-uploading the file already held in `previous_file_path` changes
+        nothing; otherwise the previous file is released.
+
+        With `usage`, the upload is charged to the storage counters of its
+        activity, course and Moodle instance (a replacement only adds the
+        difference with `previous_size`) before anything is written.
+
+        Raises:
+            QuotaExceededError: the upload does not fit in a storage quota
+
+        Returns:
+            (relative path from BASE_DIR to store in the DB, SHA-256 of the content)
         """
-        activity_dir = cls.ensure_activity_directory(moodle_id, course_id, activity_id)
+        if usage is not None:
+            StorageUsageService.charge(
+                db, usage, len(file_bytes) - previous_size, 0 if previous_file_path else 1
+            )
+        content_hash = cls.content_hash(file_bytes)
+        candidates = [
+            cls._to_relative_path(cls.blob_path(content_hash, file_name, encoding))
+            for encoding in (None, "gzip")
+        ]
+        backend = cls.backend()
+        if previous_file_path in candidates and backend.exists(cls.storage_key(previous_file_path)):
+            metrics.STORED_BLOBS.inc('unchanged')
+            return previous_file_path, content_hash
+
+        # The same bytes may be stored either way (the policy can change over time)
+        known = set(db.execute(select(StoredBlobDB.path).where(StoredBlobDB.path.in_(candidates))).scalars())
+        relative_path = next(
+            (path for path in candidates if path in known and backend.exists(cls.storage_key(path))), None
+        )
+        if relative_path is not None and db.execute(
+            update(StoredBlobDB)
+            .where(StoredBlobDB.path == relative_path)
+            .values(ref_count=StoredBlobDB.ref_count + 1)
+        ).rowcount:
+            metrics.STORED_BLOBS.inc('deduplicated')
+        else:
+            # New content, or the blob was garbage-collected since it was looked up
+            data, encoding = cls._encode(file_bytes, cls._media_type(media_type, file_name))
+            relative_path = candidates[1] if encoding else candidates[0]
+            statement = insert(StoredBlobDB).values(
+                path=relative_path, content_hash=content_hash, size=len(file_bytes),
+                stored_size=len(data), ref_count=1
+            ).on_conflict_do_update(
+                index_elements=[StoredBlobDB.path],
+                set_={'ref_count': StoredBlobDB.ref_count + 1, 'stored_size': len(data)}
+            )
+            db.execute(statement)
+            backend.put(cls.storage_key(relative_path), data, len(data))
+            metrics.STORED_BLOBS.inc('written')
+            metrics.STORED_BYTES.inc(encoding or 'identity', 'original', amount=len(file_bytes))
+            metrics.STORED_BYTES.inc(encoding or 'identity', 'stored', amount=len(data))
 
         if previous_file_path:
-            cls.delete_path(previous_file_path)
+            cls.release_file(db, previous_file_path)
+        return relative_path, content_hash
+
+    @classmethod
+    def compression_level(cls, media_type: Optional[str]) -> Optional[int]:
+        """gzip level for a MIME type under STORAGE_COMPRESSION_TYPES, None = store as uploaded"""
+        if STORAGE_COMPRESSION != "gzip" or not media_type:
+            return None
+        for pattern, level in _compression_policy(STORAGE_COMPRESSION_TYPES):
+            if fnmatch(media_type, pattern):
+                return level
+        return None
+
+    @classmethod
+    def _encode(cls, file_bytes: bytes, media_type: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """(bytes to store, encoding) for a new blob"""
+        level = cls.compression_level(media_type)
+        if level is None or len(file_bytes) < STORAGE_COMPRESSION_MIN_SIZE:
+            return file_bytes, None
+        # mtime=0: the same content always compresses to the same bytes
+        compressed = gzip.compress(file_bytes, compresslevel=level, mtime=0)
+        if len(compressed) > len(file_bytes) * (1 - STORAGE_COMPRESSION_MIN_SAVING):
+            return file_bytes, None
+        return compressed, "gzip"
+
+    @staticmethod
+    def _media_type(media_type: Optional[str], file_name: str) -> Optional[str]:
+        """Declared Content-Type of an upload, else guessed from its name"""
+        declared = (media_type or "").split(";")[0].strip().lower()
+        if declared and declared != "application/octet-stream":
+            return declared
+        return mimetypes.guess_type(file_name or "")[0]
+
+    @classmethod
+    def release_file(cls, db: Session, path: str, usage: Optional[UsageScope] = None, size: int = 0) -> None:
+        """
+        Drop a submission's reference to a stored file (and, with `usage`,
+        its `size` bytes from the storage counters, when the submission is deleted)
+
+        Blobs keep their row with ref_count 0 (a later upload of the same
+        bytes reuses them; storage_reconciler collects them); files stored
+        before the blob store existed are deleted once `db` commits, so a
+        rolled back transaction still finds its file.
+        """
+        updated = db.execute(
+            update(StoredBlobDB)
+            .where(StoredBlobDB.path == path, StoredBlobDB.ref_count > 0)
+            .values(ref_count=StoredBlobDB.ref_count - 1)
+        ).rowcount
+        if not updated and not cls.is_blob_path(path):
+            cls.delete_after_commit(db, path)
+        if usage is not None:
+            StorageUsageService.charge(db, usage, -size, -1)
+
+    @classmethod
+    def delete_after_commit(cls, db: Session, path: str) -> None:
+        """Delete a stored file when `db` commits (forgotten if it rolls back)"""
+        pending = db.info.get(_PENDING_DELETES)
+        if pending is None:
+            pending = db.info[_PENDING_DELETES] = []
+
+            def delete_pending(session):
+                for pending_path in session.info.pop(_PENDING_DELETES, []):
+                    cls.delete_path(pending_path)
 
-        sanitized_name = cls._sanitize_filename(file_name)
-        timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-        destination_name = f"{submission_id}_{timestamp}_{sanitized_name}"
-        destination_path = os.path.join(activity_dir, destination_name)
+            def forget_pending(session):
+                session.info.pop(_PENDING_DELETES, None)
+
+            event.listen(db, "after_commit", delete_pending, once=True)
+            event.listen(db, "after_rollback", forget_pending, once=True)
+        pending.append(path)
+
+    @classmethod
+    def blob_path(cls, content_hash: str, file_name: str = "", encoding: Optional[str] = None) -> str:
+        """Absolute path of a blob: hash-sharded directories, original extension kept for extraction"""
+        extension = os.path.splitext(cls._sanitize_filename(file_name))[1].lower()
+        if not re.fullmatch(r"\.[a-z0-9]{1,10}", extension):
+            extension = ""
+        blobs_dir = os.path.join(cls.UPLOADS_ROOT, BLOBS_DIRNAME)
+        if encoding is not None:
+            blobs_dir = os.path.join(blobs_dir, COMPRESSED_DIRNAME)
+        return os.path.join(blobs_dir, content_hash[:2], content_hash[2:4], content_hash + extension)
+
+    @classmethod
+    def is_blob_path(cls, path: str) -> bool:
+        blobs_root = os.path.join(cls.UPLOADS_ROOT, BLOBS_DIRNAME)
+        try:
+            return os.path.commonpath([cls.resolve_path(path), blobs_root]) == blobs_root
+        except ValueError:
+            return False
 
-        with open(destination_path, "wb") as destination_file:
-            destination_file.write(file_bytes)
+    @staticmethod
+    def content_hash(file_bytes: bytes) -> str:
+        """SHA-256 (hex) of a file's content"""
+        return hashlib.sha256(file_bytes).hexdigest()
 
-        return cls._to_relative_path(destination_path)
+    @classmethod
+    def hash_file(cls, path: str) -> str:
+        """SHA-256 (hex) of a stored file's (decoded) content, read in chunks"""
+        digest = hashlib.sha256()
+        for chunk in cls.iter_file(path):
+            digest.update(chunk)
+        return digest.hexdigest()
 
     @classmethod
     def resolve_path(cls, path: str) -> str:
@@ -87,21 +445,27 @@ class FileStorageService:
         return common_path == uploads_root
 
     @classmethod
-    def delete_path(cls, path: str) -> None:
-        """Delete a file or directory if it exists (used for cleanup)."""
+    def delete_path(cls, path: str) -> bool:
+        """Delete a stored file (or local directory) if it exists (used for cleanup).
+
+        Failures are logged and leave an orphan for storage_reconciler.
+        """
         if not path:
-            return
-        abs_path = cls.resolve_path(path)
-        if not cls.is_within_uploads(abs_path):
-            return
+            return True
+        key = cls.storage_key(path)
+        if key is None:
+            return True
+        try:
+            cls.backend().delete(key)
+        except Exception as e:
+            logger.warning("Could not delete stored file %s: %s", path, e)
+            return False
+        return True
 
-        if os.path.isdir(abs_path):
-            shutil.rmtree(abs_path, ignore_errors=True)
-        elif os.path.isfile(abs_path):
-            try:
-                os.remove(abs_path)
-            except OSError:
-                pass
+    @classmethod
+    def path_for_key(cls, key: str) -> str:
+        """Stored path (as in file_submissions.file_path) of a backend key"""
+        return cls._to_relative_path(os.path.join(cls.UPLOADS_ROOT, *key.split("/")))
 
     @classmethod
     def _to_relative_path(cls, absolute_path: str) -> str:
@@ -111,6 +475,28 @@ class FileStorageService:
             # On Windows mixing drive letters can raise ValueError; fallback to absolute
             return absolute_path
 
+    @staticmethod
+    def download_filename(
+        *,
+        file_name: Optional[str],
+        stored_path: str,
+        group_code: Optional[str] = None,
+        student_name: Optional[str] = None,
+        student_id: Optional[str] = None,
+        uploaded_by: Optional[str] = None
+    ) -> str:
+        """
+        Human-friendly name for a downloaded submission: the group code, else
+        the first member's name (or ID), else the uploader, with the original
+        file extension.
+        """
+        extension = os.path.splitext(file_name or "")[1] or os.path.splitext(stored_path)[1]
+        if group_code:
+            base_name = group_code
+        else:
+            base_name = (student_name or "").strip() or student_id or uploaded_by or "submission"
+        return FileStorageService._sanitize_filename(f"{base_name}{extension}")
+
     @staticmethod
     def sanitize_filename(file_name: str) -> str:
         """Public helper to sanitize filenames consistently."""
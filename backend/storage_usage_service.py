@@ -0,0 +1,272 @@
+"""
+Storage accounting and quotas per Moodle instance, course and activity.
+
+Counters (storage_usage) are updated incrementally in the transaction that
+saves, replaces or deletes a submission file, so reading them never walks
+the storage tree. Bytes are the uploaded (logical) sizes: deduplication and
+compression at rest are shared between tenants and are not charged to any.
+
+Quotas are enforced by the same conditional UPDATE that adds the bytes, so
+concurrent uploads cannot overshoot them; recompute() rebuilds the counters
+from file_submissions if they ever drift.
+"""
+
+import logging
+import os
+from collections import defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+import metrics
+from database import get_db_session
+from db_models import ActivityDB, FileSubmissionDB, StorageUsageDB
+
+logger = logging.getLogger(__name__)
+
+# Default quotas in bytes of uploaded files (0 = unlimited); admins can override them per row
+STORAGE_QUOTA_MOODLE_BYTES = int(os.getenv('STORAGE_QUOTA_MOODLE_BYTES', '0'))
+STORAGE_QUOTA_COURSE_BYTES = int(os.getenv('STORAGE_QUOTA_COURSE_BYTES', '0'))
+STORAGE_QUOTA_ACTIVITY_BYTES = int(os.getenv('STORAGE_QUOTA_ACTIVITY_BYTES', '0'))
+# Largest usage listing returned by the admin API
+STORAGE_USAGE_LIST_LIMIT = 1000
+
+LEVELS = ('moodle', 'course', 'activity')
+
+
+class UsageScope(NamedTuple):
+    """Moodle instance, course and activity a submission file is charged to"""
+    moodle_id: str
+    course_id: str
+    activity_id: str
+
+    def keys(self) -> List[Tuple[str, Tuple[str, str, str]]]:
+        """(level, storage_usage primary key) from the innermost level out"""
+        return [
+            ('activity', (self.moodle_id, self.course_id, self.activity_id)),
+            ('course', (self.moodle_id, self.course_id, '')),
+            ('moodle', (self.moodle_id, '', '')),
+        ]
+
+
+class QuotaExceededError(Exception):
+    """Storing the file would take a Moodle instance, course or activity over its quota"""
+
+    def __init__(self, level: str, key: Tuple[str, str, str], limit: int, used: int, requested: int):
+        self.level = level
+        self.key = key
+        self.limit = limit
+        self.used = used
+        self.requested = requested
+        super().__init__(
+            f"Storage quota of {level} {'/'.join(part for part in key if part)} exceeded: "
+            f"{used} of {limit} bytes used, {requested} more requested"
+        )
+
+
+def _level_of(key: Tuple[str, str, str]) -> str:
+    if key[2]:
+        return 'activity'
+    return 'course' if key[1] else 'moodle'
+
+
+def default_quota(level: str) -> int:
+    return {
+        'moodle': STORAGE_QUOTA_MOODLE_BYTES,
+        'course': STORAGE_QUOTA_COURSE_BYTES,
+        'activity': STORAGE_QUOTA_ACTIVITY_BYTES,
+    }[level]
+
+
+def _key_filter(key: Tuple[str, str, str]):
+    return and_(
+        StorageUsageDB.moodle_id == key[0],
+        StorageUsageDB.course_id == key[1],
+        StorageUsageDB.activity_id == key[2],
+    )
+
+
+class StorageUsageService:
+    """Per-tenant storage counters and quota enforcement"""
+
+    @staticmethod
+    def charge(db: Session, scope: UsageScope, bytes_delta: int, files_delta: int) -> None:
+        """
+        Add bytes and files to the activity, its course and its Moodle instance
+        (negative deltas release them), within the caller's transaction.
+
+        Raises:
+            QuotaExceededError: a positive bytes_delta does not fit in the
+                quota of some level; counters already updated in `db` must be
+                rolled back by the caller (closing the session does it)
+        """
+        if not bytes_delta and not files_delta:
+            return
+        keys = scope.keys()
+        db.execute(
+            insert(StorageUsageDB)
+            .values([
+                {'moodle_id': key[0], 'course_id': key[1], 'activity_id': key[2], 'used_bytes': 0, 'file_count': 0}
+                for _, key in keys
+            ])
+            .on_conflict_do_nothing()
+        )
+        for level, key in keys:
+            statement = update(StorageUsageDB).where(_key_filter(key)).values(
+                used_bytes=StorageUsageDB.used_bytes + bytes_delta,
+                file_count=StorageUsageDB.file_count + files_delta,
+            )
+            if bytes_delta > 0:
+                # Check and add in one statement: concurrent uploads cannot both fit in the last bytes
+                limit = func.coalesce(StorageUsageDB.quota_bytes, default_quota(level))
+                statement = statement.where(or_(limit <= 0, StorageUsageDB.used_bytes + bytes_delta <= limit))
+            if not db.execute(statement).rowcount:
+                row = db.get(StorageUsageDB, key)
+                metrics.STORAGE_QUOTA_REJECTIONS.inc(level)
+                raise QuotaExceededError(
+                    level, key, StorageUsageService._effective_quota(row), row.used_bytes, bytes_delta
+                )
+
+    @staticmethod
+    def _effective_quota(row: StorageUsageDB) -> int:
+        if row.quota_bytes is not None:
+            return row.quota_bytes
+        return default_quota(_level_of((row.moodle_id, row.course_id, row.activity_id)))
+
+    @staticmethod
+    def _to_dict(row: StorageUsageDB) -> Dict[str, Any]:
+        quota = StorageUsageService._effective_quota(row)
+        return {
+            'level': _level_of((row.moodle_id, row.course_id, row.activity_id)),
+            'moodle_id': row.moodle_id,
+            'course_id': row.course_id or None,
+            'activity_id': row.activity_id or None,
+            'used_bytes': row.used_bytes,
+            'file_count': row.file_count,
+            'quota_bytes': quota or None,
+            'quota_override': row.quota_bytes is not None,
+            'usage_ratio': round(row.used_bytes / quota, 4) if quota > 0 else None,
+            'updated_at': row.updated_at.isoformat() + 'Z' if row.updated_at else None,
+        }
+
+    @staticmethod
+    def get_usage(level: Optional[str] = None, moodle_id: Optional[str] = None,
+                  course_id: Optional[str] = None, limit: int = STORAGE_USAGE_LIST_LIMIT) -> List[Dict[str, Any]]:
+        """Counters and quotas, largest first, optionally filtered by level, Moodle instance and course"""
+        if level is not None and level not in LEVELS:
+            raise ValueError(f"Invalid level '{level}' (expected one of: {', '.join(LEVELS)})")
+        query = select(StorageUsageDB)
+        if level == 'moodle':
+            query = query.where(StorageUsageDB.course_id == '')
+        elif level == 'course':
+            query = query.where(StorageUsageDB.course_id != '', StorageUsageDB.activity_id == '')
+        elif level == 'activity':
+            query = query.where(StorageUsageDB.activity_id != '')
+        if moodle_id is not None:
+            query = query.where(StorageUsageDB.moodle_id == moodle_id)
+        if course_id is not None:
+            query = query.where(StorageUsageDB.course_id == course_id)
+        query = query.order_by(
+            StorageUsageDB.used_bytes.desc(), StorageUsageDB.moodle_id,
+            StorageUsageDB.course_id, StorageUsageDB.activity_id
+        ).limit(max(1, min(limit, STORAGE_USAGE_LIST_LIMIT)))
+        db = get_db_session()
+        try:
+            return [StorageUsageService._to_dict(row) for row in db.execute(query).scalars()]
+        finally:
+            db.close()
+
+    @staticmethod
+    def set_quota(moodle_id: str, course_id: Optional[str] = None, activity_id: Optional[str] = None,
+                  quota_bytes: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Override the quota of a Moodle instance, course or activity
+        (quota_bytes 0 = unlimited, None = back to the STORAGE_QUOTA_* default)
+        """
+        if not moodle_id:
+            raise ValueError("moodle_id is required")
+        if activity_id and not course_id:
+            raise ValueError("course_id is required to set an activity quota")
+        if quota_bytes is not None and quota_bytes < 0:
+            raise ValueError("quota_bytes must be 0 (unlimited) or positive")
+        key = (moodle_id, course_id or '', activity_id or '')
+        db = get_db_session()
+        try:
+            db.execute(
+                insert(StorageUsageDB)
+                .values(moodle_id=key[0], course_id=key[1], activity_id=key[2],
+                        used_bytes=0, file_count=0, quota_bytes=quota_bytes)
+                .on_conflict_do_update(
+                    index_elements=[StorageUsageDB.moodle_id, StorageUsageDB.course_id, StorageUsageDB.activity_id],
+                    set_={'quota_bytes': quota_bytes}
+                )
+            )
+            db.commit()
+            logger.info(f"Cuota de almacenamiento de {'/'.join(part for part in key if part)}: {quota_bytes}")
+            return StorageUsageService._to_dict(db.get(StorageUsageDB, key))
+        finally:
+            db.close()
+
+    @staticmethod
+    def recompute() -> Dict[str, int]:
+        """
+        Rebuild every counter from file_submissions (quotas are kept).
+
+        The counters are reset before aggregating: the first write takes the
+        database write lock, so no upload can commit between the aggregate and
+        the new counters.
+        """
+        db = get_db_session()
+        try:
+            db.execute(update(StorageUsageDB).values(used_bytes=0, file_count=0))
+            aggregates = db.execute(
+                select(
+                    FileSubmissionDB.activity_moodle_id, ActivityDB.course_id, FileSubmissionDB.activity_id,
+                    func.coalesce(func.sum(FileSubmissionDB.file_size), 0), func.count(FileSubmissionDB.id)
+                )
+                .join(ActivityDB, and_(
+                    ActivityDB.id == FileSubmissionDB.activity_id,
+                    ActivityDB.course_moodle_id == FileSubmissionDB.activity_moodle_id
+                ))
+                .group_by(FileSubmissionDB.activity_moodle_id, ActivityDB.course_id, FileSubmissionDB.activity_id)
+            ).all()
+            totals: Dict[Tuple[str, str, str], List[int]] = defaultdict(lambda: [0, 0])
+            for moodle_id, course_id, activity_id, size, files in aggregates:
+                for _, key in UsageScope(moodle_id, course_id, activity_id).keys():
+                    totals[key][0] += size
+                    totals[key][1] += files
+            for (moodle_id, course_id, activity_id), (size, files) in totals.items():
+                db.execute(
+                    insert(StorageUsageDB)
+                    .values(moodle_id=moodle_id, course_id=course_id, activity_id=activity_id,
+                            used_bytes=size, file_count=files)
+                    .on_conflict_do_update(
+                        index_elements=[StorageUsageDB.moodle_id, StorageUsageDB.course_id, StorageUsageDB.activity_id],
+                        set_={'used_bytes': size, 'file_count': files}
+                    )
+                )
+            db.commit()
+            summary = {
+                'counters': len(totals),
+                'files': sum(files for key, (_, files) in totals.items() if not key[1]),
+                'bytes': sum(size for key, (size, _) in totals.items() if not key[1]),
+            }
+            logger.info(f"Contadores de almacenamiento recalculados: {summary}")
+            return summary
+        finally:
+            db.close()
+
+    @staticmethod
+    def backfill_if_empty() -> None:
+        """Build the counters of a database that has submissions but no counters yet (first start after upgrading)"""
+        db = get_db_session()
+        try:
+            if db.execute(select(StorageUsageDB.moodle_id).limit(1)).first() is not None:
+                return
+            if db.execute(select(FileSubmissionDB.id).limit(1)).first() is None:
+                return
+        finally:
+            db.close()
+        StorageUsageService.recompute()
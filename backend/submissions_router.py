@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form
-from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
 from typing import Optional
 import logging
 import os
@@ -8,6 +8,7 @@ import urllib.parse
 from models import GroupCodeSubmission, GroupCodeResponse, SubmissionResponse, OptimizedSubmissionView
 from activities_service import ActivitiesService
 from storage_service import FileStorageService
+from file_delivery import file_response
 from database import get_db_session
 from db_models import FileSubmissionDB, StudentSubmissionDB, UserDB
 
@@ -209,24 +210,38 @@ async def download_my_submission_file(request: Request):
             # Resolve the file path
             file_path = file_submission.file_path
             decoded_path = urllib.parse.unquote(file_path)
-            full_path = FileStorageService.resolve_path(decoded_path)
+            key = FileStorageService.storage_key(decoded_path)
             
             # Security check: ensure file is within uploads directory
-            if not FileStorageService.is_within_uploads(full_path):
+            if key is None:
                 raise HTTPException(status_code=403, detail="Acceso denegado al archivo")
             
-            if not os.path.isfile(full_path):
+            backend = FileStorageService.backend()
+            stat = await run_in_threadpool(FileStorageService.stat, decoded_path)
+            if stat is None:
                 raise HTTPException(status_code=404, detail="Archivo no encontrado en el sistema")
             
             # Use the original filename for download
-            download_filename = file_submission.file_name or os.path.basename(full_path)
+            download_filename = file_submission.file_name or os.path.basename(key)
+            
+            content_hash = file_submission.content_hash
+            if not content_hash:
+                # Rows stored before content hashes existed: hash once and keep it
+                content_hash = await run_in_threadpool(FileStorageService.hash_file, decoded_path)
+                file_submission.content_hash = content_hash
+                db.commit()
             
             logging.info(f"Student {student_id} downloading their submission file: {download_filename}")
             
-            return FileResponse(
-                path=full_path,
+            return await run_in_threadpool(
+                file_response,
+                request,
+                key,
+                backend=backend,
+                stat=stat,
                 filename=download_filename,
-                media_type=file_submission.file_type or 'application/octet-stream'
+                media_type=file_submission.file_type or 'application/octet-stream',
+                content_hash=content_hash
             )
             
         finally:
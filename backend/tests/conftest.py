@@ -0,0 +1,77 @@
+"""
+Fixtures y utilidades compartidas por las pruebas de la API: la aplicación
+recargada sobre una base de datos temporal, su cliente (también con un
+administrador configurado), sesiones LTI enviadas por cabecera y entregas
+de estudiantes.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from test_endpoints import _launch_lti, _lti_payload, _reload_app_modules  # noqa: E402
+
+ADMIN_CREDENTIALS = {"username": "admin", "password": "secret"}
+
+
+@pytest.fixture
+def app_modules(tmp_path, monkeypatch):
+    return _reload_app_modules(tmp_path, monkeypatch)
+
+
+@pytest.fixture
+def client(app_modules):
+    with TestClient(app_modules["main"].app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def admin_ctx(tmp_path, monkeypatch):
+    monkeypatch.setenv("ADMIN_USERNAME", ADMIN_CREDENTIALS["username"])
+    monkeypatch.setenv("ADMIN_PASSWORD", ADMIN_CREDENTIALS["password"])
+    modules = _reload_app_modules(tmp_path, monkeypatch)
+    with TestClient(modules["main"].app) as test_client:
+        yield test_client, modules
+
+
+def admin_login(client):
+    """Log in as the administrator of admin_ctx (dropping any LTI session cookie)"""
+    client.cookies.clear()
+    assert client.post("/api/admin/login", json=ADMIN_CREDENTIALS).status_code == 200
+
+
+def lti_headers(client, user_id, roles, *, name=None, **payload_options):
+    """Launch LTI and return the X-LTI-Session header of the new session
+
+    The cookie set by the launch is cleared, so several sessions can be used
+    from the same client, each by its header.
+    """
+    payload = _lti_payload(user_id, roles, **payload_options)
+    if name is not None:
+        payload["lis_person_name_full"] = name
+    headers = {"X-LTI-Session": _launch_lti(client, payload)}
+    client.cookies.clear()
+    return headers
+
+
+def create_activity(client, teacher, title, activity_type="individual"):
+    """Create the activity of the teacher session's resource link"""
+    body = {"title": title, "description": "x", "activity_type": activity_type}
+    response = client.post("/api/activities", json=body, headers=teacher)
+    assert response.status_code == 200
+    return response.json()["activity"]
+
+
+def upload_submission(client, activity_id, user_id, file_name, content, media_type="text/plain", name=None):
+    """Submit a file as a student of the activity and return its file_submission"""
+    student = lti_headers(client, user_id, "Learner", name=name, resource_link_id=activity_id)
+    response = client.post(f"/api/activities/{activity_id}/submissions", headers=student,
+                           files={"file": (file_name, content, media_type)})
+    assert response.status_code == 200
+    return response.json()["submission"]["file_submission"]
@@ -0,0 +1,86 @@
+"""
+Pruebas de los listados de administración: paginación por clave, filtros
+por columna y exportación NDJSON en streaming.
+"""
+
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from conftest import admin_login  # noqa: E402
+
+
+@pytest.fixture
+def admin_ctx(admin_ctx):
+    client, modules = admin_ctx
+    db_models = modules["db_models"]
+    db = modules["database"].get_db_session()
+    for moodle_id in ("m1", "m2"):
+        db.add(db_models.MoodleDB(id=moodle_id, name=f"Moodle {moodle_id}"))
+        for index in range(5):
+            db.add(db_models.UserDB(
+                id=f"u{index}", moodle_id=moodle_id, full_name=f"Usuario {index}",
+                role="teacher" if index == 0 else "student", created_at=datetime(2025, 1, 1, 9, index)
+            ))
+    db.commit()
+    db.close()
+
+    admin_login(client)
+    return admin_ctx
+
+
+def test_keyset_pages_cover_listing_once(admin_ctx):
+    client, _ = admin_ctx
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/api/admin/users", params=params).json()
+        pages += 1
+        assert body["count"] == len(body["data"]) <= 3
+        seen += [(row["id"], row["moodle_id"]) for row in body["data"]]
+        cursor = body["next_cursor"]
+        assert body["has_more"] == (cursor is not None)
+        if not cursor:
+            break
+
+    assert pages == 4
+    assert seen == sorted(seen) and len(set(seen)) == 10
+    assert body["data"][-1]["created_at"] == "2025-01-01T09:04:00"
+
+
+def test_column_filters_and_errors(admin_ctx):
+    client, _ = admin_ctx
+
+    teachers = client.get("/api/admin/users", params={"role": "teacher"}).json()["data"]
+    assert [(row["id"], row["moodle_id"]) for row in teachers] == [("u0", "m1"), ("u0", "m2")]
+    named = client.get("/api/admin/users", params={"full_name": "usuario 3", "moodle_id": "m2"}).json()["data"]
+    assert [row["id"] for row in named] == ["u3"]
+    assert client.get("/api/admin/users", params={"full_name": "%"}).json()["data"] == []
+
+    assert client.get("/api/admin/users", params={"password": "x"}).status_code == 400
+    assert client.get("/api/admin/users", params={"cursor": "no-es-un-cursor"}).status_code == 400
+    assert client.get("/api/admin/users", params={"limit": 0}).status_code == 400
+    assert client.get("/api/admin/submissions", params={"sent_to_moodle": "quizás"}).status_code == 400
+    assert client.get("/api/admin/submissions", params={"sent_to_moodle": "false"}).status_code == 200
+
+
+def test_ndjson_export_streams_in_windows(admin_ctx, monkeypatch):
+    client, modules = admin_ctx
+    monkeypatch.setattr(modules["admin_service"], "ADMIN_STREAM_WINDOW", 4)
+    monkeypatch.setattr(modules["admin_service"], "ADMIN_STREAM_BATCH", 3)
+
+    response = client.get("/api/admin/users", params={"format": "ndjson", "role": "student"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 8 and all(row["role"] == "student" for row in rows)
+    assert client.get("/api/admin/users", params={"format": "ndjson", "rol": "x"}).status_code == 400
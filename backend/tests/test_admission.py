@@ -0,0 +1,162 @@
+"""
+Pruebas del control de admisión: límite de concurrencia con cola acotada,
+rechazo rápido con 503 + Retry-After, reparto equitativo entre sesiones y
+métricas del tiempo de espera.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import admission  # noqa: E402
+import metrics  # noqa: E402
+from test_endpoints import _launch_lti, _lti_payload, app_ctx  # noqa: E402,F401
+
+
+def test_pool_serves_waiting_sessions_round_robin():
+    async def scenario():
+        pool = admission.AdmissionPool('test', concurrency=1, queue_size=10, session_limit=2, max_wait=5)
+        order = []
+
+        async def request(session):
+            await pool.acquire(session)
+            order.append(session)
+            await asyncio.sleep(0)
+            pool.release(session, 0.01)
+
+        await pool.acquire('a')  # holds the only slot
+        tasks = [asyncio.create_task(request(session)) for session in ('a', 'a', 'b')]
+        await asyncio.sleep(0)
+        assert pool.queued == 3
+        pool.release('a', 0.01)
+        await asyncio.gather(*tasks)
+        return order, pool.snapshot()
+
+    order, snapshot = asyncio.run(scenario())
+    # 'a' queued twice before 'b', but 'b' is served before the second 'a'
+    assert order == ['a', 'b', 'a']
+    assert snapshot['active'] == 0 and snapshot['queued'] == 0 and snapshot['waiting_sessions'] == 0
+
+
+def test_pool_rejects_when_saturated():
+    async def scenario():
+        pool = admission.AdmissionPool('test', concurrency=1, queue_size=1, session_limit=1, max_wait=0.05)
+        await pool.acquire('a')
+        waiter = asyncio.create_task(pool.acquire('b'))
+        await asyncio.sleep(0)
+        reasons = []
+        for session in ('b', 'c'):
+            try:
+                await pool.acquire(session)
+            except admission.AdmissionRejected as e:
+                reasons.append((e.reason, e.retry_after))
+        try:
+            await waiter
+        except admission.AdmissionRejected as e:
+            reasons.append((e.reason, e.retry_after))
+        return reasons, pool.snapshot()
+
+    timeouts_before = metrics.ADMISSION_WAIT.count('test', 'timeout')
+    reasons, snapshot = asyncio.run(scenario())
+    assert reasons == [('session_limit', 2), ('queue_full', 2), ('timeout', 1)]
+    assert snapshot['active'] == 1 and snapshot['queued'] == 0
+    assert metrics.ADMISSION_WAIT.count('test', 'timeout') == timeouts_before + 1
+    assert metrics.ADMISSION_REJECTIONS.get('test', 'queue_full') >= 1
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        pool = admission.AdmissionPool('test', concurrency=1, queue_size=5, max_wait=5)
+        await pool.acquire('a')
+        waiter = asyncio.create_task(pool.acquire('b'))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        queued = pool.queued
+        pool.release('a', 0.01)
+        return queued, pool.snapshot()
+
+    queued, snapshot = asyncio.run(scenario())
+    assert queued == 0
+    assert snapshot['active'] == 0
+
+
+def test_middleware_queues_uploads_before_reading_the_body():
+    async def scenario():
+        release = asyncio.Event()
+        bodies_read = []
+
+        async def upload(request):
+            bodies_read.append(await request.body())
+            await release.wait()
+            return PlainTextResponse('ok')
+
+        app = Starlette(routes=[Route('/api/activities/{activity_id}/submissions', upload, methods=['POST'])])
+        pool = admission.AdmissionPool('upload', concurrency=1, queue_size=1, max_wait=5)
+        wrapped = admission.AdmissionMiddleware(app, pools={'upload': pool})
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=wrapped), base_url='http://test') as client:
+            def post(session):
+                return client.post('/api/activities/a1/submissions', content=session.encode(),
+                                   headers={'X-LTI-Session': session})
+
+            first = asyncio.create_task(post('s1'))
+            second = asyncio.create_task(post('s2'))
+            while pool.queued < 1:
+                await asyncio.sleep(0.001)
+            assert bodies_read == [b's1']  # the queued upload has not been received
+            rejected = await post('s3')
+            other_route = await client.post('/api/activities/a1/other', headers={'X-LTI-Session': 's3'})
+            release.set()
+            responses = await asyncio.gather(first, second)
+        return rejected, other_route, responses, bodies_read
+
+    rejected, other_route, responses, bodies_read = asyncio.run(scenario())
+    assert rejected.status_code == 503
+    assert rejected.headers['Retry-After'] == '2'
+    assert 'entregas' in rejected.json()['detail']
+    assert other_route.status_code == 404  # not a heavy route: never queued
+    assert [response.status_code for response in responses] == [200, 200]
+    assert bodies_read == [b's1', b's2']
+
+
+def test_upload_rejected_with_retry_after(app_ctx):
+    client, modules = app_ctx
+    _launch_lti(client, _lti_payload(user_id="teacher1", roles="Instructor"))
+    activity_id = client.post("/api/activities", json={
+        "title": "Entrega", "description": "", "activity_type": "individual"
+    }).json()["activity"]["id"]
+    session_id = _launch_lti(client, _lti_payload(user_id="student1", roles="Learner", resource_link_id=activity_id))
+
+    middleware = modules["main"].app.middleware_stack
+    while not isinstance(middleware, modules["admission"].AdmissionMiddleware):
+        middleware = middleware.app
+    pool = middleware.pools["upload"]
+    pool.queue_size = 0
+    for index in range(pool.concurrency):
+        asyncio.run(pool.acquire(f"lti:other-{index}"))
+
+    rejections_before = metrics.ADMISSION_REJECTIONS.get("upload", "queue_full")
+    url = f"/api/activities/{activity_id}/submissions"
+    upload = {"file": ("test.txt", b"Content", "text/plain")}
+    resp = client.post(url, files=upload)
+    assert resp.status_code == 503
+    assert int(resp.headers["Retry-After"]) >= 1
+    assert metrics.ADMISSION_REJECTIONS.get("upload", "queue_full") == rejections_before + 1
+    assert admission.session_key({"type": "http", "headers": [(b"cookie", f"lti_session={session_id}".encode())],
+                                  "query_string": b""}) == f"lti:{session_id}"
+
+    for index in range(pool.concurrency):
+        pool.release(f"lti:other-{index}", 0.0)
+    assert client.post(url, files=upload).status_code == 200
+    scrape = client.get("/metrics").text
+    assert 'lamba_admission_rejections_total{pool="upload",reason="queue_full"}' in scrape
+    assert 'lamba_admission_wait_seconds_count{pool="upload",outcome="admitted"}' in scrape
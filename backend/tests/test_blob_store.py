@@ -0,0 +1,103 @@
+"""
+Pruebas del almacén de entregas direccionado por contenido: deduplicación,
+recuento de referencias y reenvíos sin cambios.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from conftest import create_activity, lti_headers, upload_submission  # noqa: E402
+
+
+def _blobs(app_modules):
+    db = app_modules["database"].get_db_session()
+    try:
+        return {row.path: row.ref_count for row in db.query(app_modules["db_models"].StoredBlobDB)}
+    finally:
+        db.close()
+
+
+def test_identical_uploads_share_one_blob(app_modules, client, tmp_path):
+    for activity_id in ("act-1", "act-2"):
+        create_activity(client, lti_headers(client, "teacher1", "Instructor", resource_link_id=activity_id), activity_id)
+
+    template = b"def main():\n    pass\n"
+    first = upload_submission(client, "act-1", "s1", "main.py", template)
+    second = upload_submission(client, "act-1", "s2", "solucion.py", template)
+    other_course = upload_submission(client, "act-2", "s3", "main.py", template)
+
+    assert first["file_path"] == second["file_path"] == other_course["file_path"]
+    assert first["content_hash"] and first["file_path"].endswith(f"{first['content_hash']}.py")
+    assert _blobs(app_modules) == {first["file_path"]: 3}
+    stored = [path for path in (tmp_path / "uploads" / "blobs").rglob("*") if path.is_file()]
+    assert len(stored) == 1 and stored[0].read_bytes() == template
+
+
+def test_resubmissions_update_references(app_modules, client):
+    create_activity(client, lti_headers(client, "teacher1", "Instructor", resource_link_id="act-1"), "A")
+
+    original = upload_submission(client, "act-1", "s1", "ensayo.txt", b"version 1")
+    full_path = app_modules["storage_service"].FileStorageService.resolve_path(original["file_path"])
+    mtime = os.stat(full_path).st_mtime_ns
+
+    # Same bytes again: same blob, no new write, no extra reference
+    unchanged = upload_submission(client, "act-1", "s1", "ensayo.txt", b"version 1")
+    assert unchanged["file_path"] == original["file_path"]
+    assert os.stat(full_path).st_mtime_ns == mtime
+    assert _blobs(app_modules) == {original["file_path"]: 1}
+
+    # New content: the previous blob is released (kept for reuse with no references)
+    changed = upload_submission(client, "act-1", "s1", "ensayo.txt", b"version 2")
+    assert _blobs(app_modules) == {original["file_path"]: 0, changed["file_path"]: 1}
+
+    # Going back to the old content reuses the existing blob
+    back = upload_submission(client, "act-1", "s1", "ensayo.txt", b"version 1")
+    assert back["file_path"] == original["file_path"]
+    assert _blobs(app_modules) == {original["file_path"]: 1, changed["file_path"]: 0}
+
+
+def test_legacy_files_are_deleted_on_release(app_modules, tmp_path):
+    storage = app_modules["storage_service"].FileStorageService
+    legacy = tmp_path / "uploads" / "moodle-001" / "course-001" / "act-1" / "old_file.txt"
+    legacy.parent.mkdir(parents=True)
+    legacy.write_bytes(b"old")
+
+    db = app_modules["database"].get_db_session()
+    try:
+        path, content_hash = storage.save_submission_file(
+            db, file_name="nuevo.TXT", file_bytes=b"new", previous_file_path=storage._to_relative_path(str(legacy))
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    assert not legacy.exists()
+    assert path.endswith(f"{content_hash}.txt") and storage.is_blob_path(path)
+    assert storage.blob_path(content_hash, "weird.name.<script>").endswith(content_hash)
+
+
+def test_downloads_of_a_shared_blob_keep_each_submission(app_modules, client):
+    teacher = lti_headers(client, "teacher1", "Instructor", resource_link_id="a1")
+    create_activity(client, teacher, "A")
+
+    uploads = {
+        user_id: upload_submission(client, "a1", user_id, "entrega.txt", b"same bytes", name=name)
+        for user_id, name in (("alice", "Alice Doe"), ("bob", "Bob Roe"))
+    }
+    assert uploads["alice"]["file_path"] == uploads["bob"]["file_path"]
+
+    for user_id, name in (("alice", "Alice Doe"), ("bob", "Bob Roe")):
+        response = client.get(f"/api/downloads/submission/{uploads[user_id]['id']}", headers=teacher)
+        assert response.status_code == 200 and response.content == b"same bytes"
+        assert response.headers["content-disposition"] == f'attachment; filename="{name.replace(" ", "_")}.txt"'
+
+    # A teacher of another Moodle instance sees neither the submission nor the shared blob
+    other = lti_headers(client, "teacher2", "Instructor", moodle_id="moodle-002")
+    assert client.get(f"/api/downloads/submission/{uploads['bob']['id']}", headers=other).status_code == 404
+    assert client.get(f"/api/downloads/{uploads['bob']['file_path']}", headers=other).status_code == 404
+    assert client.get(f"/api/downloads/{uploads['bob']['file_path']}", headers=teacher).status_code == 200
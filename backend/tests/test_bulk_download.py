@@ -0,0 +1,111 @@
+"""
+Pruebas de la descarga masiva de entregas en ZIP: nombres iguales a los de
+/api/downloads, filtros (sin calificar, por grupo) y generación en streaming.
+"""
+
+import io
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import zip_stream  # noqa: E402
+from test_endpoints import _launch_lti, _lti_payload, _reload_app_modules  # noqa: E402
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    modules = _reload_app_modules(tmp_path, monkeypatch)
+    with TestClient(modules["main"].app) as test_client:
+        yield test_client
+
+
+def _student(client, activity_id, user_id, name):
+    payload = _lti_payload(user_id, "Learner", resource_link_id=activity_id)
+    payload["lis_person_name_full"] = name
+    session = _launch_lti(client, payload)
+    client.cookies.clear()
+    return {"X-LTI-Session": session}
+
+
+def _setup(client, activity_type):
+    teacher = {"X-LTI-Session": _launch_lti(client, _lti_payload("teacher1", "Instructor", resource_link_id="act-zip"))}
+    client.cookies.clear()
+    body = {"title": "Ensayo final", "description": "Entrega", "activity_type": activity_type}
+    if activity_type == "group":
+        body["max_group_size"] = 3
+    assert client.post("/api/activities", json=body, headers=teacher).status_code == 200
+    return teacher
+
+
+def test_individual_zip_names_and_ungraded_filter(client):
+    teacher = _setup(client, "individual")
+    uploads = {}
+    for user_id, name, content in (("s1", "Ana López", b"ana"), ("s2", "Luis", b"luis"), ("s3", "Luis", b"otro luis")):
+        response = client.post("/api/activities/act-zip/submissions", headers=_student(client, "act-zip", user_id, name),
+                               files={"file": ("trabajo.pdf", content, "application/pdf")})
+        uploads[user_id] = response.json()["submission"]["file_submission"]
+
+    response = client.get("/api/activities/act-zip/submissions/download", headers=teacher)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    assert 'filename="Ensayo_final_entregas.zip"' in response.headers["content-disposition"]
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.testzip() is None
+    assert {name: archive.read(name) for name in archive.namelist()} == {
+        "Ana_L_pez.pdf": b"ana", "Luis.pdf": b"luis", "Luis_2.pdf": b"otro luis"
+    }
+
+    # Same name as the single-file download
+    single = client.get(f"/api/downloads/{uploads['s1']['file_path']}", headers=teacher)
+    assert 'filename="Ana_L_pez.pdf"' in single.headers["content-disposition"]
+
+    assert client.post(f"/api/grades/{uploads['s1']['id']}", json={"score": 8}, headers=teacher).status_code == 200
+    ungraded = client.get("/api/activities/act-zip/submissions/download", params={"ungraded": "true"}, headers=teacher)
+    assert sorted(zipfile.ZipFile(io.BytesIO(ungraded.content)).namelist()) == ["Luis.pdf", "Luis_2.pdf"]
+
+
+def test_group_filter_missing_files_and_permissions(client, tmp_path):
+    teacher = _setup(client, "group")
+    codes = []
+    for user_id in ("s1", "s2"):
+        response = client.post("/api/activities/act-zip/submissions", headers=_student(client, "act-zip", user_id, user_id),
+                               files={"file": ("memoria.docx", user_id.encode(), "application/octet-stream")})
+        codes.append(response.json()["submission"]["file_submission"]["group_code"])
+
+    only = client.get("/api/activities/act-zip/submissions/download", params={"group_code": codes[1]}, headers=teacher)
+    assert zipfile.ZipFile(io.BytesIO(only.content)).namelist() == [f"{codes[1]}.docx"]
+
+    for stored in (tmp_path / "uploads").rglob("*.docx"):
+        if stored.read_bytes() == b"s1":
+            stored.unlink()
+    archive = zipfile.ZipFile(io.BytesIO(client.get("/api/activities/act-zip/submissions/download", headers=teacher).content))
+    assert archive.namelist() == [f"{codes[1]}.docx", "_archivos_no_encontrados.txt"]
+    assert archive.read("_archivos_no_encontrados.txt").decode().strip() == f"{codes[0]}.docx"
+
+    student = _student(client, "act-zip", "s3", "s3")
+    assert client.get("/api/activities/act-zip/submissions/download", headers=student).status_code == 403
+    assert client.get("/api/activities/act-zip/submissions/download", params={"group_code": "NOPE"},
+                      headers=teacher).status_code == 404
+
+
+def test_iter_zip_streams_in_bounded_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(zip_stream, "CHUNK_SIZE", 64 * 1024)
+    big = tmp_path / "big.bin"
+    big.write_bytes(b"\x00\x01" * (1024 * 1024))
+
+    chunks = list(zip_stream.iter_zip([
+        zip_stream.ZipEntry("big.bin", path=str(big)),
+        zip_stream.ZipEntry("notas.txt", chunks=[b"linea\n"] * 100, compress_type=zipfile.ZIP_DEFLATED),
+    ]))
+
+    assert len(chunks) > 30 and max(len(chunk) for chunk in chunks) <= 64 * 1024 + 1024
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert archive.read("big.bin") == big.read_bytes()
+    assert archive.read("notas.txt") == b"linea\n" * 100
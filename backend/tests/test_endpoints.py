@@ -26,16 +26,30 @@ MODULE_ORDER = [
     "database",
     "models",
     "db_models",
+    "storage_backends",
+    "storage_usage_service",
     "storage_service",
+    "file_delivery",
+    "frontend_assets",
+    "fast_json",
+    "response_compression",
+    "storage_reconciler",
     "moodle_service",
     "user_service",
     "course_service",
     "grade_service",
     "activities_service",
     "lti_service",
+    "evaluation_service",
     "activities_router",
     "submissions_router",
+    "grade_export_service",
     "grades_router",
+    "stats_service",
+    "admin_service",
+    "admin_router",
+    "warmup",
+    "admission",
     "main",
 ]
 
@@ -49,6 +63,8 @@ def _reload_app_modules(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
     db_file = tmp_path / "test.db"
     monkeypatch.setenv("DATABASE_URL", f"sqlite:///{db_file}")
     monkeypatch.setenv("HTTPS_ENABLED", "false")
+    monkeypatch.setenv("WARMUP_LAMB_CONNECTIONS", "0")  # No LAMB requests at startup
+    monkeypatch.setenv("METRICS_PUBLIC", "true")
 
     modules = {}
     for name in MODULE_ORDER:
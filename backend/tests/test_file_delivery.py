@@ -0,0 +1,121 @@
+"""
+Pruebas de la entrega de archivos: ETag fuerte (hash del contenido), GET
+condicional, rangos de bytes y delegación al proxy (X-Accel-Redirect / X-Sendfile).
+"""
+
+import hashlib
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from conftest import create_activity, lti_headers  # noqa: E402
+
+CONTENT = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def uploaded(client):
+    teacher = lti_headers(client, "teacher1", "Instructor", resource_link_id="act-f")
+    create_activity(client, teacher, "Memoria")
+    student = lti_headers(client, "s1", "Learner", resource_link_id="act-f")
+    response = client.post("/api/activities/act-f/submissions", headers=student,
+                           files={"file": ("memoria.pdf", CONTENT, "application/pdf")})
+    file_submission = response.json()["submission"]["file_submission"]
+    return {"teacher": teacher, "student": student, "url": f"/api/downloads/{file_submission['file_path']}",
+            "id": file_submission["id"]}
+
+
+def test_strong_etag_and_conditional_get(client, uploaded):
+    etag = f'"{hashlib.sha256(CONTENT).hexdigest()}"'
+    first = client.get(uploaded["url"], headers=uploaded["teacher"])
+    assert first.status_code == 200 and first.content == CONTENT
+    assert first.headers["etag"] == etag
+    assert first.headers["accept-ranges"] == "bytes"
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    again = client.get(uploaded["url"], headers={**uploaded["teacher"], "If-None-Match": f'W/"x", {etag}'})
+    assert again.status_code == 304 and again.content == b"" and again.headers["etag"] == etag
+
+    since = client.get(uploaded["url"], headers={**uploaded["teacher"], "If-Modified-Since": first.headers["last-modified"]})
+    assert since.status_code == 304
+    # If-None-Match takes precedence over If-Modified-Since
+    stale = client.get(uploaded["url"], headers={**uploaded["teacher"], "If-None-Match": '"other"',
+                                                 "If-Modified-Since": first.headers["last-modified"]})
+    assert stale.status_code == 200
+
+    own = client.get("/api/submissions/my-file/download", headers={**uploaded["student"], "If-None-Match": etag})
+    assert own.status_code == 304
+
+
+def test_byte_ranges(client, uploaded):
+    headers = uploaded["teacher"]
+    partial = client.get(uploaded["url"], headers={**headers, "Range": "bytes=100-199"})
+    assert partial.status_code == 206
+    assert partial.content == CONTENT[100:200]
+    assert partial.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+
+    suffix = client.get(uploaded["url"], headers={**headers, "Range": "bytes=-10"})
+    assert suffix.status_code == 206 and suffix.content == CONTENT[-10:]
+
+    unsatisfiable = client.get(uploaded["url"], headers={**headers, "Range": f"bytes={len(CONTENT)}-"})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+    # Outdated If-Range: the whole (current) file is sent
+    changed = client.get(uploaded["url"], headers={**headers, "Range": "bytes=0-9", "If-Range": '"old"'})
+    assert changed.status_code == 200 and changed.content == CONTENT
+
+
+def test_proxy_offload_and_hash_backfill(app_modules, client, uploaded, monkeypatch):
+    delivery = app_modules["file_delivery"]
+    monkeypatch.setattr(delivery, "FILE_OFFLOAD", "x-accel-redirect")
+    offloaded = client.get(uploaded["url"], headers=uploaded["teacher"])
+    assert offloaded.status_code == 200 and offloaded.content == b""
+    digest = hashlib.sha256(CONTENT).hexdigest()
+    assert offloaded.headers["x-accel-redirect"] == f"/protected-uploads/blobs/{digest[:2]}/{digest[2:4]}/{digest}.pdf"
+
+    monkeypatch.setattr(delivery, "FILE_OFFLOAD", "x-sendfile")
+    assert client.get(uploaded["url"], headers=uploaded["teacher"]).headers["x-sendfile"].endswith(f"{digest}.pdf")
+
+    # Rows without a stored hash get it computed on first download
+    db_models = app_modules["db_models"]
+    db = app_modules["database"].get_db_session()
+    try:
+        db.query(db_models.FileSubmissionDB).update({"content_hash": None})
+        db.commit()
+        monkeypatch.setattr(delivery, "FILE_OFFLOAD", "")
+        assert client.get(uploaded["url"], headers=uploaded["teacher"]).headers["etag"] == \
+            f'"{hashlib.sha256(CONTENT).hexdigest()}"'
+        db.expire_all()
+        assert db.get(db_models.FileSubmissionDB, uploaded["id"]).content_hash == hashlib.sha256(CONTENT).hexdigest()
+    finally:
+        db.close()
+
+
+def test_file_without_row_gets_weak_etag_without_hashing(app_modules, client, uploaded, monkeypatch):
+    db_models = app_modules["db_models"]
+    db = app_modules["database"].get_db_session()
+    try:
+        db.query(db_models.StudentSubmissionDB).delete()
+        db.query(db_models.FileSubmissionDB).delete()
+        db.commit()
+    finally:
+        db.close()
+
+    storage = app_modules["storage_service"].FileStorageService
+    monkeypatch.setattr(storage, "hash_file", lambda *args: pytest.fail("orphaned files must not be hashed"))
+    first = client.get(uploaded["url"], headers=uploaded["teacher"])
+    assert first.status_code == 200 and first.content == CONTENT
+    etag = first.headers["etag"]
+    assert etag.startswith(f'W/"{len(CONTENT)}-')
+
+    again = client.get(uploaded["url"], headers={**uploaded["teacher"], "If-None-Match": etag})
+    assert again.status_code == 304
+    # Weak validators never satisfy If-Range: the whole file is sent
+    ranged = client.get(uploaded["url"], headers={**uploaded["teacher"], "Range": "bytes=0-9", "If-Range": etag})
+    assert ranged.status_code == 200 and ranged.content == CONTENT
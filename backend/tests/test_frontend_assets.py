@@ -0,0 +1,111 @@
+"""
+Pruebas del servicio del build del frontend: variantes .br/.gz
+precomprimidas, caché inmutable de los recursos con huella, index.html /
+config.js / favicon.png en memoria con ETag y recarga al cambiar en disco.
+"""
+
+import gzip
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from test_endpoints import _reload_app_modules  # noqa: E402
+
+ENTRY_JS = b"export const start = () => console.log('lamba');\n" * 50
+INDEX_HTML = b"<!doctype html><html><head><script src='/config.js'></script></head><body>SPA</body></html>" * 5
+
+
+@pytest.fixture
+def build(tmp_path, monkeypatch):
+    build_dir = tmp_path / "build"
+    immutable = build_dir / "app" / "immutable" / "entry"
+    immutable.mkdir(parents=True)
+    (immutable / "start.Ab12Cd.js").write_bytes(ENTRY_JS)
+    (immutable / "start.Ab12Cd.js.gz").write_bytes(gzip.compress(ENTRY_JS))
+    (immutable / "start.Ab12Cd.js.br").write_bytes(b"fake-brotli-bytes")
+    (build_dir / "app" / "version.json").write_bytes(b'{"version":"1"}')
+    (build_dir / "img").mkdir()
+    (build_dir / "img" / "logo.svg").write_bytes(b"<svg/>")
+    (build_dir / "index.html").write_bytes(INDEX_HTML)
+    (build_dir / "config.js").write_bytes(b"window.LAMBA_CONFIG = {};\n" * 20)
+    (build_dir / "favicon.png").write_bytes(b"\x89PNG fake")
+    monkeypatch.setenv("FRONTEND_BUILD_DIR", str(build_dir))
+    modules = _reload_app_modules(tmp_path, monkeypatch)
+    with TestClient(modules["main"].app) as client:
+        yield client, build_dir
+
+
+def test_fingerprinted_assets_are_precompressed_and_immutable(build):
+    client, _ = build
+    path = "/app/immutable/entry/start.Ab12Cd.js"
+
+    brotli = client.get(path, headers={"Accept-Encoding": "gzip, br"})
+    assert brotli.status_code == 200
+    assert brotli.headers["content-encoding"] == "br"
+    assert brotli.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert brotli.headers["vary"] == "Accept-Encoding"
+    assert "javascript" in brotli.headers["content-type"]
+
+    gzipped = client.get(path, headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.content == ENTRY_JS  # decoded by the client
+    identity = client.get(path, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.content == ENTRY_JS
+    assert identity.headers["etag"] != gzipped.headers["etag"]
+    assert client.get(path, headers={"Accept-Encoding": "gzip",
+                                     "If-None-Match": gzipped.headers["etag"]}).status_code == 304
+
+    version = client.get("/app/version.json")
+    assert version.headers["cache-control"].startswith("public, max-age=")
+    assert "immutable" not in version.headers["cache-control"]
+    assert "vary" not in version.headers
+    assert client.get("/img/logo.svg").headers["cache-control"] == "public, max-age=3600"
+
+
+def test_stale_variant_is_ignored(build):
+    client, build_dir = build
+    source = build_dir / "app" / "immutable" / "entry" / "start.Ab12Cd.js"
+    for suffix in (".gz", ".br"):
+        os.utime(f"{source}{suffix}", (1_000_000, 1_000_000))
+
+    response = client.get("/app/immutable/entry/start.Ab12Cd.js", headers={"Accept-Encoding": "gzip, br"})
+
+    assert "content-encoding" not in response.headers
+    assert response.content == ENTRY_JS
+
+
+def test_spa_config_and_favicon_from_memory_with_etags(build):
+    client, build_dir = build
+
+    page = client.get("/actividad/123", headers={"Accept-Encoding": "gzip"})
+    assert page.status_code == 200
+    assert page.content == INDEX_HTML
+    assert page.headers["content-encoding"] == "gzip"
+    assert page.headers["cache-control"] == "no-cache"
+    etag = page.headers["etag"]
+    assert etag.endswith('-gzip"')
+    assert client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": etag}).status_code == 304
+    plain = client.get("/", headers={"Accept-Encoding": "identity"})
+    assert plain.headers["etag"] == etag.replace("-gzip", "")
+
+    config_js = client.get("/config.js", headers={"Accept-Encoding": "gzip"})
+    assert config_js.headers["content-encoding"] == "gzip"
+    assert config_js.headers["content-type"].startswith("text/javascript")
+    favicon = client.get("/favicon.png", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in favicon.headers  # PNG is not compressed again
+    assert favicon.headers["cache-control"] == "public, max-age=3600"
+
+    # A redeploy is picked up on the next request, with a new ETag
+    (build_dir / "index.html").write_bytes(b"<!doctype html><p>v2</p>")
+    updated = client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert updated.status_code == 200
+    assert updated.content == b"<!doctype html><p>v2</p>"
+    assert updated.headers["etag"] != etag
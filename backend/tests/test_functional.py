@@ -18,6 +18,7 @@ MODULE_ORDER = [
     "grade_service",
     "activities_service",
     "lti_service",
+    "evaluation_service",
     "activities_router",
     "submissions_router",
     "grades_router",
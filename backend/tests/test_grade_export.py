@@ -0,0 +1,95 @@
+"""
+Pruebas de la exportación de calificaciones en CSV/XLSX por actividad y por curso.
+"""
+
+import csv
+import io
+import sys
+import zipfile
+from pathlib import Path
+from xml.etree import ElementTree
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from conftest import create_activity, lti_headers, upload_submission  # noqa: E402
+
+SHEET_NS = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+
+def _submit(client, activity_id, user_id, name):
+    return upload_submission(client, activity_id, user_id, "ensayo.txt", b"texto", name=name)["id"]
+
+
+def _setup_course(client):
+    teacher = None
+    for activity_id, title in (("act-a", "Ensayo"), ("act-b", "Práctica")):
+        teacher = lti_headers(client, "teacher1", "Instructor", resource_link_id=activity_id)
+        create_activity(client, teacher, title)
+    submission = _submit(client, "act-a", "s1", "=HYPERLINK(\"x\")")
+    _submit(client, "act-a", "s2", "Bea Ñúñez")
+    _submit(client, "act-b", "s1", "=HYPERLINK(\"x\")")
+    payload = {"score": 7.5, "comment": "Buen trabajo, <revisa> & mejora"}
+    assert client.post(f"/api/grades/{submission}", json=payload, headers=teacher).status_code == 200
+    return teacher
+
+
+def test_activity_csv_export(client):
+    teacher = _setup_course(client)
+
+    response = client.get("/api/grades/activity/act-a/export", headers=teacher)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="Ensayo_notas.csv"' in response.headers["content-disposition"]
+    assert response.content.startswith(b"\xef\xbb\xbf")
+
+    rows = list(csv.DictReader(io.StringIO(response.content.decode("utf-8-sig"))))
+    assert len(rows) == 2 and {row["activity_id"] for row in rows} == {"act-a"}
+    by_student = {row["student_id"]: row for row in rows}
+    # Formula-like text is neutralised
+    assert by_student["s1"]["student_name"] == "'=HYPERLINK(\"x\")"
+    assert by_student["s1"]["score"] == "7.5"
+    assert by_student["s1"]["comment"] == "Buen trabajo, <revisa> & mejora"
+    assert by_student["s2"]["student_name"] == "Bea Ñúñez" and by_student["s2"]["score"] == ""
+
+
+def test_course_xlsx_export(client):
+    teacher = _setup_course(client)
+
+    response = client.get("/api/grades/course/export", params={"format": "xlsx"}, headers=teacher)
+    assert response.status_code == 200
+    workbook = zipfile.ZipFile(io.BytesIO(response.content))
+    assert workbook.testzip() is None
+    sheet = ElementTree.fromstring(workbook.read("xl/worksheets/sheet1.xml"))
+    rows = sheet.findall("s:sheetData/s:row", SHEET_NS)
+    assert len(rows) == 4  # header + 3 students
+
+    def cells(row):
+        return {c.get("r").rstrip("0123456789"): (c.findtext("s:is/s:t", namespaces=SHEET_NS) or c.findtext("s:v", namespaces=SHEET_NS))
+                for c in row.findall("s:c", SHEET_NS)}
+
+    header = cells(rows[0])
+    assert header["A"] == "course_id" and header["N"] == "score"
+    graded = [cells(row) for row in rows[1:] if cells(row).get("N")]
+    assert len(graded) == 1 and float(graded[0]["N"]) == 7.5
+    assert graded[0]["O"] == "Buen trabajo, <revisa> & mejora"
+    assert {cells(row)["C"] for row in rows[1:]} == {"Ensayo", "Práctica"}
+
+
+def test_export_permissions_and_errors(client):
+    teacher = _setup_course(client)
+    student = lti_headers(client, "s1", "Learner", resource_link_id="act-a")
+
+    assert client.get("/api/grades/course/export", headers=student).status_code == 403
+    assert client.get("/api/grades/course/export", params={"format": "ods"}, headers=teacher).status_code == 400
+    assert client.get("/api/grades/activity/nope/export", headers=teacher).status_code == 404
+
+
+def test_export_is_read_in_batches(app_modules, client, monkeypatch):
+    _setup_course(client)
+    export = app_modules["grade_export_service"]
+    monkeypatch.setattr(export, "GRADE_EXPORT_BATCH", 1)
+
+    chunks = list(export.GradeExportService.export("csv", "moodle-001", course_id="course-001"))
+    assert len(chunks) == 4  # header chunk + one per row
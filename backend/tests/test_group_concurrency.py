@@ -0,0 +1,155 @@
+"""
+Pruebas de concurrencia de los grupos: muchos estudiantes uniéndose a la
+vez al mismo grupo (nunca se supera el máximo), muchos líderes creando
+grupos a la vez (nombres consecutivos y códigos únicos) y grupos anteriores
+al contador de miembros.
+"""
+
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from test_endpoints import _launch_lti, _lti_payload, _reload_app_modules  # noqa: E402
+
+MAX_GROUP_SIZE = 4
+
+
+@pytest.fixture
+def group_ctx(tmp_path, monkeypatch):
+    modules = _reload_app_modules(tmp_path, monkeypatch)
+    with TestClient(modules["main"].app) as client:
+        teacher = {"X-LTI-Session": _launch_lti(client, _lti_payload("teacher1", "Instructor", resource_link_id="act-g"))}
+        client.cookies.clear()
+        response = client.post("/api/activities", headers=teacher, json={
+            "title": "G", "description": "x", "activity_type": "group", "max_group_size": MAX_GROUP_SIZE
+        })
+        assert response.status_code == 200, response.text
+        yield client, modules
+
+
+def _students(client, count, prefix):
+    for index in range(count):
+        _launch_lti(client, _lti_payload(f"{prefix}{index}", "Learner", resource_link_id="act-g"))
+        client.cookies.clear()
+    return [f"{prefix}{index}" for index in range(count)]
+
+
+def _run_concurrently(func, items):
+    """Call func(item) from one thread per item, released together; returns (results, errors)"""
+    barrier = threading.Barrier(len(items))
+    results, errors = [], []
+    lock = threading.Lock()
+
+    def worker(item):
+        barrier.wait()
+        try:
+            result = func(item)
+            with lock:
+                results.append(result)
+        except Exception as e:  # noqa: BLE001 - collected for the assertions
+            with lock:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(item,)) for item in items]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    return results, errors
+
+
+def _submit(service, student_id):
+    return service.create_submission(
+        activity_id="act-g", student_id=student_id, student_name=student_id, student_email=None,
+        file_name="grupo.txt", file_content=f"trabajo de {student_id}".encode(), file_size=0,
+        file_type="text/plain", course_id="course-001", course_moodle_id="moodle-001",
+        student_moodle_id="moodle-001"
+    )
+
+
+def _join(service, group_code, student_id):
+    return service.submit_with_group_code(
+        activity_id="act-g", group_code=group_code, student_id=student_id, student_name=student_id,
+        student_email=None, course_id="course-001", course_moodle_id="moodle-001"
+    )
+
+
+def test_concurrent_joins_never_oversubscribe_a_group(group_ctx):
+    client, modules = group_ctx
+    service = modules["activities_service"].ActivitiesService
+    db_models = modules["db_models"]
+    leader, *joiners = _students(client, 16, "s")
+    group_code = _submit(service, leader).file_submission.group_code
+
+    joined, errors = _run_concurrently(lambda student_id: _join(service, group_code, student_id), joiners)
+
+    assert len(joined) == MAX_GROUP_SIZE - 1
+    assert len(errors) == len(joiners) - len(joined)
+    assert {str(error) for error in errors} == {"Group code has reached maximum number of uses"}
+    db = modules["database"].get_db_session()
+    try:
+        file_submission = db.query(db_models.FileSubmissionDB).filter_by(group_code=group_code).one()
+        members = db.query(db_models.StudentSubmissionDB).filter_by(file_submission_id=file_submission.id).count()
+        assert file_submission.member_count == members == MAX_GROUP_SIZE
+    finally:
+        db.close()
+
+    # The same student joining twice at once gets one place
+    other_leader, twice_joiner = _students(client, 2, "t")
+    other_code = _submit(service, other_leader).file_submission.group_code
+    twice, errors = _run_concurrently(lambda student_id: _join(service, other_code, student_id), [twice_joiner] * 4)
+    assert len(twice) == 1
+    assert {str(error) for error in errors} <= {"You have already submitted to this activity",
+                                                "Ya eres miembro de este grupo"}
+
+
+def test_concurrent_leaders_get_unique_codes_and_numbers(group_ctx):
+    client, modules = group_ctx
+    service = modules["activities_service"].ActivitiesService
+    leaders = _students(client, 12, "leader")
+
+    created, errors = _run_concurrently(lambda student_id: _submit(service, student_id), leaders)
+
+    assert errors == []
+    codes = {view.file_submission.group_code for view in created}
+    assert len(codes) == len(leaders)
+    names = sorted(view.file_submission.group_display_name for view in created)
+    assert names == sorted(f"GROUP_{number}" for number in range(1, len(leaders) + 1))
+
+
+def test_group_code_collision_draws_a_new_code(group_ctx, monkeypatch):
+    client, modules = group_ctx
+    service = modules["activities_service"].ActivitiesService
+    first, second = _students(client, 2, "c")
+    codes = iter(["SAMECODE", "SAMECODE", "OTHERCOD"])
+    monkeypatch.setattr(service, "_generate_group_code", staticmethod(lambda: next(codes)))
+
+    assert _submit(service, first).file_submission.group_code == "SAMECODE"
+    assert _submit(service, second).file_submission.group_code == "OTHERCOD"
+
+
+def test_join_counts_members_of_rows_without_member_count(group_ctx):
+    client, modules = group_ctx
+    service = modules["activities_service"].ActivitiesService
+    leader, member, extra, late = _students(client, 4, "m")
+    group_code = _submit(service, leader).file_submission.group_code
+    _join(service, group_code, member)
+    db = modules["database"].get_db_session()
+    try:
+        file_submission = db.query(modules["db_models"].FileSubmissionDB).filter_by(group_code=group_code).one()
+        file_submission.member_count = None  # row stored before the counter existed
+        file_submission.max_group_members = 3
+        db.commit()
+    finally:
+        db.close()
+
+    _join(service, group_code, extra)
+    with pytest.raises(ValueError, match="maximum number of uses"):
+        _join(service, group_code, late)
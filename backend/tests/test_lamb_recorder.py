@@ -0,0 +1,116 @@
+"""
+Pruebas de la grabación y reproducción del tráfico LAMB: grabar contra el
+LAMB falso, reproducir sin red con latencia original o escalada, gestión de
+peticiones no grabadas y servidor de reproducción.
+"""
+
+import os
+import stat
+import sys
+import time
+from pathlib import Path
+
+import pytest
+import requests
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+for path in (PROJECT_ROOT, PROJECT_ROOT / "benchmarks"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+import lamb_recorder  # noqa: E402
+from fake_servers import FakeLAMBServer, LAMBProfile, ReplayLAMBServer  # noqa: E402
+from lamb_api_service import LAMBAPIService  # noqa: E402
+
+
+@pytest.fixture
+def store_path(tmp_path, monkeypatch):
+    path = tmp_path / "lamb.jsonl.gz"
+    monkeypatch.setattr(lamb_recorder, "LAMB_RECORD_PATH", "")
+    monkeypatch.setattr(lamb_recorder, "LAMB_REPLAY_PATH", "")
+    monkeypatch.setattr(lamb_recorder, "LAMB_REPLAY_LATENCY_SCALE", 1.0)
+    monkeypatch.setattr(lamb_recorder, "LAMB_REPLAY_ON_MISS", "sequential")
+    lamb_recorder.reset()
+    yield path
+    lamb_recorder.reset()
+
+
+def _record(store_path, monkeypatch, texts, median_ms=60):
+    profile = LAMBProfile(median_ms=median_ms, sigma=0, seed=3)
+    with FakeLAMBServer(profile) as lamb:
+        monkeypatch.setattr(LAMBAPIService, "LAMB_API_URL", lamb.base_url)
+        monkeypatch.setattr(lamb_recorder, "LAMB_RECORD_PATH", str(store_path))
+        results = [LAMBAPIService.evaluate_text(text, "bench-evaluator") for text in texts]
+        assert LAMBAPIService.verify_model_exists("bench-evaluator")["success"]
+    monkeypatch.setattr(lamb_recorder, "LAMB_RECORD_PATH", "")
+    return results
+
+
+def test_record_then_replay_without_network(store_path, monkeypatch):
+    recorded = _record(store_path, monkeypatch, ["primer texto", "segundo texto"])
+
+    records = list(lamb_recorder.iter_records(str(store_path)))
+    assert [record["path"] for record in records] == ["/chat/completions", "/chat/completions", "/v1/models"]
+    assert records[0]["request"]["prompt"] == "primer texto"
+    assert records[0]["elapsed_ms"] >= 60
+    assert "Authorization" not in str(records[0])
+    assert stat.S_IMODE(os.stat(store_path).st_mode) == 0o600
+
+    # Nothing listens here: every response must come from the store
+    monkeypatch.setattr(LAMBAPIService, "LAMB_API_URL", "http://127.0.0.1:9")
+    monkeypatch.setattr(lamb_recorder, "LAMB_REPLAY_PATH", str(store_path))
+    monkeypatch.setattr(lamb_recorder, "LAMB_REPLAY_LATENCY_SCALE", 0.0)
+
+    started = time.perf_counter()
+    replayed = [LAMBAPIService.evaluate_text(text, "bench-evaluator") for text in ["segundo texto", "primer texto"]]
+    assert time.perf_counter() - started < 0.05
+    assert replayed[0]["response"] == recorded[1]["response"]
+    assert replayed[1]["response"] == recorded[0]["response"]
+    assert LAMBAPIService.verify_model_exists("bench-evaluator")["success"]
+
+
+def test_record_failure_does_not_fail_the_request(store_path, monkeypatch, caplog):
+    # A directory cannot be opened as the store: every append fails
+    results = _record(store_path.parent, monkeypatch, ["texto"], median_ms=1)
+
+    assert results[0]["success"] is True
+    assert "No se pudo grabar la respuesta de LAMB" in caplog.text
+
+
+def test_replay_latency_scale_and_misses(store_path, monkeypatch):
+    _record(store_path, monkeypatch, ["texto"], median_ms=100)
+    monkeypatch.setattr(LAMBAPIService, "LAMB_API_URL", "http://127.0.0.1:9")
+    monkeypatch.setattr(lamb_recorder, "LAMB_REPLAY_PATH", str(store_path))
+
+    started = time.perf_counter()
+    assert LAMBAPIService.evaluate_text("texto", "bench-evaluator")["success"]
+    assert time.perf_counter() - started >= 0.1
+
+    # A different submission falls back to the next recording of the same path
+    monkeypatch.setattr(lamb_recorder, "LAMB_REPLAY_LATENCY_SCALE", 0.0)
+    lamb_recorder.reset()
+    assert LAMBAPIService.evaluate_text("otro texto", "bench-evaluator")["success"]
+
+    monkeypatch.setattr(lamb_recorder, "LAMB_REPLAY_ON_MISS", "error")
+    lamb_recorder.reset()
+    result = LAMBAPIService.evaluate_text("otro texto", "bench-evaluator")
+    assert not result["success"] and "No recorded LAMB response" in result["error"]
+
+
+def test_replay_server_and_truncated_store(store_path, monkeypatch):
+    _record(store_path, monkeypatch, ["texto"], median_ms=1)
+    with open(store_path, "ab") as store:
+        store.write(b"\x1f\x8b\x08\x00truncated")
+
+    store = lamb_recorder.ReplayStore.load(str(store_path), latency_scale=0)
+    assert len(store.records) == 2
+    with ReplayLAMBServer(store) as server:
+        exact = requests.post(f"{server.base_url}/chat/completions",
+                              json={"model": "lamb_assistant.bench-evaluator", "prompt": "texto"}, timeout=5)
+        other = requests.post(f"{server.base_url}/chat/completions", json={"model": "x", "prompt": "y"}, timeout=5)
+        missing = requests.get(f"{server.base_url}/unknown", timeout=5)
+
+    assert exact.json() == other.json()
+    assert "NOTA FINAL:" in exact.json()["choices"][0]["message"]["content"]
+    assert missing.status_code == 404
+    assert dict(server.outcomes) == {"hit": 1, "fallback": 1, "miss": 1}
@@ -0,0 +1,75 @@
+"""
+Pruebas del parser de respuestas LAMB contra el corpus de respuestas
+de tests/fixtures/lamb_responses.jsonl.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import lamb_response_parser  # noqa: E402
+from lamb_response_parser import LAMBResponseParser  # noqa: E402
+
+CORPUS_PATH = Path(__file__).resolve().parent / "fixtures" / "lamb_responses.jsonl"
+CORPUS = [json.loads(line) for line in CORPUS_PATH.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+@pytest.mark.parametrize("entry", CORPUS, ids=[entry["name"] for entry in CORPUS])
+def test_corpus_scores(entry):
+    parsed = LAMBResponseParser.parse(entry["response"])
+
+    assert parsed["success"] is entry["expected_success"]
+    if entry["expected_score"] is None:
+        assert parsed["score"] is None
+    else:
+        assert parsed["score"] == pytest.approx(entry["expected_score"])
+
+
+def test_structured_output_returns_feedback_as_comment():
+    parsed = LAMBResponseParser.extract_score_and_feedback('{"score": 7, "feedback": "Bien estructurado."}')
+
+    assert parsed["score"] == 7.0
+    assert parsed["comment"] == "Bien estructurado."
+
+
+def test_invalid_json_falls_back_to_text_markers():
+    parsed = LAMBResponseParser.extract_score_and_feedback('{"score": 7, broken}\nNota: 4')
+
+    assert parsed["score"] == 4.0
+
+
+def test_only_the_tail_is_scanned(monkeypatch):
+    monkeypatch.setattr(lamb_response_parser, "SCORE_TAIL_CHARS", 100)
+    content = "NOTA FINAL: 3\n" + ("relleno " * 100) + "\nScore: 9"
+
+    assert LAMBResponseParser.find_score(content) == 9.0
+    assert LAMBResponseParser.find_score("NOTA FINAL: 3\n" + ("relleno " * 100)) is None
+
+
+def test_tail_starts_at_a_line_boundary(monkeypatch):
+    monkeypatch.setattr(lamb_response_parser, "SCORE_TAIL_CHARS", 10)
+
+    assert LAMBResponseParser.find_score("intro\nNOTA FINAL: 6.5") == 6.5
+
+
+def test_tail_of_a_single_line_reply_stays_bounded(monkeypatch):
+    monkeypatch.setattr(lamb_response_parser, "SCORE_TAIL_CHARS", 100)
+    content = "NOTA FINAL: 3\n" + ("relleno " * 1000) + "sin nota"
+
+    assert len(LAMBResponseParser._tail(content)) == 100
+    assert LAMBResponseParser.find_score(content) is None
+
+
+def test_validation_is_only_attached_on_request():
+    entry = CORPUS[0]
+
+    assert "json_validation" not in LAMBResponseParser.parse(entry["response"])
+    validation = LAMBResponseParser.parse(entry["response"], include_validation=True)["json_validation"]
+    assert validation["is_valid"] is True
+    assert validation["format_detected"] == "openai_chat_completions"
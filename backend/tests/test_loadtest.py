@@ -0,0 +1,67 @@
+"""
+Pruebas del arnés de carga "última hora antes de la entrega": servidores
+falsos de LAMB/Moodle, lectura de /metrics y un escenario mínimo completo.
+"""
+
+import sys
+from pathlib import Path
+
+import requests
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+for path in (PROJECT_ROOT, PROJECT_ROOT / "benchmarks"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+import loadtest_deadline  # noqa: E402
+from fake_servers import FakeLAMBServer, LAMBProfile  # noqa: E402
+from metrics import Histogram, Registry  # noqa: E402
+
+
+def test_fake_lamb_follows_error_distribution():
+    profile = LAMBProfile(median_ms=1, sigma=0, error_rate=0.5, invalid_rate=0.25, seed=7)
+    with FakeLAMBServer(profile) as lamb:
+        assert requests.get(f"{lamb.base_url}/v1/models", timeout=5).json()["data"]
+        statuses = [
+            requests.post(f"{lamb.base_url}/chat/completions", json={"model": "m", "prompt": "x"}, timeout=5)
+            for _ in range(40)
+        ]
+
+    assert sum(lamb.outcomes.values()) == 40
+    assert lamb.outcomes["ok"] and lamb.outcomes["error"] > lamb.outcomes["ok"] / 2
+    ok = [response for response in statuses if response.headers["content-type"] == "application/json"
+          and response.status_code == 200]
+    assert "NOTA FINAL:" in ok[0].json()["choices"][0]["message"]["content"]
+
+
+def test_histogram_quantile_from_scraped_metrics():
+    registry = Registry()
+    histogram = registry.register(Histogram("lamba_db_query_duration_seconds", "t", ("operation",)))
+    for value in [0.0005] * 90 + [0.2] * 10:
+        histogram.observe(value, "insert")
+
+    scraped = loadtest_deadline.parse_metrics(registry.render())
+    report = loadtest_deadline.sqlite_contention(scraped)
+
+    assert report["locked_errors"] == 0
+    assert report["insert"]["statements"] == 100
+    assert report["insert"]["p95_ms"] > 100
+    assert loadtest_deadline.histogram_quantile(scraped, "lamba_db_query_duration_seconds", 0.5, operation="insert") <= 0.001
+
+
+def test_minimal_deadline_rush_end_to_end():
+    args = loadtest_deadline.build_parser().parse_args([
+        "--students", "6", "--activities", "2", "--concurrency", "4", "--min-mb", "0.05", "--max-mb", "0.1",
+        "--size-variants", "2", "--teacher-pollers", "1", "--poll-interval", "0.2", "--lamb-median-ms", "5",
+        "--lamb-error-rate", "0", "--outcome-latency-ms", "0", "--evaluation-timeout", "60",
+    ])
+
+    report = loadtest_deadline.run(args)
+
+    operations = report["operations"]
+    assert operations["upload"]["errors"] == 0 and operations["group_join"]["errors"] == 0
+    assert report["uploaded_files"] == operations["upload"]["requests"]
+    assert report["evaluation"]["statuses"]["completed"] == report["uploaded_files"]
+    assert report["moodle_outcome_requests"] == 6
+    assert operations["upload"]["db_p95_ms"] is not None
+    assert report["sqlite"]["insert"]["statements"] > 0
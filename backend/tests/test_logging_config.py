@@ -0,0 +1,83 @@
+"""
+Pruebas del subsistema de logging: formato JSON, muestreo de mensajes
+del camino caliente y sumidero rotativo comprimido de payloads LAMB.
+"""
+
+import gzip
+import json
+import logging
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import logging_config  # noqa: E402
+from logging_config import JsonFormatter, SamplingFilter, log_lamb_payload  # noqa: E402
+
+
+def _record(msg, *args, level=logging.INFO, **extra):
+    record = logging.LogRecord("evaluation_service", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_interpolates_lazily_and_keeps_extra_fields():
+    line = JsonFormatter().format(_record("Submission %s scored %s", "abc", 7.5, file_submission_id="abc"))
+    entry = json.loads(line)
+
+    assert entry["msg"] == "Submission abc scored 7.5"
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "evaluation_service"
+    assert entry["file_submission_id"] == "abc"
+
+
+def test_sampling_keeps_one_out_of_n_per_key():
+    sampling = SamplingFilter(every=5)
+
+    kept = [sampling.filter(_record("x", sample="lamb_call")) for _ in range(20)]
+    other = [sampling.filter(_record("y", sample="lamb_result")) for _ in range(5)]
+
+    assert kept.count(True) == 4
+    assert other.count(True) == 1
+    # Unsampled messages and warnings always pass
+    assert all(sampling.filter(_record("z")) for _ in range(10))
+    assert all(sampling.filter(_record("w", level=logging.WARNING, sample="lamb_call")) for _ in range(10))
+
+
+def test_parse_levels_ignores_invalid_entries():
+    levels = logging_config._parse_levels("lamb_api_service=DEBUG, sqlalchemy.engine=info,broken=LOUD,=INFO")
+
+    assert levels == {"lamb_api_service": logging.DEBUG, "sqlalchemy.engine": logging.INFO}
+
+
+def test_payload_sink_disabled_by_default(monkeypatch):
+    monkeypatch.setattr(logging_config, "LAMB_PAYLOAD_LOG", "")
+    logging_config.configure_logging()
+
+    class Unserializable:
+        def __repr__(self):
+            raise AssertionError("payload must not be serialized when the sink is disabled")
+
+    log_lamb_payload("response", Unserializable())
+
+
+def test_payload_sink_rotates_into_gzip_files(monkeypatch, tmp_path):
+    path = tmp_path / "payloads" / "lamb.jsonl"
+    monkeypatch.setattr(logging_config, "LAMB_PAYLOAD_LOG", str(path))
+    monkeypatch.setattr(logging_config, "LAMB_PAYLOAD_LOG_MAX_BYTES", 400)
+    monkeypatch.setattr(logging_config, "LAMB_PAYLOAD_LOG_BACKUPS", 3)
+    try:
+        logging_config.configure_logging()
+        for index in range(10):
+            log_lamb_payload("response", {"choices": [{"message": {"content": "x" * 100}}]}, file_submission_id=index)
+    finally:
+        monkeypatch.setattr(logging_config, "LAMB_PAYLOAD_LOG", "")
+        logging_config.configure_logging()
+
+    rotated = sorted(path.parent.glob("lamb.jsonl.*.gz"))
+    assert rotated
+    entry = json.loads(gzip.decompress(rotated[0].read_bytes()).decode("utf-8").splitlines()[0])
+    assert entry["kind"] == "response"
+    assert entry["payload"]["choices"][0]["message"]["content"] == "x" * 100
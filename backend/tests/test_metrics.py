@@ -0,0 +1,97 @@
+"""
+Pruebas de las métricas Prometheus y del endpoint /metrics.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import metrics  # noqa: E402
+from metrics import Counter, Histogram, Registry  # noqa: E402
+from test_endpoints import _launch_lti, _lti_payload, _reload_app_modules  # noqa: E402
+
+
+@pytest.fixture
+def app_ctx(tmp_path, monkeypatch):
+    modules = _reload_app_modules(tmp_path, monkeypatch)
+    with TestClient(modules["main"].app) as client:
+        yield client, modules
+
+
+def _sample(text: str, prefix: str) -> float:
+    """Value of the first exposition line starting with prefix"""
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{prefix} not found in metrics output")
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.register(Histogram("test_seconds", "Test", ("route",), buckets=(0.1, 1.0)))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(5, "/a")
+
+    text = registry.render()
+
+    assert '# TYPE test_seconds histogram' in text
+    assert 'test_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 'test_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'test_seconds_count{route="/a"} 3' in text
+    assert _sample(text, 'test_seconds_sum{route="/a"}') == pytest.approx(5.55)
+
+
+def test_label_values_are_escaped_and_label_count_checked():
+    counter = Counter("test_total", "Test", ("code",))
+    counter.inc('say "hi"\n')
+
+    assert 'test_total{code="say \\"hi\\"\\n"} 1' in counter.samples()
+    with pytest.raises(ValueError):
+        counter.inc()
+
+
+def test_metrics_endpoint_reports_routes_launches_and_queue(app_ctx):
+    client, _ = app_ctx
+    launches_before = metrics.LTI_LAUNCHES.get("success")
+
+    _launch_lti(client, _lti_payload(user_id="teacher1", roles="Instructor"))
+    client.get("/api/lti-data")
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = resp.text
+
+    assert _sample(text, 'lamba_lti_launches_total{outcome="success"}') == launches_before + 1
+    # Route templates, not raw paths, are used as labels
+    assert 'lamba_http_request_duration_seconds_count{method="GET",route="/api/lti-data",status="200"}' in text
+    assert 'lamba_http_request_duration_seconds_count{method="POST",route="/lti",status="303"}' in text
+    assert _sample(text, 'lamba_http_requests_in_flight') == 1  # the scrape itself
+    assert 'lamba_db_query_duration_seconds_count{operation="insert"}' in text
+    assert '# TYPE lamba_evaluation_queue_depth gauge' in text
+
+
+def test_metrics_endpoint_token(app_ctx, monkeypatch):
+    client, _ = app_ctx
+    monkeypatch.setenv("METRICS_TOKEN", "secret")
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer secret"}).status_code == 200
+
+
+def test_metrics_endpoint_closed_without_token(app_ctx, monkeypatch):
+    client, _ = app_ctx
+    monkeypatch.delenv("METRICS_TOKEN", raising=False)
+    monkeypatch.delenv("METRICS_PUBLIC")
+
+    assert client.get("/metrics").status_code == 401
+    monkeypatch.setenv("METRICS_PUBLIC", "true")
+    assert client.get("/metrics").status_code == 200
@@ -0,0 +1,113 @@
+"""
+Pruebas del perfilador por muestreo y de los diffs de tracemalloc
+expuestos en los endpoints de depuración de administración.
+"""
+
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from profiling_service import ProfilingService, ProfilerBusyError  # noqa: E402
+import profiling_service  # noqa: E402
+from test_endpoints import _reload_app_modules  # noqa: E402
+
+
+@pytest.fixture
+def admin_client(tmp_path, monkeypatch):
+    monkeypatch.setenv("ADMIN_USERNAME", "admin")
+    monkeypatch.setenv("ADMIN_PASSWORD", "secret")
+    modules = _reload_app_modules(tmp_path, monkeypatch)
+    with TestClient(modules["main"].app) as client:
+        resp = client.post("/api/admin/login", json={"username": "admin", "password": "secret"})
+        assert resp.status_code == 200
+        yield client, modules
+    ProfilingService.stop_memory_tracing()
+
+
+def _busy_loop(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profile_collapses_stacks_of_running_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop, args=(stop,), name="busy worker")
+    worker.start()
+    try:
+        profile = ProfilingService.capture_profile(0.3, mode="cpu", interval_ms=2)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert profile["samples"] > 10
+    lines = profile["collapsed"].splitlines()
+    busy = [line for line in lines if line.startswith("busy_worker;")]
+    assert busy and any("test_profiling:_busy_loop" in line for line in busy)
+    stack, count = busy[0].rsplit(" ", 1)
+    assert int(count) > 0
+
+
+def test_profile_rejects_invalid_or_concurrent_requests():
+    with pytest.raises(ValueError):
+        ProfilingService.capture_profile(1, mode="gpu")
+
+    profiling_service._profile_lock.acquire()
+    try:
+        with pytest.raises(ProfilerBusyError):
+            ProfilingService.capture_profile(0.1)
+    finally:
+        profiling_service._profile_lock.release()
+
+
+def test_profile_endpoint_requires_admin_and_returns_collapsed_file(admin_client):
+    client, _ = admin_client
+
+    resp = client.get("/api/admin/debug/profile", params={"seconds": 0.2, "interval_ms": 5})
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert 'filename="profile-wall-' in resp.headers["content-disposition"]
+    assert int(resp.headers["x-profile-samples"]) > 0
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in resp.text.splitlines())
+
+    client.cookies.clear()
+    assert client.get("/api/admin/debug/profile", params={"seconds": 0.1}).status_code == 401
+
+
+def test_memory_diff_reports_growth_and_lti_store_probe(admin_client):
+    client, modules = admin_client
+
+    assert client.get("/api/admin/debug/memory/diff").status_code == 400
+    resp = client.post("/api/admin/debug/memory/start", params={"nframes": 5})
+    assert resp.status_code == 200
+    assert resp.json()["data"]["probes"]["lti_data_store"]["entries"] == 0
+
+    for index in range(200):
+        modules["main"].lti_data_store[f"session-{index}"] = {"payload": f"{index:04d}" * 250}
+
+    resp = client.get("/api/admin/debug/memory/diff", params={"limit": 5})
+    data = resp.json()["data"]
+
+    assert resp.status_code == 200
+    assert data["probes"]["lti_data_store"]["entries"] == 200
+    assert data["probes"]["lti_data_store"]["approx_bytes"] > 200 * 1000
+    assert data["total_size_diff"] > 200 * 1000
+    assert any("test_profiling.py" in (entry["location"] or "") for entry in data["top"])
+
+    assert client.post("/api/admin/debug/memory/stop").json()["data"]["was_tracing"] is True
+
+
+def test_memory_start_caps_traceback_depth(admin_client):
+    client, _ = admin_client
+
+    resp = client.post("/api/admin/debug/memory/start", params={"nframes": 100000})
+    assert resp.status_code == 200
+    assert resp.json()["data"]["nframes"] == profiling_service.MEMORY_MAX_FRAMES
+    client.post("/api/admin/debug/memory/stop")
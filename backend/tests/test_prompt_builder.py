@@ -0,0 +1,138 @@
+"""
+Pruebas del constructor de prompts con presupuesto de tokens y de la
+evaluación por fragmentos (map-reduce) de documentos largos.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import prompt_builder  # noqa: E402
+from prompt_builder import PromptBuilder  # noqa: E402
+from evaluation_service import EvaluationService  # noqa: E402
+from lamb_api_service import LAMBAPIService  # noqa: E402
+
+
+def _lamb_response(content: str) -> dict:
+    return {
+        'success': True,
+        'response': {'choices': [{'message': {'content': content}}]},
+        'model_id': 'lamb_assistant.test'
+    }
+
+
+def test_estimate_tokens_uses_character_heuristic():
+    assert PromptBuilder.estimate_tokens("") == 0
+    assert PromptBuilder.estimate_tokens(None) == 0
+    assert PromptBuilder.estimate_tokens("a" * 400) == 100
+    assert PromptBuilder.estimate_tokens("a" * 401) == 101
+
+
+def test_per_evaluator_budget_overrides(monkeypatch):
+    monkeypatch.setattr(prompt_builder, "EVALUATOR_TOKEN_BUDGETS", "short:500, long:9000,broken:abc")
+    monkeypatch.setattr(prompt_builder, "DEFAULT_TOKEN_BUDGET", 2000)
+
+    assert PromptBuilder.get_token_budget("short") == 500
+    assert PromptBuilder.get_token_budget("long") == 9000
+    assert PromptBuilder.get_token_budget("broken") == 2000
+    assert PromptBuilder.get_token_budget("other") == 2000
+
+
+def test_document_within_budget_is_sent_untouched():
+    text = "Una entrega corta.\nCon dos líneas."
+    plan = PromptBuilder.build_prompts(text, "eval", token_budget=1000)
+
+    assert plan['chunked'] is False
+    assert plan['prompts'] == [text]
+
+
+def test_document_over_budget_is_chunked_within_budget():
+    paragraphs = [f"Paragraph {i} " + "word " * 80 for i in range(40)]
+    text = "\n".join(paragraphs)
+    budget = 500
+
+    plan = PromptBuilder.build_prompts(text, "eval", token_budget=budget)
+
+    assert plan['chunked'] is True
+    assert len(plan['prompts']) > 1
+    for index, prompt in enumerate(plan['prompts'], start=1):
+        assert prompt.startswith(f"[Part {index}/{len(plan['prompts'])}")
+        assert PromptBuilder.estimate_tokens(prompt) <= budget
+    # Every paragraph ends up in exactly one chunk
+    joined = "\n".join(prompt.split("\n\n", 1)[1] for prompt in plan['prompts'])
+    assert joined == text
+
+
+def test_split_text_cuts_paragraphs_longer_than_a_chunk():
+    text = " ".join(["palabra"] * 200)
+    chunks = PromptBuilder.split_text(text, 100)
+
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+    with pytest.raises(ValueError):
+        PromptBuilder.split_text(text, 0)
+
+
+def test_chunked_evaluation_combines_partial_scores(monkeypatch):
+    monkeypatch.setattr(prompt_builder, "DEFAULT_TOKEN_BUDGET", 300)
+    monkeypatch.setattr(prompt_builder, "EVALUATOR_TOKEN_BUDGETS", "")
+
+    calls = []
+
+    def fake_evaluate_text(text, evaluator_id, timeout=None):
+        calls.append(text)
+        score = 8 if "[Part 1/" in text else 6
+        return _lamb_response(f"Feedback for this part.\nNOTA FINAL: {score}")
+
+    monkeypatch.setattr(LAMBAPIService, "evaluate_text", staticmethod(fake_evaluate_text))
+
+    # Two paragraphs of equal size, each filling a chunk
+    text = ("a" * 1000) + "\n" + ("b" * 1000)
+    lamb_response, parsed = EvaluationService._evaluate_text(text, "eval")
+
+    assert len(calls) == 2
+    assert lamb_response['chunked'] is True
+    assert parsed['success'] is True
+    assert parsed['chunks'] == 2
+    assert parsed['score'] == pytest.approx(7.0)
+    assert "### [1/2]" in parsed['comment'] and "### [2/2]" in parsed['comment']
+
+
+def test_chunked_evaluation_combines_structured_scores(monkeypatch):
+    monkeypatch.setattr(prompt_builder, "DEFAULT_TOKEN_BUDGET", 300)
+    monkeypatch.setattr(prompt_builder, "EVALUATOR_TOKEN_BUDGETS", "")
+
+    def fake_evaluate_text(text, evaluator_id, timeout=None):
+        score = 8 if "[Part 1/" in text else 6
+        return _lamb_response(f'{{"score": {score}, "feedback": "Feedback for part with {score}."}}')
+
+    monkeypatch.setattr(LAMBAPIService, "evaluate_text", staticmethod(fake_evaluate_text))
+
+    _, parsed = EvaluationService._evaluate_text(("a" * 1000) + "\n" + ("b" * 1000), "eval")
+
+    assert parsed['success'] is True
+    assert parsed['score'] == pytest.approx(7.0)
+    assert "Feedback for part with 8." in parsed['comment']
+    assert '"score"' not in parsed['comment']
+
+
+def test_chunked_evaluation_reports_failed_parts(monkeypatch):
+    monkeypatch.setattr(prompt_builder, "DEFAULT_TOKEN_BUDGET", 300)
+    monkeypatch.setattr(prompt_builder, "EVALUATOR_TOKEN_BUDGETS", "")
+
+    def fake_evaluate_text(text, evaluator_id, timeout=None):
+        if "[Part 2/" in text:
+            return {'success': False, 'error': 'Timeout'}
+        return _lamb_response("NOTA FINAL: 9")
+
+    monkeypatch.setattr(LAMBAPIService, "evaluate_text", staticmethod(fake_evaluate_text))
+
+    _, parsed = EvaluationService._evaluate_text(("a" * 1000) + "\n" + ("b" * 1000), "eval")
+
+    assert parsed['success'] is False
+    assert "part 2/2" in parsed['error']
@@ -0,0 +1,87 @@
+"""
+Pruebas de la contabilidad de consultas por petición: cabecera
+Server-Timing, registro de consultas lentas y peticiones con N+1.
+"""
+
+import re
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import query_log  # noqa: E402
+from test_endpoints import _lti_payload, _reload_app_modules  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clean_log():
+    query_log.reset()
+    yield
+    query_log.reset()
+
+
+@pytest.fixture
+def admin_client(tmp_path, monkeypatch):
+    monkeypatch.setenv("ADMIN_USERNAME", "admin")
+    monkeypatch.setenv("ADMIN_PASSWORD", "secret")
+    modules = _reload_app_modules(tmp_path, monkeypatch)
+    with TestClient(modules["main"].app) as client:
+        yield client
+
+
+def _login(client):
+    resp = client.post("/api/admin/login", json={"username": "admin", "password": "secret"})
+    assert resp.status_code == 200
+
+
+def test_normalize_and_param_shape_never_keep_values():
+    statement = "SELECT *\n  FROM users WHERE id IN (?, ?,  ?) AND name = ?"
+
+    assert query_log.normalize_statement(statement) == "SELECT * FROM users WHERE id IN (?, ...) AND name = ?"
+    assert query_log.param_shape(("secret-id", 3, None)) == ["str[9]", "int", "NoneType"]
+    assert query_log.param_shape([("a", 1), ("b", 2)], executemany=True) == {"rows": 2, "row": ["str[1]", "int"]}
+
+
+def test_slow_queries_are_buffered_with_app_stack(monkeypatch):
+    monkeypatch.setattr(query_log, "SLOW_QUERY_THRESHOLD_MS", 50)
+
+    query_log.record_query("SELECT 1", (), 0.01)
+    query_log.record_query("SELECT * FROM grades WHERE id = ?", ("abc",), 0.2)
+    query_log.record_query("SELECT * FROM grades WHERE id = ?", ("abcd",), 0.1)
+
+    data = query_log.snapshot(order="max")
+    [offender] = data["offenders"]
+    assert offender["count"] == 2 and offender["max_ms"] == 200.0
+    latest = data["slow_queries"][0]
+    assert latest["params_shape"] == ["str[4]"]
+    assert latest["route"] is None
+    assert any("test_query_log.py" in frame for frame in latest["stack"])
+    with pytest.raises(ValueError):
+        query_log.snapshot(order="slowest")
+
+
+def test_server_timing_header_and_admin_report(admin_client, monkeypatch):
+    monkeypatch.setattr(query_log, "SLOW_QUERY_THRESHOLD_MS", 0)
+    monkeypatch.setattr(query_log, "QUERY_HEAVY_REQUEST_THRESHOLD", 1)
+
+    resp = admin_client.post("/lti", data=_lti_payload(user_id="teacher1", roles="Instructor"), follow_redirects=False)
+
+    assert resp.status_code == 303
+    match = re.match(r'db;dur=([\d.]+);desc="(\d+) queries", app;dur=([\d.]+)', resp.headers["server-timing"])
+    assert match and int(match.group(2)) > 0
+
+    _login(admin_client)
+    data = admin_client.get("/api/admin/debug/queries", params={"limit": 50}).json()["data"]
+    assert any("POST /lti" in offender["routes"] for offender in data["offenders"])
+    heavy = [entry for entry in data["heavy_requests"] if entry["route"] == "POST /lti"]
+    assert heavy and heavy[0]["queries"] == int(match.group(2))
+    assert heavy[0]["most_repeated"]
+
+    assert admin_client.delete("/api/admin/debug/queries").json() == {"success": True}
+    admin_client.cookies.clear()
+    assert admin_client.get("/api/admin/debug/queries").status_code == 401
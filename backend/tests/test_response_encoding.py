@@ -0,0 +1,130 @@
+"""
+Pruebas de la serialización y compresión de respuestas: el listado de
+entregas por la ruta ligera devuelve el mismo documento que la ruta anterior,
+negociación gzip con umbral de tamaño, NDJSON comprimido por fragmentos y
+descargas con ETag intactas.
+"""
+
+import gzip
+import json
+import sys
+import zlib
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+for path in (PROJECT_ROOT, PROJECT_ROOT / "benchmarks"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+import bench_serialization  # noqa: E402
+import seed_dataset  # noqa: E402
+from test_endpoints import _launch_lti, _lti_payload, _reload_app_modules  # noqa: E402
+
+
+@pytest.fixture
+def app_ctx(tmp_path, monkeypatch):
+    monkeypatch.setenv("ADMIN_USERNAME", "admin")
+    monkeypatch.setenv("ADMIN_PASSWORD", "secret")
+    modules = _reload_app_modules(tmp_path, monkeypatch)
+    with TestClient(modules["main"].app) as client:
+        yield client, modules
+
+
+def test_lean_listing_matches_previous_serialization(app_ctx):
+    _, modules = app_ctx
+    manifest = seed_dataset.seed(seed_dataset.SeedConfig(
+        submissions=40, moodles=1, courses=2, activities_per_course=3, group_ratio=0.5, graded_ratio=0.7,
+        files="none"
+    ))
+    activities = bench_serialization.pick_activities(manifest)
+    assert set(activities) == {"individual", "group"}
+
+    # A member whose user row is gone keeps the empty name and email of the previous path
+    db_models = modules["db_models"]
+    db = modules["database"].get_db_session()
+    try:
+        group = activities["group"]
+        member = db.query(db_models.StudentSubmissionDB).filter_by(
+            activity_id=group["id"]).filter(db_models.StudentSubmissionDB.student_id != group["student_ids"][0]).first()
+        db.query(db_models.UserDB).filter_by(id=member.student_id, moodle_id=member.student_moodle_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+    for activity in activities.values():
+        legacy = bench_serialization.legacy_body(activity["id"], activity["moodle_id"])
+        lean = bench_serialization.lean_body(activity["id"], activity["moodle_id"])
+        assert json.loads(lean) == json.loads(legacy)
+        assert lean == legacy  # same compact encoding, byte for byte
+
+
+def test_listing_is_gzipped_above_threshold(app_ctx):
+    client, modules = app_ctx
+    teacher = {"X-LTI-Session": _launch_lti(client, _lti_payload("teacher1", "Instructor", resource_link_id="act-z"))}
+    client.cookies.clear()
+    assert client.post("/api/activities", headers=teacher, json={
+        "title": "Compresión", "description": "x" * 3000, "activity_type": "individual"
+    }).status_code == 200
+
+    listing = client.get("/api/activities/act-z/submissions", headers={**teacher, "Accept-Encoding": "gzip"})
+    assert listing.status_code == 200
+    assert listing.headers["content-encoding"] == "gzip"
+    assert listing.headers["vary"] == "Accept-Encoding"
+    assert int(listing.headers["content-length"]) < 3000
+    assert listing.json()["activity"]["title"] == "Compresión"
+
+    identity = client.get("/api/activities/act-z/submissions", headers={**teacher, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["vary"] == "Accept-Encoding"
+    assert identity.json() == listing.json()
+
+    small = client.get("/api/activities/act-z/view", headers={**teacher, "Accept-Encoding": "gzip"})
+    assert len(small.content) < modules["response_compression"].RESPONSE_COMPRESSION_MIN_SIZE
+    assert "content-encoding" not in small.headers
+
+
+def test_ndjson_stream_is_compressed_per_chunk(app_ctx, monkeypatch):
+    client, modules = app_ctx
+    monkeypatch.setattr(modules["admin_service"], "ADMIN_STREAM_BATCH", 2)
+    for index in range(6):
+        _launch_lti(client, _lti_payload(f"student{index}", "Learner", resource_link_id="act-n"))
+        client.cookies.clear()
+    assert client.post("/api/admin/login", json={"username": "admin", "password": "secret"}).status_code == 200
+
+    with client.stream("GET", "/api/admin/users", params={"format": "ndjson"},
+                       headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+
+    decompressor = zlib.decompressobj(31)
+    # Every chunk ends with a sync flush: the rows decode without the gzip trailer
+    partial = decompressor.decompress(raw[:-8])
+    assert partial.count(b"\n") == 6
+    rows = [json.loads(line) for line in gzip.decompress(raw).splitlines()]
+    assert {row["id"] for row in rows} == {f"student{index}" for index in range(6)}
+
+
+def test_downloads_with_etag_are_not_recompressed(app_ctx):
+    client, _ = app_ctx
+    teacher = {"X-LTI-Session": _launch_lti(client, _lti_payload("teacher1", "Instructor", resource_link_id="act-d"))}
+    client.cookies.clear()
+    assert client.post("/api/activities", headers=teacher, json={
+        "title": "D", "description": "x", "activity_type": "individual"
+    }).status_code == 200
+    student = {"X-LTI-Session": _launch_lti(client, _lti_payload("student1", "Learner", resource_link_id="act-d"))}
+    client.cookies.clear()
+    content = b"texto de la entrega\n" * 500
+    upload = client.post("/api/activities/act-d/submissions", headers=student,
+                         files={"file": ("entrega.txt", content, "text/plain")})
+    assert upload.status_code == 200, upload.text
+    file_path = upload.json()["submission"]["file_submission"]["file_path"]
+
+    download = client.get(f"/api/downloads/{file_path}", headers={**teacher, "Accept-Encoding": "gzip"})
+    assert download.status_code == 200
+    assert "etag" in download.headers
+    assert download.headers.get("content-encoding") is None
+    assert download.content == content
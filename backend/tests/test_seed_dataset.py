@@ -0,0 +1,73 @@
+"""
+Pruebas del generador de datos a escala y del benchmark de endpoints
+con un dataset mínimo.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+for path in (PROJECT_ROOT, PROJECT_ROOT / "benchmarks"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+import bench_endpoints  # noqa: E402
+from fake_servers import FakeOutcomeServer  # noqa: E402
+import seed_dataset  # noqa: E402
+from test_endpoints import _reload_app_modules  # noqa: E402
+
+
+@pytest.fixture
+def outcome_server():
+    with FakeOutcomeServer() as server:
+        yield server
+
+
+@pytest.fixture
+def seeded(tmp_path, monkeypatch, outcome_server):
+    monkeypatch.setenv("ADMIN_USERNAME", bench_endpoints.ADMIN_USERNAME)
+    monkeypatch.setenv("ADMIN_PASSWORD", bench_endpoints.ADMIN_PASSWORD)
+    monkeypatch.setenv("OAUTH_CONSUMER_KEY", "bench-key")
+    monkeypatch.setenv("LTI_SECRET", "bench-secret")
+    modules = _reload_app_modules(tmp_path, monkeypatch)
+    config = seed_dataset.SeedConfig(submissions=60, moodles=2, courses=4, activities_per_course=3,
+                                     group_ratio=0.5, graded_ratio=1.0, teacher_graded_ratio=1.0,
+                                     outcome_url=outcome_server.url)
+    return modules, seed_dataset.seed(config)
+
+
+def test_seed_creates_consistent_rows_and_real_files(seeded):
+    modules, manifest = seeded
+    db = modules["database"].get_db_session()
+    try:
+        db_models = modules["db_models"]
+        assert db.query(db_models.StudentSubmissionDB).count() == manifest["counts"]["students"] >= 60
+        assert db.query(db_models.GradeDB).count() == manifest["counts"]["files"]
+        assert {activity["type"] for activity in manifest["activities"]} == {"individual", "group"}
+        files = db.query(db_models.FileSubmissionDB).limit(6).all()
+    finally:
+        db.close()
+
+    storage = modules["storage_service"].FileStorageService
+    extractor = sys.modules["document_extractor"].DocumentExtractor
+    for file_submission in files:
+        path = storage.resolve_path(file_submission.file_path)
+        assert storage.is_within_uploads(path)
+        assert len(extractor.extract_text_from_file(path)) > 100
+
+
+def test_endpoint_benchmark_runs_every_scenario(seeded, outcome_server):
+    _, manifest = seeded
+    target = bench_endpoints.InProcessTarget()
+    try:
+        results = bench_endpoints.run_benchmarks(target, manifest, list(bench_endpoints.SCENARIOS), requests=4,
+                                                 concurrency=2, activities=2, warmup=1, outcome_url=outcome_server.url)
+    finally:
+        target.close()
+
+    assert set(results) == set(bench_endpoints.SCENARIOS)
+    assert all(result["errors"] == 0 for result in results.values())
+    assert outcome_server.requests > 0
+    assert results["teacher_submissions"]["p95_ms"] >= results["teacher_submissions"]["p50_ms"] > 0
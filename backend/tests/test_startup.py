@@ -0,0 +1,109 @@
+"""
+Pruebas del arranque: pypdf/python-docx no se importan al arrancar, el
+warm-up abre el pool de la BD y las conexiones a LAMB antes de /readyz, y
+init_db no repite la sincronización del esquema salvo que se fuerce o falte
+algo.
+"""
+
+import logging
+import sys
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, inspect, text
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+for path in (PROJECT_ROOT, PROJECT_ROOT / "benchmarks"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+import bench_startup  # noqa: E402
+from fake_servers import FakeLAMBServer, LAMBProfile  # noqa: E402
+from test_endpoints import _reload_app_modules  # noqa: E402
+
+
+def test_heavy_extractors_are_not_imported_at_startup(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'startup.db'}")
+    records = bench_startup.profile_imports(str(tmp_path))
+
+    summary = bench_startup.summarize(records, top=5)
+    assert summary["eager_lazy_modules"] == []
+    assert summary["total_ms"] > 0
+    assert summary["app"][0].module == "main"
+    assert "activities_service" in {record.module for record in records}
+
+
+def test_readyz_waits_for_warmup_of_db_and_lamb(tmp_path, monkeypatch):
+    monkeypatch.setenv("WARMUP_DB_CONNECTIONS", "3")
+    with FakeLAMBServer(LAMBProfile(median_ms=1, sigma=0)) as lamb:
+        modules = _reload_app_modules(tmp_path, monkeypatch)
+        warmup = modules["warmup"]
+        monkeypatch.setattr(warmup, "WARMUP_LAMB_CONNECTIONS", 2)
+        monkeypatch.setattr(warmup.LAMBAPIService, "LAMB_API_URL", lamb.base_url)
+        monkeypatch.setattr(warmup, "_warmed", False)
+
+        with TestClient(modules["main"].app) as client:
+            assert client.get("/healthz").json() == {"status": "ok"}
+            deadline = time.monotonic() + 10
+            response = client.get("/readyz")
+            while response.status_code == 503 and time.monotonic() < deadline:
+                assert response.json()["status"] == "starting"
+                time.sleep(0.01)
+                response = client.get("/readyz")
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["status"] == "ready"
+    assert body["checks"]["database"] == {"ok": True, "connections": 3}
+    assert body["checks"]["lamb"] == {"ok": True, "connections": 2, "status": 200}
+    assert {"imports", "init_db", "warmup"} <= set(body["startup_ms"])
+
+
+def test_readyz_unavailable_when_database_fails(tmp_path, monkeypatch):
+    modules = _reload_app_modules(tmp_path, monkeypatch)
+    warmup = modules["warmup"]
+    with TestClient(modules["main"].app) as client:
+        monkeypatch.setattr(warmup, "_warmed", True)
+        monkeypatch.setattr(warmup, "_ping_database", lambda: False)
+        response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["status"] == "unavailable"
+
+
+def test_init_db_skips_synchronized_schema(tmp_path, monkeypatch):
+    modules = _reload_app_modules(tmp_path, monkeypatch)
+    database = modules["database"]
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(database.engine, "before_cursor_execute", listener)
+    try:
+        database.init_db()
+    finally:
+        event.remove(database.engine, "before_cursor_execute", listener)
+    assert len(statements) <= 2
+    assert not any("CREATE" in statement for statement in statements)
+
+
+def test_init_db_resync_flag_and_missing_not_null_column(tmp_path, monkeypatch, caplog):
+    modules = _reload_app_modules(tmp_path, monkeypatch)
+    database = modules["database"]
+    with database.engine.begin() as connection:
+        connection.execute(text("ALTER TABLE activities DROP COLUMN group_counter"))
+
+    # The fingerprint still matches: only a forced resync looks at the columns
+    with caplog.at_level(logging.ERROR, logger="database"):
+        database.init_db()
+    assert "group_counter" not in caplog.text
+    monkeypatch.setattr(database, "DB_SCHEMA_RESYNC", True)
+    with caplog.at_level(logging.ERROR, logger="database"):
+        database.init_db()
+    assert "activities.group_counter" in caplog.text
+    assert "group_counter" not in {column["name"] for column in inspect(database.engine).get_columns("activities")}
+
+    # Not recorded as synchronized, so the next startup reports it again
+    monkeypatch.setattr(database, "DB_SCHEMA_RESYNC", False)
+    caplog.clear()
+    with caplog.at_level(logging.ERROR, logger="database"):
+        database.init_db()
+    assert "activities.group_counter" in caplog.text
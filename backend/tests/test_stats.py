@@ -0,0 +1,122 @@
+"""
+Pruebas de las estadísticas del panel de administración: recuentos en una
+sola consulta con caché, series horarias y creación de índices en bases de
+datos existentes.
+"""
+
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import inspect, text
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import query_log  # noqa: E402
+from conftest import admin_login  # noqa: E402
+from test_endpoints import _launch_lti, _lti_payload  # noqa: E402
+
+
+def test_statistics_single_cached_query(admin_ctx, monkeypatch):
+    client, modules = admin_ctx
+    stats_service = modules["stats_service"]
+    _launch_lti(client, _lti_payload("teacher-1", "Instructor"))
+    admin_login(client)
+
+    query_log.reset()
+    monkeypatch.setattr(query_log, "SLOW_QUERY_THRESHOLD_MS", 0)
+    first = client.get("/api/admin/statistics").json()["data"]
+    assert first["users"] == 1 and first["moodle_instances"] == 1 and first["courses"] == 1
+    counts = [offender["count"] for offender in query_log.snapshot()["offenders"]
+              if "count(*)" in offender["statement"].lower()]
+    assert counts == [1]
+
+    _launch_lti(client, _lti_payload("student-1", "Learner"))
+    admin_login(client)
+    assert client.get("/api/admin/statistics").json()["data"]["users"] == 1  # Cached
+
+    stats_service.StatsService.invalidate()
+    assert client.get("/api/admin/statistics").json()["data"]["users"] == 2
+
+
+def test_slow_statistic_only_blocks_its_own_key(app_modules):
+    stats_service = app_modules["stats_service"]
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append("slow")
+        started.set()
+        release.wait(5)
+        return "slow"
+
+    stats_service._cached("warm", lambda: "cached")
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        first = pool.submit(stats_service._cached, "slow", slow)
+        assert started.wait(5)
+        second = pool.submit(stats_service._cached, "slow", slow)
+        # Other keys (hits and misses) are served while "slow" is computing
+        assert pool.submit(stats_service._cached, "other", lambda: "other").result(timeout=1) == "other"
+        assert stats_service._cached("warm", lambda: "recomputed") == "cached"
+        assert not second.done()
+        release.set()
+        assert first.result(timeout=5) == second.result(timeout=5) == "slow"
+    assert calls == ["slow"]
+
+
+def test_hourly_series_buckets_launches_uploads_and_evaluations(admin_ctx):
+    client, modules = admin_ctx
+    db_models = modules["db_models"]
+    for user in ("s1", "s2", "s3"):
+        _launch_lti(client, _lti_payload(user, "Learner"))
+        client.cookies.clear()
+
+    now = datetime.utcnow()
+    db = modules["database"].get_db_session()
+    for index, uploaded_at in enumerate([now, now - timedelta(hours=2), now - timedelta(hours=2), now - timedelta(days=3)]):
+        db.add(db_models.FileSubmissionDB(
+            id=f"f{index}", activity_id="act-001", activity_moodle_id="moodle-001", file_name="a.pdf",
+            file_path="x", file_size=1, file_type="application/pdf", uploaded_at=uploaded_at,
+            uploaded_by="s1", uploaded_by_moodle_id="moodle-001"
+        ))
+    db.add(db_models.GradeDB(id="g0", file_submission_id="f1", ai_score=7, ai_evaluated_at=now - timedelta(hours=1)))
+    db.commit()
+    db.close()
+
+    admin_login(client)
+    data = client.get("/api/admin/statistics/series", params={"hours": 6}).json()["data"]
+
+    assert len(data["series"]) == 6
+    assert data["totals"] == {"launches": 3, "uploads": 3, "evaluations": 1}
+    current, previous, two_ago = data["series"][-1], data["series"][-2], data["series"][-3]
+    assert current["hour"] == now.replace(minute=0, second=0, microsecond=0).isoformat()
+    assert (current["launches"], current["uploads"]) == (3, 1)
+    assert previous["evaluations"] == 1 and two_ago["uploads"] == 2
+    assert client.get("/api/admin/statistics/series", params={"hours": 0}).status_code == 400
+
+
+def test_init_db_adds_indexes_to_existing_tables(admin_ctx):
+    _, modules = admin_ctx
+    engine = modules["database"].engine
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_file_submissions_uploaded_at"))
+
+    # Same models as the last synchronization, but an index dropped by hand is recreated
+    modules["database"].init_db()
+    assert "ix_file_submissions_uploaded_at" in {index["name"] for index in inspect(engine).get_indexes("file_submissions")}
+
+    # A database from an older version (no or another fingerprint) is synchronized
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_file_submissions_uploaded_at"))
+        connection.execute(text("UPDATE schema_state SET fingerprint = 'older-models'"))
+    modules["database"].init_db()
+
+    indexes = {index["name"] for index in inspect(engine).get_indexes("file_submissions")}
+    assert "ix_file_submissions_uploaded_at" in indexes
+    with engine.connect() as connection:
+        stored = connection.execute(text("SELECT fingerprint FROM schema_state")).scalar()
+    assert stored == modules["database"].schema_fingerprint()
@@ -0,0 +1,142 @@
+"""
+Pruebas de la compresión en reposo de las entregas: política por tipo MIME,
+descarga comprimida o descomprimida al vuelo (también con rangos y en S3),
+deduplicación entre codificaciones y extracción de texto a través de un
+flujo descomprimido.
+"""
+
+import gzip
+import io
+import os
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+import requests
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+for path in (PROJECT_ROOT, PROJECT_ROOT / "benchmarks"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from conftest import lti_headers  # noqa: E402
+from document_extractor import DocumentExtractor  # noqa: E402
+from fake_servers import FakeS3Server  # noqa: E402
+
+TEXT = ("def evaluar(entrega):\n    return len(entrega.split())  # ñandú\n" * 400).encode("utf-8")
+
+
+@pytest.fixture
+def app_modules(app_modules, monkeypatch):
+    monkeypatch.setattr(app_modules["storage_service"], "STORAGE_COMPRESSION", "gzip")
+    return app_modules
+
+
+def _submit(client, activity_id, user_id, file_name, content, media_type):
+    teacher = lti_headers(client, "teacher1", "Instructor", resource_link_id=activity_id)
+    # Several calls share an activity: only the first one creates it
+    client.post("/api/activities", json={"title": activity_id, "description": "x", "activity_type": "individual"},
+                headers=teacher)
+    student = lti_headers(client, user_id, "Learner", resource_link_id=activity_id)
+    response = client.post(f"/api/activities/{activity_id}/submissions", headers=student,
+                           files={"file": (file_name, content, media_type)})
+    assert response.status_code == 200
+    return teacher, student, response.json()["submission"]["file_submission"]
+
+
+def test_gunzip_chunks_ranges():
+    from storage_service import gunzip_chunks
+
+    data = bytes(range(256)) * 5000
+    compressed = gzip.compress(data)
+    chunks = [compressed[i:i + 777] for i in range(0, len(compressed), 777)]
+    assert b"".join(gunzip_chunks(chunks)) == data
+    assert b"".join(gunzip_chunks(chunks, 1000, 1_100_000 - 1)) == data[1000:1_100_000]
+    assert b"".join(gunzip_chunks(chunks, len(data) - 3)) == data[-3:]
+
+
+def test_text_is_compressed_at_rest_and_served_either_way(app_modules, client, tmp_path):
+    teacher, student, file_submission = _submit(client, "act-gz", "s1", "solucion.py", TEXT, "text/x-python")
+    storage = app_modules["storage_service"].FileStorageService
+    assert "/blobs/gz/" in "/" + file_submission["file_path"].replace(os.sep, "/")
+    stored = (tmp_path / file_submission["file_path"]).read_bytes()
+    assert gzip.decompress(stored) == TEXT and len(stored) < len(TEXT) // 10
+    stat = storage.stat(file_submission["file_path"])
+    assert (stat.size, stat.encoding, stat.stored_size) == (len(TEXT), "gzip", len(stored))
+
+    url = f"/api/downloads/{file_submission['file_path']}"
+    encoded = client.get(url, headers={**teacher, "Accept-Encoding": "gzip"})
+    assert encoded.headers["content-encoding"] == "gzip" and encoded.headers["vary"] == "Accept-Encoding"
+    assert encoded.headers["etag"] == f'"{file_submission["content_hash"]}-gzip"'
+    assert encoded.content == TEXT  # decoded by the client
+    revalidated = client.get(url, headers={**teacher, "Accept-Encoding": "gzip", "If-None-Match": encoded.headers["etag"]})
+    assert revalidated.status_code == 304
+
+    plain = client.get(url, headers={**teacher, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and plain.content == TEXT
+    assert plain.headers["content-length"] == str(len(TEXT))
+    assert plain.headers["etag"] == f'"{file_submission["content_hash"]}"'
+
+    partial = client.get("/api/submissions/my-file/download", headers={**student, "Range": "bytes=5000-5099"})
+    assert partial.status_code == 206 and partial.content == TEXT[5000:5100]
+    assert partial.headers["content-range"] == f"bytes 5000-5099/{len(TEXT)}"
+
+    archive = client.get("/api/activities/act-gz/submissions/download", headers=teacher)
+    assert zipfile.ZipFile(io.BytesIO(archive.content)).read("Test_User.py") == TEXT
+
+    with storage.open_file(file_submission["file_path"]) as stream:
+        text = DocumentExtractor.extract_text_from_file("solucion.py", stream)
+    assert text == TEXT.decode("utf-8").strip()
+    with storage.local_file(file_submission["file_path"]) as local_path:
+        assert local_path.endswith(".py") and Path(local_path).read_bytes() == TEXT
+
+
+def test_policy_and_deduplication_across_encodings(app_modules, client, monkeypatch):
+    storage_module = app_modules["storage_service"]
+    # Incompressible bytes of a compressible type are kept as uploaded (minimum saving)
+    noise = os.urandom(64 * 1024)
+    _, _, random_pdf = _submit(client, "act-p", "s1", "scan.pdf", noise, "application/pdf")
+    assert "gz" not in Path(random_pdf["file_path"]).parts
+    # Types outside the policy are never compressed
+    _, _, archive = _submit(client, "act-p", "s2", "datos.zip", TEXT, "application/zip")
+    assert "gz" not in Path(archive["file_path"]).parts
+    assert storage_module.FileStorageService.compression_level("application/pdf") == 4
+    assert storage_module.FileStorageService.compression_level("text/markdown") == storage_module.STORAGE_COMPRESSION_LEVEL
+
+    _, _, first = _submit(client, "act-p", "s3", "notas.txt", TEXT, "text/plain")
+    monkeypatch.setattr(storage_module, "STORAGE_COMPRESSION", "")
+    # Same bytes after compression is disabled: the compressed blob is reused
+    _, _, second = _submit(client, "act-p", "s4", "notas.txt", TEXT, "text/plain")
+    assert second["file_path"] == first["file_path"] and "gz" in Path(first["file_path"]).parts
+
+    db = app_modules["database"].get_db_session()
+    try:
+        blob = db.get(app_modules["db_models"].StoredBlobDB, first["file_path"])
+        assert (blob.ref_count, blob.size) == (2, len(TEXT)) and blob.stored_size < len(TEXT)
+    finally:
+        db.close()
+
+
+def test_compressed_objects_on_s3(app_modules, client, monkeypatch):
+    with FakeS3Server() as server:
+        storage = app_modules["storage_service"].FileStorageService
+        storage.use_backend(app_modules["storage_backends"].S3StorageBackend(
+            server.base_url, "lamba", server.access_key, "lamba-secret-key"
+        ))
+        teacher, _, file_submission = _submit(client, "act-s3gz", "s1", "informe.md", TEXT, "text/markdown")
+        key = storage.storage_key(file_submission["file_path"])
+        assert key.startswith("blobs/gz/") and gzip.decompress(server.objects[("lamba", key)]) == TEXT
+
+        url = f"/api/downloads/{file_submission['file_path']}"
+        redirect = client.get(url, headers={**teacher, "Accept-Encoding": "gzip"}, follow_redirects=False)
+        assert redirect.status_code == 307
+        direct = requests.get(redirect.headers["location"])
+        assert direct.headers["content-encoding"] == "gzip" and direct.content == TEXT
+
+        plain = client.get(url, headers={**teacher, "Accept-Encoding": "identity"}, follow_redirects=False)
+        assert plain.status_code == 200 and plain.content == TEXT
+
+        seekable = DocumentExtractor.requires_seek("informe.pdf")
+        with storage.open_file(file_submission["file_path"], seekable=seekable) as stream:
+            assert stream.read() == TEXT
@@ -0,0 +1,113 @@
+"""
+Pruebas del reconciliador de almacenamiento: borrado diferido al commit,
+detección incremental de huérfanos, blobs sin referencias y filas colgantes,
+informe en seco, cuarentena y borrado desde la API de administración.
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from conftest import admin_login, lti_headers  # noqa: E402
+
+OLD = time.time() - 2 * 86400
+
+
+def _submit(client, user_id, content):
+    teacher = lti_headers(client, "teacher1", "Instructor", resource_link_id="act-r")
+    client.post("/api/activities", json={"title": "R", "description": "x", "activity_type": "individual"}, headers=teacher)
+    student = lti_headers(client, user_id, "Learner", resource_link_id="act-r")
+    response = client.post("/api/activities/act-r/submissions", headers=student,
+                           files={"file": ("trabajo.pdf", content, "application/pdf")})
+    return response.json()["submission"]["file_submission"]
+
+
+def _write(path: Path, data: bytes = b"x" * 100, mtime: float = OLD) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def _reconcile(client, **params):
+    admin_login(client)
+    response = client.post("/api/admin/storage/reconcile", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()["data"]
+
+
+def test_legacy_file_is_deleted_only_after_commit(admin_ctx, tmp_path):
+    _, modules = admin_ctx
+    storage = modules["storage_service"].FileStorageService
+    legacy = _write(tmp_path / "uploads" / "moodle-001" / "course-001" / "act-r" / "old.pdf")
+    db = modules["database"].get_db_session()
+    try:
+        storage.release_file(db, "uploads/moodle-001/course-001/act-r/old.pdf")
+        db.rollback()
+        assert legacy.exists()
+        storage.release_file(db, "uploads/moodle-001/course-001/act-r/old.pdf")
+        assert legacy.exists()
+        db.commit()
+        assert not legacy.exists()
+    finally:
+        db.close()
+
+
+def test_reconcile_report_quarantine_and_delete(admin_ctx, tmp_path):
+    client, modules = admin_ctx
+    uploads = tmp_path / "uploads"
+    kept = _submit(client, "s1", b"%PDF kept")
+    replaced = _submit(client, "s2", b"%PDF first version")
+    _submit(client, "s2", b"%PDF second version")  # first version: blob with ref_count 0
+    lost = _submit(client, "s3", b"%PDF lost")
+    (tmp_path / lost["file_path"]).unlink()  # dangling submission (and blob row)
+    for path in uploads.rglob("*.pdf"):
+        os.utime(path, (OLD, OLD))
+    orphan = _write(uploads / "moodle-001" / "course-001" / "act-r" / "abandoned.pdf", b"y" * 300)
+    temp_file = _write(uploads / "blobs" / "aa" / "bb" / ".tmp-crashed", b"z" * 50)
+    recent = _write(uploads / "moodle-001" / "course-001" / "act-r" / "uploading.pdf", mtime=time.time())
+
+    dry_run = _reconcile(client, action="report")
+    assert dry_run["keys_complete"] and dry_run["rows_complete"]
+    assert (dry_run["orphans"], dry_run["orphan_bytes"]) == (2, 350)
+    assert dry_run["unreferenced_blobs"] == 1 and dry_run["skipped_recent"] == 1
+    assert (dry_run["dangling_submissions"], dry_run["dangling_blobs"]) == (1, 1)
+    assert dry_run["deleted"] == dry_run["quarantined"] == 0
+    assert {item["kind"] for item in dry_run["items"]} == {"orphan", "unreferenced_blob", "dangling_submission",
+                                                           "dangling_blob"}
+    assert orphan.exists() and temp_file.exists() and (tmp_path / replaced["file_path"]).exists()
+
+    # Incremental: one key per pass, resuming from the cursor
+    first = _reconcile(client, action="report", max_keys=1, restart=True)
+    second = _reconcile(client, action="report", max_keys=1)
+    assert first["scanned_keys"] == second["scanned_keys"] == 1
+    assert second["cursor"]["key"] > first["cursor"]["key"] and not second["keys_complete"]
+
+    quarantine = _reconcile(client, action="quarantine", restart=True)
+    assert quarantine["quarantined"] == 3 and quarantine["errors"] == 0
+    assert quarantine["reclaimed_bytes"] == 350 + len(b"%PDF first version")
+    assert not orphan.exists() and not (tmp_path / replaced["file_path"]).exists()
+    assert len(list((uploads / ".quarantine").rglob("*"))) >= 3
+    assert recent.exists() and (tmp_path / kept["file_path"]).exists()
+
+    db = modules["database"].get_db_session()
+    try:
+        stored_blobs = {blob.path: blob.ref_count for blob in db.query(modules["db_models"].StoredBlobDB)}
+    finally:
+        db.close()
+    assert replaced["file_path"] not in stored_blobs  # zero-reference row collected with its file
+    assert stored_blobs[lost["file_path"]] == 1  # still referenced: reported, never removed
+
+    os.utime(recent, (OLD, OLD))
+    cleanup = _reconcile(client, action="delete", restart=True)
+    assert (cleanup["deleted"], cleanup["orphans"], cleanup["unreferenced_blobs"]) == (1, 1, 0)
+    assert not recent.exists() and cleanup["dangling_submissions"] == 1
+
+    assert client.post("/api/admin/storage/reconcile", params={"action": "purge"}).status_code == 400
+    status = client.get("/api/admin/storage/reconcile").json()["data"]
+    assert status["last_report"]["action"] == "delete" and status["interval_seconds"] == 0
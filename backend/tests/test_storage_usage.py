@@ -0,0 +1,116 @@
+"""
+Pruebas de la contabilidad de almacenamiento por Moodle, curso y actividad:
+contadores incrementales al entregar y reemplazar, cuotas al subir, API de
+administración y recálculo desde file_submissions.
+"""
+
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import metrics  # noqa: E402
+from conftest import admin_login, create_activity, lti_headers  # noqa: E402
+
+
+def _create_activity(client, activity_id):
+    create_activity(client, lti_headers(client, "teacher1", "Instructor", resource_link_id=activity_id), activity_id)
+
+
+def _submit(client, activity_id, user_id, content):
+    student = lti_headers(client, user_id, "Learner", resource_link_id=activity_id)
+    return client.post(f"/api/activities/{activity_id}/submissions", headers=student,
+                       files={"file": ("trabajo.txt", content, "text/plain")})
+
+
+def _usage(client, **params):
+    response = client.get("/api/admin/storage/usage", params=params)
+    assert response.status_code == 200, response.text
+    return {(row["level"], row["activity_id"]): row for row in response.json()["data"]}
+
+
+def test_counters_follow_uploads_and_quota_rejects(admin_ctx, tmp_path):
+    client, _ = admin_ctx
+    _create_activity(client, "act-a")
+    _create_activity(client, "act-b")
+    assert _submit(client, "act-a", "s1", b"a" * 1000).status_code == 200
+    assert _submit(client, "act-a", "s2", b"b" * 500).status_code == 200
+    assert _submit(client, "act-b", "s1", b"a" * 1000).status_code == 200  # deduplicated, still charged
+    assert _submit(client, "act-a", "s1", b"c" * 300).status_code == 200  # replacement: only the difference
+
+    admin_login(client)
+    usage = _usage(client)
+    assert (usage[("moodle", None)]["used_bytes"], usage[("moodle", None)]["file_count"]) == (1800, 3)
+    assert (usage[("course", None)]["used_bytes"], usage[("course", None)]["file_count"]) == (1800, 3)
+    assert (usage[("activity", "act-a")]["used_bytes"], usage[("activity", "act-a")]["file_count"]) == (800, 2)
+    assert usage[("activity", "act-b")]["used_bytes"] == 1000
+    assert usage[("moodle", None)]["quota_bytes"] is None
+    assert set(_usage(client, level="activity")) == {("activity", "act-a"), ("activity", "act-b")}
+    assert client.get("/api/admin/storage/usage", params={"level": "tenant"}).status_code == 400
+
+    response = client.put("/api/admin/storage/quota", json={"moodle_id": "moodle-001", "course_id": "course-001",
+                                                             "quota_bytes": 2000})
+    assert response.status_code == 200, response.text
+    assert response.json()["data"]["quota_override"] is True
+    assert response.json()["data"]["usage_ratio"] == 0.9
+    assert client.put("/api/admin/storage/quota", json={"moodle_id": "moodle-001",
+                                                         "quota_bytes": -1}).status_code == 400
+
+    files_before = sorted((tmp_path / "uploads").rglob("*.txt"))
+    rejected = _submit(client, "act-b", "s3", b"d" * 300)
+    assert rejected.status_code == 413
+    assert "curso" in rejected.json()["detail"]
+    assert sorted((tmp_path / "uploads").rglob("*.txt")) == files_before  # nothing written
+    assert _submit(client, "act-b", "s1", b"e" * 1100).status_code == 200  # +100 bytes fits
+    assert _submit(client, "act-b", "s4", b"f" * 100).status_code == 200
+
+    admin_login(client)
+    usage = _usage(client)
+    assert (usage[("course", None)]["used_bytes"], usage[("course", None)]["file_count"]) == (2000, 4)
+    assert usage[("activity", "act-b")]["used_bytes"] == 1200
+
+
+def test_default_quota_release_and_recompute(admin_ctx, monkeypatch):
+    client, modules = admin_ctx
+    usage_service = modules["storage_usage_service"]
+    monkeypatch.setattr(usage_service, "STORAGE_QUOTA_ACTIVITY_BYTES", 1500)
+    rejections_before = metrics.STORAGE_QUOTA_REJECTIONS.get("activity")
+    _create_activity(client, "act-q")
+    assert _submit(client, "act-q", "s1", b"a" * 1000).status_code == 200
+    assert _submit(client, "act-q", "s2", b"b" * 600).status_code == 413
+    assert metrics.STORAGE_QUOTA_REJECTIONS.get("activity") == rejections_before + 1
+
+    # Per-activity override wins over the default; 0 = unlimited
+    admin_login(client)
+    assert client.put("/api/admin/storage/quota", json={"moodle_id": "moodle-001", "course_id": "course-001",
+                                                         "activity_id": "act-q", "quota_bytes": 0}).status_code == 200
+    assert _submit(client, "act-q", "s2", b"b" * 600).status_code == 200
+
+    db_models = modules["db_models"]
+    db = modules["database"].get_db_session()
+    try:
+        submission = db.query(db_models.FileSubmissionDB).filter_by(uploaded_by="s2").one()
+        modules["storage_service"].FileStorageService.release_file(
+            db, submission.file_path, usage_service.UsageScope("moodle-001", "course-001", "act-q"),
+            submission.file_size
+        )
+        db.delete(db.query(db_models.StudentSubmissionDB).filter_by(file_submission_id=submission.id).one())
+        db.delete(submission)
+        db.commit()
+        moodle_row = db.get(db_models.StorageUsageDB, ("moodle-001", "", ""))
+        assert (moodle_row.used_bytes, moodle_row.file_count) == (1000, 1)
+        moodle_row.used_bytes, moodle_row.file_count = 123456, 9  # drift
+        db.commit()
+    finally:
+        db.close()
+
+    admin_login(client)
+    response = client.post("/api/admin/storage/usage/recompute")
+    assert response.status_code == 200, response.text
+    assert response.json()["data"] == {"counters": 3, "files": 1, "bytes": 1000}
+    usage = _usage(client, moodle_id="moodle-001")
+    assert (usage[("moodle", None)]["used_bytes"], usage[("moodle", None)]["file_count"]) == (1000, 1)
+    assert usage[("activity", "act-q")]["quota_bytes"] is None  # override (unlimited) kept
+    assert usage[("activity", "act-q")]["quota_override"] is True
@@ -0,0 +1,127 @@
+"""
+Pruebas del trazado por spans: muestreo de cabecera, propagación a hilos
+y trabajos en segundo plano, y exportación a fichero.
+"""
+
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import tracing  # noqa: E402
+from test_endpoints import _lti_payload, _reload_app_modules  # noqa: E402
+
+
+@pytest.fixture
+def trace_file(tmp_path, monkeypatch):
+    """Enable the file exporter with every trace sampled"""
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_EXPORTER", "file")
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(path))
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    yield path
+    tracing.flush()
+
+
+def _exported(path):
+    tracing.flush()
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_disabled_tracing_is_a_noop(monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_EXPORTER", "")
+
+    with tracing.span("anything") as current:
+        assert current is tracing.NOOP_SPAN
+        assert tracing.current_traceparent() is None
+
+
+def test_unsampled_traces_export_nothing(trace_file, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 0.0)
+
+    with tracing.span("root") as root:
+        with tracing.span("child") as child:
+            assert child.sampled is False
+        assert root.traceparent.endswith("-00")
+
+    assert _exported(trace_file) == []
+
+
+def test_children_share_trace_across_threads_and_async(trace_file):
+    @tracing.traced("async.work")
+    async def async_work():
+        return tracing.current_span().trace_id
+
+    def thread_work(_):
+        with tracing.span("thread.work") as current:
+            return current.trace_id
+
+    with tracing.span("root") as root:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            thread_trace_ids = list(executor.map(tracing.bind_context(thread_work), range(2)))
+        async_trace_id = asyncio.run(async_work())
+
+    assert set(thread_trace_ids) == {root.trace_id}
+    assert async_trace_id == root.trace_id
+
+
+def test_parent_traceparent_continues_remote_trace(trace_file):
+    parent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+    with tracing.span("background", parent=parent):
+        pass
+
+    [exported] = _exported(trace_file)
+    assert exported["traceId"] == "0af7651916cd43dd8448eb211c80319c"
+    assert exported["parentSpanId"] == "b7ad6b7169203331"
+    assert tracing.parse_traceparent("not-a-traceparent") is None
+
+
+def test_errors_are_recorded_in_span_status(trace_file):
+    with pytest.raises(ValueError):
+        with tracing.span("failing"):
+            raise ValueError("boom")
+
+    [exported] = _exported(trace_file)
+    assert exported["status"] == {"code": tracing.STATUS_ERROR, "message": "ValueError: boom"}
+
+
+def test_lti_launch_and_background_evaluation_are_traced(trace_file, tmp_path, monkeypatch):
+    modules = _reload_app_modules(tmp_path, monkeypatch)
+    with TestClient(modules["main"].app) as client:
+        resp = client.post("/lti", data=_lti_payload(user_id="teacher1", roles="Instructor"), follow_redirects=False)
+        assert resp.status_code == 303
+
+    spans = _exported(trace_file)
+    by_name = {span["name"]: span for span in spans}
+    request_span = by_name["POST /lti"]
+    launch_span = by_name["lti.launch"]
+    assert request_span["kind"] == tracing.KIND_SERVER
+    assert launch_span["parentSpanId"] == request_span["spanId"]
+    db_spans = [span for span in spans if span["name"].startswith("db.")]
+    assert db_spans and all(span["traceId"] == request_span["traceId"] for span in db_spans)
+
+    parent = f"00-{request_span['traceId']}-{request_span['spanId']}-01"
+    modules["activities_router"].run_background_evaluation(
+        activity_id="act-001",
+        activity_moodle_id="moodle-001",
+        file_submission_ids=["missing"],
+        evaluator_id="eval",
+        debug_mode=False,
+        trace_parent=parent,
+    )
+
+    spans = {span["name"]: span for span in _exported(trace_file)}
+    assert spans["evaluation.background"]["parentSpanId"] == request_span["spanId"]
+    assert spans["evaluation.batch"]["parentSpanId"] == spans["evaluation.background"]["spanId"]
+    assert spans["evaluation.submission"]["traceId"] == request_span["traceId"]
@@ -0,0 +1,391 @@
+"""
+Tracing - Lightweight span tracing with W3C trace context
+
+Handles:
+- Spans as context managers / decorators, parented through contextvars
+- Head sampling: the decision is taken once per trace, at its root span
+- Propagation into background jobs and worker threads (traceparent strings)
+- Export to a local JSONL file or to an OTLP/HTTP (JSON) collector
+
+When TRACE_EXPORTER is empty, span() returns a shared no-op object and no
+context is touched. Unsampled traces only carry the sampling decision.
+Spans are exported from a background thread, never on the request path.
+"""
+
+import atexit
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar, copy_context
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# '' (disabled), 'file' or 'otlp'
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', '').lower()
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+# Fraction of new traces that are recorded (head sampling)
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.1'))
+TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'lamba')
+# Seconds between exporter flushes
+TRACE_FLUSH_INTERVAL = float(os.getenv('TRACE_FLUSH_INTERVAL', '5'))
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+# OTLP status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# Spans buffered in memory at most; newer spans are dropped when full
+_MAX_QUEUE = 10000
+_BATCH_SIZE = 512
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('lamba_current_span', default=None)
+
+
+class Span:
+    """A timed operation within a trace"""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'sampled', 'kind',
+                 'attributes', 'start_ns', 'end_ns', 'status', 'status_message', '_token')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool,
+                 kind: int = KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.span_id = f'{random.getrandbits(64):016x}' if sampled else parent_id
+        self.kind = kind
+        self.attributes = attributes if sampled and attributes else {}
+        self.start_ns = time.time_ns() if sampled else 0
+        self.end_ns = 0
+        self.status = 0
+        self.status_message = ''
+        self._token = None
+
+    @property
+    def traceparent(self) -> str:
+        """W3C traceparent header value for this span"""
+        return f"00-{self.trace_id}-{self.span_id or '0' * 16}-{'01' if self.sampled else '00'}"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if self.sampled:
+            self.attributes[key] = value
+
+    def set_error(self, message: str) -> None:
+        if self.sampled:
+            self.status = STATUS_ERROR
+            self.status_message = message
+
+    def end(self) -> None:
+        if self.sampled and not self.end_ns:
+            self.end_ns = time.time_ns()
+            _EXPORTER.submit(self)
+
+    def __enter__(self) -> 'Span':
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is not None:
+            self.set_error(f'{exc_type.__name__}: {exc}')
+        self.end()
+        _current_span.reset(self._token)
+
+
+class _NoopSpan:
+    """Returned when tracing is disabled; every operation is a no-op"""
+
+    sampled = False
+    traceparent = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_error(self, message: str) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def is_enabled() -> bool:
+    return bool(TRACE_EXPORTER)
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Parse a W3C traceparent header into trace_id, span_id and sampled"""
+    match = _TRACEPARENT.match((value or '').strip().lower())
+    if not match:
+        return None
+    return {'trace_id': match.group(1), 'span_id': match.group(2), 'sampled': int(match.group(3), 16) & 1 == 1}
+
+
+def span(name: str, kind: int = KIND_INTERNAL, parent: Optional[str] = None, **attributes: Any):
+    """Create a span, child of the current span (or of the parent traceparent)
+
+    Usage:
+        with tracing.span('lamb.chat_completions', evaluator_id=evaluator_id) as current:
+            ...
+
+    Args:
+        name: Span name
+        kind: KIND_INTERNAL, KIND_SERVER or KIND_CLIENT
+        parent: Optional traceparent string (e.g. captured before handing
+            work to a background job); overrides the current span
+        **attributes: Span attributes (only stored when sampled)
+    """
+    if not TRACE_EXPORTER:
+        return NOOP_SPAN
+
+    remote = parse_traceparent(parent) if parent else None
+    if remote is not None:
+        return Span(name, remote['trace_id'], remote['span_id'], remote['sampled'], kind, attributes)
+
+    current = _current_span.get()
+    if current is not None:
+        return Span(name, current.trace_id, current.span_id, current.sampled, kind, attributes)
+
+    # Root span: head sampling decision for the whole trace
+    sampled = random.random() < TRACE_SAMPLE_RATE
+    return Span(name, f'{random.getrandbits(128):032x}', None, sampled, kind, attributes)
+
+
+def current_span():
+    """The active span (a no-op span when there is none)"""
+    return _current_span.get() or NOOP_SPAN
+
+
+def current_traceparent() -> Optional[str]:
+    """traceparent of the active span, to hand over to background jobs"""
+    current = _current_span.get()
+    return current.traceparent if current is not None else None
+
+
+def traced(name: str, kind: int = KIND_INTERNAL) -> Callable:
+    """Decorator running a (sync or async) function inside a span"""
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, kind):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def spans_over(name: str, items: Iterable[Any], attribute: str) -> Iterator[Any]:
+    """Iterate over items, each iteration running inside its own span
+
+    The span for an item ends when the loop moves on to the next item, so
+    'continue' works as expected. The loop must run to completion.
+
+    Args:
+        name: Span name
+        items: Items to iterate over
+        attribute: Attribute name under which each item is recorded
+    """
+    for item in items:
+        with span(name, **{attribute: item}):
+            yield item
+
+
+def bind_context(func: Callable) -> Callable:
+    """Bind func to the current context so spans it creates in worker
+    threads (e.g. ThreadPoolExecutor) are parented to the current span"""
+    if not TRACE_EXPORTER:
+        return func
+    context = copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # A context can only be entered by one thread at a time
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
+
+
+def _attribute_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(span_data: Span) -> Dict[str, Any]:
+    """Encode a finished span in the OTLP/JSON span format"""
+    encoded = {
+        'traceId': span_data.trace_id,
+        'spanId': span_data.span_id,
+        'name': span_data.name,
+        'kind': span_data.kind,
+        'startTimeUnixNano': str(span_data.start_ns),
+        'endTimeUnixNano': str(span_data.end_ns),
+        'attributes': [{'key': key, 'value': _attribute_value(value)} for key, value in span_data.attributes.items()],
+    }
+    if span_data.parent_id:
+        encoded['parentSpanId'] = span_data.parent_id
+    if span_data.status:
+        encoded['status'] = {'code': span_data.status, 'message': span_data.status_message}
+    return encoded
+
+
+class _Exporter:
+    """Buffers finished spans and exports them from a daemon thread"""
+
+    def __init__(self):
+        self._queue: 'queue.Queue[Span]' = queue.Queue(maxsize=_MAX_QUEUE)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def submit(self, finished: Span) -> None:
+        try:
+            self._queue.put_nowait(finished)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self._thread is None:
+            self._start()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(TRACE_FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self) -> None:
+        """Export every buffered span"""
+        while True:
+            batch: List[Span] = []
+            while len(batch) < _BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            try:
+                self._export([to_otlp(item) for item in batch])
+            except Exception as e:
+                logger.warning("Could not export %s spans: %s", len(batch), e)
+
+    def _export(self, spans: List[Dict[str, Any]]) -> None:
+        if TRACE_EXPORTER == 'file':
+            with open(TRACE_FILE, 'a', encoding='utf-8') as trace_file:
+                for encoded in spans:
+                    trace_file.write(json.dumps(encoded) + '\n')
+        elif TRACE_EXPORTER == 'otlp':
+            payload = {'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': TRACE_SERVICE_NAME}}]},
+                'scopeSpans': [{'scope': {'name': 'lamba'}, 'spans': spans}]
+            }]}
+            response = requests.post(TRACE_OTLP_ENDPOINT, json=payload, timeout=10)
+            response.raise_for_status()
+
+
+_EXPORTER = _Exporter()
+
+
+def flush() -> None:
+    """Export all finished spans now (used at shutdown and in tests)"""
+    _EXPORTER.flush()
+
+
+atexit.register(flush)
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware opening a server span per HTTP request
+
+    Honours an incoming traceparent header. The span ends when the response
+    body has been sent, so background tasks attached to the response are
+    not counted in the request duration.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not TRACE_EXPORTER:
+            await self.app(scope, receive, send)
+            return
+
+        parent = None
+        for key, value in scope.get('headers', ()):
+            if key == b'traceparent':
+                parent = value.decode('latin-1')
+                break
+
+        request_span = span(f"{scope['method']} {scope['path']}", KIND_SERVER, parent=parent)
+
+        def finish(status: Optional[int] = None) -> None:
+            if request_span.end_ns or not request_span.sampled:
+                return
+            route = scope.get('route')
+            if route is not None:
+                request_span.name = f"{scope['method']} {route.path}"
+                request_span.set_attribute('http.route', route.path)
+            request_span.set_attribute('http.method', scope['method'])
+            if status is not None:
+                request_span.set_attribute('http.status_code', status)
+                if status >= 500:
+                    request_span.set_error(f'HTTP {status}')
+            request_span.end()
+
+        status_holder = [None]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status_holder[0] = message['status']
+            await send(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                finish(status_holder[0])
+
+        token = _current_span.set(request_span)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            request_span.set_error(f'{type(e).__name__}: {e}')
+            raise
+        finally:
+            finish(status_holder[0])
+            _current_span.reset(token)
@@ -0,0 +1,136 @@
+"""
+Warm-up - Connections opened before the instance reports ready
+
+Handles:
+- Database pool: WARMUP_DB_CONNECTIONS connections opened (and their
+  PRAGMAs run) and returned to the pool, so the first requests after a
+  scale-up do not pay for them
+- LAMB: WARMUP_LAMB_CONNECTIONS concurrent GET /v1/models through the
+  shared session of LAMBAPIService; the TCP/TLS connections stay in its
+  keep-alive pool for the first evaluations
+- Readiness for /readyz: not ready until the warm-up has finished, then
+  ready while the database answers. A LAMB failure is only logged:
+  evaluations already retry, and an instance that cannot reach LAMB still
+  serves teachers and students
+- Startup phase timings (imports, init_db, warm-up...), logged once and
+  returned by /readyz
+
+The warm-up runs as a background task of the lifespan: the server accepts
+connections (and /healthz answers) while it is in progress.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+
+import database
+import lamb_recorder
+from lamb_api_service import LAMBAPIService
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'true').lower() == 'true'
+# Database connections opened before ready (capped by DB_POOL_SIZE: extra ones would be closed on return)
+WARMUP_DB_CONNECTIONS = int(os.getenv('WARMUP_DB_CONNECTIONS', '4'))
+# Concurrent LAMB requests (0 = do not contact LAMB at startup)
+WARMUP_LAMB_CONNECTIONS = int(os.getenv('WARMUP_LAMB_CONNECTIONS', '2'))
+# Seconds each warm-up request may take
+WARMUP_TIMEOUT = float(os.getenv('WARMUP_TIMEOUT', '5'))
+
+_phases: Dict[str, float] = {}  # phase -> seconds
+_checks: Dict[str, Any] = {}
+_warmed = False
+
+
+def record_phase(name: str, seconds: float) -> None:
+    _phases[name] = seconds
+
+
+def startup_report() -> Dict[str, float]:
+    """Milliseconds of each startup phase so far"""
+    return {name: round(seconds * 1000, 1) for name, seconds in _phases.items()}
+
+
+def _warm_database() -> Dict[str, Any]:
+    count = 1 if database._in_memory else max(1, min(WARMUP_DB_CONNECTIONS, database.DB_POOL_SIZE))
+    connections = []
+    try:
+        for _ in range(count):
+            connection = database.engine.connect()
+            connections.append(connection)
+            connection.execute(text('SELECT 1'))
+    finally:
+        for connection in connections:
+            connection.close()  # back to the pool, still open
+    return {'ok': True, 'connections': count}
+
+
+def _warm_lamb() -> Dict[str, Any]:
+    if WARMUP_LAMB_CONNECTIONS <= 0 or lamb_recorder.is_replaying():
+        return {'ok': True, 'connections': 0}
+    url = f"{LAMBAPIService.LAMB_API_URL}/v1/models"
+    session = LAMBAPIService.session()
+    count = min(WARMUP_LAMB_CONNECTIONS, LAMBAPIService.LAMB_POOL_SIZE)
+    with ThreadPoolExecutor(max_workers=count, thread_name_prefix='warmup-lamb') as pool:
+        statuses = list(pool.map(lambda _: session.get(url, timeout=WARMUP_TIMEOUT).status_code, range(count)))
+    return {'ok': all(status < 500 for status in statuses), 'connections': count, 'status': statuses[0]}
+
+
+def warm_up() -> Dict[str, Any]:
+    """Open the DB and LAMB connections (blocking; both at once)"""
+    global _warmed
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix='warmup') as pool:
+        tasks = {'database': pool.submit(_warm_database), 'lamb': pool.submit(_warm_lamb)}
+        for name, task in tasks.items():
+            try:
+                _checks[name] = task.result()
+            except Exception as e:
+                logger.warning("Warm-up de %s fallido: %s: %s", name, type(e).__name__, e)
+                _checks[name] = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+    record_phase('warmup', time.perf_counter() - started)
+    _warmed = True
+    logger.info("Arranque completado (ms por fase): %s", startup_report())
+    return dict(_checks)
+
+
+async def _run() -> None:
+    await run_in_threadpool(warm_up)
+
+
+def start_background() -> Optional[asyncio.Task]:
+    """Start the warm-up (call from the app lifespan); without it the instance is ready at once"""
+    global _warmed
+    if not WARMUP_ENABLED:
+        _warmed = True
+        logger.info("Arranque completado sin warm-up (ms por fase): %s", startup_report())
+        return None
+    return asyncio.create_task(_run(), name='warmup')
+
+
+def _ping_database() -> bool:
+    try:
+        with database.engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+        return True
+    except Exception as e:
+        logger.warning("Readiness: la base de datos no responde: %s", e)
+        return False
+
+
+def readiness() -> Tuple[bool, Dict[str, Any]]:
+    """(ready, body of /readyz); blocking (pings the database)"""
+    if not _warmed:
+        return False, {'status': 'starting', 'startup_ms': startup_report()}
+    ready = _ping_database()
+    return ready, {
+        'status': 'ready' if ready else 'unavailable',
+        'checks': dict(_checks),
+        'startup_ms': startup_report()
+    }
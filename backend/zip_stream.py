@@ -0,0 +1,101 @@
+"""
+ZIP Stream - ZIP archives generated on the fly
+
+Handles:
+- Writing ZIP archives to an iterator of byte chunks (no temp file, no seeking)
+- Entries read from files in fixed-size chunks or from byte iterators
+- Per-entry compression (stored for already-compressed documents)
+
+zipfile writes to non-seekable outputs using data descriptors, so every
+chunk can be handed to the client as soon as it is produced: memory use is
+bounded by the chunk size whatever the archive size.
+"""
+
+import io
+import os
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class ZipEntry:
+    """One archive member: a file on disk (`path`) or generated bytes (`chunks`)"""
+    name: str
+    path: Optional[str] = None
+    chunks: Optional[Iterable[bytes]] = None
+    modified: Optional[datetime] = None
+    compress_type: int = zipfile.ZIP_STORED
+    # ZIP64 headers: None = only when the size is unknown (generated entries).
+    # Small known-size members (e.g. XLSX parts) can disable them for picky readers.
+    zip64: Optional[bool] = None
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """Non-seekable sink collecting what zipfile writes until it is drained"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _zip_info(entry: ZipEntry) -> zipfile.ZipInfo:
+    modified = entry.modified or datetime.now()
+    info = zipfile.ZipInfo(entry.name, date_time=modified.timetuple()[:6])
+    info.compress_type = entry.compress_type
+    info.external_attr = 0o644 << 16
+    if entry.path is not None:
+        info.file_size = os.path.getsize(entry.path)
+    return info
+
+
+def _entry_chunks(entry: ZipEntry) -> Iterator[bytes]:
+    if entry.path is None:
+        yield from entry.chunks or ()
+        return
+    with open(entry.path, 'rb') as source:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def iter_zip(entries: Iterable[ZipEntry]) -> Iterator[bytes]:
+    """Yield the bytes of a ZIP archive holding `entries`, as they are produced"""
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', allowZip64=True) as archive:
+        for entry in entries:
+            info = _zip_info(entry)
+            zip64 = entry.path is None if entry.zip64 is None else entry.zip64
+            with archive.open(info, 'w', force_zip64=zip64) as member:
+                for chunk in _entry_chunks(entry):
+                    member.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            data = buffer.drain()
+            if data:
+                yield data
+    data = buffer.drain()
+    if data:
+        yield data
@@ -4,6 +4,16 @@
 
 const API_BASE_URL = '/api/admin';
 
+/**
+ * URL of a paginated admin listing
+ * @param {string} path
+ * @param {Record<string, string>} params
+ */
+function listingUrl(path, params) {
+  const query = new URLSearchParams(params).toString();
+  return `${API_BASE_URL}/${path}${query ? `?${query}` : ''}`;
+}
+
 export const adminAuth = {
   /**
    * @param {string} username
@@ -70,8 +80,11 @@ export const adminAPI = {
     return await response.json();
   },
 
-  async getMoodleInstances() {
-    const response = await fetch(`${API_BASE_URL}/moodle-instances`, {
+  /**
+   * @param {Record<string, string>} [params] limit, cursor and column filters
+   */
+  async getMoodleInstances(params = {}) {
+    const response = await fetch(listingUrl('moodle-instances', params), {
       credentials: 'include'
     });
 
@@ -82,8 +95,11 @@ export const adminAPI = {
     return await response.json();
   },
 
-  async getCourses() {
-    const response = await fetch(`${API_BASE_URL}/courses`, {
+  /**
+   * @param {Record<string, string>} [params] limit, cursor and column filters
+   */
+  async getCourses(params = {}) {
+    const response = await fetch(listingUrl('courses', params), {
       credentials: 'include'
     });
 
@@ -94,8 +110,11 @@ export const adminAPI = {
     return await response.json();
   },
 
-  async getActivities() {
-    const response = await fetch(`${API_BASE_URL}/activities`, {
+  /**
+   * @param {Record<string, string>} [params] limit, cursor and column filters
+   */
+  async getActivities(params = {}) {
+    const response = await fetch(listingUrl('activities', params), {
       credentials: 'include'
     });
 
@@ -106,8 +125,11 @@ export const adminAPI = {
     return await response.json();
   },
 
-  async getUsers() {
-    const response = await fetch(`${API_BASE_URL}/users`, {
+  /**
+   * @param {Record<string, string>} [params] limit, cursor and column filters
+   */
+  async getUsers(params = {}) {
+    const response = await fetch(listingUrl('users', params), {
       credentials: 'include'
     });
 
@@ -118,8 +140,11 @@ export const adminAPI = {
     return await response.json();
   },
 
-  async getSubmissions() {
-    const response = await fetch(`${API_BASE_URL}/submissions`, {
+  /**
+   * @param {Record<string, string>} [params] limit, cursor and column filters
+   */
+  async getSubmissions(params = {}) {
+    const response = await fetch(listingUrl('submissions', params), {
       credentials: 'include'
     });
 
@@ -130,8 +155,11 @@ export const adminAPI = {
     return await response.json();
   },
 
-  async getFiles() {
-    const response = await fetch(`${API_BASE_URL}/files`, {
+  /**
+   * @param {Record<string, string>} [params] limit, cursor and column filters
+   */
+  async getFiles(params = {}) {
+    const response = await fetch(listingUrl('files', params), {
       credentials: 'include'
     });
 
@@ -142,8 +170,11 @@ export const adminAPI = {
     return await response.json();
   },
 
-  async getGrades() {
-    const response = await fetch(`${API_BASE_URL}/grades`, {
+  /**
+   * @param {Record<string, string>} [params] limit, cursor and column filters
+   */
+  async getGrades(params = {}) {
+    const response = await fetch(listingUrl('grades', params), {
       credentials: 'include'
     });
 
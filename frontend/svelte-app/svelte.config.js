@@ -16,7 +16,8 @@ const config = {
 			pages: '../build',
 			assets: '../build',
 			fallback: 'index.html',
-			precompress: false,
+			// .br/.gz next to every asset, served by backend/frontend_assets.py
+			precompress: true,
 			strict: true
 		}),
 		// Ensure appDir matches the base path structure if needed